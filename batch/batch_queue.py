@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+"""
+batch_queue.py
+==============
+Work-stealing batch runner: every GPU worker takes the next sample from one
+shared queue as soon as it is free, instead of a fixed round-robin shard.
+
+Per-sample cost varies a lot (mask size, voxel count, multiview), so with
+fixed shards some GPUs idle while others work through a long tail. Here the
+queue is a SQLite file (no service to run) that any number of workers, in
+one or several processes, lease samples from:
+
+- a lease expires unless its worker sends heartbeats, so the samples of a
+  crashed worker (or of a killed runner) go back to the queue;
+- a failed sample is retried, up to --max-attempts attempts in total;
+- the queue file outlives the runner: rerunning the same command resumes,
+  skipping the samples already done. After a change of the SAM3D settings
+  pass --fresh, which queues every given sample again.
+
+Each worker runs ``run_batch.sh <sample>`` pinned to its GPU, logging to
+$OUTPUT_DIR/_logs/gpu<N>.log as run_batch_parallel.sh did. At the end the
+runner prints per-worker utilization (busy time over the batch wall time).
+
+Usage (env: any python3; the stages activate their own envs)
+    python batch_queue.py --gpus 0 1 [sample ...]
+    python batch_queue.py --gpus 0 1 2 3 --queue output/images/_queue.sqlite
+    python batch_queue.py --gpus 0 1 --fresh                 # rerun samples already done
+    python batch_queue.py --simulate 200 --gpus 0 1 2 3   # makespan vs round-robin
+"""
+import argparse
+import heapq
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import closing, contextmanager
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    name TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    task TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    ok INTEGER
+);
+"""
+
+
+class TaskQueue:
+    """
+    A queue of named tasks in a SQLite file, shared by threads and processes.
+
+    Args:
+        path (str): The SQLite file, created if missing.
+        lease_seconds (float): How long a lease lasts without a heartbeat.
+        max_attempts (int): Attempts of a task before it is marked failed.
+        clock: Time source, replaced by a virtual clock in simulations.
+    """
+
+    def __init__(self, path, lease_seconds=60.0, max_attempts=3, clock=time.time):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.clock = clock
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # one connection per operation: connections are not shared by threads
+        with closing(sqlite3.connect(self.path, timeout=60, isolation_level=None)) as db:
+            yield db
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as db:
+            # take the write lock up front, so two workers never lease one task
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def add(self, names):
+        """Queue `names`; tasks already known keep their state (resume)."""
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO tasks (name, status) VALUES (?, ?)",
+                [(name, PENDING) for name in names],
+            )
+
+    def reset(self, names):
+        """Queue `names` again from scratch, whatever their state (a fresh run)."""
+        with self._transaction() as db:
+            db.executemany(
+                "UPDATE tasks SET status = ?, worker = NULL, lease_until = NULL,"
+                " attempts = 0, error = NULL WHERE name = ?",
+                [(PENDING, name) for name in names],
+            )
+
+    def retry_failed(self):
+        """Give the tasks that used up their attempts a new set of attempts."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE tasks SET status = ?, attempts = 0 WHERE status = ?",
+                (PENDING, FAILED),
+            )
+
+    def lease(self, worker):
+        """
+        Lease the next pending task (or one whose lease expired) to `worker`;
+        None when no task is available right now.
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            while True:
+                row = db.execute(
+                    "SELECT name, status, worker, attempts FROM tasks"
+                    " WHERE status = ? OR (status = ? AND lease_until < ?)"
+                    " ORDER BY rowid LIMIT 1",
+                    (PENDING, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                name, status, previous_worker, attempts = row
+                if status == PENDING:
+                    break
+                # its worker is gone: close the attempt, count it as failed
+                self._finish_attempt(db, name, previous_worker, now, False)
+                if attempts < self.max_attempts:
+                    break
+                db.execute(
+                    "UPDATE tasks SET status = ?, lease_until = NULL, error = ? WHERE name = ?",
+                    (FAILED, "lease expired", name),
+                )
+            db.execute(
+                "UPDATE tasks SET status = ?, worker = ?, lease_until = ?,"
+                " attempts = attempts + 1 WHERE name = ?",
+                (RUNNING, worker, now + self.lease_seconds, name),
+            )
+            db.execute(
+                "INSERT INTO attempts (task, worker, started) VALUES (?, ?, ?)",
+                (name, worker, now),
+            )
+            return name
+
+    def heartbeat(self, worker, name):
+        """Extend `worker`'s lease of `name`; False when it lost the lease."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET lease_until = ?"
+                " WHERE name = ? AND worker = ? AND status = ?",
+                (self.clock() + self.lease_seconds, name, worker, RUNNING),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, worker, name, ok, error=None):
+        """
+        Record the outcome of `worker`'s attempt at `name`. A failed task goes
+        back to the queue until it used up its attempts. Outcomes of attempts
+        whose lease was taken over are ignored.
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT attempts FROM tasks WHERE name = ? AND worker = ? AND status = ?",
+                (name, worker, RUNNING),
+            ).fetchone()
+            if row is None:
+                return
+            if ok:
+                status = DONE
+            else:
+                status = PENDING if row[0] < self.max_attempts else FAILED
+            db.execute(
+                "UPDATE tasks SET status = ?, lease_until = NULL, error = ? WHERE name = ?",
+                (status, error, name),
+            )
+            self._finish_attempt(db, name, worker, now, ok)
+
+    @staticmethod
+    def _finish_attempt(db, name, worker, now, ok):
+        db.execute(
+            "UPDATE attempts SET finished = ?, ok = ?"
+            " WHERE task = ? AND worker = ? AND finished IS NULL",
+            (now, int(ok), name, worker),
+        )
+
+    def counts(self, names=None):
+        """Number of tasks per status, of the tasks `names` if given."""
+        with self._connect() as db:
+            if names is None:
+                rows = db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+                return {status: count for status, count in rows}
+            counts = {}
+            for name in names:
+                row = db.execute("SELECT status FROM tasks WHERE name = ?", (name,)).fetchone()
+                if row is not None:
+                    counts[row[0]] = counts.get(row[0], 0) + 1
+            return counts
+
+    def unfinished(self):
+        counts = self.counts()
+        return counts.get(PENDING, 0) + counts.get(RUNNING, 0)
+
+    def failed(self):
+        with self._connect() as db:
+            return db.execute(
+                "SELECT name, error FROM tasks WHERE status = ? ORDER BY rowid", (FAILED,)
+            ).fetchall()
+
+    def utilization(self, since=None):
+        """
+        Per worker: finished attempts, failed ones, busy seconds and the
+        fraction of the wall time (first start to last finish, of attempts
+        started at or after `since`) it was busy.
+        """
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT worker, started, finished, ok FROM attempts"
+                " WHERE finished IS NOT NULL AND started >= ?",
+                (since if since is not None else float("-inf"),),
+            ).fetchall()
+        if not rows:
+            return {}
+        wall = max(row[2] for row in rows) - min(row[1] for row in rows)
+        report = {}
+        for worker, started, finished, ok in rows:
+            entry = report.setdefault(worker, {"done": 0, "failed": 0, "busy": 0.0})
+            entry["done" if ok else "failed"] += 1
+            entry["busy"] += finished - started
+        for entry in report.values():
+            entry["utilization"] = entry["busy"] / wall if wall > 0 else 1.0
+        return report
+
+
+def run_worker(queue, worker, process, heartbeat_interval=None):
+    """
+    Lease and `process(name) -> bool` tasks until none is left, sending
+    heartbeats from a side thread while a task runs. An exception in
+    `process` counts as a failed attempt.
+    """
+    if heartbeat_interval is None:
+        heartbeat_interval = queue.lease_seconds / 4
+    while True:
+        name = queue.lease(worker)
+        if name is None:
+            if queue.unfinished() == 0:
+                return
+            # the rest is leased by others, wait for retries or expiries
+            time.sleep(min(heartbeat_interval, 1.0))
+            continue
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(heartbeat_interval):
+                queue.heartbeat(worker, name)
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        error = None
+        try:
+            ok = bool(process(name))
+        except Exception as exc:
+            ok, error = False, repr(exc)
+        finally:
+            stop.set()
+            beater.join()
+        queue.complete(worker, name, ok, error)
+
+
+def format_utilization(report):
+    lines = [f"{'worker':>24} {'done':>5} {'failed':>6} {'busy s':>9} {'util':>6}"]
+    for worker in sorted(report):
+        entry = report[worker]
+        lines.append(
+            f"{worker:>24} {entry['done']:>5} {entry['failed']:>6} "
+            f"{entry['busy']:>9.1f} {entry['utilization']:>6.1%}"
+        )
+    return "\n".join(lines)
+
+
+# -- simulation ---------------------------------------------------------------
+
+
+def round_robin_makespan(costs, num_workers):
+    """Makespan of the sharding of run_batch_parallel.sh: worker i runs samples i, i + N, ..."""
+    return max(sum(costs[i::num_workers]) for i in range(num_workers))
+
+
+def simulate_queue(costs, num_workers, fail_once=()):
+    """
+    Run `num_workers` simulated workers against a real TaskQueue on a virtual
+    clock: task i takes costs[i] seconds, the tasks in `fail_once` fail their
+    first attempt. Simulated workers never crash, so their leases never
+    expire. Returns (makespan, utilization report).
+    """
+    now = [0.0]
+    pending_failures = set(fail_once)
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = TaskQueue(
+            os.path.join(tmp, "queue.sqlite"), float("inf"), clock=lambda: now[0]
+        )
+        names = [str(i) for i in range(len(costs))]
+        queue.add(names)
+        # (time the worker is free, 1 if idle, worker, task it finishes then);
+        # idle workers wake after the completions of their time
+        events = [(0.0, 1, f"sim{w}", None) for w in range(num_workers)]
+        heapq.heapify(events)
+        while events:
+            now[0], _, worker, name = heapq.heappop(events)
+            if name is not None:
+                ok = name not in pending_failures
+                pending_failures.discard(name)
+                queue.complete(worker, name, ok)
+            name = queue.lease(worker)
+            if name is not None:
+                heapq.heappush(events, (now[0] + costs[int(name)], 0, worker, name))
+                continue
+            # nothing to lease now: retry once a running task finishes
+            busy = [t for t, _, _, running in events if running is not None]
+            if busy:
+                heapq.heappush(events, (min(busy), 1, worker, None))
+        return now[0], queue.utilization()
+
+
+def synthetic_costs(num_tasks, seed=0, multiview_share=0.1):
+    """Heavy-tailed per-sample seconds: lognormal, plus slower multiview samples."""
+    import random
+
+    rng = random.Random(seed)
+    costs = []
+    for _ in range(num_tasks):
+        cost = 60 * rng.lognormvariate(0.0, 0.8)
+        if rng.random() < multiview_share:
+            cost *= 4
+        costs.append(cost)
+    return costs
+
+
+# -- batch runner -------------------------------------------------------------
+
+
+def list_samples(input_dir):
+    return sorted(
+        name for name in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, name))
+    )
+
+
+def run_sample(name, gpu, log_path):
+    """run_batch.sh for one sample on one GPU; True when it succeeded."""
+    with open(log_path, "a") as log:
+        log.write(f"=== {time.strftime('%H:%M:%S')} {name} ===\n")
+        log.flush()
+        result = subprocess.run(
+            [os.path.join(_HERE, "run_batch.sh"), name],
+            env={**os.environ, "GPU": str(gpu)},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    return result.returncode == 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("samples", nargs="*", help="sample folders (default: all under $INPUT_DIR)")
+    ap.add_argument("--gpus", nargs="+", default=os.environ.get("GPUS", "0 1").split())
+    ap.add_argument("--input-dir", default=os.environ.get("INPUT_DIR"))
+    ap.add_argument("--output-dir", default=os.environ.get("OUTPUT_DIR"))
+    ap.add_argument("--queue", default=None,
+                    help="queue file (default: <output-dir>/_queue.sqlite); reuse it to resume")
+    ap.add_argument("--lease-seconds", type=float, default=60.0)
+    ap.add_argument("--max-attempts", type=int, default=2)
+    ap.add_argument("--retry-failed", action="store_true",
+                    help="give samples that failed in an earlier run new attempts")
+    ap.add_argument("--fresh", action="store_true",
+                    help="run every sample again, also those done in an earlier run "
+                         "(e.g. after changing the SAM3D settings)")
+    ap.add_argument("--simulate", type=int, default=None, metavar="N",
+                    help="compare makespans on N synthetic samples instead of running")
+    args = ap.parse_args()
+
+    if args.simulate is not None:
+        costs = synthetic_costs(args.simulate)
+        makespan, report = simulate_queue(costs, len(args.gpus))
+        bound = max(sum(costs) / len(args.gpus), max(costs))
+        print(f"[queue] {args.simulate} synthetic samples on {len(args.gpus)} workers")
+        print(f"[queue] makespan round-robin {round_robin_makespan(costs, len(args.gpus)):.0f} s,"
+              f" queue {makespan:.0f} s, lower bound {bound:.0f} s")
+        print(format_utilization(report))
+        return
+
+    if args.input_dir is None or args.output_dir is None:
+        ap.error("--input-dir and --output-dir (or INPUT_DIR / OUTPUT_DIR) are required")
+    samples = args.samples or list_samples(args.input_dir)
+    log_dir = os.path.join(args.output_dir, "_logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    queue = TaskQueue(
+        args.queue or os.path.join(args.output_dir, "_queue.sqlite"),
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+    )
+    queue.add(samples)
+    if args.fresh:
+        queue.reset(samples)
+    if args.retry_failed:
+        queue.retry_failed()
+    print(f"[queue] {len(samples)} sample(s) across {len(args.gpus)} GPU(s): "
+          f"{' '.join(args.gpus)} | {queue.counts()}")
+    done = queue.counts(samples).get(DONE, 0)
+    if done == len(samples):
+        print(f"[queue] WARNING: all {done} sample(s) are already done in {queue.path},"
+              f" nothing to run. Pass --fresh to run them again (e.g. with other"
+              f" SAM3D settings).", file=sys.stderr)
+    elif done:
+        print(f"[queue] WARNING: skipping {done} sample(s) already done in {queue.path}"
+              f" (--fresh runs them again).", file=sys.stderr)
+
+    start = time.time()
+    host = f"{socket.gethostname()}:{os.getpid()}"
+    workers = [
+        threading.Thread(
+            target=run_worker,
+            args=(
+                queue,
+                f"{host}:gpu{gpu}",
+                lambda name, gpu=gpu: run_sample(
+                    name, gpu, os.path.join(log_dir, f"gpu{gpu}.log")
+                ),
+            ),
+        )
+        for gpu in args.gpus
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    print(f"[queue] done in {time.time() - start:.0f} s | {queue.counts()}")
+    print(format_utilization(queue.utilization(since=start)))
+    failed = queue.failed()
+    for name, error in failed:
+        print(f"[queue] FAILED {name}" + (f": {error}" if error else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
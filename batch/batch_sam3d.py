@@ -13,6 +13,11 @@ under <out-dir>, plus the MoGe default (no pointmap):
     <out-dir>/lotus2/pointmap.pt    -> <out-dir>/splat_with_pt_lotus2.glb
     <out-dir>/moge2/pointmap.pt     -> <out-dir>/splat_with_pt_moge2.glb
 
+The sweep's wall time (per run and in total) is printed at the end, with the
+hits of the pointmap cache (--pointmap-cache-dir, default $POINTMAP_CACHE_DIR)
+that keeps the MoGe default's depth across reruns; compare a rerun with and
+without it.
+
 Usage
     python batch_sam3d.py --image input/images/foo/image.jpg \
         --mask input/images/foo/mask.png --out-dir output/images/foo --seed 1
@@ -21,6 +26,7 @@ Usage
 import argparse
 import os
 import sys
+import time
 
 _HERE = os.path.dirname(os.path.abspath(__file__))
 _ROOT = os.path.abspath(os.path.join(_HERE, ".."))
@@ -125,6 +131,18 @@ def main():
         action="store_true",
         help="Skip backends whose output GLB already exists",
     )
+    ap.add_argument(
+        "--feature-cache-dir",
+        default=None,
+        help="Also keep the DINO image features on disk, for reruns "
+        "(they are always cached in memory across the backend runs)",
+    )
+    ap.add_argument(
+        "--pointmap-cache-dir",
+        default=os.environ.get("POINTMAP_CACHE_DIR") or None,
+        help="Keep the MoGe default's depth outputs on disk, for reruns "
+        "(default: $POINTMAP_CACHE_DIR, unset = off)",
+    )
     args = ap.parse_args()
 
     if args.views_dir is None and (args.image is None or args.mask is None):
@@ -135,6 +153,10 @@ def main():
     config_path = os.path.join(_ROOT, "checkpoints", args.tag, "pipeline.yaml")
     print(f"[sam3d] loading model from {config_path}")
     inference = Inference(config_path, compile=False)
+    # every backend run encodes the same image and mask
+    inference._pipeline.set_feature_cache({"cache_dir": args.feature_cache_dir})
+    if args.pointmap_cache_dir:
+        inference._pipeline.set_pointmap_cache({"cache_dir": args.pointmap_cache_dir})
 
     if args.views_dir:
         run_multiview(
@@ -161,12 +183,15 @@ def main():
         else:
             print(f"[sam3d] no pointmap for '{key}' ({pt_path}) -> skip")
 
+    timings = []
+    sweep_start = time.perf_counter()
     for key, pt_path, glb_name in runs:
         out_glb = os.path.join(args.out_dir, glb_name)
         if args.skip_existing and os.path.exists(out_glb):
             print(f"[sam3d] {glb_name} exists -> skip")
             continue
 
+        run_start = time.perf_counter()
         pointmap = torch.load(pt_path) if pt_path else None
         if pointmap is not None:
             pointmap = mask_pointmap(pointmap, mask)
@@ -191,6 +216,21 @@ def main():
         finally:
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
+            timings.append((key, time.perf_counter() - run_start))
+
+    report_sweep(timings, time.perf_counter() - sweep_start, inference._pipeline.pointmap_cache)
+
+
+def report_sweep(timings, total, pointmap_cache):
+    """Print the wall time of each run and of the sweep, with the pointmap cache hits."""
+    for key, seconds in timings:
+        print(f"[sam3d] time '{key}': {seconds:.1f} s")
+    if pointmap_cache is None:
+        cache = "pointmap cache off"
+    else:
+        stats = pointmap_cache.stats
+        cache = f"pointmap cache {stats['hits']} hits / {stats['misses']} misses"
+    print(f"[sam3d] sweep: {len(timings)} run(s) in {total:.1f} s ({cache})")
 
 
 if __name__ == "__main__":
@@ -46,3 +46,16 @@ export HF_HOME TRANSFORMERS_CACHE HF_HUB_CACHE
 : "${SAM3D_SKIP_EXISTING:=0}"  # 1 = keep existing splat_*.glb, only render missing ones
 : "${SAM3D_MULTIVIEW:=1}"  # 1 = folders with >=2 <stem>+<stem>_mask.png pairs run multiview fusion
 : "${GPU:=0}"              # CUDA_VISIBLE_DEVICES
+
+# --- pointmap cache ----------------------------------------------------------
+# Shared on-disk cache of the depth outputs (see depth_cache.py), keyed on the
+# image, backend, model and conversion parameters: a rerun with other SAM3D
+# settings skips every depth model. Safe to share between GPU workers.
+# Empty = off. Cached arrays are stored as float16.
+: "${POINTMAP_CACHE_DIR:=}"
+export POINTMAP_CACHE_DIR
+
+# --- multi-GPU queue (run_batch_parallel.sh) -----------------------------------
+# Attempts per sample before it is reported failed; the queue itself is
+# $OUTPUT_DIR/_queue.sqlite (delete it to run finished samples again).
+: "${QUEUE_MAX_ATTEMPTS:=2}"
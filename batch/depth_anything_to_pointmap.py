@@ -18,6 +18,12 @@ Outputs
 Coordinate convention: pointmap[v, u] = [X, Y, Z] world space (m),
 X=right, Y=down, Z=forward.
 
+With --image and --cache-dir (default $POINTMAP_CACHE_DIR) the outputs are
+kept in the shared pointmap cache (see depth_cache.py), keyed on the image,
+--model and --conf-percentile. --cached-only writes them from the cache
+without the DA3 inputs, or exits with status 1 on a miss: run_batch.sh tries
+it first and only runs DA3 on a miss.
+
 Usage
     python depth_anything_to_pointmap.py \
         --depth d.npy --confidence c.npy --intrinsics i.npy --extrinsics e.npy \
@@ -25,10 +31,13 @@ Usage
 """
 import argparse
 import os
+import sys
 from pathlib import Path
 
 import numpy as np
 
+from depth_cache import add_cache_args, open_cache
+
 
 def depth_anything_to_pointmap(depth, intrinsics, extrinsics,
                                confidence=None, conf_percentile=0.0):
@@ -81,27 +90,54 @@ def depth_anything_to_pointmap(depth, intrinsics, extrinsics,
 def main():
     ap = argparse.ArgumentParser(description=__doc__,
                                  formatter_class=argparse.RawDescriptionHelpFormatter)
-    ap.add_argument("--depth", required=True)
+    ap.add_argument("--depth", default=None)
     ap.add_argument("--confidence", default=None)
-    ap.add_argument("--intrinsics", required=True)
-    ap.add_argument("--extrinsics", required=True)
+    ap.add_argument("--intrinsics", default=None)
+    ap.add_argument("--extrinsics", default=None)
     ap.add_argument("--out-dir", required=True)
     ap.add_argument("--conf-percentile", type=float, default=0.0,
                     help="Discard pixels below this confidence percentile (0 = keep all)")
+    ap.add_argument("--image", default=None,
+                    help="Source image: with --cache-dir, the cache key (with --model "
+                         "and --conf-percentile)")
+    ap.add_argument("--model", default="depth-anything/DA3NESTED-GIANT-LARGE-1.1",
+                    help="DA3 model id of the inputs (cache key only)")
+    add_cache_args(ap)
+    ap.add_argument("--cached-only", action="store_true",
+                    help="Only write the outputs from the cache, exit 1 on a miss")
     args = ap.parse_args()
+    if not args.cached_only and None in (args.depth, args.intrinsics, args.extrinsics):
+        ap.error("--depth, --intrinsics and --extrinsics are required")
+
+    cache = open_cache(args.cache_dir) if args.image else None
+    if args.cached_only and cache is None:
+        ap.error("--cached-only needs --image and a cache directory")
+    key = cache and cache.key(args.image, "da3", args.model,
+                              conf_percentile=args.conf_percentile)
+    arrays = cache.get(key) if cache else None
+    if arrays is not None:
+        print(f"[da3->pt] pointmap cache hit ({cache.cache_dir})")
+    elif args.cached_only:
+        print("[da3->pt] pointmap cache miss")
+        sys.exit(1)
+    else:
+        depth = np.load(args.depth)
+        confidence = (np.load(args.confidence)
+                      if args.confidence and os.path.exists(args.confidence) else None)
+        intrinsics = np.load(args.intrinsics)
+        extrinsics = np.load(args.extrinsics)
+
+        pointmap, valid, _ = depth_anything_to_pointmap(
+            depth, intrinsics, extrinsics, confidence, args.conf_percentile)
+        arrays = {"pointmap": pointmap, "valid": valid,
+                  "intrinsics": np.squeeze(intrinsics)}
+        if cache:
+            cache.put(key, arrays)
+    pointmap, valid = arrays["pointmap"], arrays["valid"]
 
     out = Path(args.out_dir)
     out.mkdir(parents=True, exist_ok=True)
 
-    depth = np.load(args.depth)
-    confidence = (np.load(args.confidence)
-                  if args.confidence and os.path.exists(args.confidence) else None)
-    intrinsics = np.load(args.intrinsics)
-    extrinsics = np.load(args.extrinsics)
-
-    pointmap, valid, _ = depth_anything_to_pointmap(
-        depth, intrinsics, extrinsics, confidence, args.conf_percentile)
-
     n_valid = int(valid.sum())
     print(f"[da3->pt] valid {n_valid}/{valid.size} pixels")
 
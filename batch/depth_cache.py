@@ -0,0 +1,50 @@
+"""
+depth_cache.py
+==============
+Shared on-disk cache of the depth backends' outputs for the batch scripts.
+
+Every depth script takes ``--cache-dir`` (default: $POINTMAP_CACHE_DIR, unset
+= no cache) and stores its final arrays there, keyed on the image file, the
+backend, its model and its conversion parameters. A rerun of the batch with
+other SAM3D settings then writes the same outputs without loading the depth
+model. The cache itself is sam3d_objects/pipeline/pointmap_cache.py (numpy
+only, so it imports from every backend env); entries are shared across GPU
+workers. The SAM3D pipeline's own MoGe runs (batch_sam3d.py) may use the
+same directory, but under their own keys (the decoded pixels and the loaded
+weights) and arrays: an entry written by one is never a hit for the other.
+"""
+import os
+import sys
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def add_cache_args(ap):
+    ap.add_argument("--cache-dir", default=os.environ.get("POINTMAP_CACHE_DIR") or None,
+                    help="Pointmap cache directory (default: $POINTMAP_CACHE_DIR, unset = off)")
+
+
+def open_cache(cache_dir):
+    """The PointmapCache in `cache_dir`, None when `cache_dir` is empty."""
+    if not cache_dir:
+        return None
+    # only the cache module is needed, not the model stack of sam3d_objects
+    os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+    if _ROOT not in sys.path:
+        sys.path.insert(0, _ROOT)
+    from sam3d_objects.pipeline.pointmap_cache import PointmapCache
+
+    return PointmapCache(cache_dir)
+
+
+def cached_or_computed(cache, key, compute, tag):
+    """The arrays under `key` in `cache` (None = no cache), else `compute()`."""
+    if cache is None:
+        return compute()
+    arrays = cache.get(key)
+    if arrays is not None:
+        print(f"[{tag}] pointmap cache hit ({cache.cache_dir})")
+        return arrays
+    arrays = compute()
+    cache.put(key, arrays)
+    return arrays
@@ -16,6 +16,12 @@ Outputs
     pointmap.npy  np.ndarray   (H, W, 3) float32
     depth_metric.npy  (H, W) float32  metric depth (m)
 
+With --image and --cache-dir (default $POINTMAP_CACHE_DIR) the outputs are
+kept in the shared pointmap cache (see depth_cache.py), keyed on the image and
+the conversion parameters. --cached-only writes them from the cache without
+--depth, or exits with status 1 on a miss: run_batch.sh tries it first and
+only runs Lotus-2 on a miss.
+
 Usage
     python lotus2_to_pointmap.py --depth depth_npy/image.npy \
         --out-dir output/images/foo/lotus2 --fov-h 24 --near 0.2 --far 1.5
@@ -23,10 +29,13 @@ Usage
 import argparse
 import json
 import math
+import sys
 from pathlib import Path
 
 import numpy as np
 
+from depth_cache import add_cache_args, open_cache
+
 
 def lotus2_depth_to_metric(depth_norm, near, far):
     depth_norm = np.clip(depth_norm, 0.0, 1.0)
@@ -49,25 +58,7 @@ def intrinsics_from_fov(fov_h_deg, W, H):
     return fx, fx, W / 2.0, H / 2.0
 
 
-def main():
-    p = argparse.ArgumentParser(description=__doc__,
-                                formatter_class=argparse.RawDescriptionHelpFormatter)
-    p.add_argument("--depth", required=True, help="Lotus-2 depth .npy (H, W) in [0,1]")
-    p.add_argument("--out-dir", required=True)
-    p.add_argument("--cam", default=None, help="JSON with fx/fy/cx/cy")
-    p.add_argument("--fx", type=float, default=None)
-    p.add_argument("--fy", type=float, default=None)
-    p.add_argument("--cx", type=float, default=None)
-    p.add_argument("--cy", type=float, default=None)
-    p.add_argument("--fov-h", type=float, default=None,
-                   help="Horizontal FOV deg. 24=85mm FF, 55=35mm FF, 70=phone, 90=wide")
-    p.add_argument("--near", type=float, default=0.3)
-    p.add_argument("--far", type=float, default=3.0)
-    args = p.parse_args()
-
-    out = Path(args.out_dir)
-    out.mkdir(parents=True, exist_ok=True)
-
+def convert(args):
     depth_norm = np.load(args.depth).astype(np.float32)
     if depth_norm.ndim == 3:
         depth_norm = depth_norm.squeeze(0)
@@ -92,6 +83,56 @@ def main():
 
     depth_m = lotus2_depth_to_metric(depth_norm, args.near, args.far)
     pointmap = backproject_to_pointmap(depth_m, fx, fy, cx, cy)
+    intrinsics = np.array([[fx, 0.0, cx], [0.0, fy, cy], [0.0, 0.0, 1.0]])
+    return {"depth_metric": depth_m, "pointmap": pointmap, "intrinsics": intrinsics}
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--depth", default=None, help="Lotus-2 depth .npy (H, W) in [0,1]")
+    p.add_argument("--out-dir", required=True)
+    p.add_argument("--cam", default=None, help="JSON with fx/fy/cx/cy")
+    p.add_argument("--fx", type=float, default=None)
+    p.add_argument("--fy", type=float, default=None)
+    p.add_argument("--cx", type=float, default=None)
+    p.add_argument("--cy", type=float, default=None)
+    p.add_argument("--fov-h", type=float, default=None,
+                   help="Horizontal FOV deg. 24=85mm FF, 55=35mm FF, 70=phone, 90=wide")
+    p.add_argument("--near", type=float, default=0.3)
+    p.add_argument("--far", type=float, default=3.0)
+    p.add_argument("--image", default=None,
+                   help="Source image: with --cache-dir, the cache key (with the parameters above)")
+    add_cache_args(p)
+    p.add_argument("--cached-only", action="store_true",
+                   help="Only write the outputs from the cache, exit 1 on a miss")
+    args = p.parse_args()
+    if args.depth is None and not args.cached_only:
+        p.error("--depth is required")
+
+    cache = open_cache(args.cache_dir) if args.image else None
+    if args.cached_only and cache is None:
+        p.error("--cached-only needs --image and a cache directory")
+    key = cache and cache.key(
+        args.image, "lotus2", "",
+        cam=Path(args.cam).read_text() if args.cam else None,
+        fx=args.fx, fy=args.fy, cx=args.cx, cy=args.cy, fov_h=args.fov_h,
+        near=args.near, far=args.far,
+    )
+    arrays = cache.get(key) if cache else None
+    if arrays is not None:
+        print(f"[lotus2->pt] pointmap cache hit ({cache.cache_dir})")
+    elif args.cached_only:
+        print("[lotus2->pt] pointmap cache miss")
+        sys.exit(1)
+    else:
+        arrays = convert(args)
+        if cache:
+            cache.put(key, arrays)
+    depth_m, pointmap = arrays["depth_metric"], arrays["pointmap"]
+
+    out = Path(args.out_dir)
+    out.mkdir(parents=True, exist_ok=True)
 
     np.save(out / "depth_metric.npy", depth_m)
     np.save(out / "pointmap.npy", pointmap)
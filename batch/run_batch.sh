@@ -13,6 +13,10 @@
 # Each depth model lives in its own conda env; we switch envs per stage.
 # A failure in one stage/image is logged and skipped; the batch continues.
 #
+# With POINTMAP_CACHE_DIR set (config.sh) depth outputs come from the shared
+# pointmap cache when present. The wall time of the depth and SAM3D stages is
+# logged per sample, and of the whole batch at the end.
+#
 # Usage:
 #   ./run_batch.sh                # process every folder under $INPUT_DIR
 #   ./run_batch.sh foo bar        # process only input/images/foo and input/images/bar
@@ -94,6 +98,8 @@ fi
 log "Batch start: ${#SAMPLES[@]} sample(s) | GPU=${CUDA_VISIBLE_DEVICES}"
 log "  input : ${INPUT_DIR}"
 log "  output: ${OUTPUT_DIR}"
+log "  pointmap cache: ${POINTMAP_CACHE_DIR:-off}"
+BATCH_START=${SECONDS}
 
 OK=0; FAIL=0
 for NAME in "${SAMPLES[@]}"; do
@@ -134,9 +140,17 @@ for NAME in "${SAMPLES[@]}"; do
     IMG_STEM="$(basename "${IMG}")"; IMG_STEM="${IMG_STEM%.*}"
     mkdir -p "${OUT}"
     log "  image=${IMG}  mask=${MASK}"
+    DEPTH_START=${SECONDS}
 
     # ---- 1. Lotus-2 -------------------------------------------------------
-    if [ "${RUN_LOTUS}" = "1" ]; then
+    if [ "${RUN_LOTUS}" = "1" ] && [ -n "${POINTMAP_CACHE_DIR}" ] && (
+            conda activate "${ENV_SAM3D}"
+            python "${SCRIPT_DIR}/lotus2_to_pointmap.py" --cached-only --image "${IMG}" \
+                --out-dir "${OUT}/lotus2" \
+                --fov-h "${LOTUS_FOV_H}" --near "${LOTUS_NEAR}" --far "${LOTUS_FAR}"
+        ); then
+        log "  [lotus2] pointmap from cache"
+    elif [ "${RUN_LOTUS}" = "1" ]; then
         log "  [lotus2] depth inference"
         (
             set -e
@@ -151,7 +165,7 @@ for NAME in "${SAMPLES[@]}"; do
         ) && (
             set -e
             conda activate "${ENV_SAM3D}"
-            python "${SCRIPT_DIR}/lotus2_to_pointmap.py" \
+            python "${SCRIPT_DIR}/lotus2_to_pointmap.py" --image "${IMG}" \
                 --depth "${OUT}/lotus2/depth_npy/${IMG_STEM}.npy" \
                 --out-dir "${OUT}/lotus2" \
                 --fov-h "${LOTUS_FOV_H}" --near "${LOTUS_NEAR}" --far "${LOTUS_FAR}"
@@ -159,7 +173,13 @@ for NAME in "${SAMPLES[@]}"; do
     fi
 
     # ---- 2. Depth Anything 3 ---------------------------------------------
-    if [ "${RUN_DA3}" = "1" ]; then
+    if [ "${RUN_DA3}" = "1" ] && [ -n "${POINTMAP_CACHE_DIR}" ] && (
+            conda activate "${ENV_SAM3D}"
+            python "${SCRIPT_DIR}/depth_anything_to_pointmap.py" --cached-only --image "${IMG}" \
+                --out-dir "${OUT}/da3" --conf-percentile "${DA3_CONF_PERCENTILE}"
+        ); then
+        log "  [da3] pointmap from cache"
+    elif [ "${RUN_DA3}" = "1" ]; then
         log "  [da3] depth inference"
         (
             set -e
@@ -169,6 +189,7 @@ for NAME in "${SAMPLES[@]}"; do
             set -e
             conda activate "${ENV_SAM3D}"
             python "${SCRIPT_DIR}/depth_anything_to_pointmap.py" \
+                --image      "${IMG}" \
                 --depth      "${OUT}/da3/depth.npy" \
                 --confidence "${OUT}/da3/confidence.npy" \
                 --intrinsics "${OUT}/da3/intrinsics.npy" \
@@ -200,7 +221,10 @@ for NAME in "${SAMPLES[@]}"; do
         ) || log "  [moge2] FAILED (continuing)"
     fi
 
+    log "  depth stages: $(( SECONDS - DEPTH_START )) s"
+
     # ---- 5. SAM3D (one GLB per backend + MoGe default) -------------------
+    SAM3D_START=${SECONDS}
     if [ "${RUN_SAM3D}" = "1" ]; then
         log "  [sam3d] reconstruction"
         (
@@ -211,11 +235,14 @@ for NAME in "${SAMPLES[@]}"; do
             [ "${SAM3D_SKIP_EXISTING}" = "1" ] && SKIP_FLAG="--skip-existing"
             python "${SCRIPT_DIR}/batch_sam3d.py" \
                 --image "${IMG}" --mask "${MASK}" --out-dir "${OUT}" --seed "${SAM3D_SEED}" ${SKIP_FLAG}
-        ) && { OK=$((OK+1)); log "  DONE ${NAME}"; } \
+        ) && { OK=$((OK+1)); log "  DONE ${NAME} (sam3d: $(( SECONDS - SAM3D_START )) s)"; } \
           || { FAIL=$((FAIL+1)); log "  [sam3d] FAILED ${NAME}"; }
     else
         OK=$((OK+1))
     fi
 done
 
-log "Batch finished: ${OK} ok, ${FAIL} failed."
+log "Batch finished: ${OK} ok, ${FAIL} failed in $(( SECONDS - BATCH_START )) s" \
+    "(pointmap cache: ${POINTMAP_CACHE_DIR:-off})."
+# non-zero when a sample failed, so batch_queue.py retries it
+[ "${FAIL}" -eq 0 ]
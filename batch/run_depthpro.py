@@ -16,6 +16,11 @@ Must run inside the `depthpro` mamba env (where `depth_pro` is installed).
 A single ``model.infer`` call yields both metric depth and focal length, so
 no separate ``depth-pro-run`` CLI step is required.
 
+With --cache-dir (default $POINTMAP_CACHE_DIR) the depth and intrinsics are
+kept in the shared pointmap cache (see depth_cache.py), keyed on the image;
+a hit writes the same files without loading the model (depth round-tripped
+through float16).
+
 Coordinate convention: X=right, Y=down, Z=forward (camera == world origin).
 
 Usage
@@ -29,24 +34,18 @@ import os
 import numpy as np
 import torch
 
-import depth_pro
-
+from depth_cache import add_cache_args, cached_or_computed, open_cache
 
-def main():
-    ap = argparse.ArgumentParser(description=__doc__,
-                                 formatter_class=argparse.RawDescriptionHelpFormatter)
-    ap.add_argument("--image", required=True, help="Input image path")
-    ap.add_argument("--out-dir", required=True, help="Directory for Depth Pro outputs")
-    args = ap.parse_args()
 
-    os.makedirs(args.out_dir, exist_ok=True)
+def infer(image_path):
+    import depth_pro
 
     print(f"[depthpro] loading model")
     model, transform = depth_pro.create_model_and_transforms()
     model.eval()
 
-    print(f"[depthpro] inference on {args.image}")
-    img, _, f_px = depth_pro.load_rgb(args.image)
+    print(f"[depthpro] inference on {image_path}")
+    img, _, f_px = depth_pro.load_rgb(image_path)
     with torch.no_grad():
         pred = model.infer(transform(img), f_px=f_px)
 
@@ -59,9 +58,30 @@ def main():
     f_internal = float(pred["focallength_px"].item())
     out_h, out_w = pred["depth"].shape[-2:]
     fx = f_internal * (W / out_w)
-    fy = fx
-    cx = W / 2.0
-    cy = H / 2.0
+    K = np.array([[fx, 0.0, W / 2.0], [0.0, fx, H / 2.0], [0.0, 0.0, 1.0]])
+    return {"depth": depth, "intrinsics": K}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--image", required=True, help="Input image path")
+    ap.add_argument("--out-dir", required=True, help="Directory for Depth Pro outputs")
+    add_cache_args(ap)
+    args = ap.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    cache = open_cache(args.cache_dir)
+    arrays = cached_or_computed(
+        cache,
+        cache and cache.key(args.image, "depthpro", "default"),
+        lambda: infer(args.image),
+        "depthpro",
+    )
+    depth = arrays["depth"]
+    H, W = depth.shape
+    K = arrays["intrinsics"].astype(np.float64)
+    fx, fy, cx, cy = float(K[0, 0]), float(K[1, 1]), float(K[0, 2]), float(K[1, 2])
     print(f"[depthpro] fx={fx:.2f} fy={fy:.2f} cx={cx} cy={cy}  ({W}x{H})")
 
     # Back-project depth -> pointmap
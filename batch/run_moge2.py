@@ -18,8 +18,15 @@ Writes the outputs SAM3D consumes:
     <out-dir>/pointmap.npy       np.ndarray   (H, W, 3) float32
     <out-dir>/depth.npy          np.ndarray   (H, W)    float32   metric depth (m)
     <out-dir>/mask.npy           np.ndarray   (H, W)    bool       valid pixels
+    <out-dir>/normal.npy         np.ndarray   (H, W, 3) float32   normals (normal
+                                 checkpoints only)
     <out-dir>/camera_params.json reference dump (intrinsics, shape)
 
+With --cache-dir (default $POINTMAP_CACHE_DIR) the arrays are kept in the
+shared pointmap cache (see depth_cache.py), keyed on the image and --model;
+a hit writes the same files without loading the model (arrays round-tripped
+through float16).
+
 Coordinate convention: X=right, Y=down, Z=forward (camera == world origin),
 matching the other backends.
 
@@ -35,26 +42,18 @@ import numpy as np
 import torch
 from PIL import Image
 
-from moge.model.v2 import MoGeModel
+from depth_cache import add_cache_args, cached_or_computed, open_cache
 
 
-def main():
-    ap = argparse.ArgumentParser(description=__doc__,
-                                 formatter_class=argparse.RawDescriptionHelpFormatter)
-    ap.add_argument("--image", required=True, help="Input image path")
-    ap.add_argument("--out-dir", required=True, help="Directory for MoGe-2 outputs")
-    ap.add_argument("--model", default="Ruicheng/moge-2-vitl-normal",
-                    help="HF model id for MoGeModel.from_pretrained")
-    args = ap.parse_args()
+def infer(image_path, model_id):
+    from moge.model.v2 import MoGeModel
 
-    os.makedirs(args.out_dir, exist_ok=True)
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"[moge2] loading {model_id} on {device}")
+    model = MoGeModel.from_pretrained(model_id).to(device).eval()
 
-    print(f"[moge2] loading {args.model} on {device}")
-    model = MoGeModel.from_pretrained(args.model).to(device).eval()
-
-    print(f"[moge2] inference on {args.image}")
-    rgb = np.asarray(Image.open(args.image).convert("RGB"), dtype=np.float32) / 255.0
+    print(f"[moge2] inference on {image_path}")
+    rgb = np.asarray(Image.open(image_path).convert("RGB"), dtype=np.float32) / 255.0
     image = torch.from_numpy(rgb).permute(2, 0, 1).to(device)  # (3, H, W) in [0,1]
 
     with torch.no_grad():
@@ -62,7 +61,6 @@ def main():
 
     # MoGe returns a metric, camera-space point map -> use directly as pointmap.
     pointmap = output["points"].cpu().numpy().astype(np.float32)  # (H, W, 3)
-    depth = output["depth"].cpu().numpy().astype(np.float32)      # (H, W)
     mask = output["mask"].cpu().numpy().astype(bool)              # (H, W)
 
     # Mark invalid pixels NaN (NOT 0.0). SAM3D feeds the pointmap to
@@ -72,14 +70,46 @@ def main():
     # NaN is the convention SAM3D's built-in MoGe default already relies on.
     pointmap[~mask] = np.nan
 
-    intrinsics = output.get("intrinsics")
-    intrinsics = (intrinsics.cpu().numpy().tolist()
-                  if intrinsics is not None else None)
+    arrays = {
+        "pointmap": pointmap,
+        "depth": output["depth"].cpu().numpy().astype(np.float32),  # (H, W)
+        "mask": mask,
+    }
+    for name in ("intrinsics", "normal"):
+        if output.get(name) is not None:
+            arrays[name] = output[name].cpu().numpy().astype(np.float32)
+    return arrays
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--image", required=True, help="Input image path")
+    ap.add_argument("--out-dir", required=True, help="Directory for MoGe-2 outputs")
+    ap.add_argument("--model", default="Ruicheng/moge-2-vitl-normal",
+                    help="HF model id for MoGeModel.from_pretrained")
+    add_cache_args(ap)
+    args = ap.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    cache = open_cache(args.cache_dir)
+    arrays = cached_or_computed(
+        cache,
+        cache and cache.key(args.image, "moge2", args.model),
+        lambda: infer(args.image, args.model),
+        "moge2",
+    )
+    pointmap, depth, mask = arrays["pointmap"], arrays["depth"], arrays["mask"]
+
+    intrinsics = arrays.get("intrinsics")
+    intrinsics = intrinsics.tolist() if intrinsics is not None else None
 
     H, W = depth.shape
     np.save(os.path.join(args.out_dir, "depth.npy"), depth)
     np.save(os.path.join(args.out_dir, "mask.npy"), mask)
     np.save(os.path.join(args.out_dir, "pointmap.npy"), pointmap)
+    if "normal" in arrays:
+        np.save(os.path.join(args.out_dir, "normal.npy"), arrays["normal"])
     torch.save(torch.from_numpy(pointmap), os.path.join(args.out_dir, "pointmap.pt"))
 
     camera_params = {
@@ -2,41 +2,73 @@
 import os
 
 # not ideal to put that here
-os.environ["CUDA_HOME"] = os.environ["CONDA_PREFIX"]
+if "CONDA_PREFIX" in os.environ:
+    os.environ["CUDA_HOME"] = os.environ["CONDA_PREFIX"]
 os.environ["LIDRA_SKIP_INIT"] = "true"
 
 import sys
-from typing import Union, Optional, List, Callable
+import importlib
+from typing import TYPE_CHECKING, Union, Optional, List, Callable
 import numpy as np
 from PIL import Image
 from omegaconf import OmegaConf, DictConfig, ListConfig
 from hydra.utils import instantiate, get_method
 import torch
 import math
-import utils3d
 import shutil
 import subprocess
-import seaborn as sns
-from PIL import Image
-import numpy as np
-import gradio as gr
-import matplotlib.pyplot as plt
 from copy import deepcopy
-from kaolin.visualize import IpyTurntableVisualizer
-from kaolin.render.camera import Camera, CameraExtrinsics, PinholeIntrinsics
 import builtins
 from loguru import logger
-from pytorch3d.transforms import quaternion_multiply, quaternion_invert
 
 import sam3d_objects  # REMARK(Pierre) : do not remove this import
-from sam3d_objects.pipeline.inference_pipeline_pointmap import InferencePipelinePointMap
-from sam3d_objects.model.backbone.tdfy_dit.utils import render_utils
 from sam3d_objects.pipeline.sampler_env_overrides import (
     resolve_env_overrides,
     resolved_settings_for_log,
 )
 
-from sam3d_objects.utils.visualization import SceneVisualizer
+if TYPE_CHECKING:
+    from sam3d_objects.pipeline.inference_pipeline_pointmap import (
+        InferencePipelinePointMap,
+    )
+
+# Visualization, interactive and rendering dependencies are imported by the
+# functions that use them: `Inference` does not need them, and importing them
+# all up front cost every batch worker, server and test seconds of startup
+# (see scripts/benchmark_import_time.py). The pipeline itself is imported by
+# `instantiate` from the config. The names below used to be module attributes
+# and still resolve, on first access.
+_LAZY_ATTRIBUTES = {
+    "utils3d": ("utils3d", None),
+    "sns": ("seaborn", None),
+    "gr": ("gradio", None),
+    "plt": ("matplotlib.pyplot", None),
+    "IpyTurntableVisualizer": ("kaolin.visualize", "IpyTurntableVisualizer"),
+    "Camera": ("kaolin.render.camera", "Camera"),
+    "CameraExtrinsics": ("kaolin.render.camera", "CameraExtrinsics"),
+    "PinholeIntrinsics": ("kaolin.render.camera", "PinholeIntrinsics"),
+    "quaternion_multiply": ("pytorch3d.transforms", "quaternion_multiply"),
+    "quaternion_invert": ("pytorch3d.transforms", "quaternion_invert"),
+    "InferencePipelinePointMap": (
+        "sam3d_objects.pipeline.inference_pipeline_pointmap",
+        "InferencePipelinePointMap",
+    ),
+    "render_utils": ("sam3d_objects.model.backbone.tdfy_dit.utils.render_utils", None),
+    "SceneVisualizer": ("sam3d_objects.utils.visualization", "SceneVisualizer"),
+    "make_scene": ("sam3d_objects.pipeline.scene_composition", "make_scene"),
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
 
 __all__ = ["Inference"]
 
@@ -112,7 +144,7 @@ class Inference:
         )
 
         check_hydra_safety(config, WHITELIST_FILTERS, BLACKLIST_FILTERS)
-        self._pipeline: InferencePipelinePointMap = instantiate(config)
+        self._pipeline: "InferencePipelinePointMap" = instantiate(config)
 
     def merge_mask_to_rgba(self, image, mask):
         # Ensure mask dimensions match image dimensions
@@ -138,7 +170,15 @@ class Inference:
         use_vertex_color: bool = True,
         rendering_engine: str = "nvdiffrast",  # nvdiffrast OR pytorch3d
         pointmap=None,
+        checkpoint_dir: Optional[str] = None,
+        resume_from: Optional[str] = None,
+        defer_postprocess: bool = False,
     ) -> dict:
+        # checkpoint_dir / resume_from: save the intermediate artifacts, or
+        # rerun only the stages after `resume_from` ("pointmap", "ss", "slat",
+        # "decoded", "layout"), see sam3d_objects/pipeline/stage_checkpoints.py
+        # defer_postprocess: return a function running the GLB postprocessing
+        # and layout optimization instead of the output, see the pipeline's run
         image = self.merge_mask_to_rgba(image, mask)
         return self._pipeline.run(
             image,
@@ -152,6 +192,44 @@ class Inference:
             stage1_inference_steps=None,
             pointmap=pointmap,
             rendering_engine=rendering_engine,
+            checkpoint_dir=checkpoint_dir,
+            resume_from=resume_from,
+            defer_postprocess=defer_postprocess,
+        )
+
+    def batch(
+        self,
+        images: List[Union[Image.Image, np.ndarray]],
+        masks: List[Union[Image.Image, np.ndarray]],
+        seed: Optional[int] = None,
+        with_mesh_postprocess: bool = False,
+        with_texture_baking: bool = False,
+        with_layout_postprocess: bool = False,
+        use_vertex_color: bool = True,
+        rendering_engine: str = "nvdiffrast",  # nvdiffrast OR pytorch3d
+        defer_postprocess: bool = False,
+    ) -> list:
+        """Reconstruct the objects of several images in one batched run.
+
+        One output per (image, mask) pair, each like the output of `__call__`
+        (or, with defer_postprocess, a function returning it). Both flow
+        stages run once for the batch, so with a seed the results are not
+        those of separate calls; see the pipeline's run_batch.
+        """
+        assert len(images) == len(masks), "one mask per image required"
+        rgba_images = [
+            self.merge_mask_to_rgba(np.array(image), np.array(mask) > 0)
+            for image, mask in zip(images, masks)
+        ]
+        return self._pipeline.run_batch(
+            rgba_images,
+            seed,
+            with_mesh_postprocess=with_mesh_postprocess,
+            with_texture_baking=with_texture_baking,
+            with_layout_postprocess=with_layout_postprocess,
+            use_vertex_color=use_vertex_color,
+            rendering_engine=rendering_engine,
+            defer_postprocess=defer_postprocess,
         )
 
     def multi_view(
@@ -167,6 +245,7 @@ class Inference:
         stage2_inference_steps: Optional[int] = None,
         decode_formats: Optional[List[str]] = None,
         mode: str = "multidiffusion",
+        defer_postprocess: bool = False,
     ) -> dict:
         """Multi-view reconstruction: fuse several photos of one object.
 
@@ -193,10 +272,54 @@ class Inference:
             use_vertex_color=use_vertex_color,
             mode=mode,
             rendering_engine=rendering_engine,
+            defer_postprocess=defer_postprocess,
+        )
+
+    def multi_object(
+        self,
+        image: Union[Image.Image, np.ndarray],
+        masks: List[Union[Image.Image, np.ndarray]],
+        seed: Optional[int] = None,
+        with_mesh_postprocess: bool = False,
+        with_texture_baking: bool = False,
+        with_layout_postprocess: bool = False,
+        use_vertex_color: bool = True,
+        rendering_engine: str = "nvdiffrast",  # nvdiffrast OR pytorch3d
+        pointmap=None,
+        decode_formats: Optional[List[str]] = None,
+    ) -> dict:
+        """Reconstruct several objects of one image in a single batched run.
+
+        The depth model runs once for the image, both flow stages run once
+        for all the masks. Returns the per-object outputs under "objects"
+        (each like the output of `__call__`) and the objects posed in the
+        camera frame under "scene": their "object_to_camera" transforms and,
+        when Gaussians are decoded, the merged "gaussian" (see
+        `make_scene`).
+        """
+        image = np.array(image)
+        masks = [
+            self.merge_mask_to_rgba(image, np.array(mask) > 0)[..., 3]
+            for mask in masks
+        ]
+        return self._pipeline.run_multi_object(
+            image,
+            masks,
+            seed,
+            stage1_only=False,
+            with_mesh_postprocess=with_mesh_postprocess,
+            with_texture_baking=with_texture_baking,
+            with_layout_postprocess=with_layout_postprocess,
+            use_vertex_color=use_vertex_color,
+            pointmap=pointmap,
+            decode_formats=decode_formats,
+            rendering_engine=rendering_engine,
         )
 
 
 def _yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitchs, rs, fovs):
+    import utils3d
+
     is_list = isinstance(yaws, list)
     if not is_list:
         yaws = [yaws]
@@ -246,6 +369,7 @@ def render_video(
     yaw_start_deg=-90,
     **kwargs,
 ):
+    from sam3d_objects.model.backbone.tdfy_dit.utils import render_utils
 
     yaws = (
         torch.linspace(0, 2 * torch.pi, num_frames) + math.radians(yaw_start_deg)
@@ -328,66 +452,6 @@ def normalized_gaussian(scene_gs, in_place=False, outlier_percentile=None):
     return scene_gs
 
 
-def make_scene(*outputs, in_place=False):
-    if not in_place:
-        outputs = [deepcopy(output) for output in outputs]
-
-    all_outs = []
-    minimum_kernel_size = float("inf")
-    for output in outputs:
-        # move gaussians to scene frame of reference
-        PC = SceneVisualizer.object_pointcloud(
-            points_local=output["gaussian"][0].get_xyz.unsqueeze(0),
-            quat_l2c=output["rotation"],
-            trans_l2c=output["translation"],
-            scale_l2c=output["scale"],
-        )
-        output["gaussian"][0].from_xyz(PC.points_list()[0])
-        # must ... ROTATE
-        output["gaussian"][0].from_rotation(
-            quaternion_multiply(
-                quaternion_invert(output["rotation"]),
-                output["gaussian"][0].get_rotation,
-            )
-        )
-        scale = output["gaussian"][0].get_scaling
-        adjusted_scale = scale * output["scale"]
-        assert (
-            output["scale"][0, 0].item()
-            == output["scale"][0, 1].item()
-            == output["scale"][0, 2].item()
-        )
-        output["gaussian"][0].mininum_kernel_size *= output["scale"][0, 0].item()
-        adjusted_scale = torch.maximum(
-            adjusted_scale,
-            torch.tensor(
-                output["gaussian"][0].mininum_kernel_size * 1.1,
-                device=adjusted_scale.device,
-            ),
-        )
-        output["gaussian"][0].from_scaling(adjusted_scale)
-        minimum_kernel_size = min(
-            minimum_kernel_size,
-            output["gaussian"][0].mininum_kernel_size,
-        )
-        all_outs.append(output)
-
-    # merge gaussians
-    scene_gs = all_outs[0]["gaussian"][0]
-    scene_gs.mininum_kernel_size = minimum_kernel_size
-    for out in all_outs[1:]:
-        out_gs = out["gaussian"][0]
-        scene_gs._xyz = torch.cat([scene_gs._xyz, out_gs._xyz], dim=0)
-        scene_gs._features_dc = torch.cat(
-            [scene_gs._features_dc, out_gs._features_dc], dim=0
-        )
-        scene_gs._scaling = torch.cat([scene_gs._scaling, out_gs._scaling], dim=0)
-        scene_gs._rotation = torch.cat([scene_gs._rotation, out_gs._rotation], dim=0)
-        scene_gs._opacity = torch.cat([scene_gs._opacity, out_gs._opacity], dim=0)
-
-    return scene_gs
-
-
 def check_target(
     target: str,
     whitelist_filters: List[Callable],
@@ -473,6 +537,9 @@ def load_masks(folder_path, indices_list=None, extension=".png"):
 
 
 def display_image(image, masks=None):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     def imshow(image, ax):
         ax.axis("off")
         ax.imshow(image)
@@ -499,6 +566,8 @@ def display_image(image, masks=None):
 
 
 def interactive_visualizer(ply_path):
+    import gradio as gr
+
     with gr.Blocks() as demo:
         gr.Markdown("# 3D Gaussian Splatting (black-screen loading might take a while)")
         gr.Model3D(
@@ -0,0 +1,262 @@
+"""Job queue with micro-batching for the SAM3D inference server.
+
+One scheduler thread owns the model: it pulls the oldest ready job, waits up
+to `max_wait` seconds for compatible jobs (same `batch_key`) to join it, and
+hands the micro-batch to `pipeline.run_batch`. CPU work -- `prepare` (image /
+mask loading) before, `postprocess` (mesh export, sidecar writes) after --
+runs on a separate thread pool, so postprocessing job N overlaps sampling
+job N+1 instead of leaving the GPU idle.
+
+Kept free of torch/model imports (like request_utils) so the scheduling can
+be unit-tested and benchmarked with a stub pipeline. A pipeline is any object
+with
+
+    run_batch(payloads) -> list of outputs, one per payload (an Exception
+                           instance fails only that job)
+    postprocess(payload, output) -> the job's result
+
+and optionally `prepare(payload) -> payload` and `batch_key(payload)`
+(hashable; jobs are only batched with jobs of an equal key).
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("sam3d-server")
+
+QUEUED = "queued"
+RUNNING = "running"
+POSTPROCESSING = "postprocessing"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """A submitted request and its progress through the queue."""
+
+    def __init__(self, payload, key):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.batch_size = None
+        self.submitted_at = time.monotonic()
+        self.ready_at = None
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job is done or failed. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        """JSON-serialisable status, without the (possibly large) result."""
+
+        def elapsed(start, end):
+            if start is None:
+                return None
+            return (end if end is not None else time.monotonic()) - start
+
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": None if self.error is None else str(self.error),
+            "batch_size": self.batch_size,
+            "queued_s": elapsed(self.submitted_at, self.started_at),
+            "total_s": elapsed(self.submitted_at, self.finished_at),
+        }
+
+
+class JobQueue:
+    """Micro-batching scheduler pipelining model sampling with CPU work.
+
+    Args:
+        pipeline: see the module docstring.
+        max_batch_size: largest micro-batch handed to `run_batch`.
+        max_wait: seconds the oldest ready job may wait for compatible jobs
+            to fill its micro-batch. 0 dispatches whatever is ready at once.
+        cpu_workers: threads for `prepare` and `postprocess`.
+        max_finished: finished jobs kept for status/result lookups; the
+            oldest are forgotten beyond this.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        max_batch_size=1,
+        max_wait=0.0,
+        cpu_workers=1,
+        max_finished=1000,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be >= 1, got {max_batch_size}")
+        if max_wait < 0:
+            raise ValueError(f"max_wait must be >= 0, got {max_wait}")
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_finished = max_finished
+
+        self._jobs = OrderedDict()
+        self._ready = []  # in readiness order; the head is always served first
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._cpu = ThreadPoolExecutor(
+            max_workers=cpu_workers, thread_name_prefix="job-queue-cpu"
+        )
+        self._scheduler = threading.Thread(
+            target=self._run, name="job-queue-scheduler", daemon=True
+        )
+
+    # ── public API ─────────────────────────────────────────────────────────
+
+    def start(self):
+        self._scheduler.start()
+        return self
+
+    def stop(self):
+        """Stop scheduling. Jobs that have not started sampling are failed."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._scheduler.is_alive():
+            self._scheduler.join()
+        self._cpu.shutdown(wait=True)
+        with self._cond:
+            pending, self._ready = self._ready, []
+        for job in pending:
+            self._finish(job, error=RuntimeError("job queue stopped"))
+
+    def submit(self, payload):
+        """Queue `payload` and return its Job (see `Job.id` / `Job.wait`)."""
+        batch_key = getattr(self.pipeline, "batch_key", None)
+        job = Job(payload, batch_key(payload) if batch_key is not None else None)
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("job queue stopped")
+            self._jobs[job.id] = job
+        if hasattr(self.pipeline, "prepare"):
+            self._cpu.submit(self._prepare, job)
+        else:
+            self._make_ready(job)
+        return job
+
+    def get(self, job_id):
+        """The Job with this id, or None if unknown (or already forgotten)."""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        """Number of jobs not finished yet."""
+        with self._cond:
+            return sum(not job.finished for job in self._jobs.values())
+
+    # ── CPU side ───────────────────────────────────────────────────────────
+
+    def _prepare(self, job):
+        try:
+            job.payload = self.pipeline.prepare(job.payload)
+        except Exception as exc:
+            log.exception(f"Job {job.id} failed in prepare")
+            self._finish(job, error=exc)
+            return
+        self._make_ready(job)
+
+    def _make_ready(self, job):
+        with self._cond:
+            if not self._stopping:
+                job.ready_at = time.monotonic()
+                self._ready.append(job)
+                self._cond.notify_all()
+                return
+        self._finish(job, error=RuntimeError("job queue stopped"))
+
+    def _postprocess(self, job, output):
+        try:
+            result = self.pipeline.postprocess(job.payload, output)
+        except Exception as exc:
+            log.exception(f"Job {job.id} failed in postprocess")
+            self._finish(job, error=exc)
+        else:
+            self._finish(job, result=result)
+
+    def _finish(self, job, result=None, error=None):
+        job.result = result
+        job.error = error
+        job.status = FAILED if error is not None else DONE
+        job.finished_at = time.monotonic()
+        # The payload (loaded images) is not needed anymore.
+        job.payload = None
+        job._done.set()
+        with self._cond:
+            finished = [j for j in self._jobs.values() if j.finished]
+            for old in finished[: max(0, len(finished) - self.max_finished)]:
+                del self._jobs[old.id]
+
+    # ── scheduler ──────────────────────────────────────────────────────────
+
+    def _next_batch(self):
+        """Oldest ready job plus up to max_batch_size - 1 compatible ones.
+
+        Serving the head first keeps the queue fair: a job can only be
+        overtaken by jobs that ride along in an earlier micro-batch, never
+        left behind by them.
+        """
+        with self._cond:
+            while not self._ready and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return None
+            head = self._ready[0]
+            deadline = head.ready_at + self.max_wait
+            while True:
+                batch = [job for job in self._ready if job.key == head.key]
+                batch = batch[: self.max_batch_size]
+                remaining = deadline - time.monotonic()
+                if len(batch) == self.max_batch_size or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                if self._stopping:
+                    return None
+            for job in batch:
+                self._ready.remove(job)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started_at = time.monotonic()
+            for job in batch:
+                job.status = RUNNING
+                job.started_at = started_at
+                job.batch_size = len(batch)
+            try:
+                outputs = self.pipeline.run_batch([job.payload for job in batch])
+                if len(outputs) != len(batch):
+                    raise RuntimeError(
+                        f"run_batch returned {len(outputs)} outputs for "
+                        f"{len(batch)} jobs"
+                    )
+            except Exception as exc:
+                log.exception(f"Batch of {len(batch)} job(s) failed")
+                for job in batch:
+                    self._finish(job, error=exc)
+                continue
+            for job, output in zip(batch, outputs):
+                if isinstance(output, Exception):
+                    self._finish(job, error=output)
+                    continue
+                job.status = POSTPROCESSING
+                self._cpu.submit(self._postprocess, job, output)
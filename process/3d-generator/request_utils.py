@@ -36,6 +36,19 @@ def normalize_views(image_path, mask_paths, views):
     return [(image_path, list(mask_paths))]
 
 
+def batch_key(payload):
+    """The job queue's batch key of a job payload (see job_queue.py).
+
+    Only single-view requests without a seed of their own are sampled
+    together: a batch draws its noise at once, so a request that chose its
+    seed would not get the result that seed gives alone (nor hit the result
+    cache). Every other request gets a key equal to no other.
+    """
+    if len(payload["view_specs"]) == 1 and payload["seed"] is None:
+        return "single-view"
+    return object()
+
+
 def _flatten(value):
     """Flatten arbitrarily nested lists/tuples into a flat list of leaves."""
     if not isinstance(value, (list, tuple)):
@@ -9,7 +9,21 @@ model loading) that previously happened on every subprocess call.
 Usage:
     python server.py [--port 8000] [--host 0.0.0.0] [--tag hf]
 
-The poller should POST to /infer instead of calling run.sh.
+With --result-cache-dir, single-view results are cached on disk (see
+sam3d_objects/pipeline/result_cache.py): a request repeating an earlier
+image, mask and seed returns without sampling. Requests without a seed get a
+random one and so never hit.
+
+The poller should POST to /infer instead of calling run.sh, or use the job
+endpoints: POST /jobs returns a job id right away, GET /jobs/{id} its status
+and GET /jobs/{id}/result the /infer response once it is done. All requests
+share one queue (see job_queue.py): the scheduler thread only samples and
+decodes, while mesh postprocessing, texture baking, layout optimization and
+export run on --cpu-workers threads, overlapping the sampling of the next
+request. Single-view requests without a seed are sampled together in
+micro-batches (--max-batch-size, --max-wait-ms) through the pipeline's
+run_batch; requests with a seed, and multi-view ones, are sampled alone so
+that their seed reproduces them.
 """
 import argparse
 import os
@@ -45,7 +59,9 @@ from request_utils import (
     extract_pose,
     extract_intrinsics,
     normal_map_sidecar_path,
+    batch_key,
 )
+from job_queue import JobQueue
 
 # ── logging ──────────────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -61,6 +77,38 @@ parser.add_argument("--port", type=int, default=8000)
 parser.add_argument(
     "--tag", default="hf", help="Checkpoint tag (subfolder under checkpoints/)"
 )
+parser.add_argument(
+    "--max-batch-size",
+    type=int,
+    default=1,
+    help="Largest micro-batch of single-view requests without a seed sampled "
+    "together (they share one random seed)",
+)
+parser.add_argument(
+    "--max-wait-ms",
+    type=float,
+    default=0.0,
+    help="How long the oldest job may wait for others to batch with",
+)
+parser.add_argument(
+    "--cpu-workers",
+    type=int,
+    default=1,
+    help="Threads for image loading, mesh postprocessing, texture baking, layout "
+    "optimization and export, overlapping sampling (each also uses GPU memory)",
+)
+parser.add_argument(
+    "--result-cache-dir",
+    default=None,
+    help="Cache single-view results on disk here, keyed by image, mask, seed, "
+    "sampler settings and checkpoint (off by default)",
+)
+parser.add_argument(
+    "--result-cache-max-gb",
+    type=float,
+    default=20.0,
+    help="Size limit of --result-cache-dir, least recently used entries go first",
+)
 args, _unknown = parser.parse_known_args()
 
 # ── model loading (happens ONCE at startup) ───────────────────────────────────
@@ -71,6 +119,17 @@ if torch.cuda.is_available():
     log.info(f"Using GPU: {torch.cuda.get_device_name(0)} | "
              f"Total: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GiB")
 _inference = Inference(config_path, compile=False)
+if args.result_cache_dir:
+    # Retries and resubmitted photos (same image, mask and seed) skip
+    # sampling; multi-view requests are not cached. Every hit is a fresh copy
+    # loaded from disk, so postprocess may scale its mesh in place.
+    _inference._pipeline.set_result_cache(
+        {
+            "cache_dir": args.result_cache_dir,
+            "max_bytes": int(args.result_cache_max_gb * 2**30),
+        }
+    )
+    log.info(f"Result cache: {args.result_cache_dir}")
 log.info("Model loaded and ready.")
 
 # ── FastAPI app ───────────────────────────────────────────────────────────────
@@ -104,39 +163,24 @@ def health():
     return {"status": "ok"}
 
 
-@app.post("/infer")
-def infer(req: InferRequest):
-    # ── validate inputs ───────────────────────────────────────────────────────
-    try:
-        view_specs = normalize_views(
-            req.image_path,
-            req.mask_paths,
-            [v.model_dump() for v in req.views] if req.views else None,
-        )
-    except ValueError as exc:
-        raise HTTPException(status_code=422, detail=str(exc))
-
-    for image_path, mask_paths in view_specs:
-        if not Path(image_path).is_file():
-            raise HTTPException(
-                status_code=400, detail=f"image_path not found: {image_path}"
-            )
-        for mp in mask_paths:
-            if not Path(mp).is_file():
-                raise HTTPException(
-                    status_code=400, detail=f"mask_path not found: {mp}"
-                )
-
-    output_path = Path(req.output_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+class ServerPipeline:
+    """The loaded model behind the job queue (see job_queue.JobQueue).
 
-    seed = req.seed if req.seed is not None else random.randint(0, 2**32 - 1)
+    run_batch samples and decodes on the scheduler thread and returns the
+    pipeline's deferred postprocessing (defer_postprocess=True), with the
+    seed it sampled with; prepare
+    (image/mask loading) and postprocess (GLB postprocessing, texture
+    baking, layout optimization, metric scale, export, normal-map sidecar)
+    run on the queue's CPU threads, so finishing one mesh overlaps sampling
+    the next.
+    """
 
-    log.info(f"Inference request | views={len(view_specs)} seed={seed}")
+    # see request_utils.batch_key
+    batch_key = staticmethod(batch_key)
 
-    try:
+    def prepare(self, payload):
         images, masks = [], []
-        for image_path, mask_paths in view_specs:
+        for image_path, mask_paths in payload["view_specs"]:
             image = load_image(image_path)
             view_masks = [load_mask(mp) for mp in mask_paths]
             mask = view_masks[0].copy()
@@ -144,9 +188,33 @@ def infer(req: InferRequest):
                 mask |= m
             images.append(image)
             masks.append(mask)
-
-        if len(view_specs) == 1:
-            output = _inference(
+        return {**payload, "images": images, "masks": masks}
+
+    def run_batch(self, payloads):
+        # A failing request only fails its own job, a failing micro-batch
+        # all of its jobs.
+        outputs = []
+        try:
+            if len(payloads) > 1:
+                return self._sample_batch(payloads)
+            for payload in payloads:
+                try:
+                    outputs.append(self._sample(payload))
+                except Exception as exc:
+                    log.exception("Inference failed")
+                    outputs.append(exc)
+        finally:
+            # Release fragmented reserved-but-unallocated memory back to CUDA.
+            torch.cuda.empty_cache()
+        return outputs
+
+    def _sample(self, payload):
+        images, masks, seed = payload["images"], payload["masks"], payload["seed"]
+        if seed is None:
+            seed = random.randint(0, 2**32 - 1)
+        log.info(f"Inference request | views={len(images)} seed={seed}")
+        if len(images) == 1:
+            return seed, _inference(
                 images[0],
                 masks[0],
                 seed=seed,
@@ -154,7 +222,46 @@ def infer(req: InferRequest):
                 with_texture_baking=True,
                 with_layout_postprocess=True,
                 rendering_engine="nvdiffrast",
+                defer_postprocess=True,
             )
+        # Layout postprocess is not supported in multi-view mode: it aligns
+        # the object into one view's scene frame, which is ambiguous with
+        # several views. The metric scale still comes through — it is
+        # decoded per view against that view's pointmap and combined.
+        return seed, _inference.multi_view(
+            images,
+            masks,
+            seed=seed,
+            with_mesh_postprocess=True,
+            with_texture_baking=True,
+            rendering_engine="nvdiffrast",
+            defer_postprocess=True,
+        )
+
+    def _sample_batch(self, payloads):
+        # Single-view requests without a seed (see batch_key): the batch
+        # draws its noise from one random seed, which every job reports.
+        seed = random.randint(0, 2**32 - 1)
+        log.info(f"Inference micro-batch | requests={len(payloads)} seed={seed}")
+        finishes = _inference.batch(
+            [payload["images"][0] for payload in payloads],
+            [payload["masks"][0] for payload in payloads],
+            seed=seed,
+            with_mesh_postprocess=True,
+            with_texture_baking=True,
+            with_layout_postprocess=True,
+            rendering_engine="nvdiffrast",
+            defer_postprocess=True,
+        )
+        return [(seed, finish) for finish in finishes]
+
+    def postprocess(self, payload, sampled):
+        seed, finish = sampled
+        output = finish()
+        output_path = Path(payload["output_path"])
+        num_views = len(payload["view_specs"])
+
+        if num_views == 1:
             # with_layout_postprocess=True solves the object's pose in the
             # source photo's metric camera frame; surface it (see extract_pose)
             # instead of discarding it as before.
@@ -163,18 +270,6 @@ def infer(req: InferRequest):
             # extract_intrinsics). Additive/informational, like pose.
             intrinsics = extract_intrinsics(output)
         else:
-            # Layout postprocess is not supported in multi-view mode: it aligns
-            # the object into one view's scene frame, which is ambiguous with
-            # several views. The metric scale still comes through — it is
-            # decoded per view against that view's pointmap and combined.
-            output = _inference.multi_view(
-                images,
-                masks,
-                seed=seed,
-                with_mesh_postprocess=True,
-                with_texture_baking=True,
-                rendering_engine="nvdiffrast",
-            )
             # No layout postprocess in multi-view -> no camera-frame pose.
             # Nulls, not an invented pose from an arbitrary view.
             pose = extract_pose(None)
@@ -212,7 +307,7 @@ def infer(req: InferRequest):
         mesh.export(str(output_path))
         log.info(f"Exported mesh to: {output_path}")
 
-        # Opt-in (req.return_normal_map): dump MoGe-2's per-pixel normal map
+        # Opt-in (return_normal_map): dump MoGe-2's per-pixel normal map
         # next to the GLB and return its path, instead of inlining a
         # full-resolution HxWx3 float array as JSON (easily several MB per
         # request -- see request_utils.normal_map_sidecar_path / the /infer
@@ -220,7 +315,7 @@ def infer(req: InferRequest):
         # multiview (no single camera frame), so it stays null there
         # regardless of the flag, same as pose/intrinsics above.
         normal_map_path = None
-        if req.return_normal_map and len(view_specs) == 1:
+        if payload["return_normal_map"] and num_views == 1:
             normal_tensor = output.get("normal")
             if normal_tensor is None:
                 log.info(
@@ -242,50 +337,135 @@ def infer(req: InferRequest):
                     # optional sidecar must not turn a good reconstruction
                     # into a 500.
                     log.warning(f"Failed to write normal map (non-fatal): {exc}")
-        elif req.return_normal_map:
+        elif payload["return_normal_map"]:
             log.info(
                 "return_normal_map=True has no effect for multiview requests "
                 "(no single camera frame to express a normal map in)."
             )
 
-    except Exception as exc:
-        log.exception("Inference failed")
-        raise HTTPException(status_code=500, detail=str(exc))
-    finally:
-        # Release fragmented reserved-but-unallocated memory back to CUDA.
-        torch.cuda.empty_cache()
+        return {
+            "output_path": str(output_path),
+            "seed": seed,
+            "views": num_views,
+            # Metres per unit-cube unit, already baked into the exported mesh.
+            # None means the mesh is still unit-cube sized (the layout head
+            # produced nothing usable).
+            "metric_scale": metric_scale,
+            # The camera-frame pose the pipeline solves for (with_layout_postprocess
+            # single-view requests only; see extract_pose). Additive / informational
+            # only -- the exported mesh above is unaffected and stays in its own
+            # object-local frame, exactly as before this field existed. All entries
+            # are None for multiview requests (no layout postprocess is run).
+            "pose": pose,
+            # MoGe-2's normalized camera intrinsics for the source photo (see
+            # extract_intrinsics for the exact convention and how to convert to
+            # pixels). Additive / informational, same caveats as pose: None for
+            # multiview requests. NOTE: not confirmed to share pose's axis
+            # convention -- see extract_intrinsics's docstring before combining
+            # the two.
+            "intrinsics": intrinsics,
+            # Path to MoGe-2's full-resolution per-pixel normal map (float32
+            # .npy, HxWx3, MoGe's own camera-space convention -- same one
+            # `intrinsics` above uses), written only when the request set
+            # return_normal_map=True. None otherwise: not requested, multiview,
+            # the checkpoint has no normal head, or the write failed (logged,
+            # non-fatal).
+            "normal_map_path": normal_map_path,
+        }
+
+
+# Every request, /infer included, goes through this queue: the scheduler
+# thread is the only caller of the model.
+_queue = JobQueue(
+    ServerPipeline(),
+    max_batch_size=args.max_batch_size,
+    max_wait=args.max_wait_ms / 1000,
+    cpu_workers=args.cpu_workers,
+).start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    _queue.stop()
+
+
+def _validated_payload(req: InferRequest):
+    """Check an InferRequest's inputs and turn it into a job payload."""
+    try:
+        view_specs = normalize_views(
+            req.image_path,
+            req.mask_paths,
+            [v.model_dump() for v in req.views] if req.views else None,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+    for image_path, mask_paths in view_specs:
+        if not Path(image_path).is_file():
+            raise HTTPException(
+                status_code=400, detail=f"image_path not found: {image_path}"
+            )
+        for mp in mask_paths:
+            if not Path(mp).is_file():
+                raise HTTPException(
+                    status_code=400, detail=f"mask_path not found: {mp}"
+                )
+
+    output_path = Path(req.output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     return {
+        "view_specs": view_specs,
         "output_path": str(output_path),
-        "seed": seed,
-        "views": len(view_specs),
-        # Metres per unit-cube unit, already baked into the exported mesh.
-        # None means the mesh is still unit-cube sized (the layout head
-        # produced nothing usable).
-        "metric_scale": metric_scale,
-        # The camera-frame pose the pipeline solves for (with_layout_postprocess
-        # single-view requests only; see extract_pose). Additive / informational
-        # only -- the exported mesh above is unaffected and stays in its own
-        # object-local frame, exactly as before this field existed. All entries
-        # are None for multiview requests (no layout postprocess is run).
-        "pose": pose,
-        # MoGe-2's normalized camera intrinsics for the source photo (see
-        # extract_intrinsics for the exact convention and how to convert to
-        # pixels). Additive / informational, same caveats as pose: None for
-        # multiview requests. NOTE: not confirmed to share pose's axis
-        # convention -- see extract_intrinsics's docstring before combining
-        # the two.
-        "intrinsics": intrinsics,
-        # Path to MoGe-2's full-resolution per-pixel normal map (float32
-        # .npy, HxWx3, MoGe's own camera-space convention -- same one
-        # `intrinsics` above uses), written only when the request set
-        # return_normal_map=True. None otherwise: not requested, multiview,
-        # the checkpoint has no normal head, or the write failed (logged,
-        # non-fatal).
-        "normal_map_path": normal_map_path,
+        # None: a random one, drawn when sampling (see batch_key)
+        "seed": req.seed,
+        "return_normal_map": req.return_normal_map,
     }
 
 
+def _get_job(job_id: str):
+    job = _queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"unknown job: {job_id}")
+    return job
+
+
+@app.post("/infer")
+def infer(req: InferRequest):
+    # Synchronous form of POST /jobs + GET /jobs/{id}/result.
+    job = _queue.submit(_validated_payload(req))
+    job.wait()
+    if job.error is not None:
+        raise HTTPException(status_code=500, detail=str(job.error))
+    return job.result
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(req: InferRequest):
+    job = _queue.submit(_validated_payload(req))
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _get_job(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str, wait: float = 0.0):
+    """The /infer response for a finished job.
+
+    `wait` blocks up to that many seconds for the job to finish. 409 while
+    it is still queued or running, 500 if it failed.
+    """
+    job = _get_job(job_id)
+    if not job.wait(wait):
+        raise HTTPException(status_code=409, detail=f"job is {job.status}")
+    if job.error is not None:
+        raise HTTPException(status_code=500, detail=str(job.error))
+    return job.result
+
+
 # ── entrypoint ────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     uvicorn.run(app, host=args.host, port=args.port, log_level="info")
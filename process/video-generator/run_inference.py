@@ -62,21 +62,21 @@ scene_gs = make_scene(output)
 
 scene_gs = ready_gaussian_for_video_rendering(scene_gs)
 
-print("Generating video...")
+print("Generating video as webm...")
 
-video = render_video(
-    scene_gs,
-    pitch_deg=10,
-    resolution=800,
-)["color"]
-
-print("Saving video as webm...")
-
-imageio.mimsave(
+# Frames are rendered in chunks and streamed into the encoder, instead of
+# holding all 300 of them in memory before saving.
+with imageio.get_writer(
     os.path.join(f"{output_path}"),
-    video,
     fps=30,
     codec="libvpx-vp9",
-)
+) as writer:
+    render_video(
+        scene_gs,
+        pitch_deg=10,
+        resolution=800,
+        chunk_size=30,
+        sink=lambda frames: [writer.append_data(f) for f in frames["color"]],
+    )
 
 print(f"Your rendering video has been saved to {output_path}")
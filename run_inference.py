@@ -98,6 +98,13 @@ def main():
     )
     parser.add_argument("--no_texture_baking", action="store_true")
     parser.add_argument("--no_mesh_postprocess", action="store_true")
+    parser.add_argument(
+        "--glb_lods",
+        default=None,
+        choices=["msft_lod", "files"],
+        help="Also write levels of detail of the GLB: result_lods.glb with the "
+        "MSFT_lod extension, or result_lods_lod<N>.glb files",
+    )
     parser.add_argument(
         "--out_dir",
         default=None,
@@ -161,6 +168,22 @@ def main():
         glb_path = out_dir / "result.glb"
         result["glb"].export(str(glb_path))
         saved.append(str(glb_path))
+        if args.glb_lods:
+            from sam3d_objects.model.backbone.tdfy_dit.utils import postprocessing_utils
+
+            lods, report = postprocessing_utils.glb_lods(result["glb"])
+            saved += postprocessing_utils.export_glb_lods(
+                lods,
+                str(out_dir / "result_lods.glb"),
+                separate_files=args.glb_lods == "files",
+                report=report,
+            )
+            for level, stats in enumerate(report):
+                logger.info(
+                    f"LOD {level}: {stats['vertices']} vertices, {stats['faces']} faces, "
+                    f"texture {stats['texture_size']}, {stats['bytes'] / 2**20:.2f} MiB, "
+                    f"{stats['seconds']:.2f} s"
+                )
     if result.get("gs") is not None:
         ply_path = out_dir / "result.ply"
         result["gs"].save_ply(str(ply_path))
@@ -54,6 +54,8 @@ class Dino(torch.nn.Module):
         self.prenorm_features = prenorm_features
         self.register_buffer('mean', torch.as_tensor([[0.485, 0.456, 0.406]]).view(-1, 1, 1), persistent=False)
         self.register_buffer('std', torch.as_tensor([[0.229, 0.224, 0.225]]).view(-1, 1, 1), persistent=False)
+        # optional FeatureCache shared by the encoders of a pipeline, see feature_cache.py
+        self.feature_cache = None
 
         # freeze
         if freeze_backbone:
@@ -109,9 +111,25 @@ class Dino(torch.nn.Module):
 
     def forward(self, x, **kwargs):
         _resized_images = self._preprocess_input(x)
-        tokens = self._forward_last_layer(_resized_images)
+        if self._use_feature_cache():
+            tokens = self.feature_cache.cached(
+                self,
+                _resized_images,
+                self._forward_last_layer,
+                namespace=f"prenorm={self.prenorm_features}",
+            )
+        else:
+            tokens = self._forward_last_layer(_resized_images)
         return tokens.to(x.dtype)
 
+    def _use_feature_cache(self):
+        # hashing the input needs a host copy: not while tracing or training
+        return (
+            self.feature_cache is not None
+            and not torch.compiler.is_compiling()
+            and not torch.is_grad_enabled()
+        )
+
     def _prune_network(self):
         """
         Ran this script:
@@ -0,0 +1,251 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Content-addressed cache of image encoder features (see `Dino.feature_cache`).
+
+The same crop is encoded by the condition embedders of both generators, and
+batch reruns encode the same image / mask pairs again. Features are keyed on
+a hash of the preprocessed input tensor and of the encoder (class, config
+namespace and a sample of its weights), so identical encoders share entries
+across stages, pipelines and, with a disk tier, processes.
+
+Two tiers, each with a byte limit:
+
+- memory: LRU of feature tensors on the device they were computed on;
+- disk (optional): one fp16 `.pt` file per entry in `cache_dir`, evicted
+  least recently used first; disk hits are promoted to memory.
+
+Hits, misses and the encoder time saved are kept in `stats` and reported to
+the active `StageProfiler` as the "feature_cache" counters.
+"""
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import torch
+from loguru import logger
+
+from sam3d_objects.utils.profiler import record_counters
+
+# elements of each weight tensor hashed into the encoder fingerprint
+FINGERPRINT_SAMPLES = 4096
+
+
+def _tensor_bytes(tensor: torch.Tensor) -> memoryview:
+    tensor = tensor.detach().contiguous().cpu()
+    return memoryview(tensor.reshape(-1).view(torch.uint8).numpy())
+
+
+_FINGERPRINTS = weakref.WeakKeyDictionary()
+
+
+def module_fingerprint(module: torch.nn.Module) -> str:
+    """
+    Hash of the class, parameter / buffer names, shapes and dtypes, and an
+    evenly strided sample of every weight tensor. Computed once per module
+    instance, so weights must not change after the first cached call.
+    """
+    if module not in _FINGERPRINTS:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(type(module).__qualname__.encode())
+        tensors = list(module.named_parameters()) + list(module.named_buffers())
+        for name, tensor in tensors:
+            digest.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype}".encode())
+            flat = tensor.detach().reshape(-1)
+            step = max(1, flat.numel() // FINGERPRINT_SAMPLES)
+            digest.update(_tensor_bytes(flat[::step][:FINGERPRINT_SAMPLES]))
+        _FINGERPRINTS[module] = digest.hexdigest()
+    return _FINGERPRINTS[module]
+
+
+def _synchronize(tensor: torch.Tensor):
+    if tensor.is_cuda:
+        torch.cuda.synchronize(tensor.device)
+
+
+class FeatureCache:
+    """
+    Args:
+        max_memory_bytes (int): Size limit of the in-memory tier; 0 disables it.
+        cache_dir (str): Directory of the on-disk tier, None to disable it.
+        max_disk_bytes (int): Size limit of the on-disk tier.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 256 * 2**20,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: int = 4 * 2**30,
+    ):
+        self.max_memory_bytes = int(max_memory_bytes)
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = int(max_disk_bytes)
+        self._memory = OrderedDict()  # key -> (features, compute_s)
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> file size, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = self._empty_stats()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, float]:
+        return {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "time_saved_s": 0.0,
+        }
+
+    # -- keys ---------------------------------------------------------------
+
+    def key(self, module: torch.nn.Module, inputs: torch.Tensor, namespace: str = "") -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(module_fingerprint(module).encode())
+        digest.update(f"{namespace}:{tuple(inputs.shape)}:{inputs.dtype}".encode())
+        digest.update(_tensor_bytes(inputs))
+        return digest.hexdigest()
+
+    # -- lookup -------------------------------------------------------------
+
+    def get(self, key: str, device=None) -> Optional[tuple]:
+        """(features, compute_s) of `key` or None; features are a copy on `device`."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            elif key in self._disk:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self.stats["disk_hits"] += 1
+                    self._put_memory(key, entry[0], entry[1])
+        if entry is None:
+            return None
+        features, compute_s = entry
+        return features.to(device, copy=True), compute_s
+
+    def put(self, key: str, features: torch.Tensor, compute_s: float = 0.0):
+        features = features.detach()
+        with self._lock:
+            self._put_memory(key, features.clone(), compute_s)
+            if self.cache_dir is not None and key not in self._disk:
+                self._write_disk(key, features, compute_s)
+
+    def cached(
+        self,
+        module: torch.nn.Module,
+        inputs: torch.Tensor,
+        compute: Callable[[torch.Tensor], torch.Tensor],
+        namespace: str = "",
+    ) -> torch.Tensor:
+        """`compute(inputs)`, served from the cache when already computed."""
+        start = time.perf_counter()
+        key = self.key(module, inputs, namespace)
+        entry = self.get(key, inputs.device)
+        if entry is not None:
+            features, compute_s = entry
+            _synchronize(features)
+            saved_s = max(0.0, compute_s - (time.perf_counter() - start))
+            with self._lock:
+                self.stats["hits"] += 1
+                self.stats["time_saved_s"] += saved_s
+            record_counters("feature_cache", hits=1, time_saved_ms=saved_s * 1e3)
+            return features
+
+        compute_start = time.perf_counter()
+        features = compute(inputs)
+        _synchronize(features)
+        self.put(key, features, time.perf_counter() - compute_start)
+        with self._lock:
+            self.stats["misses"] += 1
+        record_counters("feature_cache", misses=1)
+        return features
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def clear(self, disk: bool = False):
+        """Drop the memory tier (and the disk tier's files if `disk`)."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if disk:
+                for key in list(self._disk):
+                    self._remove_disk(key)
+
+    # -- memory tier --------------------------------------------------------
+
+    def _put_memory(self, key, features, compute_s):
+        size = features.numel() * features.element_size()
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= self._memory[key][0].numel() * self._memory[key][0].element_size()
+        self._memory[key] = (features, compute_s)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.numel() * evicted.element_size()
+
+    # -- disk tier ----------------------------------------------------------
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pt")
+
+    def _scan_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pt"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name[: -len(".pt")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            data = torch.load(path, map_location="cpu")
+            os.utime(path)
+        except (OSError, RuntimeError) as e:
+            # removed by another process, or a partial write
+            logger.warning(f"Dropping unreadable feature cache entry {path}: {e}")
+            self._remove_disk(key)
+            return None
+        self._disk.move_to_end(key)
+        features = data["features"].to(getattr(torch, data["dtype"]))
+        return features, data["compute_s"]
+
+    def _write_disk(self, key, features, compute_s):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        torch.save(
+            {
+                "features": features.to("cpu", torch.float16),
+                "dtype": str(features.dtype).replace("torch.", ""),
+                "compute_s": compute_s,
+            },
+            tmp_path,
+        )
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        self._disk[key] = size
+        self._disk_bytes += size
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            self._remove_disk(next(iter(self._disk)))
+
+    def _remove_disk(self, key):
+        self._disk_bytes -= self._disk.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
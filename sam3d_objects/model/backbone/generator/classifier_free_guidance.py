@@ -1,4 +1,5 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
+from contextlib import contextmanager
 from functools import partial
 from numbers import Number
 import torch
@@ -74,6 +75,9 @@ class ClassifierFreeGuidance(torch.nn.Module):
         # "add_flag" = add an argument in kwargs as "cfg" and defer the handling to generator backbone
         unconditional_handling="zeros",
         interval=None,  # only perform cfg if t within interval
+        # if enabled, run all guidance branches as a single batched backbone call
+        # (requires a backbone implementing `embed_branch` and `forward_branches`)
+        batched_guidance=False,
     ):
         super().__init__()
 
@@ -90,6 +94,7 @@ class ClassifierFreeGuidance(torch.nn.Module):
         self.strength = strength
         self.unconditional_handling = unconditional_handling
         self.interval = interval
+        self.batched_guidance = batched_guidance
         self._make_unconditional_args = (
             ClassifierFreeGuidance.UNCONDITIONAL_HANDLING_TYPES[
                 self.unconditional_handling
@@ -105,7 +110,35 @@ class ClassifierFreeGuidance(torch.nn.Module):
         else:
             return _pytree.tree_map(partial(self._cfg_step_tensor, strength=strength), y_cond, y_uncond)
 
+    def _use_batched_guidance(self):
+        if not self.batched_guidance:
+            return False
+        if not hasattr(self.backbone, "forward_branches"):
+            raise RuntimeError(
+                f"`batched_guidance` requires a backbone implementing `embed_branch` and `forward_branches`, got {type(self.backbone).__name__}"
+            )
+        return True
+
+    def _embed_branch(self, args, kwargs):
+        return self.backbone.embed_branch(*args, **kwargs)
+
     def inner_forward(self, x, t, is_cond, strength, *args_cond, **kwargs_cond):
+        if not is_cond and self._use_batched_guidance():
+            # copy kwargs, "add_flag" modifies them in place
+            args_uncond, kwargs_uncond = self._make_unconditional_args(
+                args_cond,
+                dict(kwargs_cond),
+            )
+            y_cond, y_uncond = self.backbone.forward_branches(
+                x,
+                t,
+                [
+                    self._embed_branch(args_cond, kwargs_cond),
+                    self._embed_branch(args_uncond, kwargs_uncond),
+                ],
+            )
+            return self._cfg_step(y_cond, y_uncond, strength)
+
         y_cond = self.backbone(x, t, *args_cond, **kwargs_cond)
         if is_cond:
             return y_cond
@@ -177,16 +210,38 @@ class PointmapCFG(ClassifierFreeGuidance):
         else:
             return _pytree.tree_map(partial(self._cfg_step_tensor, strength=strength, strength_pm=strength_pm), y_cond, y_uncond, y_pm)
 
+    @contextmanager
+    def _drop_pointmap(self):
+        force_drop_modalities = self.backbone.condition_embedder.force_drop_modalities
+        self.backbone.condition_embedder.force_drop_modalities = ['pointmap', 'rgb_pointmap']
+        try:
+            yield
+        finally:
+            self.backbone.condition_embedder.force_drop_modalities = force_drop_modalities
+
     def inner_forward(self, x, t, is_cond, strength, strength_pm, *args_cond, **kwargs_cond):
+        if not is_cond and self._use_batched_guidance():
+            branch_cond = self._embed_branch(args_cond, kwargs_cond)
+            with self._drop_pointmap():
+                branch_pm = self._embed_branch(args_cond, kwargs_cond)
+            # copy kwargs, "add_flag" modifies them in place
+            args_uncond, kwargs_uncond = self._make_unconditional_args(
+                args_cond,
+                dict(kwargs_cond),
+            )
+            branch_uncond = self._embed_branch(args_uncond, kwargs_uncond)
+            y_cond, y_pm, y_uncond = self.backbone.forward_branches(
+                x, t, [branch_cond, branch_pm, branch_uncond]
+            )
+            return self._cfg_step(y_cond, y_uncond, y_pm, strength, strength_pm)
+
         y_cond = self.backbone(x, t, *args_cond, **kwargs_cond)
 
         if is_cond:
             return y_cond
         else:                        
-            force_drop_modalities = self.backbone.condition_embedder.force_drop_modalities
-            self.backbone.condition_embedder.force_drop_modalities = ['pointmap', 'rgb_pointmap']
-            y_pm = self.backbone(x, t, *args_cond, **kwargs_cond)
-            self.backbone.condition_embedder.force_drop_modalities = force_drop_modalities
+            with self._drop_pointmap():
+                y_pm = self.backbone(x, t, *args_cond, **kwargs_cond)
 
             args_cond, kwargs_cond = self._make_unconditional_args(
                 args_cond,
@@ -16,6 +16,9 @@ from sam3d_objects.model.backbone.generator.flow_matching.solver import (
     RungeKutta4,
     gradient,
     SDE,
+    Heun,
+    DPMSolverPlusPlus,
+    AdaptiveRungeKutta,
 )
 
 # default sampler in flow matching
@@ -41,6 +44,9 @@ class FlowMatching(Base):
         "midpoint": Midpoint,
         "rk4": RungeKutta4,
         "sde": SDE,
+        "heun": Heun,
+        "dpmpp_2m": DPMSolverPlusPlus,
+        "adaptive_rk": AdaptiveRungeKutta,
     }
 
     def __init__(
@@ -77,18 +83,40 @@ class FlowMatching(Base):
             solver_method, solver_kwargs
         )
 
-    def _get_solver(self, solver_method, solver_kwargs):
-        if solver_method in FlowMatching.SOLVER_METHODS:
-            solver = FlowMatching.SOLVER_METHODS[solver_method](**solver_kwargs)
-        elif isinstance(solver_method, ODESolver):
-            solver_method = f"custom[{solver_method.__class__.__name__}]"
+    def _get_solver(self, solver_method, solver_kwargs=None):
+        if isinstance(solver_method, ODESolver):
             solver = solver_method
+            solver_method = f"custom[{solver.__class__.__name__}]"
+        elif solver_method in FlowMatching.SOLVER_METHODS:
+            solver = FlowMatching.SOLVER_METHODS[solver_method](**(solver_kwargs or {}))
         else:
             raise ValueError(
                 f"Invalid solver `{solver_method}`, should be in {set(self.SOLVER_METHODS.keys())} or an ODESolver instance"
             )
+        self._check_solver(solver)
         return solver_method, solver
 
+    def _check_solver(self, solver, log_likelihood=False):
+        # the multistep solver assumes the rectified flow path, sampled from noise at t = 0
+        if isinstance(solver, DPMSolverPlusPlus):
+            if self.sigma_min != 0:
+                raise ValueError(
+                    f"{type(solver).__name__} needs sigma_min = 0, got {self.sigma_min}"
+                )
+            if self.reversed_timestamp or log_likelihood:
+                raise ValueError(
+                    f"{type(solver).__name__} only integrates from t = 0 to 1, it cannot be "
+                    + ("used for log_likelihood" if log_likelihood else "used with reversed_timestamp")
+                )
+
+    def set_solver(
+        self, solver_method: Union[str, ODESolver], solver_kwargs: dict = None
+    ):
+        """Sample with another ODE solver (a `SOLVER_METHODS` name or an instance)."""
+        self._solver_method, self._solver = self._get_solver(
+            solver_method, solver_kwargs
+        )
+
     def _generate_noise_tensor(self, x_shape, x_device):
         return torch.randn(
             x_shape,
@@ -225,6 +253,9 @@ class FlowMatching(Base):
         *args_conditionals,
         **kwargs_conditionals,
     ):
+        if not torch.is_tensor(t):
+            # solvers evaluating between the sampling times pass python floats
+            t = torch.tensor(t, device=_get_device(x_t), dtype=torch.float32)
         return self.reverse_fn(x_t, t * self.time_scale, *args_conditionals, **kwargs_conditionals)
 
     def _log_p0(self, x0):
@@ -246,6 +277,7 @@ class FlowMatching(Base):
         t_seq = self._prepare_t(steps).to(device)
         t_seq = 1 - t_seq  # from x1 to x0
         solver = self._solver if solver is None else self._get_solver(solver)[1]
+        self._check_solver(solver, log_likelihood=True)
 
         x_0 = solver.solve(
             partial(self._log_likelihood_dynamics, device=device, z_samples=z_samples),
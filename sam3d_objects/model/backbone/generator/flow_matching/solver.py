@@ -1,9 +1,12 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
+import math
+
 import optree
 import torch
 from functools import partial
 
 from sam3d_objects.data.utils import tree_tensor_map
+from sam3d_objects.utils.profiler import profile_step
 
 
 def linear_approximation_step(x_t, dt, velocity):
@@ -32,9 +35,11 @@ class ODESolver:
 
     def solve_iter(self, dynamics_fn, x_init, times, *args, **kwargs):
         x_t = x_init
-        for t0, t1 in zip(times[:-1], times[1:]):
+        for i, (t0, t1) in enumerate(zip(times[:-1], times[1:])):
             dt = t1 - t0
-            x_t = self.step(dynamics_fn, x_t, t0, dt, *args, **kwargs)
+            with profile_step(i) as event:
+                x_t = self.step(dynamics_fn, x_t, t0, dt, *args, **kwargs)
+                event.record_tensors("x_t", x_t)
             yield x_t, t0
 
     def solve(self, dynamics_fn, x_init, times, *args, **kwargs):
@@ -60,9 +65,10 @@ class SDE(ODESolver):
     def step(self, dynamics_fn, x_t, t, dt, *args, **kwargs):
         velocity = dynamics_fn(x_t, t, *args, **kwargs)
         sigma = 1 - t
-        var_t = sigma / (1 - torch.tensor(sigma).clamp(min=dt))
+        # at t = 0 (sigma = 1) use the variance of the next step, as the paper does
+        var_t = sigma / (1 - torch.as_tensor(sigma).clamp(max=1 - dt))
         std_dev_t = (
-            torch.sqrt(variance) * self.sde_strength
+            torch.sqrt(var_t) * self.sde_strength
         )  # self.sde_strength = alpha
 
         def compute_mean(x, v):
@@ -75,7 +81,7 @@ class SDE(ODESolver):
         # Generate noise and compute final sample using tree_tensor_map
         def add_noise(mean_val):
             variance_noise = torch.randn_like(mean_val)
-            return mean_val + std_dev_t * torch.sqrt(torch.tensor(dt)) * variance_noise
+            return mean_val + std_dev_t * torch.sqrt(torch.as_tensor(dt)) * variance_noise
 
         prev_sample = tree_tensor_map(add_noise, prev_sample_mean)
 
@@ -124,3 +130,257 @@ class RungeKutta4(ODESolver):
         velocity_k = tree_tensor_map(compute_velocity, k1, k2, k3, k4)
         x_tp1 = linear_approximation_step(x_t, dt, velocity_k)
         return x_tp1
+
+
+# https://en.wikipedia.org/wiki/Heun%27s_method
+class Heun(ODESolver):
+    def step(self, dynamics_fn, x_t, t, dt, *args, **kwargs):
+        velocity = dynamics_fn(x_t, t, *args, **kwargs)
+        x_euler = linear_approximation_step(x_t, dt, velocity)
+        velocity_end = dynamics_fn(x_euler, t + dt, *args, **kwargs)
+        velocity = tree_tensor_map(lambda v0, v1: (v0 + v1) / 2, velocity, velocity_end)
+        return linear_approximation_step(x_t, dt, velocity)
+
+
+# https://arxiv.org/abs/2211.01095 (multistep DPM-Solver++, "2M")
+class DPMSolverPlusPlus(ODESolver):
+    """
+    Second order multistep solver in data prediction form, one evaluation per
+    step. Assumes the rectified flow path of `FlowMatching`, sampled from
+    t = 0 to 1: `x_t = (1 - t) x_0 + t x_1` (sigma_min = 0), so the data
+    estimate is `x_t + (1 - t) v` and, with it held constant, the step from
+    t to s is exact: `x_s = r x_t + (1 - r) x_1`, `r = (1 - s) / (1 - t)`.
+    Other paths and time grids (decreasing times, as in `log_likelihood` or
+    with `reversed_timestamp`) are rejected, see `FlowMatching._check_solver`.
+
+    The data estimates of the last two steps are extrapolated linearly in
+    log-SNR time. A step from t = 0 (infinite log-SNR step) has no usable
+    history and the step reaching t = 1 returns the data estimate, both are
+    first order.
+    """
+
+    def step(self, dynamics_fn, x_t, t, dt, *args, **kwargs):
+        t, s = float(t), float(t + dt)
+        self._check_times([t, s])
+        velocity = dynamics_fn(x_t, t, *args, **kwargs)
+        return self._update(x_t, t, s, self._data_estimate(x_t, t, velocity))
+
+    @staticmethod
+    def _check_times(times):
+        if any(t < 0 or t > 1 for t in times) or any(
+            t1 <= t0 for t0, t1 in zip(times[:-1], times[1:])
+        ):
+            raise ValueError(
+                "DPMSolverPlusPlus samples the rectified flow path from t = 0 to 1 "
+                "and needs increasing times in [0, 1]"
+            )
+
+    @staticmethod
+    def _log_snr(t):
+        # log(alpha_t / sigma_t), alpha_t = t, sigma_t = 1 - t
+        if t <= 0:
+            return -math.inf
+        if t >= 1:
+            return math.inf
+        return math.log(t) - math.log1p(-t)
+
+    @staticmethod
+    def _data_estimate(x_t, t, velocity):
+        return tree_tensor_map(lambda x, v: x + (1 - t) * v, x_t, velocity)
+
+    @staticmethod
+    def _update(x_t, t, s, data):
+        ratio = (1 - s) / (1 - t)
+        return tree_tensor_map(lambda x, d: ratio * x + (1 - ratio) * d, x_t, data)
+
+    def solve_iter(self, dynamics_fn, x_init, times, *args, **kwargs):
+        x_t = x_init
+        times = [float(t) for t in times]
+        self._check_times(times)
+        previous_data, previous_h = None, math.inf
+        for i, (t0, t1) in enumerate(zip(times[:-1], times[1:])):
+            with profile_step(i) as event:
+                velocity = dynamics_fn(x_t, t0, *args, **kwargs)
+                data = self._data_estimate(x_t, t0, velocity)
+                h = self._log_snr(t1) - self._log_snr(t0)
+                target = data
+                if previous_data is not None and math.isfinite(h) and math.isfinite(previous_h):
+                    # D + (D - D_prev) / (2 r), r = h_prev / h
+                    weight = h / (2 * previous_h)
+                    target = tree_tensor_map(
+                        lambda d, d_prev: d + weight * (d - d_prev), data, previous_data
+                    )
+                x_t = self._update(x_t, t0, t1, target)
+                previous_data, previous_h = data, h
+                event.record_tensors("x_t", x_t)
+            yield x_t, t0
+
+
+# Butcher tableaux of embedded Runge-Kutta pairs: nodes c, stage weights a,
+# weights b of the propagated solution and b_err of (solution - embedded one)
+RK_TABLEAUX = {
+    # https://en.wikipedia.org/wiki/Bogacki%E2%80%93Shampine_method, 3(2)
+    "bosh3": {
+        "order": 3,
+        "c": [0.0, 1 / 2, 3 / 4, 1.0],
+        "a": [[], [1 / 2], [0.0, 3 / 4], [2 / 9, 1 / 3, 4 / 9]],
+        "b": [2 / 9, 1 / 3, 4 / 9, 0.0],
+        "b_err": [2 / 9 - 7 / 24, 1 / 3 - 1 / 4, 4 / 9 - 1 / 3, -1 / 8],
+    },
+    # https://en.wikipedia.org/wiki/Dormand%E2%80%93Prince_method, 5(4)
+    "dopri5": {
+        "order": 5,
+        "c": [0.0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1.0, 1.0],
+        "a": [
+            [],
+            [1 / 5],
+            [3 / 40, 9 / 40],
+            [44 / 45, -56 / 15, 32 / 9],
+            [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+            [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+            [35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+        ],
+        "b": [35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0.0],
+        "b_err": [
+            35 / 384 - 5179 / 57600,
+            0.0,
+            500 / 1113 - 7571 / 16695,
+            125 / 192 - 393 / 640,
+            -2187 / 6784 + 92097 / 339200,
+            11 / 84 - 187 / 2100,
+            -1 / 40,
+        ],
+    },
+}
+
+
+def _weighted_sum(x_t, dt, weights, ks):
+    # x_t + dt * sum_i w_i k_i (dt * sum_i w_i k_i if x_t is None), zero weights skipped
+    terms = [(w, k) for w, k in zip(weights, ks) if w != 0]
+
+    def combine(*values):
+        x, vs = (0, values) if x_t is None else (values[0], values[1:])
+        return x + dt * sum(w * v for (w, _), v in zip(terms, vs))
+
+    trees = [k for _, k in terms]
+    return tree_tensor_map(combine, *([] if x_t is None else [x_t]), *trees)
+
+
+class AdaptiveRungeKutta(ODESolver):
+    """
+    Embedded Runge-Kutta pair with step size control: each step also yields
+    a lower order solution, their difference estimates the local error, and
+    the step is accepted when its RMS, relative to `atol + rtol * |x|`, is
+    at most 1. The next step size follows from the error and the order.
+
+    The sampling times are kept as output points: the solver integrates
+    between consecutive times with as many internal steps as the tolerance
+    needs, and yields once per time as the fixed-step solvers do. With few
+    sampling steps (e.g. `inference_steps=1`), the tolerance alone decides
+    the number of evaluations.
+
+    Args:
+        tableau (str): "bosh3" (Bogacki-Shampine 3(2), 3 evaluations per
+            step, the last one reused by the next step) or "dopri5"
+            (Dormand-Prince 5(4), 6 evaluations per step).
+        rtol, atol (float): Relative and absolute error tolerance.
+        first_step (float): Initial step size, the first interval by default.
+        max_steps (int): Internal steps allowed per `solve` before failing.
+    """
+
+    def __init__(
+        self,
+        tableau: str = "bosh3",
+        rtol: float = 1e-3,
+        atol: float = 1e-3,
+        first_step: float = None,
+        max_steps: int = 1000,
+        safety: float = 0.9,
+        min_factor: float = 0.2,
+        max_factor: float = 5.0,
+    ):
+        super().__init__()
+        if tableau not in RK_TABLEAUX:
+            raise ValueError(
+                f"Invalid tableau `{tableau}`, should be in {set(RK_TABLEAUX.keys())}"
+            )
+        self.tableau = RK_TABLEAUX[tableau]
+        self.rtol = rtol
+        self.atol = atol
+        self.first_step = first_step
+        self.max_steps = max_steps
+        self.safety = safety
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        # first-same-as-last: the last stage is the velocity at the new point
+        self._fsal = self.tableau["a"][-1] == self.tableau["b"][:-1]
+
+    def _stages(self, dynamics_fn, x_t, t, dt, k0, *args, **kwargs):
+        ks = [dynamics_fn(x_t, t, *args, **kwargs) if k0 is None else k0]
+        for c, a in zip(self.tableau["c"][1:], self.tableau["a"][1:]):
+            x_stage = _weighted_sum(x_t, dt, a, ks)
+            ks.append(dynamics_fn(x_stage, t + c * dt, *args, **kwargs))
+        return ks
+
+    def _error_ratio(self, x_t, x_next, error):
+        squares, count = 0.0, 0
+        for x, y, e in zip(
+            optree.tree_leaves(x_t), optree.tree_leaves(x_next), optree.tree_leaves(error)
+        ):
+            if not isinstance(e, torch.Tensor):
+                continue
+            scale = self.atol + self.rtol * torch.maximum(x.abs(), y.abs())
+            squares += float(((e / scale) ** 2).sum())
+            count += e.numel()
+        return math.sqrt(squares / max(count, 1))
+
+    def step(self, dynamics_fn, x_t, t, dt, *args, **kwargs):
+        """One step of the higher order method, without error control."""
+        ks = self._stages(dynamics_fn, x_t, t, dt, None, *args, **kwargs)
+        return _weighted_sum(x_t, dt, self.tableau["b"], ks)
+
+    def solve_iter(self, dynamics_fn, x_init, times, *args, **kwargs):
+        x_t = x_init
+        times = [float(t) for t in times]
+        order = self.tableau["order"]
+        step_size = self.first_step
+        k0 = None
+        internal_steps = 0
+        for i, (t0, t1) in enumerate(zip(times[:-1], times[1:])):
+            with profile_step(i) as event:
+                t = t0
+                if step_size is None:
+                    step_size = abs(t1 - t0)
+                direction = 1.0 if t1 >= t0 else -1.0
+                while direction * (t1 - t) > 1e-12:
+                    if internal_steps >= self.max_steps:
+                        raise RuntimeError(
+                            f"{type(self).__name__} needed more than {self.max_steps} "
+                            f"steps, increase the tolerances or max_steps"
+                        )
+                    internal_steps += 1
+                    dt = direction * min(step_size, abs(t1 - t))
+                    ks = self._stages(dynamics_fn, x_t, t, dt, k0, *args, **kwargs)
+                    x_next = _weighted_sum(x_t, dt, self.tableau["b"], ks)
+                    error = _weighted_sum(None, dt, self.tableau["b_err"], ks)
+                    ratio = self._error_ratio(x_t, x_next, error)
+                    factor = (
+                        self.max_factor
+                        if ratio == 0
+                        else self.safety * ratio ** (-1 / order)
+                    )
+                    factor = min(self.max_factor, max(self.min_factor, factor))
+                    if ratio <= 1:
+                        t, x_t = t + dt, x_next
+                        k0 = ks[-1] if self._fsal else None
+                        if abs(dt) < step_size:
+                            # clipped to the output time: keep the step size
+                            step_size = max(step_size, abs(dt) * factor)
+                        else:
+                            step_size = abs(dt) * factor
+                    else:
+                        k0 = ks[0]
+                        step_size = abs(dt) * factor
+                event.annotate(internal_steps=internal_steps)
+                event.record_tensors("x_t", x_t)
+            yield x_t, t0
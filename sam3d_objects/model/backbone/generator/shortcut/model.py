@@ -11,6 +11,11 @@ from sam3d_objects.model.backbone.generator.base import Base
 from sam3d_objects.data.utils import right_broadcasting
 from sam3d_objects.data.utils import tree_tensor_map, tree_reduce_unique
 from sam3d_objects.model.backbone.generator.flow_matching.model import FlowMatching, _get_device
+from sam3d_objects.model.backbone.generator.flow_matching.solver import (
+    AdaptiveRungeKutta,
+    DPMSolverPlusPlus,
+    Heun,
+)
 from torch.nn.attention import SDPBackend, sdpa_kernel
 from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
 import copy
@@ -18,6 +23,10 @@ import copy
 
 # https://arxiv.org/pdf/2410.12557
 class ShortCut(FlowMatching):
+    # solvers whose steps differ from the step size `d` the model is conditioned
+    # on (steps to t + dt, adaptive step sizes): flow matching only (no_shortcut)
+    FLOW_MATCHING_SOLVERS = (Heun, DPMSolverPlusPlus, AdaptiveRungeKutta)
+
     def __init__(
         self,
         no_shortcut=False,
@@ -419,6 +428,11 @@ class ShortCut(FlowMatching):
         **kwargs_conditionals,
     ):
         """Generate samples using shortcut model"""
+        if not self.no_shortcut and isinstance(self._solver, self.FLOW_MATCHING_SOLVERS):
+            raise ValueError(
+                f"solver `{self._solver_method}` does not take steps of the shortcut step "
+                f"size d, use it with no_shortcut=True (or euler / midpoint / rk4 / sde)"
+            )
         x_0 = self._generate_noise(x_shape, x_device)
         t_seq, d = self._prepare_t_and_d()
 
@@ -4,7 +4,7 @@ from typing import *
 from torch.utils import _pytree
 import torch
 import torch.nn as nn
-from ..modules.utils import convert_module_to_f16, convert_module_to_f32
+from ..modules.utils import convert_module_to_f16, convert_module_to_f32, broadcast_batch
 from collections import namedtuple
 from ..modules.utils import FP16_TYPE
 from ..modules.transformer import (
@@ -210,14 +210,25 @@ class SparseStructureFlowTdfyWrapper(SparseStructureFlowModel):
         **condition_kwargs,
     ) -> dict:
         d = condition_kwargs.pop("d", None)
-            
+        cond = self._embed_condition(*condition_args, **condition_kwargs)
+        return self._forward_embedded(latents_dict, t, cond, d)
+
+    def _embed_condition(self, *condition_args, **condition_kwargs) -> torch.Tensor:
         cfg_activate = condition_kwargs.pop("cfg", False)
         if self.force_zeros_cond and cfg_activate:
             cond = self.condition_embedder(*condition_args, **condition_kwargs)
             cond = cond * 0
         else:
             cond = self.condition_embedder(*condition_args, **condition_kwargs)
+        return cond
 
+    def _forward_embedded(
+        self,
+        latents_dict: dict,
+        t: torch.Tensor,
+        cond: torch.Tensor,
+        d: torch.Tensor = None,
+    ) -> dict:
         # concatenate input
         latent_dict = self.project_input(latents_dict)
         output = super().forward(latent_dict, t, cond, d)
@@ -227,6 +238,58 @@ class SparseStructureFlowTdfyWrapper(SparseStructureFlowModel):
 
         return output_latents
 
+    def embed_branch(self, *condition_args, **condition_kwargs) -> dict:
+        """
+        Embed the conditions of one guidance branch for `forward_branches`.
+        Takes the same conditional arguments as `forward`.
+        """
+        d = condition_kwargs.pop("d", None)
+        return {
+            "cond": self._embed_condition(*condition_args, **condition_kwargs),
+            "d": d,
+        }
+
+    def forward_branches(
+        self,
+        latents_dict: dict,
+        t: torch.Tensor,
+        branches: List[dict],
+    ) -> List[dict]:
+        """
+        Run several guidance branches (see `embed_branch`) on the same latents
+        as a single forward pass by stacking them along the batch dimension.
+        Returns one output per branch, in order.
+        """
+        n_branches = len(branches)
+        batch_size = tree_reduce_unique(lambda tensor: tensor.shape[0], latents_dict)
+
+        latents_dict = _pytree.tree_map(
+            lambda x: torch.cat([x] * n_branches, dim=0), latents_dict
+        )
+        t = broadcast_batch(t, batch_size).repeat(n_branches)
+        cond = torch.cat(
+            [
+                branch["cond"].expand(batch_size, *branch["cond"].shape[1:])
+                for branch in branches
+            ],
+            dim=0,
+        )
+        ds = [branch["d"] for branch in branches]
+        if all(d is None for d in ds):
+            d = None
+        elif any(d is None for d in ds):
+            raise ValueError("either all or none of the guidance branches can set `d`")
+        else:
+            d = torch.cat([broadcast_batch(d, batch_size) for d in ds], dim=0)
+
+        output = self._forward_embedded(latents_dict, t, cond, d)
+        return [
+            _pytree.tree_map(
+                lambda x: x[i * batch_size : (i + 1) * batch_size], output
+            )
+            for i in range(n_branches)
+        ]
+
     def project_input(
         self,
         latents_dict: Dict,
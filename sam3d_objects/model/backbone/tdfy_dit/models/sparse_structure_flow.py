@@ -4,7 +4,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
-from ..modules.utils import convert_module_to_f16, convert_module_to_f32
+from ..modules.utils import convert_module_to_f16, convert_module_to_f32, broadcast_batch
 from collections import namedtuple
 from ..modules.utils import FP16_TYPE
 from ..modules.transformer import (
@@ -268,13 +268,7 @@ class SparseStructureFlowTdfyWrapper(SparseStructureFlowModel):
             self.condition_embedder = lambda x: x
         self.force_zeros_cond = force_zeros_cond
 
-    def forward(
-        self,
-        x: torch.Tensor,
-        t: torch.Tensor,
-        *condition_args,
-        **condition_kwargs,
-    ) -> torch.Tensor:
+    def _embed_condition(self, *condition_args, **condition_kwargs) -> torch.Tensor:
         cfg_activate = condition_kwargs.pop("cfg", False)
         if self.force_zeros_cond and cfg_activate:
             # TODO: @weiyaowang, refactor to read directly from embedder
@@ -282,6 +276,14 @@ class SparseStructureFlowTdfyWrapper(SparseStructureFlowModel):
             cond = cond * 0
         else:
             cond = self.condition_embedder(*condition_args, **condition_kwargs)
+        return cond
+
+    def _forward_embedded(
+        self,
+        x: torch.Tensor,
+        t: torch.Tensor,
+        cond: torch.Tensor,
+    ) -> torch.Tensor:
         if self.include_pose:
             pose = x[:, -1:]
             x = x[:, :-1]
@@ -301,3 +303,45 @@ class SparseStructureFlowTdfyWrapper(SparseStructureFlowModel):
         if self.include_pose:
             h = torch.cat([h, pose], dim=1)
         return h
+
+    def forward(
+        self,
+        x: torch.Tensor,
+        t: torch.Tensor,
+        *condition_args,
+        **condition_kwargs,
+    ) -> torch.Tensor:
+        cond = self._embed_condition(*condition_args, **condition_kwargs)
+        return self._forward_embedded(x, t, cond)
+
+    def embed_branch(self, *condition_args, **condition_kwargs) -> dict:
+        """
+        Embed the conditions of one guidance branch for `forward_branches`.
+        Takes the same conditional arguments as `forward`.
+        """
+        return {"cond": self._embed_condition(*condition_args, **condition_kwargs)}
+
+    def forward_branches(
+        self,
+        x: torch.Tensor,
+        t: torch.Tensor,
+        branches: List[dict],
+    ) -> List[torch.Tensor]:
+        """
+        Run several guidance branches (see `embed_branch`) on the same input
+        as a single forward pass by stacking them along the batch dimension.
+        Returns one output per branch, in order.
+        """
+        n_branches = len(branches)
+        batch_size = x.shape[0]
+        x = torch.cat([x] * n_branches, dim=0)
+        t = broadcast_batch(t, batch_size).repeat(n_branches)
+        cond = torch.cat(
+            [
+                branch["cond"].expand(batch_size, *branch["cond"].shape[1:])
+                for branch in branches
+            ],
+            dim=0,
+        )
+        h = self._forward_embedded(x, t, cond)
+        return list(h.split(batch_size, dim=0))
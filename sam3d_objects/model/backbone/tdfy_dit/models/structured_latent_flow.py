@@ -4,7 +4,13 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
-from ..modules.utils import zero_module, convert_module_to_f16, convert_module_to_f32
+from torch.utils import _pytree
+from ..modules.utils import (
+    zero_module,
+    convert_module_to_f16,
+    convert_module_to_f32,
+    broadcast_batch,
+)
 from ..modules.transformer import AbsolutePositionEmbedder
 from ..modules.norm import LayerNorm32
 from ..modules import sparse as sp
@@ -301,6 +307,94 @@ class SLatFlowModel(nn.Module):
         return h
 
 
+class SLatSamplingSession:
+    """
+    State shared by the denoising steps of one SLAT sampling run, all of which
+    use the same `coords` (the numpy array / tensor passed as conditional
+    input, matched by identity). Coords may pack several objects as batch
+    indices 0..K-1 (`num_objects`); each dense latent row then holds the
+    concatenated latents of the K objects. The session caches
+
+    - the packed input SparseTensor per (device, number of batch elements),
+      so coords are uploaded and their shape / layout computed once, and the
+      later steps only swap the features in (`SparseTensor.replace`);
+    - the coords-only spatial caches (downsample maps, conv orderings,
+      attention partitions), shared through those inputs;
+    - the condition embedding of every guidance branch, keyed on the
+      identity of the branch's conditional inputs (see `branch_key`).
+    """
+
+    # "zeros" guidance makes new zero tensors every step: keep a few branches only
+    MAX_BRANCHES = 8
+
+    def __init__(self, coords):
+        self.coords = coords
+        self.num_objects = int(coords[:, 0].max()) + 1
+        self._coords = {}
+        self._inputs = {}
+        self._spatial_caches = {}
+        self._branches = {}
+
+    def coords_on(self, device) -> torch.Tensor:
+        device = torch.device(device)
+        if device not in self._coords:
+            self._coords[device] = torch.as_tensor(self.coords).to(device)
+        return self._coords[device]
+
+    def spatial_cache(self, num_elements: int) -> dict:
+        return self._spatial_caches.setdefault(num_elements, {})
+
+    def sparse_input(self, x: torch.Tensor, repeats: int = 1) -> sp.SparseTensor:
+        """
+        Dense latents of shape (B, N, C) as one SparseTensor with `repeats * B`
+        rows on `coords` (the latents repeated `repeats` times), each row being
+        `num_objects` batch elements.
+        """
+        num_elements = x.shape[0] * repeats * self.num_objects
+        feats = x.reshape(-1, *x.shape[2:])
+        if repeats > 1:
+            feats = feats.repeat(repeats, *([1] * (feats.dim() - 1)))
+        key = (x.device, num_elements)
+        template = self._inputs.get(key)
+        if template is None:
+            coords = self.coords_on(x.device)
+            rows = [
+                sp.SparseTensor(feats=feats[: coords.shape[0]].detach(), coords=coords)
+            ] * (x.shape[0] * repeats)
+            template = rows[0] if len(rows) == 1 else sp.sparse_cat(rows)
+            template._spatial_cache = self.spatial_cache(num_elements)
+            self._inputs[key] = template
+        return template.replace(feats)
+
+    @staticmethod
+    def branch_key(condition_args, condition_kwargs, force_drop_modalities=None):
+        """
+        Hashable key of one guidance branch. Objects count by identity (tensors
+        also by their in-place version counter), plain values by value; the
+        key objects are kept alive with the cached embedding, so ids are never
+        reused while the entry exists.
+        """
+        leaves, spec = _pytree.tree_flatten((condition_args, condition_kwargs))
+        key = [str(spec), tuple(force_drop_modalities or ())]
+        for leaf in leaves:
+            if leaf is None or isinstance(leaf, (bool, int, float, str)):
+                key.append((type(leaf), leaf))
+            elif isinstance(leaf, torch.Tensor):
+                key.append((id(leaf), leaf._version))
+            else:
+                key.append(id(leaf))
+        return tuple(key), leaves
+
+    def embedding(self, key, leaves, embed: Callable[[], torch.Tensor]) -> torch.Tensor:
+        if key in self._branches:
+            return self._branches[key][1]
+        cond = embed()
+        if len(self._branches) >= self.MAX_BRANCHES:
+            del self._branches[next(iter(self._branches))]
+        self._branches[key] = (leaves, cond)
+        return cond
+
+
 class SLatFlowModelTdfyWrapper(SLatFlowModel):
     def __init__(self, *args, **kwargs):
         condition_embedder = kwargs.pop("condition_embedder", None)
@@ -315,14 +409,10 @@ class SLatFlowModelTdfyWrapper(SLatFlowModel):
             self.condition_embedder = lambda x: x
         self.force_zeros_cond = force_zeros_cond
         # self.null_condition = None
+        # state shared across denoising steps, see `_sampling_session`
+        self._session = None
 
-    def forward(
-        self,
-        x: torch.Tensor,
-        t: torch.Tensor,
-        *condition_args,
-        **condition_kwargs,
-    ) -> torch.Tensor:
+    def _split_condition_inputs(self, condition_args, condition_kwargs):
         # Extract d from kwargs_conditionals if present, for shortcut model
         if not torch.compiler.is_compiling():
             d = condition_kwargs.pop("d", None)
@@ -336,12 +426,9 @@ class SLatFlowModelTdfyWrapper(SLatFlowModel):
             coords = condition_args[-1]
             condition_args = condition_args[:-1]
             d = condition_kwargs.pop("d", None)
-            
-        coords = torch.tensor(coords).to(x.device)
-        x = sp.SparseTensor(
-            feats=x[0],
-            coords=coords,
-        )
+        return coords, d, condition_args, condition_kwargs
+
+    def _embed_condition(self, *condition_args, **condition_kwargs) -> torch.Tensor:
         cfg_activate = condition_kwargs.pop("cfg", False)
         if self.force_zeros_cond and cfg_activate:
             # TODO: @weiyaowang, refactor to read directly from embedder
@@ -349,6 +436,153 @@ class SLatFlowModelTdfyWrapper(SLatFlowModel):
             cond = cond * 0
         else:
             cond = self.condition_embedder(*condition_args, **condition_kwargs)
+        return cond
+
+    def _session_embed_condition(
+        self, session, *condition_args, **condition_kwargs
+    ) -> torch.Tensor:
+        """
+        `_embed_condition`, computed once per guidance branch and sampling
+        session. Only at inference (no grad), where neither the conditions nor
+        the embedder change between steps.
+        """
+        if torch.is_grad_enabled() or torch.compiler.is_compiling():
+            return self._embed_condition(*condition_args, **condition_kwargs)
+        key, leaves = session.branch_key(
+            condition_args,
+            condition_kwargs,
+            getattr(self.condition_embedder, "force_drop_modalities", None),
+        )
+        return session.embedding(
+            key,
+            leaves,
+            lambda: self._embed_condition(*condition_args, **condition_kwargs),
+        )
+
+    def forward(
+        self,
+        x: torch.Tensor,
+        t: torch.Tensor,
+        *condition_args,
+        **condition_kwargs,
+    ) -> torch.Tensor:
+        coords, d, condition_args, condition_kwargs = self._split_condition_inputs(
+            condition_args, condition_kwargs
+        )
+        rows = x.shape[0]
+        session = self._sampling_session(coords)
+        x = session.sparse_input(x)
+        if x.shape[0] > 1:
+            t = self._per_element(t, rows, session.num_objects)
+            if d is not None:
+                d = self._per_element(d, rows, session.num_objects)
+        cond = self._session_embed_condition(
+            session, *condition_args, **condition_kwargs
+        )
         h = super().forward(x, t, cond, d)
-        h = h.feats[None]
-        return h
+        return self._dense_output(h, rows)
+
+    @staticmethod
+    def _per_element(value: torch.Tensor, rows: int, num_objects: int) -> torch.Tensor:
+        # one value per dense row (or a shared one) -> one per sparse batch element
+        value = broadcast_batch(value, rows)
+        if num_objects > 1:
+            value = value.repeat_interleave(num_objects)
+        return value
+
+    def _sparse_input(self, x: torch.Tensor, coords) -> sp.SparseTensor:
+        """
+        Pack dense latents of shape (B, N, C) that all live on the same `coords`
+        into one SparseTensor with B batch elements.
+        """
+        coords = torch.tensor(coords).to(x.device)
+        if x.shape[0] == 1:
+            return sp.SparseTensor(feats=x[0], coords=coords)
+        return sp.sparse_cat(
+            [sp.SparseTensor(feats=feats, coords=coords) for feats in x]
+        )
+
+    def _sampling_session(self, coords) -> SLatSamplingSession:
+        """
+        Session of the sampling run on `coords`. Coords stay fixed for every
+        step of a sampling run, so the coords upload, the packed sparse input,
+        the coords-only geometry and the condition embeddings are computed on
+        the first step and reused afterwards. The session is keyed on the
+        coords object itself and is dropped as soon as different coords come in.
+        """
+        if self._session is None or coords is not self._session.coords:
+            self._session = SLatSamplingSession(coords)
+        return self._session
+
+    def clear_spatial_cache(self):
+        """End the sampling session, freeing everything cached for its coords."""
+        self._session = None
+
+    def _dense_output(self, h: sp.SparseTensor, rows: int) -> torch.Tensor:
+        if rows == 1:
+            return h.feats[None]
+        if rows == h.shape[0]:
+            return torch.stack([h_i.feats for h_i in h.unbind(0)])
+        # rows of packed objects, in row order
+        return h.feats.reshape(rows, -1, *h.feats.shape[1:])
+
+    def embed_branch(self, *condition_args, **condition_kwargs) -> dict:
+        """
+        Embed the conditions of one guidance branch for `forward_branches`.
+        Takes the same conditional arguments as `forward`, coords included.
+        """
+        coords, d, condition_args, condition_kwargs = self._split_condition_inputs(
+            condition_args, condition_kwargs
+        )
+        return {
+            "cond": self._session_embed_condition(
+                self._sampling_session(coords), *condition_args, **condition_kwargs
+            ),
+            "coords": coords,
+            "d": d,
+        }
+
+    def forward_branches(
+        self,
+        x: torch.Tensor,
+        t: torch.Tensor,
+        branches: List[dict],
+    ) -> List[torch.Tensor]:
+        """
+        Run several guidance branches (see `embed_branch`) on the same latent
+        as a single forward pass. Each branch contributes its own batch elements
+        to a `sparse_cat`-ed SparseTensor. Returns one output per branch, in order.
+        """
+        n_branches = len(branches)
+        rows = x.shape[0]
+        coords = branches[0]["coords"]
+        if all(branch["coords"] is coords for branch in branches):
+            session = self._sampling_session(coords)
+            num_objects = session.num_objects
+            x = session.sparse_input(x, repeats=n_branches)
+        else:
+            num_objects = 1
+            x = sp.sparse_cat(
+                [self._sparse_input(x, branch["coords"]) for branch in branches]
+            )
+        batch_size = rows * num_objects
+        t = self._per_element(t, rows, num_objects).repeat(n_branches)
+        cond = torch.cat(
+            [
+                branch["cond"].expand(batch_size, *branch["cond"].shape[1:])
+                for branch in branches
+            ],
+            dim=0,
+        )
+        ds = [branch["d"] for branch in branches]
+        if all(d is None for d in ds):
+            d = None
+        elif any(d is None for d in ds):
+            raise ValueError("either all or none of the guidance branches can set `d`")
+        else:
+            d = torch.cat(
+                [self._per_element(d, rows, num_objects) for d in ds], dim=0
+            )
+
+        h = super().forward(x, t, cond, d)
+        return list(self._dense_output(h, rows * n_branches).split(rows, dim=0))
@@ -33,6 +33,7 @@ def __from_env():
         "xformers",
         "flash_attn",
         "sdpa",
+        "sdpa_varlen",
     ]:
         ATTN = env_sparse_attn
 
@@ -52,7 +53,7 @@ def set_debug(debug: bool):
     DEBUG = debug
 
 
-def set_attn(attn: Literal["xformers", "flash_attn"]):
+def set_attn(attn: Literal["xformers", "flash_attn", "sdpa", "sdpa_varlen"]):
     global ATTN
     ATTN = attn
 
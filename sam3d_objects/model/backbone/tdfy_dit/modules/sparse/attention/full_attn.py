@@ -10,6 +10,8 @@ elif ATTN == "flash_attn":
     import flash_attn
 elif ATTN == "sdpa":
     from .masked_sdpa import masked_sdpa
+elif ATTN == "sdpa_varlen":
+    from .masked_sdpa import varlen_sdpa as masked_sdpa
 else:
     raise ValueError(f"Unknown attention module: {ATTN}")
 
@@ -292,7 +294,7 @@ def sparse_scaled_dot_product_attention(*args, **kwargs):
             out = flash_attn.flash_attn_varlen_func(
                 q, k, v, cu_seqlens_q, cu_seqlens_kv, max(q_seqlen), max(kv_seqlen)
             )
-    elif ATTN == "sdpa":
+    elif ATTN in ("sdpa", "sdpa_varlen"):
         if num_all_args == 1:
             q, k, v = qkv.unbind(dim=1)
         elif num_all_args == 2:
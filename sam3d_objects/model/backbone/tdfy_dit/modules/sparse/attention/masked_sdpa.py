@@ -58,3 +58,101 @@ def masked_sdpa(q, k, v, q_seqlen, kv_seqlen):
     out = out.permute(0, 2, 1, 3)
 
     return out[0]
+
+
+def length_buckets(q_seqlens, kv_seqlens, max_padding=0.25):
+    """
+    Group sequence indices into buckets that can be padded to a common length.
+    Sequences are sorted by length and a bucket is closed as soon as padding it
+    to its longest member would waste more than `max_padding` of the attention
+    area (q_len * kv_len) of the bucket. Sequences of equal length always share
+    a bucket and need no padding at all.
+    """
+    order = sorted(
+        range(len(q_seqlens)), key=lambda i: (kv_seqlens[i], q_seqlens[i])
+    )
+    buckets, bucket = [], []
+    for i in order:
+        if bucket:
+            padded_area = (
+                (len(bucket) + 1)
+                * max(max_q, q_seqlens[i])
+                * max(max_kv, kv_seqlens[i])
+            )
+            if padded_area > (1 + max_padding) * (area + q_seqlens[i] * kv_seqlens[i]):
+                buckets.append(bucket)
+                bucket = []
+        if not bucket:
+            area, max_q, max_kv = 0, 0, 0
+        bucket.append(i)
+        area += q_seqlens[i] * kv_seqlens[i]
+        max_q = max(max_q, q_seqlens[i])
+        max_kv = max(max_kv, kv_seqlens[i])
+    if bucket:
+        buckets.append(bucket)
+    return buckets
+
+
+def _padded_index(starts, lengths, max_len, device):
+    """
+    [B, max_len] gather index into the packed tokens. Positions past a
+    sequence's end repeat its last token, so the gather never leaves it.
+    """
+    starts = torch.tensor(starts, device=device)
+    lengths = torch.tensor(lengths, device=device)
+    offsets = torch.arange(max_len, device=device)
+    offsets = torch.minimum(offsets[None], lengths[:, None] - 1)
+    return starts[:, None] + offsets, lengths
+
+
+def varlen_sdpa(q, k, v, q_seqlen, kv_seqlen, max_padding=0.25):
+    """
+    Drop-in replacement for `masked_sdpa` that never materializes the
+    [sum_q, sum_kv] block-diagonal mask. Sequences are grouped into length
+    buckets (see `length_buckets`), each bucket is gathered into a padded
+    [B, H, L, C] batch and attended with a key padding mask only when its
+    lengths differ. Memory is bounded by the largest bucket instead of
+    growing quadratically with the total token count.
+    """
+    q, k, v = q[0], k[0], v[0]  # [T, H, C]
+    device = q.device
+    q_starts = [0]
+    for length in q_seqlen[:-1]:
+        q_starts.append(q_starts[-1] + length)
+    kv_starts = [0]
+    for length in kv_seqlen[:-1]:
+        kv_starts.append(kv_starts[-1] + length)
+
+    out = q.new_empty(q.shape[0], q.shape[1], v.shape[-1])
+    for bucket in length_buckets(q_seqlen, kv_seqlen, max_padding):
+        bucket_q_lens = [q_seqlen[i] for i in bucket]
+        bucket_kv_lens = [kv_seqlen[i] for i in bucket]
+        max_q, max_kv = max(bucket_q_lens), max(bucket_kv_lens)
+        q_index, q_lens = _padded_index(
+            [q_starts[i] for i in bucket], bucket_q_lens, max_q, device
+        )
+        kv_index, kv_lens = _padded_index(
+            [kv_starts[i] for i in bucket], bucket_kv_lens, max_kv, device
+        )
+
+        attn_mask = None
+        if min(bucket_kv_lens) != max_kv:
+            # [B, 1, 1, L_kv], True where attention is allowed
+            attn_mask = (
+                torch.arange(max_kv, device=device)[None] < kv_lens[:, None]
+            )[:, None, None]
+
+        out_bucket = F.scaled_dot_product_attention(
+            q[q_index].permute(0, 2, 1, 3),  # [B, H, L_q, C]
+            k[kv_index].permute(0, 2, 1, 3),  # [B, H, L_kv, C]
+            v[kv_index].permute(0, 2, 1, 3),
+            attn_mask=attn_mask,
+        ).permute(0, 2, 1, 3)  # [B, L_q, H, C]
+
+        if min(bucket_q_lens) == max_q:
+            out[q_index.reshape(-1)] = out_bucket.reshape(-1, *out_bucket.shape[2:])
+        else:
+            valid = torch.arange(max_q, device=device)[None] < q_lens[:, None]
+            out[q_index[valid]] = out_bucket[valid]
+
+    return out
@@ -12,6 +12,9 @@ elif ATTN == "flash_attn":
 elif ATTN == "sdpa":
     from torch.nn.functional import scaled_dot_product_attention as sdpa
     from .masked_sdpa import masked_sdpa
+elif ATTN == "sdpa_varlen":
+    from torch.nn.functional import scaled_dot_product_attention as sdpa
+    from .masked_sdpa import varlen_sdpa as masked_sdpa
 else:
     raise ValueError(f"Unknown attention module: {ATTN}")
 
@@ -93,21 +96,12 @@ def sparse_windowed_scaled_dot_product_self_attention(
     ), f"Invalid shape for qkv, got {qkv.shape}, expected [N, *, 3, H, C]"
 
     serialization_spatial_cache_name = f"window_partition_{window_size}_{shift_window}"
-    serialization_spatial_cache = qkv.get_spatial_cache(
-        serialization_spatial_cache_name
-    )
-    if serialization_spatial_cache is None:
-        fwd_indices, bwd_indices, seq_lens, seq_batch_indices = calc_window_partition(
-            qkv, window_size, shift_window
-        )
-        qkv.register_spatial_cache(
+    fwd_indices, bwd_indices, seq_lens, seq_batch_indices = (
+        qkv.get_or_register_spatial_cache(
             serialization_spatial_cache_name,
-            (fwd_indices, bwd_indices, seq_lens, seq_batch_indices),
-        )
-    else:
-        fwd_indices, bwd_indices, seq_lens, seq_batch_indices = (
-            serialization_spatial_cache
+            lambda: calc_window_partition(qkv, window_size, shift_window),
         )
+    )
 
     M = fwd_indices.shape[0]
     T = qkv.feats.shape[0]
@@ -144,7 +138,7 @@ def sparse_windowed_scaled_dot_product_self_attention(
             out = xops.memory_efficient_attention(q, k, v)  # [B, N, H, C]
         elif ATTN == "flash_attn":
             out = flash_attn.flash_attn_qkvpacked_func(qkv_feats)  # [B, N, H, C]
-        elif ATTN == "sdpa":
+        elif ATTN in ("sdpa", "sdpa_varlen"):
             q, k, v = qkv_feats.unbind(dim=2)
             q = q.permute(0, 2, 1, 3)  # [N, H, L, C]
             k = k.permute(0, 2, 1, 3)  # [N, H, L, C]
@@ -174,7 +168,7 @@ def sparse_windowed_scaled_dot_product_self_attention(
             out = flash_attn.flash_attn_varlen_qkvpacked_func(
                 qkv_feats, cu_seqlens, max(seq_lens)
             )  # [M, H, C]
-        elif ATTN == "sdpa":
+        elif ATTN in ("sdpa", "sdpa_varlen"):
             q, k, v = qkv_feats.unbind(dim=1)
             q = q.unsqueeze(0)
             k = k.unsqueeze(0)
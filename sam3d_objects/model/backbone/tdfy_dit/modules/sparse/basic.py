@@ -14,8 +14,24 @@ __all__ = [
     "sparse_batch_op",
     "sparse_cat",
     "sparse_unbind",
+    "SPATIAL_CACHE_STATS",
+    "reset_spatial_cache_stats",
 ]
 
+# Lookups through `SparseTensor.get_or_register_spatial_cache`, i.e. of the
+# coords-only geometry (window partitions, serializations, downsample maps).
+SPATIAL_CACHE_STATS = {"hits": 0, "misses": 0}
+
+
+def reset_spatial_cache_stats() -> Dict[str, int]:
+    """
+    Reset the spatial cache counters and return their values before the reset.
+    """
+    stats = dict(SPATIAL_CACHE_STATS)
+    SPATIAL_CACHE_STATS["hits"] = 0
+    SPATIAL_CACHE_STATS["misses"] = 0
+    return stats
+
 
 class SparseTensor:
     """
@@ -452,6 +468,20 @@ class SparseTensor:
             return cur_scale_cache
         return cur_scale_cache.get(key, None)
 
+    def get_or_register_spatial_cache(self, key, compute: Callable[[], Any]):
+        """
+        Get a spatial cache, computing and registering it with `compute()` on a miss.
+        Hits and misses are counted in `SPATIAL_CACHE_STATS`.
+        """
+        value = self.get_spatial_cache(key)
+        if value is None:
+            SPATIAL_CACHE_STATS["misses"] += 1
+            value = compute()
+            self.register_spatial_cache(key, value)
+        else:
+            SPATIAL_CACHE_STATS["hits"] += 1
+        return value
+
 
 def sparse_batch_broadcast(input: SparseTensor, other: torch.Tensor) -> torch.Tensor:
     """
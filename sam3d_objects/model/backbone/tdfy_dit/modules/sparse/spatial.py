@@ -24,18 +24,14 @@ class SparseDownsample(nn.Module):
             factor
         ), "Input coordinates must have the same dimension as the downsample factor."
 
-        coord = list(input.coords.unbind(dim=-1))
-        for i, f in enumerate(factor):
-            coord[i + 1] = coord[i + 1] // f
-
-        MAX = [coord[i + 1].max().item() + 1 for i in range(DIM)]
-        OFFSET = torch.cumprod(torch.tensor(MAX[::-1]), 0).tolist()[::-1] + [1]
-        code = sum([c * o for c, o in zip(coord, OFFSET)])
-        code, idx = code.unique(return_inverse=True)
+        idx, new_coords = input.get_or_register_spatial_cache(
+            f"downsample_{factor}",
+            lambda: self._downsample_coords(input.coords, factor),
+        )
 
         new_feats = torch.scatter_reduce(
             torch.zeros(
-                code.shape[0],
+                new_coords.shape[0],
                 input.feats.shape[1],
                 device=input.feats.device,
                 dtype=input.feats.dtype,
@@ -45,11 +41,6 @@ class SparseDownsample(nn.Module):
             src=input.feats,
             reduce="mean",
         )
-        new_coords = torch.stack(
-            [code // OFFSET[0]]
-            + [(code // OFFSET[i + 1]) % MAX[i] for i in range(DIM)],
-            dim=-1,
-        )
         out = SparseTensor(
             new_feats,
             new_coords,
@@ -64,6 +55,29 @@ class SparseDownsample(nn.Module):
 
         return out
 
+    @staticmethod
+    def _downsample_coords(coords: torch.Tensor, factor: Tuple[int, ...]):
+        """
+        Map every input voxel to its downsampled voxel.
+        Returns the inverse index into the new coords and the new coords.
+        """
+        DIM = len(factor)
+        coord = list(coords.unbind(dim=-1))
+        for i, f in enumerate(factor):
+            coord[i + 1] = coord[i + 1] // f
+
+        MAX = [coord[i + 1].max().item() + 1 for i in range(DIM)]
+        OFFSET = torch.cumprod(torch.tensor(MAX[::-1]), 0).tolist()[::-1] + [1]
+        code = sum([c * o for c, o in zip(coord, OFFSET)])
+        code, idx = code.unique(return_inverse=True)
+
+        new_coords = torch.stack(
+            [code // OFFSET[0]]
+            + [(code // OFFSET[i + 1]) % MAX[i] for i in range(DIM)],
+            dim=-1,
+        )
+        return idx, new_coords
+
 
 class SparseUpsample(nn.Module):
     """
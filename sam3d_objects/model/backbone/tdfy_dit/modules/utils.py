@@ -70,3 +70,14 @@ def scale_module(module, scale):
 
 def modulate(x, shift, scale):
     return x * (1 + scale.unsqueeze(1)) + shift.unsqueeze(1)
+
+
+def broadcast_batch(x: torch.Tensor, batch_size: int) -> torch.Tensor:
+    """
+    Broadcast a per-sample 1-D tensor (e.g. a timestep) to `batch_size` entries.
+    Tensors holding a single value are shared across the whole batch.
+    """
+    x = x.reshape(-1)
+    if x.shape[0] == 1:
+        x = x.expand(batch_size)
+    return x
@@ -1,8 +1,8 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
 import torch
 import numpy as np
-from plyfile import PlyData, PlyElement
 from .general_utils import inverse_sigmoid, strip_symmetric, build_scaling_rotation
+from .ply_io import load_gaussians, save_gaussians
 
 
 class Gaussian:
@@ -133,84 +133,58 @@ class Gaussian:
             l.append("rot_{}".format(i))
         return l
 
-    def save_ply(self, path):
-        xyz = self.get_xyz.detach().cpu().numpy()
-        normals = np.zeros_like(xyz)
-        f_dc = (
-            self._features_dc.detach()
+    def save_ply(self, path, compact=False):
+        """
+        Save as a standard 3DGS PLY, or with `compact=True` as a quantized
+        PLY about a third of the size (see ply_io.compact_encode).
+        """
+        attributes = {
+            "xyz": self.get_xyz.detach().cpu().numpy(),
+            "f_dc": self._features_dc.detach()
             .transpose(1, 2)
             .flatten(start_dim=1)
             .contiguous()
             .cpu()
-            .numpy()
-        )
-        opacities = inverse_sigmoid(self.get_opacity).detach().cpu().numpy()
-        scale = torch.log(self.get_scaling).detach().cpu().numpy()
-        rotation = (self._rotation + self.rots_bias[None, :]).detach().cpu().numpy()
-
-        dtype_full = [
-            (attribute, "f4") for attribute in self.construct_list_of_attributes()
-        ]
-
-        elements = np.empty(xyz.shape[0], dtype=dtype_full)
-        attributes = np.concatenate(
-            (xyz, normals, f_dc, opacities, scale, rotation), axis=1
-        )
-        elements[:] = list(map(tuple, attributes))
-        el = PlyElement.describe(elements, "vertex")
-        PlyData([el]).write(path)
+            .numpy(),
+            "opacity": inverse_sigmoid(self.get_opacity).detach().cpu().numpy(),
+            "scale": torch.log(self.get_scaling).detach().cpu().numpy(),
+            "rotation": (self._rotation + self.rots_bias[None, :])
+            .detach()
+            .cpu()
+            .numpy(),
+        }
+        if self._features_rest is not None:
+            attributes["f_rest"] = (
+                self._features_rest.detach()
+                .transpose(1, 2)
+                .flatten(start_dim=1)
+                .contiguous()
+                .cpu()
+                .numpy()
+            )
+        save_gaussians(path, attributes, compact=compact)
 
     def load_ply(self, path):
-        plydata = PlyData.read(path)
-
-        xyz = np.stack(
-            (
-                np.asarray(plydata.elements[0]["x"]),
-                np.asarray(plydata.elements[0]["y"]),
-                np.asarray(plydata.elements[0]["z"]),
-            ),
-            axis=1,
-        )
-        opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
+        attributes = load_gaussians(path)
 
-        features_dc = np.zeros((xyz.shape[0], 3, 1))
-        features_dc[:, 0, 0] = np.asarray(plydata.elements[0]["f_dc_0"])
-        features_dc[:, 1, 0] = np.asarray(plydata.elements[0]["f_dc_1"])
-        features_dc[:, 2, 0] = np.asarray(plydata.elements[0]["f_dc_2"])
+        xyz = attributes["xyz"]
+        opacities = attributes["opacity"]
+        # (P, 3) -> (P, 3, 1)
+        features_dc = attributes["f_dc"][..., np.newaxis]
 
         if self.sh_degree > 0:
-            extra_f_names = [
-                p.name
-                for p in plydata.elements[0].properties
-                if p.name.startswith("f_rest_")
-            ]
-            extra_f_names = sorted(extra_f_names, key=lambda x: int(x.split("_")[-1]))
-            assert len(extra_f_names) == 3 * (self.sh_degree + 1) ** 2 - 3
-            features_extra = np.zeros((xyz.shape[0], len(extra_f_names)))
-            for idx, attr_name in enumerate(extra_f_names):
-                features_extra[:, idx] = np.asarray(plydata.elements[0][attr_name])
+            features_extra = attributes["f_rest"]
+            assert (
+                features_extra is not None
+                and features_extra.shape[1] == 3 * (self.sh_degree + 1) ** 2 - 3
+            )
             # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
             features_extra = features_extra.reshape(
-                (features_extra.shape[0], 3, (self.max_sh_degree + 1) ** 2 - 1)
+                (features_extra.shape[0], 3, (self.sh_degree + 1) ** 2 - 1)
             )
 
-        scale_names = [
-            p.name
-            for p in plydata.elements[0].properties
-            if p.name.startswith("scale_")
-        ]
-        scale_names = sorted(scale_names, key=lambda x: int(x.split("_")[-1]))
-        scales = np.zeros((xyz.shape[0], len(scale_names)))
-        for idx, attr_name in enumerate(scale_names):
-            scales[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        rot_names = [
-            p.name for p in plydata.elements[0].properties if p.name.startswith("rot")
-        ]
-        rot_names = sorted(rot_names, key=lambda x: int(x.split("_")[-1]))
-        rots = np.zeros((xyz.shape[0], len(rot_names)))
-        for idx, attr_name in enumerate(rot_names):
-            rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
+        scales = attributes["scale"]
+        rots = attributes["rotation"]
 
         # convert to actual gaussian attributes
         xyz = torch.tensor(xyz, dtype=torch.float, device=self.device)
@@ -0,0 +1,365 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Vectorized PLY I/O for Gaussian splats.
+
+Elements are read and written as structured numpy arrays straight from / to
+the file buffer, with no per-splat Python work. Besides the standard 3DGS
+layout (one float32 per attribute), splats can be stored in a compact PLY:
+splats are grouped in chunks of `COMPACT_CHUNK_SIZE`, and positions, log
+scales and higher SH bands are quantized against each chunk's min/max
+(uint16 / uint8 / uint8), rotations and opacities to uint8, and the DC color
+to float16 -- about a third of the standard size.
+
+Only numpy is needed here, so the format can be tested without a GPU.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+COMPACT_CHUNK_SIZE = 256
+COMPACT_COMMENT = "sam3d compact gaussian splat v1"
+
+_PLY_TO_NUMPY = {
+    "char": "i1",
+    "int8": "i1",
+    "uchar": "u1",
+    "uint8": "u1",
+    "short": "i2",
+    "int16": "i2",
+    "ushort": "u2",
+    "uint16": "u2",
+    "int": "i4",
+    "int32": "i4",
+    "uint": "u4",
+    "uint32": "u4",
+    "float": "f4",
+    "float32": "f4",
+    "double": "f8",
+    "float64": "f8",
+}
+_NUMPY_TO_PLY = {
+    "i1": "char",
+    "u1": "uchar",
+    "i2": "short",
+    "u2": "ushort",
+    "i4": "int",
+    "u4": "uint",
+    "f4": "float",
+    "f8": "double",
+}
+
+
+def write_ply(path, elements: Dict[str, np.ndarray], comments=()):
+    """
+    Write structured arrays as the elements of a binary little-endian PLY.
+
+    Args:
+        path: output file.
+        elements: element name -> structured array, in file order. float16
+            fields are not valid PLY and must be viewed as uint16 first.
+        comments: header comment lines.
+    """
+    header = ["ply", "format binary_little_endian 1.0"]
+    header += [f"comment {comment}" for comment in comments]
+    for name, array in elements.items():
+        header.append(f"element {name} {len(array)}")
+        for field in array.dtype.names:
+            header.append(
+                f"property {_NUMPY_TO_PLY[array.dtype.fields[field][0].str[1:]]} {field}"
+            )
+    header.append("end_header")
+    with open(path, "wb") as f:
+        f.write(("\n".join(header) + "\n").encode("ascii"))
+        for array in elements.values():
+            np.ascontiguousarray(
+                array, dtype=array.dtype.newbyteorder("<")
+            ).tofile(f)
+
+
+def read_ply(path) -> Tuple[Dict[str, np.ndarray], list]:
+    """
+    Read every element of a PLY file as a structured array.
+
+    Binary little-endian files with scalar properties only (what `write_ply`
+    and 3DGS tools write) are read straight into their arrays; anything else
+    (ascii, big-endian, list properties) goes through plyfile.
+
+    Returns:
+        (dict, list): element name -> structured array, and the header comments.
+    """
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"{path} is not a PLY file")
+        fmt, comments, elements = None, [], []
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"{path}: truncated PLY header")
+            words = line.decode("ascii").split()
+            if not words:
+                continue
+            if words[0] == "end_header":
+                break
+            if words[0] == "format":
+                fmt = words[1]
+            elif words[0] == "comment":
+                comments.append(line.decode("ascii").strip()[len("comment ") :])
+            elif words[0] == "element":
+                elements.append((words[1], int(words[2]), []))
+            elif words[0] == "property":
+                if words[1] == "list" or words[1] not in _PLY_TO_NUMPY:
+                    fmt = None
+                else:
+                    elements[-1][2].append((words[2], "<" + _PLY_TO_NUMPY[words[1]]))
+
+        if fmt == "binary_little_endian":
+            return {
+                name: np.fromfile(f, dtype=np.dtype(fields), count=count)
+                for name, count, fields in elements
+            }, comments
+
+    from plyfile import PlyData
+
+    plydata = PlyData.read(path)
+    return {el.name: el.data for el in plydata.elements}, comments
+
+
+def _as_float_array(data: np.ndarray, names) -> np.ndarray:
+    fields = data.dtype.fields
+    if all(fields[name][0] == np.float32 for name in names):
+        # homogeneous float32 records: gather the columns in one indexing op
+        # instead of one strided copy per property
+        if data.flags.c_contiguous and all(
+            fields[name][0] == np.float32 for name in data.dtype.names
+        ):
+            columns = [fields[name][1] // 4 for name in names]
+            return data.view(np.float32).reshape(len(data), -1)[:, columns]
+    return np.stack([np.asarray(data[name], dtype=np.float32) for name in names], axis=1)
+
+
+def _sorted_names(data: np.ndarray, prefix: str):
+    names = [name for name in data.dtype.names if name.startswith(prefix)]
+    return sorted(names, key=lambda x: int(x.split("_")[-1]))
+
+
+# -- standard 3DGS layout -----------------------------------------------------
+
+
+def gaussian_attribute_names(num_dc: int, num_scale: int, num_rot: int, num_rest: int = 0):
+    names = ["x", "y", "z", "nx", "ny", "nz"]
+    names += [f"f_dc_{i}" for i in range(num_dc)]
+    names += [f"f_rest_{i}" for i in range(num_rest)]
+    names.append("opacity")
+    names += [f"scale_{i}" for i in range(num_scale)]
+    names += [f"rot_{i}" for i in range(num_rot)]
+    return names
+
+
+def pack_gaussians(
+    xyz: np.ndarray,
+    f_dc: np.ndarray,
+    opacity: np.ndarray,
+    scale: np.ndarray,
+    rotation: np.ndarray,
+    f_rest: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Standard 3DGS vertex element: one float32 property per column, in the
+    `gaussian_attribute_names` order. Built as a (N, K) float32 array viewed
+    as the structured dtype, i.e. a single copy.
+
+    Args:
+        xyz: (N, 3) positions. f_dc: (N, 3). opacity: (N, 1) logits.
+        scale: (N, S) log scales. rotation: (N, 4). f_rest: (N, R) or None.
+    """
+    n = xyz.shape[0]
+    num_rest = 0 if f_rest is None else f_rest.shape[1]
+    columns = [xyz, np.zeros((n, 3), dtype=np.float32), f_dc]
+    if num_rest:
+        columns.append(f_rest)
+    columns += [opacity, scale, rotation]
+    attributes = np.ascontiguousarray(np.concatenate(columns, axis=1), dtype="<f4")
+    names = gaussian_attribute_names(f_dc.shape[1], scale.shape[1], rotation.shape[1], num_rest)
+    return attributes.view([(name, "<f4") for name in names]).reshape(n)
+
+
+def unpack_gaussians(data: np.ndarray) -> Dict[str, np.ndarray]:
+    """Inverse of `pack_gaussians` for any 3DGS-style vertex element."""
+    f_rest_names = _sorted_names(data, "f_rest_")
+    return {
+        "xyz": _as_float_array(data, ["x", "y", "z"]),
+        "f_dc": _as_float_array(data, _sorted_names(data, "f_dc_")),
+        "f_rest": _as_float_array(data, f_rest_names) if f_rest_names else None,
+        "opacity": _as_float_array(data, ["opacity"]),
+        "scale": _as_float_array(data, _sorted_names(data, "scale_")),
+        "rotation": _as_float_array(data, _sorted_names(data, "rot")),
+    }
+
+
+# -- compact layout -------------------------------------------------------------
+
+
+def _chunk_min_max(values: np.ndarray, chunk_size: int):
+    # values: (N, C) -> per-chunk (num_chunks, C) min and max
+    n = values.shape[0]
+    num_chunks = (n + chunk_size - 1) // chunk_size
+    padded = np.concatenate(
+        [values, np.repeat(values[-1:], num_chunks * chunk_size - n, axis=0)]
+    ).reshape(num_chunks, chunk_size, -1)
+    return padded.min(axis=1), padded.max(axis=1)
+
+
+def _quantize(values, mins, maxs, chunk_size, levels):
+    chunk = np.arange(values.shape[0]) // chunk_size
+    lo, hi = mins[chunk], maxs[chunk]
+    t = (values - lo) / np.maximum(hi - lo, 1e-12)
+    return np.rint(np.clip(t, 0, 1) * levels)
+
+
+def _dequantize(q, mins, maxs, chunk_size, levels):
+    chunk = np.arange(q.shape[0]) // chunk_size
+    lo, hi = mins[chunk], maxs[chunk]
+    return (lo + q.astype(np.float32) / levels * (hi - lo)).astype(np.float32)
+
+
+def _fields(prefix, count, dtype):
+    return [(f"{prefix}_{i}", dtype) for i in range(count)]
+
+
+def compact_encode(
+    xyz: np.ndarray,
+    f_dc: np.ndarray,
+    opacity: np.ndarray,
+    scale: np.ndarray,
+    rotation: np.ndarray,
+    f_rest: Optional[np.ndarray] = None,
+    chunk_size: int = COMPACT_CHUNK_SIZE,
+) -> Dict[str, np.ndarray]:
+    """
+    Quantize splats (same arguments as `pack_gaussians`) into the "chunk" and
+    "vertex" elements of a compact PLY.
+
+    Per-splat storage: position 3 x uint16 and log scale 3 x uint8 against
+    the chunk min/max, normalized rotation 4 x uint8 in [-1, 1], sigmoid
+    opacity uint8, DC color 3 x float16 and higher SH bands uint8 against
+    one chunk min/max.
+    """
+    n = xyz.shape[0]
+    num_rest = 0 if f_rest is None else f_rest.shape[1]
+    xyz_min, xyz_max = _chunk_min_max(xyz, chunk_size)
+    scale_min, scale_max = _chunk_min_max(scale, chunk_size)
+
+    chunk_fields = (
+        _fields("min_xyz", 3, "<f4")
+        + _fields("max_xyz", 3, "<f4")
+        + _fields("min_scale", scale.shape[1], "<f4")
+        + _fields("max_scale", scale.shape[1], "<f4")
+    )
+    chunk_columns = [xyz_min, xyz_max, scale_min, scale_max]
+    if num_rest:
+        rest_min, rest_max = _chunk_min_max(f_rest.reshape(-1, 1), chunk_size * num_rest)
+        chunk_fields += [("min_f_rest", "<f4"), ("max_f_rest", "<f4")]
+        chunk_columns += [rest_min, rest_max]
+    chunk = np.ascontiguousarray(np.concatenate(chunk_columns, axis=1), dtype="<f4")
+    chunk = chunk.view(chunk_fields).reshape(-1)
+
+    rotation = rotation / np.maximum(np.linalg.norm(rotation, axis=1, keepdims=True), 1e-12)
+    # q and -q are the same rotation; a non-negative w keeps the range tight
+    rotation = np.where(rotation[:, :1] < 0, -rotation, rotation)
+    alpha = 1 / (1 + np.exp(-opacity.astype(np.float64)))
+
+    vertex_fields = (
+        _fields("xyz", 3, "<u2")
+        + _fields("scale", scale.shape[1], "u1")
+        + _fields("rot", rotation.shape[1], "u1")
+        + [("opacity", "u1")]
+        + _fields("f_dc", f_dc.shape[1], "<u2")  # float16 bits
+        + _fields("f_rest", num_rest, "u1")
+    )
+    vertex = np.empty(n, dtype=vertex_fields)
+    q_xyz = _quantize(xyz, xyz_min, xyz_max, chunk_size, 65535).astype(np.uint16)
+    q_scale = _quantize(scale, scale_min, scale_max, chunk_size, 255).astype(np.uint8)
+    q_rot = np.rint((np.clip(rotation, -1, 1) + 1) / 2 * 255).astype(np.uint8)
+    q_opacity = np.rint(alpha[:, 0] * 255).astype(np.uint8)
+    dc_bits = f_dc.astype(np.float16).view(np.uint16)
+    for i in range(3):
+        vertex[f"xyz_{i}"] = q_xyz[:, i]
+    for i in range(scale.shape[1]):
+        vertex[f"scale_{i}"] = q_scale[:, i]
+    for i in range(rotation.shape[1]):
+        vertex[f"rot_{i}"] = q_rot[:, i]
+    vertex["opacity"] = q_opacity
+    for i in range(f_dc.shape[1]):
+        vertex[f"f_dc_{i}"] = dc_bits[:, i]
+    if num_rest:
+        q_rest = _quantize(
+            f_rest.reshape(-1, 1), rest_min, rest_max, chunk_size * num_rest, 255
+        ).reshape(n, num_rest).astype(np.uint8)
+        for i in range(num_rest):
+            vertex[f"f_rest_{i}"] = q_rest[:, i]
+    return {"chunk": chunk, "vertex": vertex}
+
+
+def compact_decode(
+    elements: Dict[str, np.ndarray], chunk_size: int = COMPACT_CHUNK_SIZE
+) -> Dict[str, np.ndarray]:
+    """Inverse of `compact_encode`, in the `unpack_gaussians` format."""
+    chunk, vertex = elements["chunk"], elements["vertex"]
+    scale_names = _sorted_names(vertex, "scale_")
+    f_rest_names = _sorted_names(vertex, "f_rest_")
+
+    xyz = _dequantize(
+        _as_float_array(vertex, ["xyz_0", "xyz_1", "xyz_2"]),
+        _as_float_array(chunk, _sorted_names(chunk, "min_xyz_")),
+        _as_float_array(chunk, _sorted_names(chunk, "max_xyz_")),
+        chunk_size,
+        65535,
+    )
+    scale = _dequantize(
+        _as_float_array(vertex, scale_names),
+        _as_float_array(chunk, _sorted_names(chunk, "min_scale_")),
+        _as_float_array(chunk, _sorted_names(chunk, "max_scale_")),
+        chunk_size,
+        255,
+    )
+    rotation = _as_float_array(vertex, _sorted_names(vertex, "rot_")) / 255 * 2 - 1
+    alpha = np.clip(_as_float_array(vertex, ["opacity"]) / 255, 1 / 512, 1 - 1 / 512)
+    f_dc = np.stack(
+        [np.asarray(vertex[name]).view(np.float16) for name in _sorted_names(vertex, "f_dc_")],
+        axis=1,
+    ).astype(np.float32)
+    f_rest = None
+    if f_rest_names:
+        n = len(vertex)
+        f_rest = _dequantize(
+            _as_float_array(vertex, f_rest_names).reshape(-1, 1),
+            _as_float_array(chunk, ["min_f_rest"]),
+            _as_float_array(chunk, ["max_f_rest"]),
+            chunk_size * len(f_rest_names),
+            255,
+        ).reshape(n, len(f_rest_names))
+    return {
+        "xyz": xyz,
+        "f_dc": f_dc,
+        "f_rest": f_rest,
+        "opacity": np.log(alpha / (1 - alpha)).astype(np.float32),
+        "scale": scale,
+        "rotation": rotation.astype(np.float32),
+    }
+
+
+def save_gaussians(path, attributes: Dict[str, np.ndarray], compact: bool = False):
+    """Write `unpack_gaussians`-style attributes as a standard or compact PLY."""
+    attributes = {k: v for k, v in attributes.items() if v is not None}
+    if compact:
+        write_ply(path, compact_encode(**attributes), comments=[COMPACT_COMMENT])
+    else:
+        write_ply(path, {"vertex": pack_gaussians(**attributes)})
+
+
+def load_gaussians(path) -> Dict[str, np.ndarray]:
+    """Read a standard or compact Gaussian PLY into `unpack_gaussians` attributes."""
+    elements, comments = read_ply(path)
+    if COMPACT_COMMENT in comments:
+        return compact_decode(elements)
+    return unpack_gaussians(elements["vertex"])
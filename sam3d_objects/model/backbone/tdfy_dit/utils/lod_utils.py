@@ -0,0 +1,209 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Levels of detail of the meshes of `to_glb` (see `postprocessing_utils.glb_lods`).
+
+Coarser levels are derived from the finished, textured mesh instead of
+running the postprocessing again: `cluster_decimate` merges the vertices of
+every grid cell (Rossignac-Borrel vertex clustering), with positions averaged
+over the whole cell, so that the coarse mesh stays closed where the fine one
+is, and UVs averaged per cell and UV chart, so that the baked texture (scaled
+down) still applies. The levels go into one GLB with the MSFT_lod extension
+(`add_msft_lod`) or into sibling files.
+"""
+import json
+import struct
+from typing import *
+
+import numpy as np
+
+from .uv_parametrization import face_components
+
+# (fraction of the faces, texture size) per level, finest first
+LOD_LEVELS = ((1.0, 2048), (0.25, 1024), (0.06, 512), (0.015, 256))
+
+# fraction of the screen below which a level gives way to the next one
+# (MSFT_screencoverage), per level
+LOD_SCREEN_COVERAGE = (0.5, 0.2, 0.05, 0.0)
+
+
+def _packed(columns: np.ndarray) -> np.ndarray:
+    # one int64 key per row of non-negative integers, ordered like the rows
+    key = np.zeros(len(columns), dtype=np.int64)
+    for column in columns.T:
+        key = key * (int(column.max()) + 1) + column
+    return key
+
+
+def _cluster(vertices, faces, charts, cell):
+    cells = np.floor((vertices - vertices.min(0)) / cell).astype(np.int64)
+    _, position_ids = np.unique(_packed(cells), return_inverse=True)
+    _, cluster_ids = np.unique(
+        _packed(np.stack([position_ids, charts], 1)), return_inverse=True
+    )
+    clustered = cluster_ids[faces]
+    kept = (
+        (clustered[:, 0] != clustered[:, 1])
+        & (clustered[:, 1] != clustered[:, 2])
+        & (clustered[:, 2] != clustered[:, 0])
+    )
+    clustered = clustered[kept]
+    # faces collapsed onto the same three clusters
+    corners = np.sort(clustered, axis=1)
+    if (cluster_ids.max() + 1) ** 3 < 2**62:
+        _, first = np.unique(_packed(corners), return_index=True)
+    else:
+        _, first = np.unique(corners, axis=0, return_index=True)
+    return position_ids, cluster_ids, clustered[np.sort(first)]
+
+
+def cluster_decimate(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    target_faces: int,
+    attributes: Optional[np.ndarray] = None,
+    uvs: Optional[np.ndarray] = None,
+    iterations: int = 12,
+) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Decimate a mesh to at most `target_faces` faces by vertex clustering on
+    a grid, bisecting the cell size.
+
+    Args:
+        vertices (np.ndarray): (V, 3) positions.
+        faces (np.ndarray): (F, 3) faces.
+        target_faces (int): Face budget.
+        attributes (np.ndarray, optional): (V, C) per vertex values (e.g.
+            colors), averaged over every cluster.
+        uvs (np.ndarray, optional): (V, 2) UVs of a parametrized mesh (seams
+            split into separate vertices, as from xatlas); clusters do not
+            cross UV charts, so the texture of the mesh still applies.
+
+    Returns:
+        vertices, faces, attributes and uvs of the decimated mesh (None
+        where not given).
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    if len(faces) <= target_faces:
+        return vertices, faces, attributes, uvs
+    charts = np.zeros(len(vertices), dtype=np.int64)
+    if uvs is not None:
+        charts[faces.reshape(-1)] = np.repeat(face_components(faces, len(vertices)), 3)
+
+    extent = float((vertices.max(0) - vertices.min(0)).max())
+    # the cell size is bisected in log space: cells of `lo` keep too many
+    # faces, cells of `hi` are within the budget
+    lo, hi = np.log(extent * 1e-4), np.log(extent * 1.01)
+    best = None
+    for _ in range(iterations):
+        cell = np.exp(0.5 * (lo + hi))
+        clustering = _cluster(vertices, faces, charts, cell)
+        if len(clustering[2]) > target_faces:
+            lo = np.log(cell)
+        else:
+            hi = np.log(cell)
+            best = clustering
+    if best is None:
+        best = _cluster(vertices, faces, charts, np.exp(hi))
+    position_ids, cluster_ids, new_faces = best
+
+    def mean(values, ids):
+        values = np.asarray(values, dtype=np.float64).reshape(len(ids), -1)
+        sums = np.zeros((ids.max() + 1, values.shape[1]))
+        np.add.at(sums, ids, values)
+        return sums / np.bincount(ids)[:, None]
+
+    # every cluster lies in one position cell
+    cell_of_cluster = np.zeros(cluster_ids.max() + 1, dtype=np.int64)
+    cell_of_cluster[cluster_ids] = position_ids
+    new_vertices = mean(vertices, position_ids)[cell_of_cluster]
+    new_attributes = None if attributes is None else mean(attributes, cluster_ids)
+    new_uvs = None if uvs is None else mean(uvs, cluster_ids)
+
+    # drop the clusters no face uses any more
+    used, new_faces = np.unique(new_faces, return_inverse=True)
+    new_faces = new_faces.reshape(-1, 3)
+    return (
+        new_vertices[used],
+        new_faces,
+        None if new_attributes is None else new_attributes[used].astype(np.asarray(attributes).dtype),
+        None if new_uvs is None else new_uvs[used].astype(np.asarray(uvs).dtype),
+    )
+
+
+# -- GLB ----------------------------------------------------------------------
+
+_GLB_MAGIC = b"glTF"
+_JSON_CHUNK = b"JSON"
+_BIN_CHUNK = b"BIN\x00"
+
+
+def read_glb(data: bytes) -> Tuple[dict, bytes]:
+    """The glTF JSON and the binary chunk of a GLB file."""
+    magic, version, length = struct.unpack_from("<4sII", data, 0)
+    if magic != _GLB_MAGIC or version != 2:
+        raise ValueError("not a glTF 2.0 binary file")
+    offset, gltf, binary = 12, None, b""
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from("<I4s", data, offset)
+        chunk = data[offset + 8 : offset + 8 + chunk_length]
+        if chunk_type == _JSON_CHUNK:
+            gltf = json.loads(chunk)
+        elif chunk_type == _BIN_CHUNK:
+            binary = bytes(chunk)
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise ValueError("GLB file without a JSON chunk")
+    return gltf, binary
+
+
+def write_glb(gltf: dict, binary: bytes = b"") -> bytes:
+    """A GLB file of a glTF JSON and a binary chunk (4 byte aligned, as required)."""
+    text = json.dumps(gltf, separators=(",", ":")).encode()
+    text += b" " * (-len(text) % 4)
+    chunks = struct.pack("<I4s", len(text), _JSON_CHUNK) + text
+    if binary:
+        binary = binary + b"\x00" * (-len(binary) % 4)
+        chunks += struct.pack("<I4s", len(binary), _BIN_CHUNK) + binary
+    return struct.pack("<4sII", _GLB_MAGIC, 2, 12 + len(chunks)) + chunks
+
+
+def add_msft_lod(
+    data: bytes,
+    node_names: Sequence[str],
+    screen_coverage: Optional[Sequence[float]] = LOD_SCREEN_COVERAGE,
+) -> bytes:
+    """
+    Turn the nodes named `node_names` (finest first) of a GLB file into the
+    levels of detail of the first one (MSFT_lod): the coarser nodes are
+    detached from the scene graph and listed by the finest node, which
+    viewers without the extension display alone.
+
+    Returns:
+        bytes: The GLB file.
+    """
+    gltf, binary = read_glb(data)
+    nodes = gltf.get("nodes", [])
+    index = {node.get("name"): i for i, node in enumerate(nodes)}
+    missing = [name for name in node_names if name not in index]
+    if missing:
+        raise ValueError(f"no nodes named {missing} in the GLB file")
+    ids = [index[name] for name in node_names]
+    lods = set(ids[1:])
+    for node in nodes:
+        if "children" in node:
+            node["children"] = [child for child in node["children"] if child not in lods]
+            if not node["children"]:
+                del node["children"]
+    for scene in gltf.get("scenes", []):
+        scene["nodes"] = [node for node in scene.get("nodes", []) if node not in lods]
+    base = nodes[ids[0]]
+    base.setdefault("extensions", {})["MSFT_lod"] = {"ids": ids[1:]}
+    if screen_coverage is not None:
+        base.setdefault("extras", {})["MSFT_screencoverage"] = list(
+            screen_coverage[: len(ids)]
+        )
+    used = gltf.setdefault("extensionsUsed", [])
+    if "MSFT_lod" not in used:
+        used.append("MSFT_lod")
+    return write_glb(gltf, binary)
@@ -1,4 +1,6 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
+import os
+import time
 from typing import *
 import numpy as np
 import torch
@@ -15,11 +17,25 @@ import cv2
 from PIL import Image
 from .random_utils import sphere_hammersley_sequence
 from .render_utils import render_multiview
+from .visibility_utils import face_visibility, resolve_visibility_backend
+from .texture_baking import adaptive_bake, optimize_texture, projection_bake, sample_texture
+from .uv_parametrization import UVParametrizer
+from .lod_utils import LOD_LEVELS, LOD_SCREEN_COVERAGE, add_msft_lod, cluster_decimate
 from ..renderers import GaussianRenderer
 from ..representations import Strivec, Gaussian, MeshExtractResult
 from loguru import logger
+from sam3d_objects.utils.profiler import profiled
 
 
+# Visibility settings of `_fill_holes` used by `to_glb`. "fast" trades view
+# count and resolution for early termination once the visible set converges.
+FILL_HOLES_MODES = {
+    "full": dict(resolution=1024, num_views=1000, convergence_tol=None),
+    "fast": dict(resolution=512, num_views=300, convergence_tol=1e-3),
+}
+
+
+@profiled("fill_holes")
 @torch.no_grad()
 def _fill_holes(
     verts,
@@ -28,6 +44,11 @@ def _fill_holes(
     max_hole_nbe=32,
     resolution=128,
     num_views=500,
+    visibility_backend="auto",
+    chunk_size=None,
+    convergence_tol=None,
+    convergence_window=64,
+    stats=None,
     debug=False,
     verbose=False,
 ):
@@ -43,65 +64,30 @@ def _fill_holes(
         max_hole_size (float): Maximum area of a hole to fill.
         resolution (int): Resolution of the rasterization.
         num_views (int): Number of views to rasterize the mesh.
+        visibility_backend (str): 'nvdiffrast', 'bvh' (CPU ray casting) or 'auto'.
+        chunk_size (int): Views rasterized per batch.
+        convergence_tol (float): Stop adding views once visibility converges,
+            see visibility_utils.face_visibility. None uses all `num_views`.
+        convergence_window (int): Views between two convergence checks.
+        stats (dict): If given, filled with the number of views used, of
+            invisible faces and of faces removed by the mincut.
         verbose (bool): Whether to print progress.
     """
-    # Construct cameras
-    yaws = []
-    pitchs = []
-    for i in range(num_views):
-        y, p = sphere_hammersley_sequence(i, num_views)
-        yaws.append(y)
-        pitchs.append(p)
-    yaws = torch.tensor(yaws).cuda()
-    pitchs = torch.tensor(pitchs).cuda()
-    radius = 2.0
-    fov = torch.deg2rad(torch.tensor(40)).cuda()
-    projection = utils3d.torch.perspective_from_fov_xy(fov, fov, 1, 3)
-    views = []
-    for yaw, pitch in zip(yaws, pitchs):
-        orig = (
-            torch.tensor(
-                [
-                    torch.sin(yaw) * torch.cos(pitch),
-                    torch.cos(yaw) * torch.cos(pitch),
-                    torch.sin(pitch),
-                ]
-            )
-            .cuda()
-            .float()
-            * radius
-        )
-        view = utils3d.torch.view_look_at(
-            orig,
-            torch.tensor([0, 0, 0]).float().cuda(),
-            torch.tensor([0, 0, 1]).float().cuda(),
-        )
-        views.append(view)
-    views = torch.stack(views, dim=0)
-
-    # Rasterize
-    visblity = torch.zeros(faces.shape[0], dtype=torch.int32, device=verts.device)
-    rastctx = utils3d.torch.RastContext(backend="cuda")
-    for i in tqdm(
-        range(views.shape[0]),
-        total=views.shape[0],
-        disable=not verbose,
-        desc="Rasterizing",
-    ):
-        view = views[i]
-        buffers = utils3d.torch.rasterize_triangle_faces(
-            rastctx,
-            verts[None],
-            faces,
-            resolution,
-            resolution,
-            view=view,
-            projection=projection,
-        )
-        face_id = buffers["face_id"][0][buffers["mask"][0] > 0.95] - 1
-        face_id = torch.unique(face_id).long()
-        visblity[face_id] += 1
-    visblity = visblity.float() / num_views
+    # Visibility of each face over the views
+    visblity, views_used = face_visibility(
+        verts,
+        faces,
+        num_views=num_views,
+        resolution=resolution,
+        backend=visibility_backend,
+        chunk_size=chunk_size,
+        convergence_tol=convergence_tol,
+        convergence_window=convergence_window,
+        verbose=verbose,
+    )
+    if stats is not None:
+        stats["views"] = views_used
+        stats["removed_faces"] = 0
 
     # Mincut
     ## construct outer faces
@@ -121,6 +107,8 @@ def _fill_holes(
 
     ## construct inner faces
     inner_face_indices = torch.nonzero(visblity == 0).reshape(-1)
+    if stats is not None:
+        stats["invisible_faces"] = inner_face_indices.shape[0]
     if verbose:
         tqdm.write(f"Found {inner_face_indices.shape[0]} invisible faces")
     if inner_face_indices.shape[0] == 0:
@@ -256,6 +244,8 @@ def _fill_holes(
         mask[remove_face_indices] = 0
         faces = faces[mask]
         faces, verts = utils3d.torch.remove_unreferenced_vertices(faces, verts)
+        if stats is not None:
+            stats["removed_faces"] = int((~mask).sum())
         if verbose:
             tqdm.write(f"Removed {(~mask).sum()} faces by mincut")
     else:
@@ -266,13 +256,15 @@ def _fill_holes(
     mesh.load_array(verts.cpu().numpy(), faces.cpu().numpy())
     mesh.fill_small_boundaries(nbe=max_hole_nbe, refine=True)
     verts, faces = mesh.return_arrays()
+    device = faces.device
     verts, faces = torch.tensor(
-        verts, device="cuda", dtype=torch.float32
-    ), torch.tensor(faces, device="cuda", dtype=torch.int32)
+        verts, device=device, dtype=torch.float32
+    ), torch.tensor(faces, device=device, dtype=torch.int32)
 
     return verts, faces
 
 
+@profiled()
 def postprocess_mesh(
     vertices: np.array,
     faces: np.array,
@@ -283,6 +275,9 @@ def postprocess_mesh(
     fill_holes_max_hole_nbe: int = 32,
     fill_holes_resolution: int = 1024,
     fill_holes_num_views: int = 1000,
+    fill_holes_backend: str = "auto",
+    fill_holes_chunk_size: Optional[int] = None,
+    fill_holes_convergence_tol: Optional[float] = None,
     debug: bool = False,
     verbose: bool = False,
 ):
@@ -299,6 +294,10 @@ def postprocess_mesh(
         fill_holes_max_hole_nbe (int): Maximum number of boundary edges of a hole to fill.
         fill_holes_resolution (int): Resolution of the rasterization.
         fill_holes_num_views (int): Number of views to rasterize the mesh.
+        fill_holes_backend (str): Visibility backend, 'nvdiffrast', 'bvh' or 'auto'.
+        fill_holes_chunk_size (int): Views rasterized per batch.
+        fill_holes_convergence_tol (float): Early termination tolerance of the
+            visibility, None to use all views.
         verbose (bool): Whether to print progress.
     """
 
@@ -321,9 +320,11 @@ def postprocess_mesh(
 
     # Remove invisible faces
     if fill_holes:
+        fill_holes_backend = resolve_visibility_backend(fill_holes_backend)
+        device = "cuda" if fill_holes_backend == "nvdiffrast" else "cpu"
         vertices, faces = (
-            torch.tensor(vertices).cuda(),
-            torch.tensor(faces.astype(np.int32)).cuda(),
+            torch.tensor(vertices).to(device),
+            torch.tensor(faces.astype(np.int32)).to(device),
         )
         vertices, faces = _fill_holes(
             vertices,
@@ -332,6 +333,9 @@ def postprocess_mesh(
             max_hole_nbe=fill_holes_max_hole_nbe,
             resolution=fill_holes_resolution,
             num_views=fill_holes_num_views,
+            visibility_backend=fill_holes_backend,
+            chunk_size=fill_holes_chunk_size,
+            convergence_tol=fill_holes_convergence_tol,
             debug=debug,
             verbose=verbose,
         )
@@ -344,16 +348,26 @@ def postprocess_mesh(
     return vertices, faces
 
 
-def parametrize_mesh(vertices: np.array, faces: np.array):
+@profiled()
+def parametrize_mesh(
+    vertices: np.array,
+    faces: np.array,
+    parametrizer: Optional[UVParametrizer] = None,
+):
     """
     Parametrize a mesh to a texture space, using xatlas.
 
     Args:
         vertices (np.array): Vertices of the mesh. Shape (V, 3).
         faces (np.array): Faces of the mesh. Shape (F, 3).
+        parametrizer (UVParametrizer, optional): Cache (and process pool) to
+            parametrize through; None runs xatlas directly.
     """
 
-    vmapping, indices, uvs = xatlas.parametrize(vertices, faces)
+    if parametrizer is None:
+        vmapping, indices, uvs = xatlas.parametrize(vertices, faces)
+    else:
+        vmapping, indices, uvs = parametrizer(vertices, faces)
 
     vertices = vertices[vmapping]
     faces = indices
@@ -361,6 +375,7 @@ def parametrize_mesh(vertices: np.array, faces: np.array):
     return vertices, faces, uvs
 
 
+@profiled()
 @torch.inference_mode(False)
 @torch.enable_grad()
 def bake_texture(
@@ -374,11 +389,12 @@ def bake_texture(
     texture_size: int = 4096,
     near: float = 0.1,
     far: float = 10.0,
-    mode: Literal["fast", "opt"] = "opt",
+    mode: Literal["fast", "opt", "adaptive"] = "opt",
     lambda_tv: float = 1e-2,
     verbose: bool = False,
     rendering_engine: str = "nvdiffrast",  # nvdiffrast OR "pytorch3d"
     device: str = "cuda",
+    stats: Optional[dict] = None,
 ):
     """
     Bake texture to a mesh from multiple observations.
@@ -394,9 +410,15 @@ def bake_texture(
         texture_size (int): Size of the texture.
         near (float): Near plane of the camera.
         far (float): Far plane of the camera.
-        mode (Literal['fast', 'opt']): Mode of texture baking.
+        mode (Literal['fast', 'opt', 'adaptive']): Mode of texture baking.
+            'fast' averages the observed colors per texel, 'opt' runs 2500
+            optimization steps from a black texture, 'adaptive' optimizes
+            coarse-to-fine from the 'fast' result and stops once the loss
+            stops improving (see texture_baking.adaptive_bake).
         lambda_tv (float): Weight of total variation loss in optimization.
         verbose (bool): Whether to print progress.
+        stats (dict, optional): Filled with the steps taken per level in
+            'adaptive' mode.
     """
 
     vertices = torch.tensor(vertices).to(device)
@@ -417,171 +439,86 @@ def bake_texture(
         for intr in intrinsics
     ]
 
-    if mode == "fast":
-        texture = torch.zeros((texture_size * texture_size, 3), dtype=torch.float32).to(
-            device
-        )
-        texture_weights = torch.zeros(
-            (texture_size * texture_size), dtype=torch.float32
-        ).to(device)
-        rastctx = utils3d.torch.RastContext(
-            backend=device if device.startswith("cuda") else "cuda"
-        )
-        for observation, view, projection in tqdm(
-            zip(observations, views, projections),
-            total=len(observations),
-            disable=not verbose,
-            desc="Texture baking (fast)",
-        ):
-            with torch.no_grad():
-                rast = utils3d.torch.rasterize_triangle_faces(
-                    rastctx,
-                    vertices[None],
-                    faces,
-                    observation.shape[1],
-                    observation.shape[0],
-                    uv=uvs[None],
-                    view=view,
-                    projection=projection,
-                )
-                uv_map = rast["uv"][0].detach().flip(0)
-                mask = rast["mask"][0].detach().bool() & masks[0]
-
-            # nearest neighbor interpolation
-            uv_map = (uv_map * texture_size).floor().long()
-            obs = observation[mask]
-            uv_map = uv_map[mask]
-            idx = uv_map[:, 0] + (texture_size - uv_map[:, 1] - 1) * texture_size
-            texture = texture.scatter_add(0, idx.view(-1, 1).expand(-1, 3), obs)
-            texture_weights = texture_weights.scatter_add(
-                0,
-                idx,
-                torch.ones((obs.shape[0]), dtype=torch.float32, device=texture.device),
+    if mode not in ("fast", "opt", "adaptive"):
+        raise ValueError(f"Unknown mode: {mode}")
+
+    rastctx = utils3d.torch.RastContext(
+        backend=device if device.startswith("cuda") else "cuda"
+    )
+    # bottom-up rows, like the rasterized UV maps (see texture_baking)
+    observations = [observations.flip(0) for observations in observations]
+    masks = [m.flip(0) for m in masks]
+    _uv = []
+    _uv_dr = []
+    _hit = []
+    for observation, view, projection in tqdm(
+        zip(observations, views, projections),
+        total=len(views),
+        disable=not verbose,
+        desc=f"Texture baking ({mode}): UV",
+    ):
+        with torch.no_grad():
+            rast = utils3d.torch.rasterize_triangle_faces(
+                rastctx,
+                vertices[None],
+                faces,
+                observation.shape[1],
+                observation.shape[0],
+                uv=uvs[None],
+                view=view,
+                projection=projection,
             )
+            _uv.append(rast["uv"].detach())
+            _uv_dr.append(rast["uv_dr"].detach())
+            _hit.append(rast["mask"][0].detach().bool())
+    # pixels the mesh misses have uv = 0: the projection bake would put
+    # them all into texel (0, 0)
+    covered = [m & hit for m, hit in zip(masks, _hit)]
 
-        mask = texture_weights > 0
-        texture[mask] /= texture_weights[mask][:, None]
-        texture = np.clip(
-            texture.reshape(texture_size, texture_size, 3).cpu().numpy() * 255, 0, 255
-        ).astype(np.uint8)
+    if mode == "fast":
+        with torch.no_grad():
+            sums, weights = projection_bake(_uv, observations, covered, texture_size)
+        texture = sums / weights.clamp(min=1)[..., None]
+        texture = np.clip(texture.flip(0).cpu().numpy() * 255, 0, 255).astype(np.uint8)
 
         # inpaint
-        mask = (
-            (texture_weights == 0)
-            .cpu()
-            .numpy()
-            .astype(np.uint8)
-            .reshape(texture_size, texture_size)
-        )
+        mask = (weights == 0).flip(0).cpu().numpy().astype(np.uint8)
         texture = cv2.inpaint(texture, mask, 3, cv2.INPAINT_TELEA)
 
-    elif mode == "opt":
-        rastctx = utils3d.torch.RastContext(
-            backend=device if device.startswith("cuda") else "cuda"
-        )
-        observations = [observations.flip(0) for observations in observations]
-        masks = [m.flip(0) for m in masks]
-        _uv = []
-        _uv_dr = []
-        for observation, view, projection in tqdm(
-            zip(observations, views, projections),
-            total=len(views),
-            disable=not verbose,
-            desc="Texture baking (opt): UV",
-        ):
-            with torch.no_grad():
-                rast = utils3d.torch.rasterize_triangle_faces(
-                    rastctx,
-                    vertices[None],
-                    faces,
-                    observation.shape[1],
-                    observation.shape[0],
-                    uv=uvs[None],
-                    view=view,
-                    projection=projection,
-                )
-                _uv.append(rast["uv"].detach())
-                _uv_dr.append(rast["uv_dr"].detach())
-
-        texture = torch.nn.Parameter(
-            torch.zeros((1, texture_size, texture_size, 3), dtype=torch.float32).to(
-                device
-            )
-        )
-        optimizer = torch.optim.Adam([texture], betas=(0.5, 0.9), lr=1e-2)
-
-        def exp_anealing(optimizer, step, total_steps, start_lr, end_lr):
-            return start_lr * (end_lr / start_lr) ** (step / total_steps)
+    else:
 
-        def cosine_anealing(optimizer, step, total_steps, start_lr, end_lr):
-            return end_lr + 0.5 * (start_lr - end_lr) * (
-                1 + np.cos(np.pi * step / total_steps)
+        def render(texture, selected):
+            if rendering_engine == "nvdiffrast":
+                import nvdiffrast.torch as dr
+
+                return dr.texture(texture, _uv[selected], _uv_dr[selected])[0]
+            return sample_texture(texture, _uv[selected])
+
+        if mode == "opt":
+            texture = optimize_texture(
+                torch.zeros((1, texture_size, texture_size, 3), dtype=torch.float32).to(
+                    device
+                ),
+                render,
+                observations,
+                masks,
+                steps=2500,
+                lr=1e-2,
+                end_lr=1e-5,
+                lambda_tv=lambda_tv,
+                verbose=verbose,
             )
-
-        def tv_loss(texture):
-            return torch.nn.functional.l1_loss(
-                texture[:, :-1, :, :], texture[:, 1:, :, :]
-            ) + torch.nn.functional.l1_loss(texture[:, :, :-1, :], texture[:, :, 1:, :])
-
-        def render_pt3d_texture(texture, uv, uv_dr=None):
-            import torch.nn.functional as F
-
-            texture_perm = texture.permute(0, 3, 1, 2)
-            grid = uv * 2 - 1
-            if grid.dim() == 3:
-                grid = grid.unsqueeze(0)  # (1, H, W, 2)
-            elif grid.dim() == 4 and grid.shape[0] == 1:
-                pass
-            elif grid.dim() == 4 and grid.shape[1] == 1:
-                grid = grid.squeeze(1)  # remove extra batch dimension if necessary
-            else:
-                raise ValueError(f"Unexpected grid shape: {grid.shape}")
-            render = F.grid_sample(
-                texture_perm,
-                grid,
-                mode="bilinear",
-                padding_mode="border",
-                align_corners=True,
+        else:
+            texture = adaptive_bake(
+                _uv,
+                render,
+                observations,
+                covered,
+                texture_size,
+                lambda_tv=lambda_tv,
+                stats=stats,
+                verbose=verbose,
             )
-            render = render.permute(0, 2, 3, 1)[0]  # (H_out, W_out, 3)
-            return render
-
-        total_steps = 2500
-
-        with tqdm(
-            total=total_steps,
-            disable=not verbose,
-            desc="Texture baking (opt): optimizing",
-        ) as pbar:
-            for step in range(total_steps):
-                optimizer.zero_grad()
-                selected = np.random.randint(0, len(views))
-                uv, uv_dr, observation, mask = (
-                    _uv[selected],
-                    _uv_dr[selected],
-                    observations[selected],
-                    masks[selected],
-                )
-
-                if rendering_engine == "nvdiffrast":
-                    import nvdiffrast.torch as dr
-
-                    render = dr.texture(texture, uv, uv_dr)[0]
-
-                if rendering_engine == "pytorch3d":
-                    render = render_pt3d_texture(texture, uv)
-
-                loss = torch.nn.functional.l1_loss(render[mask], observation[mask])
-                if lambda_tv > 0:
-                    loss += lambda_tv * tv_loss(texture)
-                loss.backward()
-                optimizer.step()
-                # annealing
-                optimizer.param_groups[0]["lr"] = cosine_anealing(
-                    optimizer, step, total_steps, 1e-2, 1e-5
-                )
-                pbar.set_postfix({"loss": loss.item()})
-                pbar.update()
         texture = np.clip(
             texture[0].flip(0).detach().cpu().numpy() * 255, 0, 255
         ).astype(np.uint8)
@@ -589,8 +526,6 @@ def bake_texture(
             rastctx, (uvs * 2 - 1)[None], faces, texture_size, texture_size
         )["mask"][0].detach().cpu().numpy().astype(np.uint8)
         texture = cv2.inpaint(texture, mask, 3, cv2.INPAINT_TELEA)
-    else:
-        raise ValueError(f"Unknown mode: {mode}")
 
     return texture
 
@@ -601,7 +536,11 @@ def to_glb(
     simplify: float = 0.8,
     fill_holes: bool = True,
     fill_holes_max_size: float = 0.02,
+    fill_holes_mode: str = "full",
+    fill_holes_backend: str = "auto",
     texture_size: int = 4096,
+    texture_bake_mode: str = "opt",
+    uv_parametrizer: Optional[UVParametrizer] = None,
     debug: bool = False,
     verbose: bool = True,
     with_mesh_postprocess=True,
@@ -618,7 +557,15 @@ def to_glb(
         simplify (float): Ratio of faces to remove in simplification.
         fill_holes (bool): Whether to fill holes in the mesh.
         fill_holes_max_size (float): Maximum area of a hole to fill.
+        fill_holes_mode (str): Visibility settings of the hole filling, see
+            FILL_HOLES_MODES.
+        fill_holes_backend (str): Visibility backend, 'nvdiffrast', 'bvh'
+            (CPU ray casting) or 'auto'.
         texture_size (int): Size of the texture.
+        texture_bake_mode (str): Mode of the texture baking, 'opt',
+            'adaptive' or 'fast' (see bake_texture).
+        uv_parametrizer (UVParametrizer, optional): Cache of the UV
+            parametrization, see parametrize_mesh.
         debug (bool): Whether to print debug information.
         verbose (bool): Whether to print progress.
     """
@@ -628,13 +575,17 @@ def to_glb(
 
     if with_mesh_postprocess:
         # mesh postprocess
-        # fill_holes requires nvdiffrast; disable it under pytorch3d
-        effective_fill_holes = fill_holes and rendering_engine == "nvdiffrast"
-        if fill_holes and rendering_engine == "pytorch3d":
+        # fill_holes requires nvdiffrast unless its visibility is ray cast on
+        # the CPU; disable it under pytorch3d otherwise
+        effective_fill_holes = fill_holes and (
+            rendering_engine == "nvdiffrast" or fill_holes_backend == "bvh"
+        )
+        if fill_holes and not effective_fill_holes:
             logger.warning(
                 "fill_holes is disabled because rendering_engine is "
-                "'pytorch3d' (requires nvdiffrast)"
+                "'pytorch3d' (requires nvdiffrast or fill_holes_backend='bvh')"
             )
+        fill_holes_settings = FILL_HOLES_MODES[fill_holes_mode]
         vertices, faces = postprocess_mesh(
             vertices,
             faces,
@@ -643,20 +594,22 @@ def to_glb(
             fill_holes=effective_fill_holes,
             fill_holes_max_hole_size=fill_holes_max_size,
             fill_holes_max_hole_nbe=int(250 * np.sqrt(1 - simplify)),
-            fill_holes_resolution=1024,
-            fill_holes_num_views=1000,
+            fill_holes_resolution=fill_holes_settings["resolution"],
+            fill_holes_num_views=fill_holes_settings["num_views"],
+            fill_holes_backend=fill_holes_backend,
+            fill_holes_convergence_tol=fill_holes_settings["convergence_tol"],
             debug=debug,
             verbose=verbose,
         )
 
     if with_texture_baking:
         # parametrize mesh
-        vertices, faces, uvs = parametrize_mesh(vertices, faces)
+        vertices, faces, uvs = parametrize_mesh(vertices, faces, uv_parametrizer)
         logger.info("Baking texture ...")
 
         # bake texture
         observations, extrinsics, intrinsics = render_multiview(
-            app_rep, resolution=1024, nviews=100
+            app_rep, resolution=1024, nviews=100, chunk_size=25
         )
         masks = [np.any(observation > 0, axis=-1) for observation in observations]
         extrinsics = [extrinsics[i].cpu().numpy() for i in range(len(extrinsics))]
@@ -670,7 +623,7 @@ def to_glb(
             extrinsics,
             intrinsics,
             texture_size=texture_size,
-            mode="opt",
+            mode=texture_bake_mode,
             lambda_tv=0.01,
             verbose=verbose,
             rendering_engine=rendering_engine,
@@ -702,6 +655,122 @@ def to_glb(
     return mesh
 
 
+@profiled()
+def glb_lods(
+    glb: trimesh.Trimesh,
+    lod_levels: Sequence[Tuple[float, int]] = LOD_LEVELS,
+) -> Tuple[List[trimesh.Trimesh], List[dict]]:
+    """
+    Levels of detail of a mesh from to_glb, without postprocessing it again:
+    every level keeps a fraction of the faces (lod_utils.cluster_decimate,
+    reusing the UVs of the mesh) and the texture scaled down to its size.
+
+    Args:
+        glb (trimesh.Trimesh): Mesh from to_glb (textured or vertex colored).
+        lod_levels (Sequence[Tuple[float, int]]): (fraction of the faces,
+            texture size) of every level, finest first; textures are never
+            scaled up.
+
+    Returns:
+        The meshes, finest first, and a report per level with its "faces",
+        "vertices", "texture_size" and generation time ("seconds").
+    """
+    vertices = np.asarray(glb.vertices)
+    faces = np.asarray(glb.faces)
+    uvs, texture, material, colors = None, None, None, None
+    if isinstance(glb.visual, trimesh.visual.TextureVisuals) and glb.visual.uv is not None:
+        uvs = np.asarray(glb.visual.uv)
+        material = glb.visual.material
+        texture = getattr(material, "baseColorTexture", None)
+    elif glb.visual.kind == "vertex":
+        colors = np.asarray(glb.visual.vertex_colors)
+
+    meshes, report = [], []
+    for fraction, texture_size in lod_levels:
+        start = time.perf_counter()
+        level_vertices, level_faces, level_colors, level_uvs = cluster_decimate(
+            vertices,
+            faces,
+            max(1, int(round(fraction * len(faces)))),
+            attributes=colors,
+            uvs=uvs,
+        )
+        if uvs is not None:
+            level_texture = texture
+            if texture is not None and texture_size < max(texture.size):
+                level_texture = texture.resize(
+                    (texture_size, texture_size), Image.LANCZOS
+                )
+            level_material = trimesh.visual.material.PBRMaterial(
+                roughnessFactor=getattr(material, "roughnessFactor", 1.0),
+                baseColorTexture=level_texture,
+                baseColorFactor=getattr(material, "baseColorFactor", None),
+            )
+            visual = trimesh.visual.TextureVisuals(uv=level_uvs, material=level_material)
+        elif colors is not None:
+            visual = trimesh.visual.ColorVisuals(vertex_colors=level_colors)
+        else:
+            visual = None
+        meshes.append(
+            trimesh.Trimesh(level_vertices, level_faces, visual=visual, process=False)
+        )
+        report.append(
+            dict(
+                faces=len(level_faces),
+                vertices=len(level_vertices),
+                texture_size=(
+                    None
+                    if texture is None
+                    else min(texture_size, max(texture.size))
+                ),
+                seconds=time.perf_counter() - start,
+            )
+        )
+    return meshes, report
+
+
+def export_glb_lods(
+    meshes: Sequence[trimesh.Trimesh],
+    path: str,
+    separate_files: bool = False,
+    screen_coverage: Optional[Sequence[float]] = LOD_SCREEN_COVERAGE,
+    report: Optional[List[dict]] = None,
+) -> List[str]:
+    """
+    Write the levels of glb_lods, finest first: into one GLB file at `path`
+    whose finest mesh lists the others with the MSFT_lod extension (viewers
+    without it show the finest mesh), or with `separate_files` into one GLB
+    file per level next to it (`<name>_lod<level>.glb`).
+
+    Args:
+        report (List[dict], optional): Report of glb_lods, given the "bytes"
+            of every level (its size as a GLB file of its own).
+
+    Returns:
+        List[str]: The written files.
+    """
+    encoded = [mesh.export(file_type="glb") for mesh in meshes]
+    if report is not None:
+        for level, data in zip(report, encoded):
+            level["bytes"] = len(data)
+    if separate_files:
+        base, _ = os.path.splitext(path)
+        paths = [f"{base}_lod{level}.glb" for level in range(len(meshes))]
+        for level_path, data in zip(paths, encoded):
+            with open(level_path, "wb") as f:
+                f.write(data)
+        return paths
+
+    names = [f"lod{level}" for level in range(len(meshes))]
+    scene = trimesh.Scene()
+    for name, mesh in zip(names, meshes):
+        scene.add_geometry(mesh, node_name=name, geom_name=name)
+    data = add_msft_lod(scene.export(file_type="glb"), names, screen_coverage)
+    with open(path, "wb") as f:
+        f.write(data)
+    return [path]
+
+
 def simplify_gs(
     gs: Gaussian,
     simplify: float = 0.95,
@@ -1,4 +1,6 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
+from typing import Callable, Dict, Optional
+
 import torch
 import numpy as np
 from tqdm import tqdm
@@ -9,6 +11,7 @@ from ..renderers import OctreeRenderer, GaussianRenderer, MeshRenderer
 from ..representations import Octree, Gaussian, MeshExtractResult
 from ..modules import sparse as sp
 from .random_utils import sphere_hammersley_sequence
+from sam3d_objects.utils.profiler import profiled
 
 
 def yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitchs, rs, fovs):
@@ -50,15 +53,44 @@ def yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitchs, rs, fovs):
     return extrinsics, intrinsics
 
 
-def render_frames(
-    sample,
-    extrinsics,
-    intrinsics,
-    options={},
-    colors_overwrite=None,
-    verbose=True,
-    **kwargs,
+def yaw_pitch_r_fov_to_extrinsics_intrinsics_batched(
+    yaws, pitchs, rs, fovs, device="cuda"
 ):
+    """
+    Vectorized `yaw_pitch_r_fov_to_extrinsics_intrinsics` for many cameras.
+
+    Args:
+        yaws, pitchs: (N,) sequences or tensors, in radians.
+        rs, fovs: scalars or (N,) camera distances and fovs (in degrees).
+
+    Returns:
+        (torch.Tensor, torch.Tensor): (N, 4, 4) extrinsics and (N, 3, 3)
+        intrinsics, built on `device` in one go.
+    """
+    yaws = torch.as_tensor(yaws, dtype=torch.float32, device=device).reshape(-1)
+    pitchs = torch.as_tensor(pitchs, dtype=torch.float32, device=device).reshape(-1)
+    rs = torch.as_tensor(rs, dtype=torch.float32, device=device).expand_as(yaws)
+    fovs = torch.deg2rad(
+        torch.as_tensor(fovs, dtype=torch.float32, device=device)
+    ).expand_as(yaws)
+    origs = torch.stack(
+        [
+            torch.sin(yaws) * torch.cos(pitchs),
+            torch.cos(yaws) * torch.cos(pitchs),
+            torch.sin(pitchs),
+        ],
+        dim=-1,
+    ) * rs.unsqueeze(-1)
+    extrinsics = utils3d.torch.extrinsics_look_at(
+        origs,
+        torch.zeros_like(origs),
+        torch.tensor([0, 0, 1], dtype=torch.float32, device=device).expand_as(origs),
+    )
+    intrinsics = utils3d.torch.intrinsics_from_fov_xy(fovs, fovs)
+    return extrinsics, intrinsics
+
+
+def get_renderer(sample, options={}, **kwargs):
     if isinstance(sample, Octree):
         renderer = OctreeRenderer()
         renderer.rendering_options.resolution = options.get("resolution", 512)
@@ -85,6 +117,50 @@ def render_frames(
         renderer.rendering_options.ssaa = options.get("ssaa", 4)
     else:
         raise ValueError(f"Unsupported sample type: {type(sample)}")
+    return renderer
+
+
+def _to_uint8_image(image):
+    # (3, H, W) float in [0, 1] -> uint8, same rounding as np.clip().astype()
+    return (image.detach() * 255).clamp_(0, 255).to(torch.uint8)
+
+
+def _frames_to_numpy(frames):
+    # one transfer per key; images go (N, 3, H, W) -> (N, H, W, 3) as a view
+    out = {}
+    for key, values in frames.items():
+        if any(v is None for v in values):
+            out[key] = [None if v is None else v.cpu().numpy() for v in values]
+            continue
+        array = torch.stack(values).cpu().numpy()
+        out[key] = array.transpose(0, 2, 3, 1) if key != "depth" else array
+    return out
+
+
+def render_frames(
+    sample,
+    extrinsics,
+    intrinsics,
+    options={},
+    colors_overwrite=None,
+    verbose=True,
+    chunk_size=None,
+    sink=None,
+    **kwargs,
+):
+    if chunk_size is not None or sink is not None:
+        return render_frames_batched(
+            sample,
+            extrinsics,
+            intrinsics,
+            options,
+            colors_overwrite=colors_overwrite,
+            verbose=verbose,
+            chunk_size=chunk_size or 32,
+            sink=sink,
+            **kwargs,
+        )
+    renderer = get_renderer(sample, options, **kwargs)
 
     rets = {}
     for j, (extr, intr) in tqdm(
@@ -124,6 +200,71 @@ def render_frames(
     return rets
 
 
+def render_frames_batched(
+    sample,
+    extrinsics,
+    intrinsics,
+    options={},
+    colors_overwrite=None,
+    verbose=True,
+    chunk_size=32,
+    sink: Optional[Callable[[Dict[str, np.ndarray]], None]] = None,
+    **kwargs,
+):
+    """
+    `render_frames` that renders `chunk_size` cameras at a time and keeps
+    the frames on the device, converted to uint8 there.
+
+    Without `sink`, every frame is copied back in a single bulk transfer at
+    the end; the return value matches `render_frames` (lists of (H, W, 3)
+    uint8 arrays, views into one (N, H, W, 3) array). With `sink`, each chunk
+    is transferred and passed to `sink` as a dict of (chunk, ...) arrays
+    instead, e.g. to stream frames into a video encoder, and an empty dict is
+    returned.
+
+    Args:
+        extrinsics, intrinsics: (N, 4, 4) / (N, 3, 3) tensors (see
+            `yaw_pitch_r_fov_to_extrinsics_intrinsics_batched`) or lists of
+            per-camera tensors.
+    """
+    renderer = get_renderer(sample, options, **kwargs)
+    if isinstance(extrinsics, (list, tuple)):
+        extrinsics = torch.stack(list(extrinsics))
+    if isinstance(intrinsics, (list, tuple)):
+        intrinsics = torch.stack(list(intrinsics))
+
+    frames = {}
+    num_chunks = (len(extrinsics) + chunk_size - 1) // chunk_size
+    for start in tqdm(
+        range(0, len(extrinsics), chunk_size),
+        total=num_chunks,
+        desc="Rendering",
+        disable=not verbose,
+    ):
+        for extr, intr in zip(
+            extrinsics[start : start + chunk_size],
+            intrinsics[start : start + chunk_size],
+        ):
+            if not isinstance(sample, MeshExtractResult):
+                res = renderer.render(
+                    sample, extr, intr, colors_overwrite=colors_overwrite
+                )
+                color = res["color"][0] if isinstance(res["color"], tuple) else res["color"]
+                frames.setdefault("color", []).append(_to_uint8_image(color))
+                depth = res.get("percent_depth", res.get("depth"))
+                frames.setdefault("depth", []).append(
+                    None if depth is None else depth.detach()
+                )
+            else:
+                res = renderer.render(sample, extr, intr)
+                frames.setdefault("normal", []).append(_to_uint8_image(res["normal"]))
+        if sink is not None:
+            sink(_frames_to_numpy(frames))
+            frames = {}
+
+    return {key: list(values) for key, values in _frames_to_numpy(frames).items()}
+
+
 def render_gaussian_color_stay_in_device(
     sample,
     extrinsics,
@@ -164,38 +305,58 @@ def render_video(
     r=2,
     fov=40,
     backend="inria",
+    chunk_size=None,
+    sink=None,
     **kwargs,
 ):
     yaws = torch.linspace(0, 2 * 3.1415, num_frames)
     pitch = 0.25 + 0.5 * torch.sin(torch.linspace(0, 2 * 3.1415, num_frames))
-    yaws = yaws.tolist()
-    pitch = pitch.tolist()
-    extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics(
-        yaws, pitch, r, fov
-    )
+    if chunk_size is not None or sink is not None:
+        extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics_batched(
+            yaws, pitch, r, fov
+        )
+    else:
+        extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics(
+            yaws.tolist(), pitch.tolist(), r, fov
+        )
     return render_frames(
         sample,
         extrinsics,
         intrinsics,
         {"resolution": resolution, "bg_color": bg_color, "backend": backend},
+        chunk_size=chunk_size,
+        sink=sink,
         **kwargs,
     )
 
 
-def render_multiview(sample, resolution=512, nviews=30):
+@profiled()
+def render_multiview(sample, resolution=512, nviews=30, chunk_size=None):
+    """
+    Render `nviews` cameras spread over the sphere. With `chunk_size`, the
+    cameras are built in one vectorized call and rendered in chunks (see
+    `render_frames_batched`); extrinsics / intrinsics are then (N, 4, 4) /
+    (N, 3, 3) tensors instead of lists, indexable the same way.
+    """
     r = 2
     fov = 40
     cams = [sphere_hammersley_sequence(i, nviews) for i in range(nviews)]
     yaws = [cam[0] for cam in cams]
     pitchs = [cam[1] for cam in cams]
-    extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics(
-        yaws, pitchs, r, fov
-    )
+    if chunk_size is not None:
+        extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics_batched(
+            yaws, pitchs, r, fov
+        )
+    else:
+        extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics(
+            yaws, pitchs, r, fov
+        )
     res = render_frames(
         sample,
         extrinsics,
         intrinsics,
         {"resolution": resolution, "bg_color": (0, 0, 0)},
+        chunk_size=chunk_size,
     )
     return res["color"], extrinsics, intrinsics
 
@@ -0,0 +1,307 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+from typing import *
+import numpy as np
+import torch
+import torch.nn.functional as F
+from tqdm import tqdm
+
+
+# Settings of the "adaptive" mode of `bake_texture`: the step budget of every
+# pyramid level, the learning rate (annealed to end_lr once the level stops
+# improving), and the relative improvement of the photometric loss over one
+# pass through the views below which a level stops.
+ADAPTIVE_BAKE = dict(
+    levels=3,
+    max_steps=1000,
+    lr=3e-3,
+    end_lr=1e-5,
+    convergence_tol=5e-3,
+    min_epochs=2,
+)
+
+# Textures are (1, T, T, C) with row v and column u of the UV map, the layout
+# sampled by nvdiffrast and by `sample_texture`; `bake_texture` flips them to
+# image rows at the end. Texel (i, j) covers v in [i / T, (i + 1) / T) and u
+# in [j / T, (j + 1) / T), centered as in nvdiffrast's `dr.texture`. UV maps
+# are (1, H, W, 2) in [0, 1], observations (H, W, C) and masks (H, W) in the
+# same (bottom-up) row order.
+
+
+def sample_texture(texture: torch.Tensor, uv: torch.Tensor) -> torch.Tensor:
+    """
+    Bilinear lookup of a texture at a UV map, the texture sampling of
+    `bake_texture` without nvdiffrast.
+
+    Args:
+        texture (torch.Tensor): (1, T, T, C) texture.
+        uv (torch.Tensor): (1, H, W, 2) UV map.
+
+    Returns:
+        torch.Tensor: (H, W, C) rendered colors.
+    """
+    render = F.grid_sample(
+        texture.permute(0, 3, 1, 2),
+        uv * 2 - 1,
+        mode="bilinear",
+        padding_mode="border",
+        align_corners=False,
+    )
+    return render.permute(0, 2, 3, 1)[0]
+
+
+def projection_bake(
+    uv_maps: List[torch.Tensor],
+    observations: List[torch.Tensor],
+    masks: List[torch.Tensor],
+    texture_size: int,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Accumulate every masked pixel into the texel its UV falls in: the closed
+    form least squares texture under nearest neighbor sampling is the
+    weighted average `sums / weights` (the "fast" mode of `bake_texture`).
+
+    Returns:
+        sums (torch.Tensor): (T, T, C) summed colors.
+        weights (torch.Tensor): (T, T) number of pixels per texel.
+    """
+    channels = observations[0].shape[-1]
+    device = observations[0].device
+    sums = torch.zeros(texture_size * texture_size, channels, device=device)
+    weights = torch.zeros(texture_size * texture_size, device=device)
+    for uv, observation, mask in zip(uv_maps, observations, masks):
+        texel = (uv[0][mask] * texture_size).floor().long().clamp(0, texture_size - 1)
+        index = texel[:, 1] * texture_size + texel[:, 0]
+        sums.index_add_(0, index, observation[mask].float())
+        weights.index_add_(0, index, torch.ones_like(index, dtype=weights.dtype))
+    return (
+        sums.view(texture_size, texture_size, channels),
+        weights.view(texture_size, texture_size),
+    )
+
+
+def _pool(sums: torch.Tensor, weights: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    size = sums.shape[0] // 2
+    sums = sums.view(size, 2, size, 2, -1).sum((1, 3))
+    weights = weights.view(size, 2, size, 2).sum((1, 3))
+    return sums, weights
+
+
+def texture_pyramid(
+    sums: torch.Tensor, weights: torch.Tensor, levels: int
+) -> List[torch.Tensor]:
+    """
+    Hole filled textures of a projection bake at `levels` resolutions, from
+    T / 2^(levels - 1) to T (push-pull: every level averages the 2x2 blocks
+    of the finer one, and texels no pixel reached take the color of their
+    coarser parent).
+
+    Returns:
+        List[torch.Tensor]: (1, t, t, C) textures, coarsest first.
+    """
+    pulled = [(sums, weights)]
+    for _ in range(levels - 1):
+        pulled.append(_pool(*pulled[-1]))
+    coarsest_sums, coarsest_weights = pulled[-1]
+    total = coarsest_weights.sum().clamp(min=1)
+    filled = (coarsest_sums.sum((0, 1)) / total).expand_as(coarsest_sums)
+    pyramid = []
+    for level_sums, level_weights in reversed(pulled):
+        if pyramid:
+            filled = filled.repeat_interleave(2, 0).repeat_interleave(2, 1)
+        seen = level_weights > 0
+        filled = torch.where(
+            seen[..., None], level_sums / level_weights.clamp(min=1)[..., None], filled
+        )
+        pyramid.append(filled[None])
+    return pyramid
+
+
+def _upsample(texture: torch.Tensor, size: int) -> torch.Tensor:
+    return F.interpolate(
+        texture.permute(0, 3, 1, 2), size=(size, size), mode="bilinear", align_corners=False
+    ).permute(0, 2, 3, 1)
+
+
+def _tv_loss(texture):
+    return F.l1_loss(texture[:, :-1, :, :], texture[:, 1:, :, :]) + F.l1_loss(
+        texture[:, :, :-1, :], texture[:, :, 1:, :]
+    )
+
+
+def _cosine_annealing(step, total_steps, start_lr, end_lr):
+    return end_lr + 0.5 * (start_lr - end_lr) * (1 + np.cos(np.pi * step / total_steps))
+
+
+def optimize_texture(
+    texture: torch.Tensor,
+    render: Callable[[torch.Tensor, int], torch.Tensor],
+    observations: List[torch.Tensor],
+    masks: List[torch.Tensor],
+    steps: int = 2500,
+    lr: float = 1e-2,
+    end_lr: float = 1e-5,
+    lambda_tv: float = 1e-2,
+    convergence_tol: Optional[float] = None,
+    min_epochs: int = 2,
+    stats: Optional[dict] = None,
+    desc: str = "Texture baking (opt): optimizing",
+    verbose: bool = False,
+) -> torch.Tensor:
+    """
+    Fit a texture to the observations by Adam on the masked L1 photometric
+    loss plus `lambda_tv` total variation, one view per step.
+
+    Without `convergence_tol` this is the "opt" mode of `bake_texture`:
+    `steps` steps on uniformly drawn views with the learning rate cosine
+    annealed from `lr` to `end_lr`. With it, the views are visited in
+    shuffled passes (epochs) at the constant rate `lr`, and once the mean
+    loss of a pass improves on the previous one by less than
+    `convergence_tol` (relative; after at least `min_epochs` passes) the
+    rate is annealed to `end_lr` over one more pass and the loop stops.
+    `steps` then caps the total, annealing pass included.
+
+    Args:
+        texture (torch.Tensor): (1, T, T, C) initial texture.
+        render (Callable): render(texture, view index) -> (H, W, C) colors.
+        stats (dict, optional): filled with "steps" (taken) and "losses"
+            (mean loss of every pass, with convergence_tol).
+
+    Returns:
+        torch.Tensor: (1, T, T, C) optimized texture.
+    """
+    texture = torch.nn.Parameter(texture.detach().clone())
+    optimizer = torch.optim.Adam([texture], betas=(0.5, 0.9), lr=lr)
+    num_views = len(observations)
+    adaptive = convergence_tol is not None
+    epoch_losses, running = [], []
+    anneal_from = steps - num_views if adaptive else 0
+    order = []
+
+    step = 0
+    with tqdm(total=steps, disable=not verbose, desc=desc) as pbar:
+        while step < steps:
+            optimizer.zero_grad()
+            if adaptive:
+                if not order:
+                    order = np.random.permutation(num_views).tolist()
+                selected = order.pop()
+            else:
+                selected = np.random.randint(0, num_views)
+            mask = masks[selected]
+            loss = F.l1_loss(render(texture, selected)[mask], observations[selected][mask])
+            if lambda_tv > 0:
+                loss += lambda_tv * _tv_loss(texture)
+            loss.backward()
+            optimizer.step()
+            step += 1
+            if not adaptive:
+                optimizer.param_groups[0]["lr"] = _cosine_annealing(step - 1, steps, lr, end_lr)
+                pbar.set_postfix({"loss": loss.item()})
+                pbar.update()
+                continue
+
+            # losses stay on the device until the end of a pass
+            running.append(loss.detach())
+            if step > anneal_from:
+                optimizer.param_groups[0]["lr"] = _cosine_annealing(
+                    step - anneal_from, steps - anneal_from, lr, end_lr
+                )
+            if len(running) == num_views:
+                epoch_losses.append(torch.stack(running).mean().item())
+                running = []
+                pbar.set_postfix({"loss": epoch_losses[-1]})
+                if (
+                    step <= anneal_from
+                    and len(epoch_losses) >= max(min_epochs, 2)
+                    and epoch_losses[-2] - epoch_losses[-1]
+                    < convergence_tol * epoch_losses[-2]
+                ):
+                    # converged: one annealing pass, then stop
+                    anneal_from, steps = step, min(steps, step + num_views)
+                    pbar.total = steps
+            pbar.update()
+    if stats is not None:
+        stats["steps"] = step
+        stats["losses"] = epoch_losses
+    return texture.detach()
+
+
+def adaptive_bake(
+    uv_maps: List[torch.Tensor],
+    render: Callable[[torch.Tensor, int], torch.Tensor],
+    observations: List[torch.Tensor],
+    masks: List[torch.Tensor],
+    texture_size: int,
+    levels: int = ADAPTIVE_BAKE["levels"],
+    max_steps: int = ADAPTIVE_BAKE["max_steps"],
+    lr: float = ADAPTIVE_BAKE["lr"],
+    end_lr: float = ADAPTIVE_BAKE["end_lr"],
+    convergence_tol: float = ADAPTIVE_BAKE["convergence_tol"],
+    min_epochs: int = ADAPTIVE_BAKE["min_epochs"],
+    lambda_tv: float = 1e-2,
+    stats: Optional[dict] = None,
+    verbose: bool = False,
+) -> torch.Tensor:
+    """
+    Coarse-to-fine texture baking with early stopping: the "adaptive" mode
+    of `bake_texture`.
+
+    The texture starts as the projection bake (`projection_bake`, hole
+    filled by `texture_pyramid`) at T / 2^(levels - 1) and is optimized
+    (`optimize_texture` with `convergence_tol`) until its loss stops
+    improving. Every finer level starts from the upsampled coarser result
+    plus the detail the projection bake has at that level and not at the
+    coarser one, so with no optimization the result is the projection bake
+    itself. Levels are halved as long as the texture size is even.
+
+    Args:
+        uv_maps (List[torch.Tensor]): (1, H, W, 2) UV map of every view.
+        render (Callable): render(texture, view index) -> (H, W, C) colors.
+        max_steps (int): step budget of every level.
+        stats (dict, optional): filled with "levels", a list of
+            {"size", "steps", "losses"} per level, and "steps" (total).
+
+    Returns:
+        torch.Tensor: (1, T, T, C) texture.
+    """
+    while levels > 1 and texture_size % 2 ** (levels - 1):
+        levels -= 1
+    with torch.no_grad():
+        pyramid = texture_pyramid(
+            *projection_bake(uv_maps, observations, masks, texture_size), levels
+        )
+    if stats is not None:
+        stats["levels"] = []
+    texture = None
+    for level, projection in enumerate(pyramid):
+        size = projection.shape[1]
+        if texture is None:
+            texture = projection
+        else:
+            with torch.no_grad():
+                texture = (
+                    _upsample(texture, size)
+                    + projection
+                    - _upsample(pyramid[level - 1], size)
+                )
+        level_stats = {}
+        texture = optimize_texture(
+            texture,
+            render,
+            observations,
+            masks,
+            steps=max_steps,
+            lr=lr,
+            end_lr=end_lr,
+            lambda_tv=lambda_tv,
+            convergence_tol=convergence_tol,
+            min_epochs=min_epochs,
+            stats=level_stats,
+            desc=f"Texture baking (adaptive): {size}x{size}",
+            verbose=verbose,
+        )
+        if stats is not None:
+            stats["levels"].append(dict(size=size, **level_stats))
+    if stats is not None:
+        stats["steps"] = sum(level["steps"] for level in stats["levels"])
+    return texture
@@ -0,0 +1,403 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Cached and parallel UV parametrization of the meshes of `to_glb` (see
+`parametrize_mesh`).
+
+xatlas runs single threaded and is deterministic, so a mesh that was already
+parametrized (postprocessing sweeps over texture settings, result cache
+misses that decode the same shape again) gets the same UVs back. Results are
+keyed on the vertex and face bytes (`mesh_digest`) and the parametrization
+settings, in two tiers like the feature cache:
+
+- memory: LRU of (vmapping, faces, uvs) arrays;
+- disk (optional): one `.npz` file per entry in `cache_dir`, evicted least
+  recently used first; disk hits are promoted to memory.
+
+Meshes with at least `min_parallel_faces` faces are split into their
+connected components, grouped into `processes` parts of similar face count
+and parametrized in a process pool. Every part comes back as its own atlas;
+`merge_atlases` rescales them to one texel density and shelf packs their
+bounding boxes into the unit square. This packs less tightly than one xatlas
+call over all charts; `uv_utilization` measures the difference (see
+scripts/benchmark_uv_parametrization.py).
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from sam3d_objects.utils.profiler import record_counters
+
+# (vmapping, faces, uvs), as returned by xatlas.parametrize
+Atlas = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def xatlas_parametrize(vertices: np.ndarray, faces: np.ndarray) -> Atlas:
+    """One xatlas call, the parametrization of `parametrize_mesh`."""
+    import xatlas
+
+    return xatlas.parametrize(vertices, faces)
+
+
+def mesh_digest(vertices: np.ndarray, faces: np.ndarray) -> str:
+    """Hash of the dtypes, shapes and bytes of a mesh's vertices and faces."""
+    digest = hashlib.blake2b(digest_size=20)
+    for array in (vertices, faces):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}:{array.shape}:".encode())
+        digest.update(memoryview(array.reshape(-1).view(np.uint8)))
+    return digest.hexdigest()
+
+
+def face_components(faces: np.ndarray, num_vertices: int) -> np.ndarray:
+    """
+    Connected component of every face (faces sharing a vertex are
+    connected), numbered from 0 in order of their first face.
+
+    Returns:
+        np.ndarray: (F,) component labels.
+    """
+    faces = np.asarray(faces, dtype=np.int64)
+    if len(faces) == 0:
+        return np.zeros(0, dtype=np.int64)
+    a = faces[:, [0, 1]].reshape(-1)
+    b = faces[:, [1, 2]].reshape(-1)
+    parent = np.arange(num_vertices)
+    while True:
+        # hook the larger root of every edge onto the smaller one ...
+        ra, rb = parent[a], parent[b]
+        lo, hi = np.minimum(ra, rb), np.maximum(ra, rb)
+        linked = lo != hi
+        if not linked.any():
+            break
+        np.minimum.at(parent, hi[linked], lo[linked])
+        # ... and point every vertex at its root
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    _, labels = np.unique(parent[faces[:, 0]], return_inverse=True)
+    order = np.full(labels.max() + 1, len(labels))
+    np.minimum.at(order, labels, np.arange(len(labels)))
+    return np.argsort(np.argsort(order))[labels]
+
+
+def split_mesh(
+    vertices: np.ndarray, faces: np.ndarray, num_parts: int
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Group the connected components of a mesh into at most `num_parts` parts
+    of similar face count (largest component first, into the lightest part).
+
+    Returns:
+        List of (vertex ids, local faces) per part; vertex ids index
+        `vertices`, local faces index the vertex ids.
+    """
+    labels = face_components(faces, len(vertices))
+    sizes = np.bincount(labels)
+    loads = np.zeros(min(num_parts, len(sizes)), dtype=np.int64)
+    part_of = np.empty(len(sizes), dtype=np.int64)
+    for component in np.argsort(-sizes, kind="stable"):
+        part = int(np.argmin(loads))
+        part_of[component] = part
+        loads[part] += sizes[component]
+    face_parts = part_of[labels]
+    parts = []
+    for part in range(len(loads)):
+        part_faces = faces[face_parts == part]
+        vertex_ids, local = np.unique(part_faces, return_inverse=True)
+        parts.append((vertex_ids, local.reshape(-1, 3)))
+    return parts
+
+
+def uv_utilization(uvs: np.ndarray, faces: np.ndarray) -> float:
+    """Fraction of the unit UV square covered by the (non-overlapping) UV triangles."""
+    tri = np.asarray(uvs, dtype=np.float64)[faces]
+    edges = tri[:, 1:] - tri[:, :1]
+    area = 0.5 * np.abs(edges[:, 0, 0] * edges[:, 1, 1] - edges[:, 0, 1] * edges[:, 1, 0])
+    return float(area.sum())
+
+
+def _surface_area(vertices, faces):
+    tri = np.asarray(vertices, dtype=np.float64)[faces]
+    return 0.5 * np.linalg.norm(np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]), axis=1).sum()
+
+
+def _shelf_pack(sizes: np.ndarray, width: float, padding: float) -> Tuple[np.ndarray, float]:
+    # tallest first, left to right in rows of at most `width`
+    offsets = np.zeros_like(sizes)
+    x = y = shelf = 0.0
+    for i in np.argsort(-sizes[:, 1], kind="stable"):
+        w, h = sizes[i]
+        if x > 0 and x + w > width:
+            x, y, shelf = 0.0, y + shelf + padding, 0.0
+        offsets[i] = (x, y)
+        x += w + padding
+        shelf = max(shelf, h)
+    return offsets, y + shelf
+
+
+def merge_atlases(
+    parts: List[Tuple[np.ndarray, np.ndarray]],
+    atlases: List[Atlas],
+    vertices: np.ndarray,
+    padding: float = 2 / 1024,
+) -> Atlas:
+    """
+    Combine the atlases of the parts of `split_mesh` into one atlas of the
+    whole mesh: every part's UVs are scaled so that all parts have the same
+    texel density (UV area per surface area), and the bounding boxes of the
+    parts are shelf packed into the unit square, `padding` apart.
+
+    Returns:
+        (vmapping, faces, uvs) of the whole mesh, as from xatlas.parametrize.
+    """
+    boxes, scales = [], []
+    for (vertex_ids, _), (vmapping, indices, uvs) in zip(parts, atlases):
+        lo, hi = uvs.min(0), uvs.max(0)
+        density = np.sqrt(
+            _surface_area(vertices[vertex_ids[vmapping]], indices)
+            / max(uv_utilization(uvs, indices), 1e-12)
+        )
+        scales.append(density)
+        boxes.append((lo, (hi - lo) * density))
+    sizes = np.array([size for _, size in boxes], dtype=np.float64)
+    total = np.sqrt(sizes.prod(1).sum())
+    # the squarest of a few shelf widths
+    best = None
+    for width in np.linspace(max(total, sizes[:, 0].max()), 2 * total, 8):
+        offsets, height = _shelf_pack(sizes, width, padding * total)
+        used_width = (offsets[:, 0] + sizes[:, 0]).max()
+        side = max(used_width, height)
+        if best is None or side < best[0]:
+            best = (side, offsets)
+    side, offsets = best
+
+    vmappings, faces, uvs, base = [], [], [], 0
+    for (vertex_ids, _), (vmapping, indices, part_uvs), (lo, _), scale, offset in zip(
+        parts, atlases, boxes, scales, offsets
+    ):
+        vmappings.append(vertex_ids[vmapping])
+        faces.append(indices + base)
+        uvs.append(((part_uvs - lo) * scale + offset) / side)
+        base += len(vmapping)
+    return (
+        np.concatenate(vmappings),
+        np.concatenate(faces).astype(np.uint32),
+        np.concatenate(uvs).astype(np.float32),
+    )
+
+
+class UVParametrizer:
+    """
+    Args:
+        max_memory_bytes (int): Size limit of the in-memory tier; 0 disables it.
+        cache_dir (str): Directory of the on-disk tier, None to disable it.
+        max_disk_bytes (int): Size limit of the on-disk tier.
+        processes (int): Worker processes for large meshes; 0 or 1
+            parametrizes every mesh with a single call in this process.
+        min_parallel_faces (int): Smaller meshes are not split.
+        parametrize (Callable): parametrize(vertices, faces) -> (vmapping,
+            faces, uvs) of a mesh or part, xatlas by default. Must be
+            picklable when processes > 1.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 256 * 2**20,
+        cache_dir: Optional[str] = None,
+        max_disk_bytes: int = 2 * 2**30,
+        processes: int = 0,
+        min_parallel_faces: int = 50000,
+        parametrize: Callable[[np.ndarray, np.ndarray], Atlas] = xatlas_parametrize,
+    ):
+        self.max_memory_bytes = int(max_memory_bytes)
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = int(max_disk_bytes)
+        self.processes = processes
+        self.min_parallel_faces = min_parallel_faces
+        self.parametrize = parametrize
+        self._pool = None
+        self._shutdown_pool = None
+        self._memory = OrderedDict()  # key -> atlas
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> file size, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    def settings(self) -> Tuple[str, int, int]:
+        """The settings that change the atlas of a mesh: the parametrization and the split."""
+        name = getattr(self.parametrize, "__qualname__", repr(self.parametrize))
+        return name, self.processes, self.min_parallel_faces
+
+    def key(self, vertices: np.ndarray, faces: np.ndarray) -> str:
+        """Key of a mesh's atlas: its bytes and whether (and how) it is split."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(mesh_digest(vertices, faces).encode())
+        parts = self._num_parts(faces)
+        digest.update(f"\0{self.settings()[0]}\0{parts}".encode())
+        return digest.hexdigest()
+
+    def __call__(self, vertices: np.ndarray, faces: np.ndarray) -> Atlas:
+        """(vmapping, faces, uvs) of a mesh, served from the cache when already computed."""
+        key = self.key(vertices, faces)
+        atlas = self.get(key)
+        if atlas is not None:
+            with self._lock:
+                self.stats["hits"] += 1
+            record_counters("uv_parametrization", hits=1)
+            return atlas
+        atlas = self.compute(vertices, faces)
+        self.put(key, atlas)
+        with self._lock:
+            self.stats["misses"] += 1
+        record_counters("uv_parametrization", misses=1)
+        return atlas
+
+    def compute(self, vertices: np.ndarray, faces: np.ndarray) -> Atlas:
+        """Parametrize a mesh, split over the process pool if large enough."""
+        num_parts = self._num_parts(faces)
+        if num_parts <= 1:
+            return self.parametrize(vertices, faces)
+        parts = split_mesh(vertices, faces, num_parts)
+        if len(parts) == 1:
+            return self.parametrize(vertices, faces)
+        pool = self._get_pool()
+        atlases = list(
+            pool.map(
+                self.parametrize,
+                [vertices[vertex_ids] for vertex_ids, _ in parts],
+                [part_faces for _, part_faces in parts],
+            )
+        )
+        return merge_atlases(parts, atlases, vertices)
+
+    def _num_parts(self, faces):
+        if self.processes <= 1 or len(faces) < self.min_parallel_faces:
+            return 1
+        return self.processes
+
+    def _get_pool(self):
+        if self._pool is None:
+            # not fork: the parent holds CUDA contexts and the server's
+            # threads, which a forked worker inherits in whatever state
+            # they were in
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context(method)
+            )
+            # also shut down when the parametrizer is collected, or at exit
+            self._shutdown_pool = weakref.finalize(self, self._pool.shutdown)
+        return self._pool
+
+    def close(self):
+        """Shut the process pool down."""
+        if self._pool is not None:
+            self._shutdown_pool()
+            self._pool = None
+            self._shutdown_pool = None
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    # -- lookup -------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Atlas]:
+        """The atlas stored under `key` (copies), or None."""
+        with self._lock:
+            atlas = self._memory.get(key)
+            if atlas is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            elif key in self._disk:
+                atlas = self._read_disk(key)
+                if atlas is not None:
+                    self.stats["disk_hits"] += 1
+                    self._put_memory(key, atlas)
+        if atlas is None:
+            return None
+        return tuple(array.copy() for array in atlas)
+
+    def put(self, key: str, atlas: Atlas):
+        atlas = tuple(np.array(array) for array in atlas)
+        with self._lock:
+            self._put_memory(key, atlas)
+            if self.cache_dir is not None and key not in self._disk:
+                self._write_disk(key, atlas)
+
+    # -- memory tier --------------------------------------------------------
+
+    def _put_memory(self, key, atlas):
+        size = sum(array.nbytes for array in atlas)
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= sum(array.nbytes for array in self._memory[key])
+        self._memory[key] = atlas
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= sum(array.nbytes for array in evicted)
+
+    # -- disk tier ----------------------------------------------------------
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _scan_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npz"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name[: -len(".npz")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                atlas = (data["vmapping"], data["faces"], data["uvs"])
+            os.utime(path)
+        except (OSError, ValueError, KeyError) as e:
+            # removed by another process, or a partial write
+            logger.warning(f"Dropping unreadable UV cache entry {path}: {e}")
+            self._remove_disk(key)
+            return None
+        self._disk.move_to_end(key)
+        return atlas
+
+    def _write_disk(self, key, atlas):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        vmapping, faces, uvs = atlas
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vmapping=vmapping, faces=faces, uvs=uvs)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        self._disk[key] = size
+        self._disk_bytes += size
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            self._remove_disk(next(iter(self._disk)))
+
+    def _remove_disk(self, key):
+        self._disk_bytes -= self._disk.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,400 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+from typing import *
+import numpy as np
+import torch
+from tqdm import tqdm
+from .random_utils import radical_inverse, sphere_hammersley_sequence
+
+
+VISIBILITY_BACKENDS = ("auto", "nvdiffrast", "bvh")
+
+
+def sphere_camera_origins(num_views: int, radius: float = 2.0) -> np.ndarray:
+    """
+    Camera positions of `_fill_holes`: a Hammersley set on the sphere of
+    radius `radius`, looking at the origin.
+
+    The views are returned in a progressive order (sorted by the base 3
+    radical inverse of their index, so that every prefix covers the whole
+    sphere) instead of the Hammersley order, which sweeps from one pole to
+    the other. Visibility accumulated over all views does not depend on the
+    order, but early termination does.
+
+    Returns:
+        np.ndarray: (num_views, 3) camera positions.
+    """
+    order = np.argsort([radical_inverse(3, i) for i in range(num_views)], kind="stable")
+    origins = []
+    for i in order:
+        yaw, pitch = sphere_hammersley_sequence(i, num_views)
+        origins.append(
+            [
+                np.sin(yaw) * np.cos(pitch),
+                np.cos(yaw) * np.cos(pitch),
+                np.sin(pitch),
+            ]
+        )
+    return np.asarray(origins, dtype=np.float64).reshape(-1, 3) * radius
+
+
+def count_boundary_loops(faces: np.ndarray) -> int:
+    """
+    Number of holes of a triangle mesh, i.e. connected loops of boundary
+    edges (edges used by a single face).
+    """
+    faces = np.asarray(faces, dtype=np.int64)
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edges, counts = np.unique(edges, axis=0, return_counts=True)
+    boundary = edges[counts == 1]
+    if len(boundary) == 0:
+        return 0
+    # union-find over the boundary vertices
+    nodes, boundary = np.unique(boundary, return_inverse=True)
+    boundary = boundary.reshape(-1, 2)
+    parent = np.arange(len(nodes))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in boundary:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+    return len({find(x) for x in range(len(nodes))})
+
+
+# -- CPU ray casting ------------------------------------------------------------
+
+
+def _morton_codes(points: np.ndarray) -> np.ndarray:
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    q = ((points - lo) / np.maximum(hi - lo, 1e-12) * 1023).astype(np.uint64)
+    codes = np.zeros(len(points), dtype=np.uint64)
+    for bit in range(10):
+        for axis in range(3):
+            codes |= ((q[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(
+                3 * bit + 2 - axis
+            )
+    return codes
+
+
+class TriangleBVH:
+    """
+    Bounding volume hierarchy over the triangles of a mesh, for vectorized
+    closest-hit ray casting with numpy.
+
+    Triangles are sorted along a Morton curve and grouped `leaf_size` at a
+    time into the leaves of a complete binary tree, whose node bounds are
+    reduced level by level. Rays are traversed breadth first, and the leaves
+    a ray reaches are then tested in order of distance until no closer leaf
+    is left.
+    """
+
+    def __init__(self, vertices: np.ndarray, faces: np.ndarray, leaf_size: int = 8):
+        vertices = np.asarray(vertices, dtype=np.float64)
+        faces = np.asarray(faces, dtype=np.int64)
+        triangles = vertices[faces]
+        self.v0 = triangles[:, 0]
+        self.e1 = triangles[:, 1] - triangles[:, 0]
+        self.e2 = triangles[:, 2] - triangles[:, 0]
+
+        order = np.argsort(_morton_codes(triangles.mean(axis=1)), kind="stable")
+        num_leaves = max(1, -(-len(faces) // leaf_size))
+        num_leaves = 1 << int(np.ceil(np.log2(num_leaves)))
+        leaf_faces = np.full(num_leaves * leaf_size, -1, dtype=np.int64)
+        leaf_faces[: len(order)] = order
+        self.leaf_faces = leaf_faces.reshape(num_leaves, leaf_size)
+
+        # empty slots / leaves get inverted bounds, see `_intersect_first`
+        valid = self.leaf_faces >= 0
+        index = np.where(valid, self.leaf_faces, 0)
+        lo = np.where(valid[..., None], triangles.min(axis=1)[index], np.inf)
+        hi = np.where(valid[..., None], triangles.max(axis=1)[index], -np.inf)
+        levels = [(lo.min(axis=1), hi.max(axis=1))]
+        while len(levels[0][0]) > 1:
+            lo, hi = levels[0]
+            levels.insert(
+                0,
+                (
+                    np.minimum(lo[0::2], lo[1::2]),
+                    np.maximum(hi[0::2], hi[1::2]),
+                ),
+            )
+        self.levels = levels
+
+    @staticmethod
+    def _slab(origins, inv_directions, lo, hi):
+        # nan (0 * inf, ray in the plane of a side) is ignored by fmax / fmin
+        with np.errstate(invalid="ignore"):
+            t0 = (lo - origins) * inv_directions
+            t1 = (hi - origins) * inv_directions
+        near, far = np.minimum(t0, t1), np.maximum(t0, t1)
+        tnear = np.fmax(np.fmax(near[:, 0], near[:, 1]), near[:, 2])
+        tfar = np.fmin(np.fmin(far[:, 0], far[:, 1]), far[:, 2])
+        return tnear, tfar
+
+    def _triangles(self, origins, directions, face_ids, eps=1e-9):
+        # Moller-Trumbore, returns the hit distance or inf
+        e1, e2 = self.e1[face_ids], self.e2[face_ids]
+        p = np.cross(directions, e2)
+        det = np.einsum("ij,ij->i", e1, p)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_det = 1.0 / det
+            s = origins - self.v0[face_ids]
+            u = np.einsum("ij,ij->i", s, p) * inv_det
+            q = np.cross(s, e1)
+            v = np.einsum("ij,ij->i", directions, q) * inv_det
+            t = np.einsum("ij,ij->i", e2, q) * inv_det
+            hit = (np.abs(det) > eps) & (u >= -eps) & (v >= -eps) & (u + v <= 1 + eps)
+            hit &= t > eps
+        return np.where(hit, t, np.inf)
+
+    def intersect_first(
+        self, origins: np.ndarray, directions: np.ndarray, max_rays: int = 1 << 16
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Closest hit of each ray.
+
+        Args:
+            origins (np.ndarray): (N, 3) ray origins.
+            directions (np.ndarray): (N, 3) ray directions.
+            max_rays (int): Rays traversed at once, bounds the memory.
+
+        Returns:
+            (np.ndarray, np.ndarray): (N,) index of the face hit first, -1 on
+                a miss, and (N,) distance along the ray, inf on a miss.
+        """
+        origins = np.asarray(origins, dtype=np.float64)
+        directions = np.asarray(directions, dtype=np.float64)
+        face_ids = np.full(len(origins), -1, dtype=np.int64)
+        distances = np.full(len(origins), np.inf)
+        for start in range(0, len(origins), max_rays):
+            end = start + max_rays
+            face_ids[start:end], distances[start:end] = self._intersect_first(
+                origins[start:end], directions[start:end]
+            )
+        return face_ids, distances
+
+    def _intersect_first(self, origins, directions):
+        num_rays = len(origins)
+        with np.errstate(divide="ignore"):
+            inv_directions = 1.0 / directions
+
+        # broad phase: (ray, node) pairs whose boxes are hit, level by level
+        rays = np.arange(num_rays)
+        nodes = np.zeros(num_rays, dtype=np.int64)
+        for depth, (lo, hi) in enumerate(self.levels):
+            tnear, tfar = self._slab(
+                origins[rays], inv_directions[rays], lo[nodes], hi[nodes]
+            )
+            # lo <= hi: the slab test alone would hit an empty (inverted) box
+            hit = (tnear <= tfar) & (tfar >= 0) & (lo[nodes, 0] <= hi[nodes, 0])
+            rays, nodes, tnear = rays[hit], nodes[hit], tnear[hit]
+            if depth + 1 < len(self.levels):
+                rays = np.repeat(rays, 2)
+                nodes = (nodes[:, None] * 2 + np.arange(2)).reshape(-1)
+
+        # narrow phase: leaves of each ray from near to far
+        order = np.lexsort((tnear, rays))
+        rays, nodes, tnear = rays[order], nodes[order], tnear[order]
+        rank = np.arange(len(rays)) - np.searchsorted(rays, rays, side="left")
+        # group the pairs by rank: the r-th closest leaf of every ray
+        order = np.argsort(rank, kind="stable")
+        rays, nodes, tnear = rays[order], nodes[order], tnear[order]
+        bounds = np.searchsorted(rank[order], np.arange(rank.max() + 2 if len(rank) else 1))
+
+        best_t = np.full(num_rays, np.inf)
+        best_face = np.full(num_rays, -1, dtype=np.int64)
+        leaf_size = self.leaf_faces.shape[1]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            select = slice(start, end)
+            keep = tnear[select] < best_t[rays[select]]
+            if not keep.any():
+                # leaves further down every list are further away as well
+                break
+            pair_rays = np.repeat(rays[select][keep], leaf_size)
+            pair_faces = self.leaf_faces[nodes[select][keep]].reshape(-1)
+            valid = pair_faces >= 0
+            pair_rays, pair_faces = pair_rays[valid], pair_faces[valid]
+            t = self._triangles(origins[pair_rays], directions[pair_rays], pair_faces)
+            closer = t < best_t[pair_rays]
+            pair_rays, pair_faces, t = pair_rays[closer], pair_faces[closer], t[closer]
+            order = np.lexsort((t, pair_rays))
+            pair_rays, pair_faces, t = pair_rays[order], pair_faces[order], t[order]
+            _, first_hit = np.unique(pair_rays, return_index=True)
+            best_t[pair_rays[first_hit]] = t[first_hit]
+            best_face[pair_rays[first_hit]] = pair_faces[first_hit]
+        return best_face, best_t
+
+
+def _camera_rays(origin: np.ndarray, resolution: int, fov: float) -> Tuple[np.ndarray, np.ndarray]:
+    # pinhole rays through the pixel centers of a camera looking at the
+    # origin with z up, the same camera as the rasterized views
+    forward = -origin / np.linalg.norm(origin)
+    right = np.cross(forward, [0.0, 0.0, 1.0])
+    if np.linalg.norm(right) < 1e-8:
+        right = np.array([1.0, 0.0, 0.0])
+    right = right / np.linalg.norm(right)
+    up = np.cross(right, forward)
+    s = ((np.arange(resolution) + 0.5) / resolution * 2 - 1) * np.tan(fov / 2)
+    sx, sy = np.meshgrid(s, -s, indexing="xy")
+    directions = (
+        forward[None] + sx.reshape(-1, 1) * right[None] + sy.reshape(-1, 1) * up[None]
+    )
+    return np.broadcast_to(origin, directions.shape), directions
+
+
+def _visible_faces_bvh(bvh, origins, num_faces, resolution, fov):
+    seen = np.zeros((len(origins), num_faces), dtype=bool)
+    for i, origin in enumerate(origins):
+        face_ids, _ = bvh.intersect_first(*_camera_rays(origin, resolution, fov))
+        seen[i, face_ids[face_ids >= 0]] = True
+    return seen
+
+
+def _visible_faces_nvdiffrast(rastctx, verts, faces, origins, resolution, fov):
+    import utils3d
+
+    origins = torch.tensor(origins, dtype=torch.float32, device=verts.device)
+    fov = torch.deg2rad(torch.tensor(fov, device=verts.device))
+    projection = utils3d.torch.perspective_from_fov_xy(fov, fov, 1, 3)
+    views = utils3d.torch.view_look_at(
+        origins,
+        torch.zeros_like(origins),
+        torch.tensor([0, 0, 1], dtype=torch.float32, device=verts.device).expand_as(
+            origins
+        ),
+    )
+    buffers = utils3d.torch.rasterize_triangle_faces(
+        rastctx,
+        verts[None].expand(len(origins), -1, -1),
+        faces,
+        resolution,
+        resolution,
+        view=views,
+        projection=projection,
+    )
+    # face_id is 1-based, 0 is the background
+    face_id = torch.where(
+        buffers["mask"] > 0.95, buffers["face_id"].long(), torch.zeros_like(buffers["face_id"]).long()
+    )
+    seen = torch.zeros(
+        len(origins), faces.shape[0] + 1, dtype=torch.bool, device=verts.device
+    )
+    seen.scatter_(1, face_id.reshape(len(origins), -1), True)
+    return seen[:, 1:]
+
+
+def resolve_visibility_backend(backend: str = "auto") -> str:
+    """'auto' is nvdiffrast on CUDA when utils3d is available, otherwise the CPU BVH."""
+    if backend not in VISIBILITY_BACKENDS:
+        raise ValueError(
+            f"unknown visibility backend {backend!r}, expected one of {VISIBILITY_BACKENDS}"
+        )
+    if backend != "auto":
+        return backend
+    if torch.cuda.is_available():
+        try:
+            import utils3d  # noqa: F401
+
+            return "nvdiffrast"
+        except ImportError:
+            pass
+    return "bvh"
+
+
+@torch.no_grad()
+def face_visibility(
+    verts: torch.Tensor,
+    faces: torch.Tensor,
+    num_views: int = 1000,
+    resolution: int = 1024,
+    backend: str = "auto",
+    chunk_size: Optional[int] = None,
+    convergence_tol: Optional[float] = None,
+    convergence_window: int = 64,
+    radius: float = 2.0,
+    fov: float = 40.0,
+    verbose: bool = False,
+) -> Tuple[torch.Tensor, int]:
+    """
+    Fraction of views from which each face of a mesh is visible.
+
+    Views are processed `chunk_size` at a time (one batched rasterization per
+    chunk with nvdiffrast). With `convergence_tol` set, the views stop as
+    soon as a window of `convergence_window` views makes at most
+    `convergence_tol * F` faces visible for the first time: the set of never
+    seen faces is what drives `_fill_holes`, the visibility fractions are
+    only compared to coarse thresholds.
+
+    Args:
+        verts (torch.Tensor): Vertices of the mesh. Shape (V, 3).
+        faces (torch.Tensor): Faces of the mesh. Shape (F, 3).
+        num_views (int): View budget.
+        resolution (int): Resolution of each view.
+        backend (str): 'nvdiffrast' (CUDA rasterization), 'bvh' (CPU ray
+            casting, see TriangleBVH) or 'auto'.
+        chunk_size (int): Views per batch, defaults to 8 for nvdiffrast and 1
+            for the BVH.
+        convergence_tol (float): Early termination tolerance, None to always
+            use every view.
+        convergence_window (int): Views between two convergence checks.
+        verbose (bool): Whether to print progress.
+
+    Returns:
+        (torch.Tensor, int): (F,) visibility in [0, 1] on the device of
+            `verts`, and the number of views used.
+    """
+    backend = resolve_visibility_backend(backend)
+    if chunk_size is None:
+        chunk_size = 8 if backend == "nvdiffrast" else 1
+    num_faces = faces.shape[0]
+    origins = sphere_camera_origins(num_views, radius)
+
+    if backend == "nvdiffrast":
+        import utils3d
+
+        rastctx = utils3d.torch.RastContext(backend="cuda")
+        counts = torch.zeros(num_faces, dtype=torch.int32, device=verts.device)
+    else:
+        bvh = TriangleBVH(verts.cpu().numpy(), faces.cpu().numpy())
+        counts = np.zeros(num_faces, dtype=np.int64)
+
+    views_used = 0
+    checkpoint_views, checkpoint_visible = 0, 0
+    for start in tqdm(
+        range(0, num_views, chunk_size),
+        disable=not verbose,
+        desc="Visibility",
+    ):
+        chunk = origins[start : start + chunk_size]
+        if backend == "nvdiffrast":
+            seen = _visible_faces_nvdiffrast(
+                rastctx, verts, faces, chunk, resolution, fov
+            )
+            counts += seen.sum(dim=0, dtype=torch.int32)
+        else:
+            seen = _visible_faces_bvh(bvh, chunk, num_faces, resolution, fov)
+            counts += seen.sum(axis=0)
+        views_used += len(chunk)
+
+        if (
+            convergence_tol is not None
+            and views_used - checkpoint_views >= convergence_window
+        ):
+            visible = int((counts > 0).sum())
+            if (
+                checkpoint_views > 0
+                and visible - checkpoint_visible <= convergence_tol * num_faces
+            ):
+                if verbose:
+                    tqdm.write(f"Visibility converged after {views_used} views")
+                break
+            checkpoint_views, checkpoint_visible = views_used, visible
+
+    if backend != "nvdiffrast":
+        counts = torch.from_numpy(counts).to(verts.device)
+    return counts.float() / views_used, views_used
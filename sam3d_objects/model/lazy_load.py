@@ -0,0 +1,143 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""Fast-startup model loading.
+
+Models are built with their parameters on the meta device (no allocation,
+no random init), then materialized straight from a memory-mapped
+.safetensors file into their final device and dtype. Only the tensors a
+model actually uses are read, e.g. the generator half of a checkpoint that
+also holds the condition embedder.
+"""
+import resource
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import torch
+from loguru import logger
+from safetensors import safe_open
+
+
+@contextmanager
+def init_empty_weights():
+    """Create every parameter registered in this context on the meta device.
+
+    Buffers are created normally: they are often computed in `__init__`
+    (positional embeddings, rope frequencies) and missing from checkpoints.
+    """
+    register_parameter = torch.nn.Module.register_parameter
+
+    def register_empty_parameter(module, name, param):
+        register_parameter(module, name, param)
+        if param is not None:
+            module._parameters[name] = torch.nn.Parameter(
+                param.to("meta"), requires_grad=param.requires_grad
+            )
+
+    torch.nn.Module.register_parameter = register_empty_parameter
+    try:
+        yield
+    finally:
+        torch.nn.Module.register_parameter = register_parameter
+
+
+def load_safetensors_into_empty_model(
+    model: torch.nn.Module,
+    ckpt_path: str,
+    device=None,
+    state_dict_fn: Optional[Callable[[Dict], Dict]] = None,
+) -> List[str]:
+    """Materialize `model`'s state from a memory-mapped safetensors file.
+
+    Each tensor is read once and moved straight to `device` (default: where
+    the model's tensor lives, CPU for meta ones) in the dtype the model was
+    built with, like `load_state_dict` would copy it.
+
+    Args:
+        model: a model built under `init_empty_weights`.
+        ckpt_path: path to a .safetensors file.
+        device: target device of the materialized tensors.
+        state_dict_fn: a key-only transform of the checkpoint state dict
+            (filter / rename, see model/io.py); it is applied to the key
+            names, so no tensor is read before it is known to be needed.
+
+    Returns:
+        list: state dict entries of `model` that the checkpoint does not
+        provide and that are still on the meta device.
+    """
+    with safe_open(ckpt_path, framework="pt", device="cpu") as f:
+        key_map = {key: key for key in f.keys()}
+        if state_dict_fn is not None:
+            key_map = state_dict_fn(key_map)
+
+        state_dict, missing = {}, []
+        for name, target in model.state_dict(keep_vars=True).items():
+            if name not in key_map:
+                if target.is_meta:
+                    missing.append(name)
+                continue
+            tensor = f.get_tensor(key_map[name])
+            if device is not None:
+                target_device = device
+            else:
+                target_device = "cpu" if target.is_meta else target.device
+            dtype = target.dtype if tensor.is_floating_point() else tensor.dtype
+            state_dict[name] = tensor.to(device=target_device, dtype=dtype)
+
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    return missing
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+@contextmanager
+def measure_load(name: str, report: Optional[Dict[str, Dict]] = None):
+    """Log (and record in `report[name]`) how long loading `name` took and
+    the process' peak RSS (and CUDA memory) afterwards."""
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    yield
+    stats = {
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_increase_mb": _peak_rss_mb() - rss_before,
+    }
+    if torch.cuda.is_available():
+        stats["peak_cuda_mb"] = torch.cuda.max_memory_allocated() / 2**20
+    if report is not None:
+        report[name] = stats
+    logger.info(
+        "Loaded {} in {:.2f}s | peak RSS {:.0f} MB (+{:.0f} MB)",
+        name,
+        stats["seconds"],
+        stats["peak_rss_mb"],
+        stats["peak_rss_increase_mb"],
+    )
+
+
+class LazyModuleDict(torch.nn.ModuleDict):
+    """ModuleDict whose entries can be registered as loaders, run on first
+    access. Entries that are not loaded yet are not part of `keys()`,
+    `state_dict()` or `.to()`; the loader is responsible for placing them."""
+
+    def __init__(self, modules=None):
+        super().__init__(modules)
+        self._loaders = {}
+
+    def add_lazy(self, key: str, loader: Callable[[], Optional[torch.nn.Module]]):
+        self._loaders[key] = loader
+
+    def is_loaded(self, key: str) -> bool:
+        return key not in self._loaders
+
+    def __getitem__(self, key: str):
+        loader = self._loaders.pop(key, None)
+        if loader is not None:
+            self[key] = loader()
+        return super().__getitem__(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._loaders or super().__contains__(key)
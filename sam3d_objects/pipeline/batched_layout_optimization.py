@@ -0,0 +1,399 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Render-and-compare layout optimization of several pose hypotheses at once.
+
+`run_render_compare` and `run_gs_render_compare_rgb_mask` optimize a single
+pose, starting from the identity. When the pose is ambiguous (a symmetric-
+looking object seen from a flipped side, an uncertain scale), that start can
+sit in the wrong basin. Here N hypotheses (`pose_hypotheses`) are rendered as
+one batch and optimized together with the same two-stage Adam schedule and
+loss. Every `prune_every` steps the worse half is dropped, and the best
+remaining pose is returned.
+
+A pose is, as in layout_post_optimization_utils, a delta (quat, translation,
+scale) applied about `center`:
+
+    p -> (p - center) * scale @ R(quat)^T + center + translation
+
+Rendering goes through a `render(quat, translation, scale)` callable, for N
+poses, returning {"mask": (N, H, W)} and, for RGB supervision,
+{"rgb": (N, 3, H, W)}:
+
+- `mesh_hypotheses_renderer`: one pytorch3d mesh batch;
+- `gaussian_hypotheses_renderer`: one render per hypothesis, of transformed
+  copies of the Gaussian (`transformed_gaussian`), out of place instead of
+  the in-place transform + backup / restore of the single-pose path;
+- `SoftPointRenderer`: a pure-torch differentiable stand-in, for tests and
+  CPU benchmarks (scripts/benchmark_layout_hypotheses.py).
+"""
+import copy
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn.functional as F
+
+# as in run_render_compare and run_gs_render_compare_rgb_mask
+MESH_LOSS_WEIGHTS = {"mask": 200, "reg_q": 0.1, "reg_t": 0.05, "reg_s": 0.05}
+GS_LOSS_WEIGHTS = {"rgb": 10, "mask": 10, "reg_q": 0.1, "reg_t": 0.05, "reg_s": 0.05}
+# (optimized parameters, iterations, learning rate) of each stage
+STAGES = (
+    (("translation", "scale"), 5, 1e-2),
+    (("quat", "translation", "scale"), 25, 5e-3),
+)
+
+
+def quaternion_to_matrix(quat: torch.Tensor) -> torch.Tensor:
+    """Rotation matrices (..., 3, 3) of quaternions (..., 4), real part first (as pytorch3d)."""
+    r, i, j, k = quat.unbind(-1)
+    two_s = 2.0 / (quat * quat).sum(-1)
+    matrix = torch.stack(
+        (
+            1 - two_s * (j * j + k * k),
+            two_s * (i * j - k * r),
+            two_s * (i * k + j * r),
+            two_s * (i * j + k * r),
+            1 - two_s * (i * i + k * k),
+            two_s * (j * k - i * r),
+            two_s * (i * k - j * r),
+            two_s * (j * k + i * r),
+            1 - two_s * (i * i + j * j),
+        ),
+        -1,
+    )
+    return matrix.reshape(quat.shape[:-1] + (3, 3))
+
+
+def quaternion_multiply(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    """Product of quaternions, with a non-negative real part (as pytorch3d)."""
+    aw, ax, ay, az = a.unbind(-1)
+    bw, bx, by, bz = b.unbind(-1)
+    product = torch.stack(
+        (
+            aw * bw - ax * bx - ay * by - az * bz,
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+        ),
+        -1,
+    )
+    return torch.where(product[..., :1] < 0, -product, product)
+
+
+def transform_points(points, center, quat, translation, scale) -> torch.Tensor:
+    """(V, 3) `points` under each of N poses (quat (N, 4), translation (N, 3), scale (N,)): (N, V, 3)."""
+    rotation = quaternion_to_matrix(F.normalize(quat, dim=-1))
+    scaled = (points - center) * scale[:, None, None]
+    return scaled @ rotation.transpose(1, 2) + center + translation[:, None]
+
+
+def pose_hypotheses(
+    num_rotations: int = 1,
+    scales: Sequence[float] = (1.0,),
+    axis: Sequence[float] = (0.0, 1.0, 0.0),
+    device=None,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Starting (quat (N, 4), scale (N,)) of N = num_rotations * len(scales)
+    hypotheses: rotations evenly spaced about `axis` (y, up in the pytorch3d
+    frame the layout is optimized in) times the candidate scales. With
+    scales[0] = 1 the first hypothesis is the identity, the single-pose start.
+    """
+    angles = torch.arange(num_rotations, dtype=torch.float32) * (2 * math.pi / num_rotations)
+    axis = F.normalize(torch.tensor(axis, dtype=torch.float32), dim=0)
+    quats = torch.cat([torch.cos(angles / 2)[:, None], torch.sin(angles / 2)[:, None] * axis], 1)
+    scales = torch.tensor(scales, dtype=torch.float32)
+    quats = quats.repeat_interleave(len(scales), 0)
+    scales = scales.repeat(num_rotations)
+    return quats.to(device), scales.to(device)
+
+
+def hypotheses_loss(rendered, mask, loss_weights, quat, translation, scale, start, rgb=None):
+    """
+    Loss (N,) of each hypothesis: `compute_loss`, or `compute_gs_loss_rgb_mask`
+    when `loss_weights` has "rgb", with the pose regularized towards the
+    hypothesis' `start` (quat, translation, scale) rather than the identity.
+    """
+    target = mask.reshape(mask.shape[-2:])
+    loss = loss_weights["mask"] * ((rendered["mask"] - target) ** 2).flatten(1).mean(1)
+    if "rgb" in loss_weights and rgb is not None:
+        valid = target > 0.5
+        if valid.any():
+            error = (rendered["rgb"] - rgb.reshape(rgb.shape[-3:]))[:, :, valid]
+            loss = loss + loss_weights["rgb"] * (error**2).flatten(1).mean(1)
+    start_quat, start_translation, start_scale = start
+    loss_reg_q = ((F.normalize(quat, dim=-1) - F.normalize(start_quat, dim=-1)) ** 2).mean(-1)
+    loss_reg_t = ((translation - start_translation) ** 2).sum(-1)
+    loss_reg_s = (scale - start_scale) ** 2
+    return (
+        loss
+        + loss_weights["reg_q"] * loss_reg_q
+        + loss_weights["reg_t"] * loss_reg_t
+        + loss_weights["reg_s"] * loss_reg_s
+    )
+
+
+class _RowAdam:
+    """
+    `torch.optim.Adam` (default betas and eps) over (N, ...) parameters, with
+    N independent rows: `step(rows)` only updates (and counts a step for) the
+    rows selected, the others keep their value and moments.
+    """
+
+    def __init__(self, params: List[torch.Tensor], lr: float, betas=(0.9, 0.999), eps=1e-8):
+        self.params, self.lr, self.betas, self.eps = params, lr, betas, eps
+        self.exp_avg = [torch.zeros_like(p) for p in params]
+        self.exp_avg_sq = [torch.zeros_like(p) for p in params]
+        self.steps = torch.zeros(params[0].shape[0], device=params[0].device)
+
+    @torch.no_grad()
+    def step(self, rows: torch.Tensor):
+        beta1, beta2 = self.betas
+        self.steps += rows
+        for param, exp_avg, exp_avg_sq in zip(self.params, self.exp_avg, self.exp_avg_sq):
+            shape = (-1,) + (1,) * (param.dim() - 1)
+            selected = rows.view(shape)
+            grad = param.grad
+            exp_avg.copy_(torch.where(selected, exp_avg.lerp(grad, 1 - beta1), exp_avg))
+            exp_avg_sq.copy_(
+                torch.where(selected, exp_avg_sq * beta2 + grad * grad * (1 - beta2), exp_avg_sq)
+            )
+            steps = self.steps.clamp(min=1).view(shape)
+            step_size = self.lr / (1 - beta1**steps)
+            denom = exp_avg_sq.sqrt() / (1 - beta2**steps).sqrt() + self.eps
+            param.sub_(torch.where(selected, step_size * exp_avg / denom, 0))
+
+
+@dataclass
+class BatchedLayoutResult:
+    """The best pose, as returned by `run_render_compare`, and how the search went."""
+
+    quat: torch.Tensor  # (4,) normalized
+    translation: torch.Tensor  # (3,)
+    scale: torch.Tensor  # ()
+    R: torch.Tensor  # (3, 3)
+    index: int  # of the best hypothesis
+    losses: torch.Tensor  # (N,) last loss of each hypothesis, pruned ones included
+    alive: torch.Tensor  # (N,) bool, not pruned
+    steps: int  # batched optimizer steps
+    renders: int  # hypothesis renders, the cost next to the single-pose path
+    # (seconds since the start, hypotheses rendered, best loss) after each step
+    history: List[Tuple[float, int, float]] = field(default_factory=list)
+
+
+def _prune(losses, alive, keep_fraction, min_keep):
+    count = int(alive.sum())
+    keep = max(min_keep, math.ceil(count * keep_fraction))
+    if keep >= count:
+        return alive
+    order = torch.where(alive, losses, math.inf).argsort()
+    kept = torch.zeros_like(alive)
+    kept[order[:keep]] = True
+    return kept
+
+
+def run_batched_render_compare(
+    render: Callable[..., Dict[str, torch.Tensor]],
+    mask: torch.Tensor,
+    quat: torch.Tensor,
+    translation: Optional[torch.Tensor] = None,
+    scale: Optional[torch.Tensor] = None,
+    loss_weights: Dict[str, float] = MESH_LOSS_WEIGHTS,
+    rgb: Optional[torch.Tensor] = None,
+    stages=STAGES,
+    prune_every: int = 5,
+    keep_fraction: float = 0.5,
+    min_keep: int = 1,
+    tol: float = 1e-5,
+) -> BatchedLayoutResult:
+    """
+    Optimize N pose hypotheses starting at quat (N, 4), translation (N, 3)
+    (default 0) and scale (N,) (default 1) against `mask` (and `rgb`).
+
+    Each hypothesis follows the single-pose schedule: a fresh Adam per
+    stage, and the stage ends for it once its loss changes by less than
+    `tol`, while the others go on. Every `prune_every` steps, only the best
+    `keep_fraction` (at least `min_keep`) of the hypotheses left is kept;
+    `prune_every=0` never prunes. One hypothesis follows `run_render_compare`
+    step for step.
+    """
+    device = quat.device
+    count = quat.shape[0]
+    if translation is None:
+        translation = torch.zeros(count, 3, device=device)
+    if scale is None:
+        scale = torch.ones(count, device=device)
+    start = (quat.detach().clone(), translation.detach().clone(), scale.detach().clone())
+    params = {
+        "quat": start[0].clone().requires_grad_(),
+        "translation": start[1].clone().requires_grad_(),
+        "scale": start[2].clone().requires_grad_(),
+    }
+    alive = torch.ones(count, dtype=torch.bool, device=device)
+    losses = torch.full((count,), math.inf, device=device)
+    prev_losses = torch.full((count,), math.nan, device=device)
+    history, steps, renders = [], 0, 0
+    started = time.perf_counter()
+
+    def pose(rows):
+        return [params[name][rows] for name in ("quat", "translation", "scale")]
+
+    for names, iterations, lr in stages:
+        optimizer = _RowAdam([params[name] for name in names], lr)
+        running = alive.clone()
+        for _ in range(iterations):
+            rows = running.nonzero().squeeze(1)
+            if rows.numel() == 0:
+                break
+            for param in params.values():
+                param.grad = None
+            rows_quat, rows_translation, rows_scale = pose(rows)
+            loss = hypotheses_loss(
+                render(rows_quat, rows_translation, rows_scale),
+                mask,
+                loss_weights,
+                rows_quat,
+                rows_translation,
+                rows_scale,
+                [value[rows] for value in start],
+                rgb,
+            )
+            loss.sum().backward()
+            optimizer.step(running)
+            steps, renders = steps + 1, renders + rows.numel()
+
+            loss = loss.detach()
+            converged = (loss - prev_losses[rows]).abs() < tol
+            prev_losses[rows] = losses[rows] = loss
+            running[rows[converged]] = False
+            if prune_every and steps % prune_every == 0:
+                alive = _prune(losses, alive, keep_fraction, min_keep)
+                running &= alive
+            best_loss = float(torch.where(alive, losses, math.inf).min())
+            history.append((time.perf_counter() - started, rows.numel(), best_loss))
+
+    rows = alive.nonzero().squeeze(1)
+    if rows.numel() == 1:
+        best = int(rows[0])
+    else:
+        # the last losses predate the last step: compare the final poses
+        with torch.no_grad():
+            rows_pose = pose(rows)
+            final = hypotheses_loss(
+                render(*rows_pose), mask, loss_weights, *rows_pose,
+                [value[rows] for value in start], rgb,
+            )
+        losses[rows] = final
+        renders += rows.numel()
+        best = int(rows[final.argmin()])
+
+    best_quat, best_translation, best_scale = (value.detach() for value in pose(best))
+    best_quat = F.normalize(best_quat, dim=-1)
+    return BatchedLayoutResult(
+        quat=best_quat,
+        translation=best_translation,
+        scale=best_scale,
+        R=quaternion_to_matrix(best_quat),
+        index=best,
+        losses=losses,
+        alive=alive,
+        steps=steps,
+        renders=renders,
+        history=history,
+    )
+
+
+def mesh_hypotheses_renderer(mesh, center, renderer):
+    """`render` of `mesh` (a pytorch3d Meshes of one mesh) with the silhouette `renderer`."""
+    from pytorch3d.structures import Meshes
+
+    verts, faces = mesh.verts_packed(), mesh.faces_packed()
+
+    def render(quat, translation, scale):
+        points = transform_points(verts, center, quat, translation, scale)
+        count = points.shape[0]
+        meshes = Meshes(
+            verts=list(points), faces=[faces] * count, textures=mesh.textures.extend(count)
+        )
+        return {"mask": renderer(meshes)[..., 3]}
+
+    return render
+
+
+def transformed_gaussian(gaussian, center, quat, translation, scale, opencv=False):
+    """
+    A copy of `gaussian` under one pose, as `apply_gs_transform_inplace`, then
+    `flip_coords_pytorch3d_to_opencv` if `opencv`. The copy is shallow: only
+    the positions, scalings and rotations are new (and differentiable in the
+    pose); `gaussian` itself is left as it is.
+    """
+    quat = F.normalize(quat, dim=-1)
+    points = transform_points(gaussian.get_xyz, center, quat[None], translation[None], scale[None])[0]
+    rotations = gaussian.get_rotation
+    rotations = quaternion_multiply(quat.expand_as(rotations), rotations)
+    if opencv:
+        # flip x and y: a half turn about z
+        points = points * points.new_tensor([-1.0, -1.0, 1.0])
+        half_turn = rotations.new_tensor([0.0, 0.0, 0.0, 1.0])
+        rotations = quaternion_multiply(half_turn.expand_as(rotations), rotations)
+
+    transformed = copy.copy(gaussian)
+    transformed.from_xyz(points)
+    transformed._scaling = gaussian._scaling + torch.log(scale)
+    transformed.from_rotation(rotations)
+    return transformed
+
+
+def gaussian_hypotheses_renderer(gaussian, center, renderer, intrinsics):
+    """`render` of `gaussian` with a `GaussianRenderer`, one hypothesis at a time."""
+    from sam3d_objects.pipeline.layout_post_optimization_utils import (
+        extract_mask_from_gs_rendering,
+        extract_rgb_from_gs_rendering,
+    )
+
+    extrinsics = torch.eye(4, device=center.device, dtype=torch.float32)
+
+    def render(quat, translation, scale):
+        masks, rgbs = [], []
+        for pose in zip(quat, translation, scale):
+            rendered = renderer.render(
+                transformed_gaussian(gaussian, center, *pose, opencv=True),
+                extrinsics,
+                intrinsics,
+            )
+            masks.append(extract_mask_from_gs_rendering(rendered, mode="optimization"))
+            rgbs.append(extract_rgb_from_gs_rendering(rendered))
+        return {"mask": torch.stack(masks), "rgb": torch.stack(rgbs)}
+
+    return render
+
+
+class SoftPointRenderer:
+    """
+    Differentiable silhouettes of `points` (V, 3), pure torch: each point,
+    projected with the pinhole `intrinsics` (3, 3, in pixels; z forward),
+    splats an isotropic Gaussian of `sigma` pixels and the alpha is
+    1 - exp(-sum). A stand-in for the rasterizers in tests and CPU
+    benchmarks; its cost is N * V * H * W.
+    """
+
+    def __init__(self, points, center, intrinsics, image_size, sigma=1.0):
+        self.points, self.center, self.intrinsics = points, center, intrinsics
+        self.sigma = sigma
+        height, width = image_size
+        rows, columns = torch.meshgrid(
+            torch.arange(height, dtype=points.dtype, device=points.device) + 0.5,
+            torch.arange(width, dtype=points.dtype, device=points.device) + 0.5,
+            indexing="ij",
+        )
+        self.pixels = torch.stack([columns, rows], -1)  # (H, W, 2), as (u, v)
+
+    def __call__(self, quat, translation, scale):
+        points = transform_points(self.points, self.center, quat, translation, scale)
+        projected = points @ self.intrinsics.T
+        uv = projected[..., :2] / projected[..., 2:].clamp(min=1e-6)
+        distances = ((uv[:, :, None, None] - self.pixels) ** 2).sum(-1)  # (N, V, H, W)
+        density = torch.exp(-distances / (2 * self.sigma**2)).sum(1)
+        return {"mask": 1 - torch.exp(-density)}
@@ -0,0 +1,336 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Torch ICP, on the device the point clouds are on, batched over clouds.
+
+`icp` follows `open3d.pipelines.registration.registration_icp`: the same
+loop, correspondences (the nearest target point within `threshold` of each
+transformed source point), point-to-point (Umeyama, no scaling) or
+point-to-plane (linearized, open3d's angle convention) updates, fitness /
+inlier RMSE and relative convergence criteria. With backend="torch",
+`run_ICP` and `run_gs_ICP` use it instead of copying the clouds to the host
+for open3d; open3d stays their default until the two are shown to agree on
+real layouts (tests/test_icp.py compares them when open3d is installed).
+
+Nearest neighbors come from a voxel grid of cell size `threshold`: the
+target points are sorted by (cloud, cell) key. A source point's
+correspondence can only be in the 27 cells around its own, so the search is
+exact and costs the points of those cells rather than the whole target. The
+cells are scanned nearest first (the own cell, then across faces, edges,
+corners), and a cell farther than the nearest point found so far is skipped.
+Several clouds (objects, pose hypotheses) are packed into one set of tensors
+with a cloud index, and every step is one batched op over all of them.
+"""
+import itertools
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Union
+
+import torch
+
+# distances computed per chunk of query points, bounds the memory of the searches
+CANDIDATE_BUDGET = 2**24
+
+# the cells around a point's own, nearest first: the own cell, then those
+# across a face, an edge and a corner of it
+_CELL_PASSES = [
+    [offset for offset in itertools.product((-1, 0, 1), repeat=3) if sum(map(abs, offset)) == nonzero]
+    for nonzero in range(4)
+]
+
+
+@dataclass
+class ICPResult:
+    """As open3d's RegistrationResult, per cloud (a leading batch dim for batched calls)."""
+
+    transformation: torch.Tensor  # (4, 4), acting on column vectors: R @ p + t
+    fitness: torch.Tensor  # matched fraction of the source points
+    inlier_rmse: torch.Tensor  # RMS distance of the matches
+    iterations: torch.Tensor  # updates applied before convergence
+
+
+class VoxelGridIndex:
+    """
+    Nearest neighbors within `max_distance` among `points` (N, 3) of several
+    clouds (`batch` (N,), cloud indices), in cells of size `max_distance`.
+    """
+
+    def __init__(self, points: torch.Tensor, batch: torch.Tensor, max_distance: float):
+        self.points, self.max_distance = points, max_distance
+        cells = torch.floor(points / max_distance).long()
+        # one empty cell of margin on each side, so neighbor keys never wrap
+        self.origin = cells.min(0)[0] - 1
+        cells = cells - self.origin
+        self.dims = cells.max(0)[0] + 2
+        self.keys, self.order = self._keys(batch, cells).sort()
+        self.sorted_points = points[self.order]
+        # every pass's cell offsets, as key offsets (keys are linear in the cell),
+        # and which of them lie below / above the own cell on each axis
+        self.passes = []
+        for offsets in _CELL_PASSES:
+            offsets = torch.tensor(offsets, device=points.device)
+            self.passes.append(
+                (
+                    self._keys(0, offsets),
+                    (offsets < 0).T.to(points.dtype),
+                    (offsets > 0).T.to(points.dtype),
+                )
+            )
+        # the point range of every cell, when the grid is small enough to tabulate
+        self.volume = (int(batch.max()) + 1 if batch.numel() else 1) * int(self.dims.prod())
+        self.table = None
+        if self.volume <= CANDIDATE_BUDGET:
+            all_keys = torch.arange(self.volume, device=points.device)
+            self.table = torch.stack(
+                [torch.searchsorted(self.keys, all_keys), torch.searchsorted(self.keys, all_keys, right=True)]
+            )
+
+    def _keys(self, batch, cells):
+        dims = self.dims
+        x, y, z = cells.unbind(-1)
+        return ((batch * dims[0] + x) * dims[1] + y) * dims[2] + z
+
+    def nearest(self, queries: torch.Tensor, batch: torch.Tensor):
+        """
+        Index of the nearest point of the same cloud of each query (N, 3) and
+        its squared distance; -1 and inf when none is within `max_distance`.
+        """
+        count, device = queries.shape[0], queries.device
+        scaled = queries / self.max_distance
+        # the occupied cells are 1 .. dims - 2: a query out of them is more than
+        # max_distance from every point, and its neighbors stay in the grid
+        cells = torch.minimum((torch.floor(scaled).long() - self.origin).clamp(min=1), self.dims - 2)
+        own_keys = self._keys(batch, cells)
+        fraction = scaled - torch.floor(scaled)  # position in the cell, in [0, 1)
+        index = torch.full((count,), -1, dtype=torch.long, device=device)
+        squared = torch.full((count,), float("inf"), dtype=queries.dtype, device=device)
+        # the nearest point found so far bounds which of the farther cells can hold a nearer one
+        for offset_keys, below, above in self.passes:
+            # squared distance of the query to each cell, in cells
+            gap = fraction**2 @ below.to(fraction) + (1 - fraction) ** 2 @ above.to(fraction)
+            bound = squared.clamp(max=self.max_distance**2)
+            reachable = gap * self.max_distance**2 <= bound[:, None] * (1 + 1e-6)
+            query, offset = reachable.nonzero(as_tuple=True)
+            keys = own_keys[query] + offset_keys[offset]
+            if self.table is not None:
+                starts, ends = self.table[:, keys]
+            else:
+                starts = torch.searchsorted(self.keys, keys)
+                ends = torch.searchsorted(self.keys, keys, right=True)
+            counts = ends - starts
+
+            candidates = counts.cumsum(0)
+            begin = 0
+            while begin < len(query):
+                # chunks of cells with at most CANDIDATE_BUDGET candidates (or one cell)
+                limit = (candidates[begin - 1] if begin else 0) + CANDIDATE_BUDGET
+                end = max(begin + 1, int(torch.searchsorted(candidates, limit, right=True)))
+                self._scan(queries, query[begin:end], starts[begin:end], counts[begin:end], index, squared)
+                begin = end
+
+        found = squared <= self.max_distance**2
+        return torch.where(found, index, -1), torch.where(found, squared, float("inf"))
+
+    def _scan(self, queries, query, starts, counts, index, squared):
+        """
+        Update the nearest `index` / `squared` of `queries` with the points of
+        cells, the `counts` sorted points from `starts`, of the queries `query`.
+        """
+        total = int(counts.sum())
+        if total == 0:
+            return
+        device = queries.device
+        # every candidate's position in the sorted points, and its query
+        first = counts.cumsum(0) - counts
+        positions = torch.arange(total, device=device) + torch.repeat_interleave(
+            starts - first, counts, output_size=total
+        )
+        query = torch.repeat_interleave(query, counts, output_size=total)
+        distances = ((queries[query] - self.sorted_points[positions]) ** 2).sum(1)
+
+        best = squared.scatter_reduce(0, query, distances, "amin")
+        # smallest point index among the ties, as a deterministic pick
+        tied = distances == best[query]
+        previous = torch.where((squared == best) & (index >= 0), index, self.points.shape[0])
+        chosen = previous.scatter_reduce(0, query[tied], self.order[positions[tied]], "amin")
+        index.copy_(torch.where(best < float("inf"), chosen, -1))
+        squared.copy_(best)
+
+
+def nearest_neighbors(points: torch.Tensor, k: int) -> torch.Tensor:
+    """Indices (N, k) of the k nearest points of each point (itself included), by chunked cdist."""
+    k = min(k, points.shape[0])
+    chunk_size = max(1, CANDIDATE_BUDGET // points.shape[0])
+    return torch.cat(
+        [
+            torch.cdist(points[start : start + chunk_size], points).topk(k, largest=False).indices
+            for start in range(0, points.shape[0], chunk_size)
+        ]
+    )
+
+
+def estimate_normals(points: torch.Tensor, k: int = 30) -> torch.Tensor:
+    """Unoriented unit normals (N, 3): the least-variance direction of the k nearest neighbors."""
+    neighbors = points[nearest_neighbors(points, k)]  # (N, k, 3)
+    centered = neighbors - neighbors.mean(1, keepdim=True)
+    covariance = centered.transpose(1, 2) @ centered
+    return torch.linalg.eigh(covariance.double())[1][..., 0].to(points.dtype)
+
+
+def _pack(clouds):
+    points = torch.cat(list(clouds))
+    batch = torch.repeat_interleave(
+        torch.arange(len(clouds), device=points.device),
+        torch.tensor([len(cloud) for cloud in clouds], device=points.device),
+    )
+    return points, batch
+
+
+def _segment_sum(values, batch, count):
+    sums = torch.zeros((count,) + values.shape[1:], dtype=values.dtype, device=values.device)
+    return sums.index_add_(0, batch, values)
+
+
+def _point_to_point(source, target, batch, count):
+    """Rigid transforms (count, 4, 4) best aligning the matched pairs (Umeyama, no scaling)."""
+    source, target = source.double(), target.double()
+    matches = _segment_sum(torch.ones_like(source[:, 0]), batch, count)[:, None]
+    source_mean = _segment_sum(source, batch, count) / matches.clamp(min=1)
+    target_mean = _segment_sum(target, batch, count) / matches.clamp(min=1)
+    centered_source = source - source_mean[batch]
+    centered_target = target - target_mean[batch]
+    covariance = _segment_sum(centered_target[:, :, None] * centered_source[:, None], batch, count)
+    u, _, vh = torch.linalg.svd(covariance)
+    sign = torch.ones_like(source_mean)
+    sign[:, 2] = torch.linalg.det(u @ vh).sign()
+    rotation = u @ (sign[:, :, None] * vh)
+    # clouds without matches keep the identity
+    identity = torch.eye(3, dtype=rotation.dtype, device=rotation.device)
+    rotation = torch.where(matches[:, :, None] > 0, rotation, identity)
+    translation = target_mean - (rotation @ source_mean[:, :, None])[..., 0]
+    return _transformation(rotation, translation)
+
+
+def _point_to_plane(source, target, normals, batch, count):
+    """Linearized point-to-plane updates (count, 4, 4), as open3d's estimation."""
+    source, target, normals = source.double(), target.double(), normals.double()
+    jacobian = torch.cat([torch.cross(source, normals, dim=1), normals], 1)  # (M, 6)
+    residual = ((source - target) * normals).sum(1)
+    jtj = _segment_sum(jacobian[:, :, None] * jacobian[:, None], batch, count)
+    jtr = _segment_sum(jacobian * residual[:, None], batch, count)
+    # clouds without matches keep the identity
+    unmatched = (jtj.abs().sum((1, 2)) == 0)[:, None, None]
+    jtj = jtj + torch.eye(6, dtype=jtj.dtype, device=jtj.device) * unmatched
+    update = torch.linalg.solve(jtj, -jtr)
+    alpha, beta, gamma = update[:, 0], update[:, 1], update[:, 2]
+    rotation = _axis_rotation(gamma, 2) @ _axis_rotation(beta, 1) @ _axis_rotation(alpha, 0)
+    return _transformation(rotation, update[:, 3:])
+
+
+def _axis_rotation(angle, axis):
+    cos, sin = torch.cos(angle), torch.sin(angle)
+    first, second = [a for a in range(3) if a != axis]
+    rotation = torch.eye(3, dtype=angle.dtype, device=angle.device).repeat(angle.shape[0], 1, 1)
+    rotation[:, first, first] = cos
+    rotation[:, second, second] = cos
+    # about y the (first, second) = (x, z) plane turns the other way
+    sign = -1 if axis == 1 else 1
+    rotation[:, first, second] = -sign * sin
+    rotation[:, second, first] = sign * sin
+    return rotation
+
+
+def _transformation(rotation, translation):
+    transformation = torch.eye(4, dtype=rotation.dtype, device=rotation.device)
+    transformation = transformation.repeat(rotation.shape[0], 1, 1)
+    transformation[:, :3, :3] = rotation
+    transformation[:, :3, 3] = translation
+    return transformation
+
+
+def _apply(transformation, points, batch):
+    rotated = (transformation[batch, :3, :3] @ points[:, :, None])[..., 0]
+    return rotated + transformation[batch, :3, 3]
+
+
+def icp(
+    source: Union[torch.Tensor, Sequence[torch.Tensor]],
+    target: Union[torch.Tensor, Sequence[torch.Tensor]],
+    threshold: float,
+    init: Optional[torch.Tensor] = None,
+    method: str = "point_to_point",
+    target_normals: Optional[Union[torch.Tensor, Sequence[torch.Tensor]]] = None,
+    max_iterations: int = 30,
+    relative_fitness: float = 1e-6,
+    relative_rmse: float = 1e-6,
+) -> ICPResult:
+    """
+    Register `source` (N, 3) onto `target` (M, 3), or each of a list of
+    sources onto the matching target, as open3d's registration_icp with
+    ICPConvergenceCriteria(relative_fitness, relative_rmse, max_iterations).
+
+    Args:
+        threshold: Max correspondence distance.
+        init: Initial transformation(s), (4, 4) or (B, 4, 4); identity by default.
+        method: "point_to_point" or "point_to_plane".
+        target_normals: For point_to_plane, estimated (`estimate_normals`) if missing.
+    """
+    batched = not torch.is_tensor(source)
+    sources = list(source) if batched else [source]
+    targets = list(target) if batched else [target]
+    if len(sources) != len(targets):
+        raise ValueError(f"{len(sources)} sources for {len(targets)} targets")
+    if method not in ("point_to_point", "point_to_plane"):
+        raise ValueError(f"unknown ICP method {method!r}")
+    count = len(sources)
+    source_points, source_batch = _pack(sources)
+    target_points, target_batch = _pack(targets)
+    dtype, device = source_points.dtype, source_points.device
+    if method == "point_to_plane":
+        if target_normals is None:
+            target_normals = [estimate_normals(points) for points in targets]
+        elif torch.is_tensor(target_normals):
+            target_normals = [target_normals]
+        normals = torch.cat(list(target_normals)).to(dtype)
+
+    transformation = torch.eye(4, dtype=torch.float64, device=device).repeat(count, 1, 1)
+    if init is not None:
+        transformation = init.to(transformation).expand(count, 4, 4).clone()
+    index = VoxelGridIndex(target_points, target_batch, threshold)
+    source_sizes = torch.bincount(source_batch, minlength=count).to(torch.float64)
+
+    def evaluate(transformation):
+        moved = _apply(transformation.to(dtype), source_points, source_batch)
+        nearest, squared = index.nearest(moved, source_batch)
+        matched = nearest >= 0
+        matches = _segment_sum(matched.double(), source_batch, count)
+        squared_sum = _segment_sum(torch.where(matched, squared, 0).double(), source_batch, count)
+        fitness = matches / source_sizes.clamp(min=1)
+        rmse = torch.where(matches > 0, (squared_sum / matches.clamp(min=1)).sqrt(), 0)
+        return moved, nearest, matched, fitness, rmse
+
+    moved, nearest, matched, fitness, rmse = evaluate(transformation)
+    active = torch.ones(count, dtype=torch.bool, device=device)
+    iterations = torch.zeros(count, dtype=torch.long, device=device)
+    for _ in range(max_iterations):
+        pairs = matched & active[source_batch]
+        batch = source_batch[pairs]
+        if method == "point_to_point":
+            update = _point_to_point(moved[pairs], target_points[nearest[pairs]], batch, count)
+        else:
+            update = _point_to_plane(
+                moved[pairs], target_points[nearest[pairs]], normals[nearest[pairs]], batch, count
+            )
+        transformation = torch.where(active[:, None, None], update @ transformation, transformation)
+        iterations += active
+        previous_fitness, previous_rmse = fitness, rmse
+        moved, nearest, matched, fitness, rmse = evaluate(transformation)
+        converged = ((previous_fitness - fitness).abs() < relative_fitness) & (
+            (previous_rmse - rmse).abs() < relative_rmse
+        )
+        active &= ~converged
+        if not active.any():
+            break
+
+    result = ICPResult(transformation, fitness, rmse, iterations)
+    if not batched:
+        result = ICPResult(*(value[0] for value in (transformation, fitness, rmse, iterations)))
+    return result
@@ -1,10 +1,11 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
 import os
+import threading
 
 from tqdm import tqdm
 import torch
 from loguru import logger
-from functools import wraps
+from functools import partial, wraps
 from torch.utils._pytree import tree_map_only
 
 
@@ -23,7 +24,7 @@ def set_attention_backend():
 
 set_attention_backend()
 
-from typing import List, Literal, Optional, Union
+from typing import Callable, List, Literal, Optional, Union
 from hydra.utils import instantiate
 from omegaconf import OmegaConf
 import numpy as np
@@ -38,6 +39,7 @@ from sam3d_objects.pipeline.inference_utils import (
     SLAT_MEAN,
     SLAT_STD,
     downsample_sparse_structure,
+    filter_sparse_components,
     prune_sparse_structure,
 )
 
@@ -45,11 +47,39 @@ from sam3d_objects.model.io import (
     load_model_from_checkpoint,
     filter_and_remove_prefix_state_dict_fn,
 )
+from sam3d_objects.model.lazy_load import (
+    LazyModuleDict,
+    init_empty_weights,
+    load_safetensors_into_empty_model,
+    measure_load,
+)
 
+from sam3d_objects.model.backbone.dit.embedder.dino import Dino
+from sam3d_objects.model.backbone.dit.embedder.feature_cache import FeatureCache
+from sam3d_objects.model.backbone.tdfy_dit.utils.uv_parametrization import UVParametrizer
 from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
 from sam3d_objects.model.backbone.tdfy_dit.utils import postprocessing_utils
+from sam3d_objects.pipeline.result_cache import ResultCache, checkpoint_fingerprint
+from sam3d_objects.pipeline.sampler_env_overrides import (
+    SAMPLER_KNOBS,
+    resolved_settings_for_log,
+)
+from sam3d_objects.utils.profiler import StageProfiler, profiled, profiling
 from safetensors.torch import load_file
 
+# Held while sampling draws from the global RNG (from the seed until
+# decoding) and while the layout optimization reseeds it (set_seed): with
+# deferred postprocessing (`defer_postprocess`), they may run on different
+# threads.
+GLOBAL_RNG_LOCK = threading.RLock()
+
+# decode format -> the slat decoder producing it
+SLAT_DECODERS = {
+    "gaussian": "slat_decoder_gs",
+    "gaussian_4": "slat_decoder_gs_4",
+    "mesh": "slat_decoder_mesh",
+}
+
 
 class InferencePipeline:
     def __init__(
@@ -80,6 +110,7 @@ class InferencePipeline:
         pose_decoder_name="default",
         workspace_dir="",
         downsample_ss_dist=0,  # the distance we use to downsample
+        ss_min_component_voxels=0,  # drop smaller sparse structure components
         ss_inference_steps=25,
         ss_rescale_t=3,
         ss_cfg_strength=7,
@@ -89,6 +120,15 @@ class InferencePipeline:
         slat_rescale_t=3,
         slat_cfg_strength=5,
         slat_cfg_interval=[0, 500],
+        batched_guidance=False,
+        batched_multi_view=False,
+        meta_init=False,
+        lazy_decoders=False,
+        fill_holes_mode="full",
+        texture_bake_mode="opt",
+        uv_parametrizer=None,
+        feature_cache=None,
+        result_cache=None,
         shape_model_dtype=None,
         compile_model=False,
         slat_mean=SLAT_MEAN,
@@ -109,6 +149,7 @@ class InferencePipeline:
             self.slat_condition_input_mapping = slat_condition_input_mapping
             self.workspace_dir = workspace_dir
             self.downsample_ss_dist = downsample_ss_dist
+            self.ss_min_component_voxels = ss_min_component_voxels
             self.ss_inference_steps = ss_inference_steps
             self.ss_rescale_t = ss_rescale_t
             self.ss_cfg_strength = ss_cfg_strength
@@ -118,6 +159,46 @@ class InferencePipeline:
             self.slat_rescale_t = slat_rescale_t
             self.slat_cfg_strength = slat_cfg_strength
             self.slat_cfg_interval = slat_cfg_interval
+            self.batched_guidance = batched_guidance
+            self.batched_multi_view = batched_multi_view
+            # meta_init: build models on the meta device and memory-map their
+            # .safetensors weights. lazy_decoders: decoders for formats outside
+            # decode_formats are only loaded on first use.
+            self.meta_init = meta_init
+            self.lazy_decoders = lazy_decoders
+            self.load_report = {}
+            # visibility settings of the GLB hole filling, see
+            # postprocessing_utils.FILL_HOLES_MODES
+            self.fill_holes_mode = fill_holes_mode
+            # texture baking of the GLB, see postprocessing_utils.bake_texture
+            self.texture_bake_mode = texture_bake_mode
+            # UV parametrization of the GLB, see set_uv_parametrizer
+            self.set_uv_parametrizer(uv_parametrizer)
+            # identity of the weights, part of the result cache keys
+            self._checkpoint_paths = [
+                os.path.join(workspace_dir, path)
+                for path in (
+                    ss_generator_config_path,
+                    ss_generator_ckpt_path,
+                    slat_generator_config_path,
+                    slat_generator_ckpt_path,
+                    ss_decoder_config_path,
+                    ss_decoder_ckpt_path,
+                    slat_decoder_gs_config_path,
+                    slat_decoder_gs_ckpt_path,
+                    slat_decoder_mesh_config_path,
+                    slat_decoder_mesh_ckpt_path,
+                    slat_decoder_gs_4_config_path,
+                    slat_decoder_gs_4_ckpt_path,
+                    ss_encoder_config_path,
+                    ss_encoder_ckpt_path,
+                )
+                if path
+            ]
+            # pipeline.yaml holds the settings not passed here (e.g. the
+            # depth model, see scripts/set_depth_model.py)
+            self._checkpoint_paths.append(os.path.join(workspace_dir, "pipeline.yaml"))
+            self.set_result_cache(result_cache)
 
             self.dtype = self._get_dtype(dtype)
             if shape_model_dtype is None:
@@ -136,40 +217,74 @@ class InferencePipeline:
 
             logger.info("Loading model weights...")
 
-            ss_generator = self.init_ss_generator(
-                ss_generator_config_path, ss_generator_ckpt_path
-            )
-            slat_generator = self.init_slat_generator(
-                slat_generator_config_path, slat_generator_ckpt_path
-            )
-            ss_decoder = self.init_ss_decoder(
-                ss_decoder_config_path, ss_decoder_ckpt_path
+            ss_generator = self._load_model(
+                "ss_generator",
+                self.init_ss_generator,
+                ss_generator_config_path,
+                ss_generator_ckpt_path,
             )
-            ss_encoder = self.init_ss_encoder(
-                ss_encoder_config_path, ss_encoder_ckpt_path
+            slat_generator = self._load_model(
+                "slat_generator",
+                self.init_slat_generator,
+                slat_generator_config_path,
+                slat_generator_ckpt_path,
             )
-            slat_decoder_gs = self.init_slat_decoder_gs(
-                slat_decoder_gs_config_path, slat_decoder_gs_ckpt_path
+            ss_decoder = self._load_model(
+                "ss_decoder",
+                self.init_ss_decoder,
+                ss_decoder_config_path,
+                ss_decoder_ckpt_path,
             )
-            slat_decoder_gs_4 = self.init_slat_decoder_gs(
-                slat_decoder_gs_4_config_path, slat_decoder_gs_4_ckpt_path
-            )
-            slat_decoder_mesh = self.init_slat_decoder_mesh(
-                slat_decoder_mesh_config_path, slat_decoder_mesh_ckpt_path
+            ss_encoder = self._load_model(
+                "ss_encoder",
+                self.init_ss_encoder,
+                ss_encoder_config_path,
+                ss_encoder_ckpt_path,
             )
+            slat_decoder_loaders = {
+                "slat_decoder_gs": partial(
+                    self.init_slat_decoder_gs,
+                    slat_decoder_gs_config_path,
+                    slat_decoder_gs_ckpt_path,
+                ),
+                "slat_decoder_gs_4": partial(
+                    self.init_slat_decoder_gs,
+                    slat_decoder_gs_4_config_path,
+                    slat_decoder_gs_4_ckpt_path,
+                ),
+                "slat_decoder_mesh": partial(
+                    self.init_slat_decoder_mesh,
+                    slat_decoder_mesh_config_path,
+                    slat_decoder_mesh_ckpt_path,
+                ),
+            }
+            needed_decoders = {SLAT_DECODERS.get(f) for f in decode_formats}
+            slat_decoders = {
+                name: self._load_model(name, loader)
+                for name, loader in slat_decoder_loaders.items()
+                if not lazy_decoders or name in needed_decoders
+            }
 
             # Load conditioner embedder so that we only load it once
-            ss_condition_embedder = self.init_ss_condition_embedder(
-                ss_generator_config_path, ss_generator_ckpt_path
+            ss_condition_embedder = self._load_model(
+                "ss_condition_embedder",
+                self.init_ss_condition_embedder,
+                ss_generator_config_path,
+                ss_generator_ckpt_path,
             )
-            slat_condition_embedder = self.init_slat_condition_embedder(
-                slat_generator_config_path, slat_generator_ckpt_path
+            slat_condition_embedder = self._load_model(
+                "slat_condition_embedder",
+                self.init_slat_condition_embedder,
+                slat_generator_config_path,
+                slat_generator_ckpt_path,
             )
 
             self.condition_embedders = {
                 "ss_condition_embedder": ss_condition_embedder,
                 "slat_condition_embedder": slat_condition_embedder,
             }
+            # image features shared across stages and runs, see set_feature_cache
+            self.set_feature_cache(feature_cache)
 
             # override generator and condition embedder setting
             self.override_ss_generator_cfg_config(
@@ -179,6 +294,7 @@ class InferencePipeline:
                 rescale_t=ss_rescale_t,
                 cfg_interval=ss_cfg_interval,
                 cfg_strength_pm=ss_cfg_strength_pm,
+                batched_guidance=batched_guidance,
             )
             self.override_slat_generator_cfg_config(
                 slat_generator,
@@ -186,19 +302,23 @@ class InferencePipeline:
                 inference_steps=slat_inference_steps,
                 rescale_t=slat_rescale_t,
                 cfg_interval=slat_cfg_interval,
+                batched_guidance=batched_guidance,
             )
 
-            self.models = torch.nn.ModuleDict(
+            self.models = LazyModuleDict(
                 {
                     "ss_generator": ss_generator,
                     "slat_generator": slat_generator,
                     "ss_encoder": ss_encoder,
                     "ss_decoder": ss_decoder,
-                    "slat_decoder_gs": slat_decoder_gs,
-                    "slat_decoder_gs_4": slat_decoder_gs_4,
-                    "slat_decoder_mesh": slat_decoder_mesh,
+                    **slat_decoders,
                 }
             )
+            for name, loader in slat_decoder_loaders.items():
+                if name not in slat_decoders:
+                    self.models.add_lazy(
+                        name, partial(self._load_model_lazily, name, loader)
+                    )
             logger.info("Loading model weights completed!")
 
             if self.compile_model:
@@ -264,6 +384,162 @@ class InferencePipeline:
             coords = ss_return_dict["coords"]
             slat = self.sample_slat(slat_input_dict, coords)
 
+    def set_feature_cache(self, feature_cache: Optional[Union[FeatureCache, dict]]):
+        """
+        Share a DINO feature cache (a FeatureCache, or a dict of its arguments)
+        between the image encoders of both condition embedders; None disables
+        it. The cache is bypassed inside the compiled `embed_condition`.
+        """
+        if feature_cache is not None and not isinstance(feature_cache, FeatureCache):
+            feature_cache = FeatureCache(**feature_cache)
+        if feature_cache is not None and self.compile_model:
+            logger.warning("compile_model is set: the DINO feature cache is not used")
+        self.feature_cache = feature_cache
+        for embedder in self.condition_embedders.values():
+            if embedder is None:
+                continue
+            for module in embedder.modules():
+                if isinstance(module, Dino):
+                    module.feature_cache = feature_cache
+
+    def set_uv_parametrizer(
+        self, uv_parametrizer: Optional[Union[UVParametrizer, dict]]
+    ):
+        """
+        Parametrize GLB meshes through a UVParametrizer (or a dict of its
+        arguments), which caches the UVs of meshes it has seen and splits
+        large ones over a process pool; None calls xatlas directly. The split
+        changes the UV layout, so results in the result cache are keyed on
+        the parametrizer's settings. The process pool of a replaced
+        parametrizer is shut down.
+        """
+        if uv_parametrizer is not None and not isinstance(uv_parametrizer, UVParametrizer):
+            uv_parametrizer = UVParametrizer(**uv_parametrizer)
+        previous = getattr(self, "uv_parametrizer", None)
+        if previous is not None and previous is not uv_parametrizer:
+            previous.close()
+        self.uv_parametrizer = uv_parametrizer
+
+    def _uv_parametrizer_settings(self):
+        return None if self.uv_parametrizer is None else self.uv_parametrizer.settings()
+
+    def set_result_cache(self, result_cache: Optional[Union[ResultCache, dict]]):
+        """
+        Cache the results of `run` on disk (a ResultCache, or a dict of its
+        arguments), see sam3d_objects/pipeline/result_cache.py; None disables
+        it. Runs without a seed are not cached.
+        """
+        if result_cache is not None and not isinstance(result_cache, ResultCache):
+            result_cache = ResultCache(**result_cache)
+        self.result_cache = result_cache
+        self._checkpoint_fingerprint = None
+
+    def result_cache_key(self, image, seed, pointmap=None) -> Optional[str]:
+        """
+        Key of the samples of `image` (RGBA, mask merged) and `pointmap` under
+        `seed` with the current sampler settings and weights; None when they
+        are not cached. Per stage artifacts are keyed under it (`_result_key`).
+        """
+        if self.result_cache is None or seed is None:
+            return None
+        if self._checkpoint_fingerprint is None:
+            self._checkpoint_fingerprint = checkpoint_fingerprint(self._checkpoint_paths)
+        return ResultCache.key(
+            "sample",
+            image,
+            seed,
+            pointmap,
+            self._result_cache_settings(),
+            self._checkpoint_fingerprint,
+        )
+
+    def _result_cache_settings(self) -> dict:
+        # settings of the sampling that `result_cache_key` hashes
+        settings = resolved_settings_for_log(
+            {knob.config_key: getattr(self, knob.config_key) for knob in SAMPLER_KNOBS}
+        )
+        settings.update(
+            ss_rescale_t=self.ss_rescale_t,
+            ss_cfg_interval=list(self.ss_cfg_interval),
+            slat_rescale_t=self.slat_rescale_t,
+            slat_cfg_interval=list(self.slat_cfg_interval),
+            batched_guidance=self.batched_guidance,
+            ss_min_component_voxels=self.ss_min_component_voxels,
+            dtype=str(self.dtype),
+            shape_model_dtype=str(self.shape_model_dtype),
+            pad_size=self.pad_size,
+            version=self.version,
+            ss_solver=getattr(self.models["ss_generator"], "_solver_method", None),
+            slat_solver=getattr(self.models["slat_generator"], "_solver_method", None),
+        )
+        return settings
+
+    @staticmethod
+    def _result_key(parent_key: Optional[str], stage: str, *settings) -> Optional[str]:
+        return None if parent_key is None else ResultCache.key(parent_key, stage, settings)
+
+    def _cached_result(self, key: Optional[str], stage: str):
+        return None if key is None else self.result_cache.get(key, stage=stage)
+
+    def _cache_result(self, key: Optional[str], value):
+        if key is not None:
+            self.result_cache.put(key, value)
+
+    @staticmethod
+    def _rng_state() -> dict:
+        # the SLAT noise follows the SS samples in the RNG streams: restoring
+        # the state after a cached SS stage reproduces an uncached run
+        return {
+            "cpu": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+        }
+
+    @staticmethod
+    def _set_rng_state(state: dict):
+        torch.set_rng_state(state["cpu"])
+        if state["cuda"] is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(state["cuda"])
+
+    @staticmethod
+    def _slat_to_cache(slat: sp.SparseTensor) -> dict:
+        return {"coords": slat.coords, "feats": slat.feats}
+
+    @staticmethod
+    def _slat_from_cache(cached: dict) -> sp.SparseTensor:
+        return sp.SparseTensor(coords=cached["coords"], feats=cached["feats"])
+
+    def _load_model(self, name, init_fn, *args):
+        with measure_load(name, self.load_report):
+            return init_fn(*args)
+
+    def _load_model_lazily(self, name, init_fn):
+        logger.info(f"Loading {name} on first use")
+        with self.device:
+            return self._load_model(name, init_fn)
+
+    def _instantiate_and_load_on_meta(self, config, ckpt_path, state_dict_fn, device):
+        target = config.get("_target_")
+        try:
+            with init_empty_weights():
+                model = instantiate(config)
+        except Exception as e:
+            logger.warning(
+                f"Cannot build {target} on the meta device ({e}), "
+                "falling back to a regular load"
+            )
+            return None
+
+        missing = load_safetensors_into_empty_model(
+            model, ckpt_path, device=device, state_dict_fn=state_dict_fn
+        )
+        if len(missing) > 0:
+            logger.warning(
+                f"{len(missing)} parameters of {target} are not in {ckpt_path} "
+                f"(e.g. {missing[0]}), falling back to a regular load"
+            )
+            return None
+        return model.eval().to(device)
+
     def instantiate_and_load_from_pretrained(
         self,
         config,
@@ -272,6 +548,13 @@ class InferencePipeline:
         state_dict_key="state_dict",
         device="cuda",
     ):
+        if self.meta_init and ckpt_path.endswith(".safetensors"):
+            model = self._instantiate_and_load_on_meta(
+                config, ckpt_path, state_dict_fn, device
+            )
+            if model is not None:
+                return model
+
         model = instantiate(config)
 
         if ckpt_path.endswith(".safetensors"):
@@ -432,6 +715,7 @@ class InferencePipeline:
         rescale_t=3,
         cfg_interval=[0, 500],
         cfg_strength_pm=0.0,
+        batched_guidance=False,
     ):
         # override generator setting
         ss_generator.inference_steps = inference_steps
@@ -441,14 +725,16 @@ class InferencePipeline:
         ss_generator.reverse_fn.backbone.condition_embedder.normalize_images = True
         ss_generator.reverse_fn.unconditional_handling = "add_flag"
         ss_generator.reverse_fn.strength_pm = cfg_strength_pm
+        ss_generator.reverse_fn.batched_guidance = batched_guidance
 
         logger.info(
-            "ss_generator parameters: inference_steps={}, cfg_strength={}, cfg_interval={}, rescale_t={}, cfg_strength_pm={}",
+            "ss_generator parameters: inference_steps={}, cfg_strength={}, cfg_interval={}, rescale_t={}, cfg_strength_pm={}, batched_guidance={}",
             inference_steps,
             cfg_strength,
             cfg_interval,
             rescale_t,
             cfg_strength_pm,
+            batched_guidance,
         )
 
     def override_slat_generator_cfg_config(
@@ -458,18 +744,21 @@ class InferencePipeline:
         inference_steps=25,
         rescale_t=3,
         cfg_interval=[0, 500],
+        batched_guidance=False,
     ):
         slat_generator.inference_steps = inference_steps
         slat_generator.reverse_fn.strength = cfg_strength
         slat_generator.reverse_fn.interval = cfg_interval
         slat_generator.rescale_t = rescale_t
+        slat_generator.reverse_fn.batched_guidance = batched_guidance
 
         logger.info(
-            "slat_generator parameters: inference_steps={}, cfg_strength={}, cfg_interval={}, rescale_t={}",
+            "slat_generator parameters: inference_steps={}, cfg_strength={}, cfg_interval={}, rescale_t={}, batched_guidance={}",
             inference_steps,
             cfg_strength,
             cfg_interval,
             rescale_t,
+            batched_guidance,
         )
 
     def run(
@@ -487,6 +776,7 @@ class InferencePipeline:
         use_stage2_distillation=False,
         decode_formats=None,
         rendering_engine: str = "nvdiffrast",
+        profiler: Optional[StageProfiler] = None,
     ) -> dict:
         """
         Parameters:
@@ -495,12 +785,14 @@ class InferencePipeline:
         - stage1_only (bool, optional): If True, only the sparse structure is sampled and returned. Default is False.
         - with_mesh_postprocess (bool, optional): If True, performs mesh post-processing. Default is True.
         - with_texture_baking (bool, optional): If True, applies texture baking to the 3D model. Default is True.
+        - profiler (StageProfiler, optional): If given, records the time and memory of every
+          stage and denoising step of this call (see sam3d_objects.utils.profiler).
         Returns:
         - dict: A dictionary containing the GLB file and additional data from the sparse structure sampling.
         """
         # This should only happen if called from demo
         image = self.merge_image_and_mask(image, mask)
-        with self.device:
+        with self.device, profiling(profiler, "run"):
             ss_input_dict = self.preprocess_image(image, self.ss_preprocessor)
             slat_input_dict = self.preprocess_image(image, self.slat_preprocessor)
             torch.manual_seed(seed)
@@ -546,6 +838,7 @@ class InferencePipeline:
                 **outputs,
             }
 
+    @profiled()
     def postprocess_slat_output(
         self,
         outputs,
@@ -570,6 +863,9 @@ class InferencePipeline:
                 with_texture_baking=with_texture_baking,
                 use_vertex_color=use_vertex_color,
                 rendering_engine=rendering_engine,
+                fill_holes_mode=self.fill_holes_mode,
+                texture_bake_mode=self.texture_bake_mode,
+                uv_parametrizer=self.uv_parametrizer,
             )
 
         # glb.export("sample.glb")
@@ -606,6 +902,7 @@ class InferencePipeline:
         image = np.array(image)
         return image
 
+    @profiled()
     def decode_slat(
         self,
         slat: sp.SparseTensor,
@@ -659,9 +956,49 @@ class InferencePipeline:
 
         return condition_args, condition_kwargs
 
+    @staticmethod
+    def stack_input_dicts(input_dicts: List[dict]) -> dict:
+        """Stack the preprocessed inputs of several objects on the batch dimension."""
+        return {
+            key: torch.cat([input_dict[key] for input_dict in input_dicts])
+            for key in input_dicts[0]
+        }
+
+    @profiled()
     def sample_sparse_structure(
         self, ss_input_dict: dict, inference_steps=None, use_distillation=False
     ):
+        return_dict, ss = self._sample_sparse_structure_latents(
+            ss_input_dict, inference_steps, use_distillation
+        )
+        return_dict.update(self._sparse_structure_coords(ss))
+        return return_dict
+
+    @profiled()
+    def sample_sparse_structure_multi_object(
+        self, ss_input_dict: dict, inference_steps=None, use_distillation=False
+    ) -> List[dict]:
+        """
+        Stage 1 for K objects in one batch: `ss_input_dict` holds the inputs of
+        the K objects stacked on the batch dimension (see `stack_input_dicts`).
+        Returns one dict per object, as `sample_sparse_structure` would for
+        that object alone (the SS latents have a fixed size, so the objects
+        batch without padding).
+        """
+        return_dict, ss = self._sample_sparse_structure_latents(
+            ss_input_dict, inference_steps, use_distillation
+        )
+        object_dicts = []
+        for i in range(ss.shape[0]):
+            object_dict = {key: value[i : i + 1] for key, value in return_dict.items()}
+            object_dict.update(self._sparse_structure_coords(ss[i : i + 1]))
+            object_dicts.append(object_dict)
+        return object_dicts
+
+    def _sample_sparse_structure_latents(
+        self, ss_input_dict: dict, inference_steps=None, use_distillation=False
+    ):
+        """SS latents of every batch element and the decoded occupancy grid."""
         ss_generator = self.models["ss_generator"]
         ss_decoder = self.models["ss_decoder"]
         if use_distillation:
@@ -718,26 +1055,34 @@ class InferencePipeline:
                     .contiguous()
                     .view(shape_latent.shape[0], 8, 16, 16, 16)
                 )
-                coords = torch.argwhere(ss > 0)[:, [0, 2, 3, 4]].int()
-
-                # downsample output
-                return_dict["coords_original"] = coords
-                original_shape = coords.shape
-                if self.downsample_ss_dist > 0:
-                    coords = prune_sparse_structure(
-                        coords,
-                        max_neighbor_axes_dist=self.downsample_ss_dist,
-                    )
-                coords, downsample_factor = downsample_sparse_structure(coords)
-                logger.info(
-                    f"Downsampled coords from {original_shape[0]} to {coords.shape[0]}"
-                )
-                return_dict["coords"] = coords
-                return_dict["downsample_factor"] = downsample_factor
 
         ss_generator.inference_steps = prev_inference_steps
+        return return_dict, ss
+
+    def _sparse_structure_coords(self, ss: torch.Tensor) -> dict:
+        """Occupied voxels of a decoded structure, pruned and downsampled."""
+        coords = torch.argwhere(ss > 0)[:, [0, 2, 3, 4]].int()
+
+        # downsample output
+        return_dict = {"coords_original": coords}
+        original_shape = coords.shape
+        if self.ss_min_component_voxels > 1:
+            # floaters: voxel clusters not connected to the object
+            coords = filter_sparse_components(coords, self.ss_min_component_voxels)
+        if self.downsample_ss_dist > 0:
+            coords = prune_sparse_structure(
+                coords,
+                max_neighbor_axes_dist=self.downsample_ss_dist,
+            )
+        coords, downsample_factor = downsample_sparse_structure(coords)
+        logger.info(
+            f"Downsampled coords from {original_shape[0]} to {coords.shape[0]}"
+        )
+        return_dict["coords"] = coords
+        return_dict["downsample_factor"] = downsample_factor
         return return_dict
 
+    @profiled()
     def sample_slat(
         self,
         slat_input: dict,
@@ -745,10 +1090,54 @@ class InferencePipeline:
         inference_steps=25,
         use_distillation=False,
     ) -> sp.SparseTensor:
+        slat = self._sample_slat_latent(
+            slat_input,
+            coords,
+            slat_input["image"].shape[0],
+            inference_steps,
+            use_distillation,
+        )
+        return self._denormalize_slat(slat[0], coords)
+
+    @profiled()
+    def sample_slat_multi_object(
+        self,
+        slat_input: dict,
+        coords: List[torch.Tensor],
+        inference_steps=25,
+        use_distillation=False,
+    ) -> List[sp.SparseTensor]:
+        """
+        Stage 2 for K objects in one batch: `slat_input` holds the K objects'
+        inputs stacked on the batch dimension, `coords` their K sparse
+        structures. The structures are packed into one sparse batch (object i
+        as batch index i), sampled together and split again.
+        """
+        packed = torch.cat(
+            [
+                torch.cat([torch.full_like(c[:, :1], i), c[:, 1:]], dim=1)
+                for i, c in enumerate(coords)
+            ]
+        )
+        slat = self._sample_slat_latent(
+            slat_input, packed, 1, inference_steps, use_distillation
+        )
+        feats = slat[0].split([c.shape[0] for c in coords])
+        return [self._denormalize_slat(f, c) for f, c in zip(feats, coords)]
+
+    def _sample_slat_latent(
+        self,
+        slat_input: dict,
+        coords: torch.Tensor,
+        num_rows: int,
+        inference_steps=25,
+        use_distillation=False,
+    ) -> torch.Tensor:
+        """Dense SLAT latent of shape (num_rows, len(coords), 8) on `coords`."""
         image = slat_input["image"]
         DEVICE = image.device
         slat_generator = self.models["slat_generator"]
-        latent_shape = (image.shape[0],) + (coords.shape[0], 8)
+        latent_shape = (num_rows,) + (coords.shape[0], 8)
         prev_inference_steps = slat_generator.inference_steps
         if inference_steps:
             slat_generator.inference_steps = inference_steps
@@ -775,18 +1164,30 @@ class InferencePipeline:
                     self.slat_condition_input_mapping,
                 )
                 condition_args += (coords.cpu().numpy(),)
+                sp.reset_spatial_cache_stats()
                 slat = slat_generator(
                     latent_shape, DEVICE, *condition_args, **condition_kwargs
                 )
-                slat = sp.SparseTensor(
-                    coords=coords,
-                    feats=slat[0],
-                ).to(DEVICE)
-                slat = slat * self.slat_std.to(DEVICE) + self.slat_mean.to(DEVICE)
+                self._release_slat_spatial_cache(slat_generator)
 
         slat_generator.inference_steps = prev_inference_steps
         return slat
 
+    def _denormalize_slat(self, feats: torch.Tensor, coords: torch.Tensor) -> sp.SparseTensor:
+        device = feats.device
+        slat = sp.SparseTensor(coords=coords, feats=feats).to(device)
+        return slat * self.slat_std.to(device) + self.slat_mean.to(device)
+
+    def _release_slat_spatial_cache(self, slat_generator):
+        """Log the spatial cache hits/misses of one SLAT sampling run and free the cache."""
+        stats = sp.reset_spatial_cache_stats()
+        logger.info(
+            "SLAT spatial cache: {} hits, {} misses", stats["hits"], stats["misses"]
+        )
+        backbone = slat_generator.reverse_fn.backbone
+        if hasattr(backbone, "clear_spatial_cache"):
+            backbone.clear_spatial_cache()
+
     def _apply_transform(self, input: torch.Tensor, transform):
         if input is not None:
             input = transform(input)
@@ -811,6 +1212,7 @@ class InferencePipeline:
         image = image.astype(np.float32)
         return image
 
+    @profiled()
     def preprocess_image(
         self, image: Union[Image.Image, np.ndarray], preprocessor
     ) -> torch.Tensor:
@@ -900,6 +1302,7 @@ class InferencePipeline:
 
         return (all_conditions,), {}
 
+    @profiled()
     def sample_sparse_structure_multi_view(
         self,
         view_ss_input_dicts: List[dict],
@@ -957,6 +1360,7 @@ class InferencePipeline:
                     num_views=num_views,
                     num_steps=ss_generator.inference_steps,
                     mode=mode,
+                    batched=self.batched_multi_view,
                 ):
                     return_dict = ss_generator(
                         latent_shape_dict,
@@ -974,26 +1378,12 @@ class InferencePipeline:
                     .contiguous()
                     .view(shape_latent.shape[0], 8, 16, 16, 16)
                 )
-                coords = torch.argwhere(ss > 0)[:, [0, 2, 3, 4]].int()
-
-                # downsample output
-                return_dict["coords_original"] = coords
-                original_shape = coords.shape
-                if self.downsample_ss_dist > 0:
-                    coords = prune_sparse_structure(
-                        coords,
-                        max_neighbor_axes_dist=self.downsample_ss_dist,
-                    )
-                coords, downsample_factor = downsample_sparse_structure(coords)
-                logger.info(
-                    f"Downsampled coords from {original_shape[0]} to {coords.shape[0]}"
-                )
-                return_dict["coords"] = coords
-                return_dict["downsample_factor"] = downsample_factor
+                return_dict.update(self._sparse_structure_coords(ss))
 
         ss_generator.inference_steps = prev_inference_steps
         return return_dict
 
+    @profiled()
     def sample_slat_multi_view(
         self,
         view_slat_input_dicts: List[dict],
@@ -1041,10 +1431,13 @@ class InferencePipeline:
                     num_views=num_views,
                     num_steps=slat_generator.inference_steps,
                     mode=mode,
+                    batched=self.batched_multi_view,
                 ):
+                    sp.reset_spatial_cache_stats()
                     slat = slat_generator(
                         latent_shape, DEVICE, *condition_args, **condition_kwargs
                     )
+                self._release_slat_spatial_cache(slat_generator)
 
                 slat = sp.SparseTensor(
                     coords=coords,
@@ -1071,7 +1464,9 @@ class InferencePipeline:
         stage1_only: bool = False,
         mode: Literal["stochastic", "multidiffusion"] = "multidiffusion",
         rendering_engine: str = "nvdiffrast",  # nvdiffrast OR pytorch3d
-    ) -> dict:
+        profiler: Optional[StageProfiler] = None,
+        defer_postprocess: bool = False,
+    ) -> Union[dict, Callable[[], dict]]:
         """Training-free multi-view reconstruction (multidiffusion fusion).
 
         Each view is preprocessed independently; a single shared latent is
@@ -1087,7 +1482,49 @@ class InferencePipeline:
                 matching entry in view_masks is None).
             view_masks: one bool/uint8 mask per view, or None per entry if
                 the image already carries the mask in its alpha channel.
+            profiler: if given, records the time and memory of every stage
+                and denoising step of this call.
+            defer_postprocess: return after decoding, with a function that
+                runs the GLB postprocessing and returns the output (see the
+                pointmap pipeline's `run`).
         """
+        with profiling(profiler, "run_multi_view", num_views=len(view_images)), GLOBAL_RNG_LOCK:
+            return self._run_multi_view(
+                view_images,
+                view_masks=view_masks,
+                seed=seed,
+                stage1_inference_steps=stage1_inference_steps,
+                stage2_inference_steps=stage2_inference_steps,
+                use_stage1_distillation=use_stage1_distillation,
+                use_stage2_distillation=use_stage2_distillation,
+                decode_formats=decode_formats,
+                with_mesh_postprocess=with_mesh_postprocess,
+                with_texture_baking=with_texture_baking,
+                use_vertex_color=use_vertex_color,
+                stage1_only=stage1_only,
+                mode=mode,
+                rendering_engine=rendering_engine,
+                defer_postprocess=defer_postprocess,
+            )
+
+    def _run_multi_view(
+        self,
+        view_images: List[Union[np.ndarray, Image.Image]],
+        view_masks: Optional[List[Union[None, np.ndarray, Image.Image]]] = None,
+        seed: Optional[int] = None,
+        stage1_inference_steps: Optional[int] = None,
+        stage2_inference_steps: Optional[int] = None,
+        use_stage1_distillation: bool = False,
+        use_stage2_distillation: bool = False,
+        decode_formats: Optional[List[str]] = None,
+        with_mesh_postprocess: bool = True,
+        with_texture_baking: bool = True,
+        use_vertex_color: bool = False,
+        stage1_only: bool = False,
+        mode: Literal["stochastic", "multidiffusion"] = "multidiffusion",
+        rendering_engine: str = "nvdiffrast",  # nvdiffrast OR pytorch3d
+        defer_postprocess: bool = False,
+    ) -> Union[dict, Callable[[], dict]]:
         num_views = len(view_images)
         if view_masks is None:
             view_masks = [None] * num_views
@@ -1227,7 +1664,7 @@ class InferencePipeline:
         if stage1_only:
             logger.info("Finished!")
             ss_return_dict["voxel"] = ss_return_dict["coords"][:, 1:] / 64 - 0.5
-            return ss_return_dict
+            return (lambda: ss_return_dict) if defer_postprocess else ss_return_dict
 
         coords = ss_return_dict["coords"]
         logger.info("Stage 2: sampling structured latent...")
@@ -1242,16 +1679,20 @@ class InferencePipeline:
         outputs = self.decode_slat(
             slat, self.decode_formats if decode_formats is None else decode_formats
         )
-        outputs = self.postprocess_slat_output(
-            outputs,
-            with_mesh_postprocess,
-            with_texture_baking,
-            use_vertex_color,
-            rendering_engine,
-        )
-        logger.info("Finished!")
 
-        return {
-            **ss_return_dict,
-            **outputs,
-        }
+        def finish():
+            postprocessed = self.postprocess_slat_output(
+                outputs,
+                with_mesh_postprocess,
+                with_texture_baking,
+                use_vertex_color,
+                rendering_engine,
+            )
+            logger.info("Finished!")
+
+            return {
+                **ss_return_dict,
+                **postprocessed,
+            }
+
+        return finish if defer_postprocess else finish()
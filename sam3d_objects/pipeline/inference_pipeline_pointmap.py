@@ -1,6 +1,8 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
-from typing import Union, Optional
+from contextlib import ExitStack
+from typing import Callable, List, Union, Optional
 from copy import deepcopy
+from functools import partial
 import numpy as np
 import torch
 from tqdm import tqdm
@@ -12,7 +14,7 @@ from pytorch3d.renderer import look_at_view_transform
 from pytorch3d.transforms import Transform3d
 
 from sam3d_objects.model.backbone.dit.embedder.pointmap import PointPatchEmbed
-from sam3d_objects.pipeline.inference_pipeline import InferencePipeline
+from sam3d_objects.pipeline.inference_pipeline import GLOBAL_RNG_LOCK, InferencePipeline
 from sam3d_objects.data.dataset.tdfy.img_and_mask_transforms import (
     get_mask,
 )
@@ -20,6 +22,23 @@ from sam3d_objects.data.dataset.tdfy.transforms_3d import (
     DecomposedTransform,
 )
 from sam3d_objects.pipeline.utils.pointmap import infer_intrinsics_from_pointmap
+from sam3d_objects.pipeline.pointmap_cache import PointmapCache
+from sam3d_objects.pipeline.scene_composition import compose_scene
+from sam3d_objects.pipeline.stage_checkpoints import (
+    StageCheckpoints,
+    check_stage,
+    pointmap_from_checkpoint,
+    pointmap_to_checkpoint,
+    run_stage,
+)
+from sam3d_objects.model.backbone.dit.embedder.feature_cache import module_fingerprint
+from sam3d_objects.utils.profiler import (
+    StageProfiler,
+    profile_stage,
+    profiled,
+    profiling,
+    record_counters,
+)
 from sam3d_objects.pipeline.inference_utils import (
     o3d_plane_estimation,
     estimate_plane_area,
@@ -94,6 +113,8 @@ def compile_wrapper(
 
 
 class InferencePipelinePointMap(InferencePipeline):
+    # depth model outputs shared across runs, see set_pointmap_cache
+    pointmap_cache: Optional[PointmapCache] = None
 
     def __init__(
         self,
@@ -102,14 +123,82 @@ class InferencePipelinePointMap(InferencePipeline):
         layout_post_optimization_method=layout_post_optimization,
         layout_post_optimization_method_GS=layout_post_optimization_method_GS,
         clip_pointmap_beyond_scale=None,
+        pointmap_cache=None,
+        layout_rotation_hypotheses=1,
+        layout_scale_hypotheses=(1.0,),
         **kwargs,
     ):
         self.depth_model = depth_model
         self.layout_post_optimization_method = layout_post_optimization_method
         self.layout_post_optimization_method_GS = layout_post_optimization_method_GS
+        # starting poses of the layout render-and-compare (turns about the up
+        # axis times scales); with more than one, they are optimized as one
+        # batch and the worse half is pruned every few steps. It is the
+        # pruning that saves time over trying them one by one, see
+        # batched_layout_optimization.run_batched_render_compare.
+        self.layout_rotation_hypotheses = layout_rotation_hypotheses
+        self.layout_scale_hypotheses = tuple(layout_scale_hypotheses)
         self.clip_pointmap_beyond_scale = clip_pointmap_beyond_scale
+        self.set_pointmap_cache(pointmap_cache)
         super().__init__(*args, **kwargs)
 
+    def set_pointmap_cache(self, pointmap_cache: Optional[Union[PointmapCache, dict]]):
+        """
+        Keep the depth model's outputs (pointmap, intrinsics, normal) in an
+        on-disk PointmapCache (or a dict of its arguments), shared with other
+        processes and the batch depth scripts; None disables it. Entries are
+        keyed on the image's RGB pixels, so other masks of a photo hit too.
+        """
+        if pointmap_cache is not None and not isinstance(pointmap_cache, PointmapCache):
+            pointmap_cache = PointmapCache(**pointmap_cache)
+        self.pointmap_cache = pointmap_cache
+
+    def _depth_model_output(self, image, rgb: torch.Tensor) -> dict:
+        """The depth model's output on `rgb` (3, H, W), through the pointmap cache."""
+        if self.pointmap_cache is None:
+            return self._run_depth_model(rgb)
+
+        model = getattr(self.depth_model, "model", None)
+        key = self.pointmap_cache.key(
+            np.asarray(image)[..., :3],
+            type(self.depth_model).__name__,
+            module_fingerprint(model) if isinstance(model, torch.nn.Module) else "",
+            dtype=str(self.dtype),
+        )
+        cached = self.pointmap_cache.get(key)
+        record_counters("pointmap_cache", **{"misses" if cached is None else "hits": 1})
+        if cached is not None:
+            return {
+                name: torch.from_numpy(value).to(self.device)
+                for name, value in cached.items()
+            }
+        output = self._run_depth_model(rgb)
+        arrays = {}
+        for name in ("pointmaps", "intrinsics", "normal"):
+            if output.get(name) is not None:
+                arrays[name] = output[name].detach().float().cpu().numpy()
+        self.pointmap_cache.put(key, arrays)
+        return output
+
+    def _result_cache_settings(self) -> dict:
+        # the pointmap of an image without one comes from the depth model
+        model = getattr(self.depth_model, "model", None)
+        return dict(
+            super()._result_cache_settings(),
+            depth_model=type(self.depth_model).__name__,
+            depth_model_fingerprint=(
+                module_fingerprint(model) if isinstance(model, torch.nn.Module) else ""
+            ),
+            clip_pointmap_beyond_scale=self.clip_pointmap_beyond_scale,
+        )
+
+    def _run_depth_model(self, rgb: torch.Tensor) -> dict:
+        with torch.no_grad():
+            with torch.autocast(
+                device_type="cuda", dtype=self.dtype
+            ), profile_stage("depth_model"):
+                return self.depth_model(rgb)
+
     def _compile(self):
         torch._dynamo.config.cache_size_limit = 64
         torch._dynamo.config.accumulated_cache_size_limit = 2048
@@ -279,16 +368,20 @@ class InferencePipelinePointMap(InferencePipeline):
 
         return revised_scale
 
-    def compute_pointmap(self, image, pointmap=None):
+    @profiled()
+    def compute_pointmap(self, image, pointmap=None, clip=True):
+        """
+        Pointmap (and intrinsics, normals) of `image`, from the depth model or
+        the given `pointmap`. With `clip`, points far beyond the object of
+        the image's mask (alpha channel) are dropped, see `_clip_pointmap`.
+        """
         loaded_image = self.image_to_float(image)
         loaded_image = torch.from_numpy(loaded_image)
         loaded_mask = loaded_image[..., -1]
         loaded_image = loaded_image.permute(2, 0, 1).contiguous()[:3]
 
         if pointmap is None:
-            with torch.no_grad():
-                with torch.autocast(device_type="cuda", dtype=self.dtype):
-                    output = self.depth_model(loaded_image)
+            output = self._depth_model_output(image, loaded_image)
             pointmaps = output["pointmaps"]
             camera_convention_transform = (
                 Transform3d()
@@ -360,11 +453,13 @@ class InferencePipelinePointMap(InferencePipeline):
         point_map_tensor["normal"] = normal
 
         points_tensor = points_tensor.permute(2, 0, 1)
-        points_tensor = self._clip_pointmap(points_tensor, loaded_mask)
+        if clip:
+            points_tensor = self._clip_pointmap(points_tensor, loaded_mask)
         point_map_tensor["pointmap"] = points_tensor
 
         return point_map_tensor
 
+    @profiled()
     @torch.autograd.grad_mode.inference_mode(mode=False)
     def run_post_optimization(self, mesh_glb, intrinsics, pose_dict, layout_input_dict):
         intrinsics = intrinsics.clone()
@@ -383,6 +478,8 @@ class InferencePipelinePointMap(InferencePipeline):
                 Enable_shape_ICP=False,
                 min_size=518,
                 device=self.device,
+                num_rotation_hypotheses=self.layout_rotation_hypotheses,
+                scale_hypotheses=self.layout_scale_hypotheses,
             )
         )
 
@@ -394,6 +491,7 @@ class InferencePipelinePointMap(InferencePipeline):
             "iou": final_iou,
         }
 
+    @profiled()
     @torch.autograd.grad_mode.inference_mode(mode=False)
     def run_post_optimization_GS(
         self, gs_input, intrinsics, pose_dict, layout_input_dict, backend="gsplat"
@@ -427,6 +525,8 @@ class InferencePipelinePointMap(InferencePipeline):
             min_size=518,
             device=self.device,
             backend=backend,
+            num_rotation_hypotheses=self.layout_rotation_hypotheses,
+            scale_hypotheses=self.layout_scale_hypotheses,
         )
 
         revised_scale = self.refine_scale(revised_scale)
@@ -439,6 +539,82 @@ class InferencePipelinePointMap(InferencePipeline):
             "optim_accepted": flag_optim,
         }
 
+    def _decode_pose(self, ss_return_dict, ss_input_dict):
+        """Decode the object pose of a stage 1 output, in place."""
+        # We could probably use the decoder from the models themselves
+        pointmap_scale = ss_input_dict.get("pointmap_scale", None)
+        pointmap_shift = ss_input_dict.get("pointmap_shift", None)
+        ss_return_dict.update(
+            self.pose_decoder(
+                ss_return_dict,
+                scene_scale=pointmap_scale,
+                scene_shift=pointmap_shift,
+            )
+        )
+
+        logger.info(
+            f"Rescaling scale by {ss_return_dict['downsample_factor']} after downsampling"
+        )
+        ss_return_dict["scale"] = (
+            ss_return_dict["scale"] * ss_return_dict["downsample_factor"]
+        )
+        # Decoded against the MoGe pointmap's scene scale above, so this is
+        # metres per unit-cube unit and callers may bake it into the mesh.
+        ss_return_dict["scale_is_metric"] = True
+
+    def _layout_post_optimization(
+        self, outputs, intrinsics, ss_return_dict, ss_input_dict
+    ):
+        """
+        Refine the decoded pose in `ss_return_dict` (in place) against the
+        pointmap, with the mesh method when a GLB was made, else the GS one.
+        Errors are logged, the pose is then left as sampled.
+        """
+        glb = outputs.get("glb", None)
+        gs_input = outputs.get("gaussian", None)
+
+        logger.info(f"GS: {gs_input}")
+        logger.info(
+            f"layout_post_optimization_method_GS: {self.layout_post_optimization_method_GS}"
+        )
+
+        logger.info(f"GBL: {glb}")
+        logger.info(
+            f"layout post optimization method: {self.layout_post_optimization_method}"
+        )
+
+        try:
+            if glb is not None and self.layout_post_optimization_method is not None:
+                logger.info("Running mesh layout post optimization method...")
+                postprocessed_pose = self.run_post_optimization(
+                    deepcopy(glb),
+                    intrinsics,
+                    ss_return_dict,
+                    ss_input_dict,
+                )
+                ss_return_dict.update(postprocessed_pose)
+                logger.info("Finished mesh post-optimization!")
+            elif (
+                gs_input is not None
+                and self.layout_post_optimization_method_GS is not None
+            ):
+                logger.info("Running GS layout post optimization method...")
+                postprocessed_pose = self.run_post_optimization_GS(
+                    deepcopy(gs_input[0]),
+                    intrinsics,
+                    ss_return_dict,
+                    ss_input_dict,
+                    backend="gsplat",
+                )
+                ss_return_dict.update(postprocessed_pose)
+                logger.info(f"Finished GS post-optimization!")
+            else:
+                logger.info(
+                    "No post-optimization method available (no GS or mesh found)"
+                )
+        except Exception as e:
+            logger.error(f"Error during layout post optimization: {e}", exc_info=True)
+
     def run(
         self,
         image: Union[None, Image.Image, np.ndarray],
@@ -457,153 +633,494 @@ class InferencePipelinePointMap(InferencePipeline):
         decode_formats=None,
         estimate_plane=False,
         rendering_engine: str = "nvdiffrast",  # nvdiffrast OR "pytorch3d"
-    ) -> dict:
+        profiler: Optional[StageProfiler] = None,
+        checkpoint_dir: Optional[str] = None,
+        resume_from: Optional[str] = None,
+        defer_postprocess: bool = False,
+    ) -> Union[dict, Callable[[], dict]]:
+        # checkpoint_dir: save the artifact of every stage there; resume_from:
+        # load that stage and the ones before it from checkpoint_dir instead of
+        # computing them, see sam3d_objects/pipeline/stage_checkpoints.py.
+        # defer_postprocess: return after decoding, with a function that runs
+        # the GLB postprocessing and layout optimization and returns the
+        # output, so that a caller (the server's job queue) can run it on
+        # another thread while sampling the next request. The profiler does
+        # not follow it there.
+        check_stage(resume_from)
+        if resume_from is not None and checkpoint_dir is None:
+            raise ValueError("resume_from needs the checkpoint_dir to resume from")
+        checkpoints = None if checkpoint_dir is None else StageCheckpoints(checkpoint_dir)
         image = self.merge_image_and_mask(image, mask)
-        with self.device:
-            pointmap_dict = self.compute_pointmap(image, pointmap)
-            pointmap = pointmap_dict["pointmap"]
-            pts = type(self)._down_sample_img(pointmap)
-            pts_colors = type(self)._down_sample_img(pointmap_dict["pts_color"])
-
-            if estimate_plane:
-                return self.estimate_plane(pointmap_dict, image)
+        if decode_formats is None:
+            decode_formats = self.decode_formats
+        stage_settings = {
+            "pointmap": {"pointmap_given": pointmap is not None},
+            "ss": {
+                "seed": seed,
+                "stage1_inference_steps": stage1_inference_steps,
+                "use_stage1_distillation": use_stage1_distillation,
+            },
+            "slat": {
+                "stage2_inference_steps": stage2_inference_steps,
+                "use_stage2_distillation": use_stage2_distillation,
+            },
+            "decoded": {"decode_formats": sorted(decode_formats)},
+            "layout": {
+                "with_layout_postprocess": with_layout_postprocess,
+                "with_mesh_postprocess": with_mesh_postprocess,
+                "with_texture_baking": with_texture_baking,
+                "use_vertex_color": use_vertex_color,
+                "rendering_engine": rendering_engine,
+            },
+        }
+        # result cache keys (see set_result_cache), None when not caching;
+        # checkpointed runs bypass the cache so that every stage is saved
+        sample_key = (
+            None
+            if estimate_plane or checkpoints is not None
+            else self.result_cache_key(image, seed, pointmap)
+        )
+        ss_key = self._result_key(
+            sample_key, "ss", stage1_inference_steps, use_stage1_distillation
+        )
+        slat_key = self._result_key(
+            ss_key, "slat", stage2_inference_steps, use_stage2_distillation
+        )
+        decoded_key = self._result_key(slat_key, "decoded", sorted(decode_formats))
+        output_key = self._result_key(
+            ss_key if stage1_only else decoded_key,
+            "output",
+            stage1_only,
+            with_mesh_postprocess,
+            with_texture_baking,
+            with_layout_postprocess,
+            use_vertex_color,
+            rendering_engine,
+            self.fill_holes_mode,
+            self.texture_bake_mode,
+            self._uv_parametrizer_settings(),
+            self.layout_rotation_hypotheses,
+            self.layout_scale_hypotheses,
+        )
 
-            ss_input_dict = self.preprocess_image(
-                image, self.ss_preprocessor, pointmap=pointmap
+        def stage(name, compute, to_checkpoint=None, from_checkpoint=None):
+            return run_stage(
+                checkpoints,
+                name,
+                compute,
+                resume_from,
+                stage_settings[name],
+                to_checkpoint,
+                from_checkpoint,
             )
 
-            slat_input_dict = self.preprocess_image(image, self.slat_preprocessor)
-            if seed is not None:
-                torch.manual_seed(seed)
-            ss_return_dict = self.sample_sparse_structure(
-                ss_input_dict,
-                inference_steps=stage1_inference_steps,
-                use_distillation=use_stage1_distillation,
+        with self.device, profiling(profiler, "run"), ExitStack() as sampling:
+            output = self._cached_result(output_key, "output")
+            if output is not None:
+                logger.info("Finished! (cached result)")
+                return (lambda: output) if defer_postprocess else output
+
+            pointmap_dict = stage(
+                "pointmap",
+                lambda: self.compute_pointmap(image, pointmap),
+                pointmap_to_checkpoint,
+                pointmap_from_checkpoint,
             )
+            if estimate_plane:
+                return self.estimate_plane(pointmap_dict, image)
 
-            # We could probably use the decoder from the models themselves
-            pointmap_scale = ss_input_dict.get("pointmap_scale", None)
-            pointmap_shift = ss_input_dict.get("pointmap_shift", None)
-            ss_return_dict.update(
-                self.pose_decoder(
-                    ss_return_dict,
-                    scene_scale=pointmap_scale,
-                    scene_shift=pointmap_shift,
-                )
+            ss_input_dict = self.preprocess_image(
+                image, self.ss_preprocessor, pointmap=pointmap_dict["pointmap"]
             )
 
-            logger.info(
-                f"Rescaling scale by {ss_return_dict['downsample_factor']} after downsampling"
+            # released once decoded, see GLOBAL_RNG_LOCK
+            sampling.enter_context(GLOBAL_RNG_LOCK)
+            ss = stage(
+                "ss",
+                partial(
+                    self._sample_ss_stage,
+                    ss_input_dict,
+                    seed,
+                    ss_key,
+                    stage1_inference_steps,
+                    use_stage1_distillation,
+                ),
             )
-            ss_return_dict["scale"] = (
-                ss_return_dict["scale"] * ss_return_dict["downsample_factor"]
-            )
-            # Decoded against the MoGe pointmap's scene scale above, so this is
-            # metres per unit-cube unit and callers may bake it into the mesh.
-            ss_return_dict["scale_is_metric"] = True
+            ss_return_dict = ss["ss_return_dict"]
+            self._set_rng_state(ss["rng_state"])
 
             if stage1_only:
                 logger.info("Finished!")
                 ss_return_dict["voxel"] = ss_return_dict["coords"][:, 1:] / 64 - 0.5
-                return {
-                    **ss_return_dict,
-                    "pointmap": pts.cpu().permute((1, 2, 0)),  # HxWx3
-                    "pointmap_colors": pts_colors.cpu().permute((1, 2, 0)),  # HxWx3
-                    # Additive (see compute_pointmap): normalized camera
-                    # intrinsics and MoGe's per-pixel normal map, both in
-                    # MoGe's own camera-space convention. None when unavailable.
-                    "intrinsics": pointmap_dict.get("intrinsics"),
-                    "normal": pointmap_dict.get("normal"),
-                }
-                # return ss_return_dict
-
-            coords = ss_return_dict["coords"]
-            slat = self.sample_slat(
-                slat_input_dict,
-                coords,
-                inference_steps=stage2_inference_steps,
-                use_distillation=use_stage2_distillation,
+                output = {**ss_return_dict, **self._pointmap_outputs(pointmap_dict)}
+                self._cache_result(output_key, output)
+                return (lambda: output) if defer_postprocess else output
+
+            sample_slat = partial(
+                self._sample_slat_stage,
+                image,
+                ss_return_dict["coords"],
+                slat_key,
+                stage2_inference_steps,
+                use_stage2_distillation,
             )
-            outputs = self.decode_slat(
-                slat, self.decode_formats if decode_formats is None else decode_formats
+            outputs = stage(
+                "decoded",
+                partial(self._decode_stage, stage, sample_slat, decoded_key, decode_formats),
             )
-            outputs = self.postprocess_slat_output(
+            sampling.close()
+
+            finish = partial(
+                self._finish,
+                stage,
                 outputs,
-                with_mesh_postprocess,
-                with_texture_baking,
-                use_vertex_color,
-                rendering_engine,
+                ss_return_dict,
+                ss_input_dict,
+                pointmap_dict,
+                output_key,
+                **stage_settings["layout"],
             )
-            glb = outputs.get("glb", None)
-            gs_input = outputs.get("gaussian", None)
+            if not defer_postprocess:
+                return finish()
 
-            logger.info(f"GS: {gs_input}")
-            logger.info(
-                f"layout_post_optimization_method_GS: {self.layout_post_optimization_method_GS}"
-            )
+            def deferred():
+                with self.device:
+                    return finish()
 
-            logger.info(f"GBL: {glb}")
-            logger.info(
-                f"layout post optimization method: {self.layout_post_optimization_method}"
+            return deferred
+
+    def _sample_ss_stage(
+        self, ss_input_dict, seed, ss_key, inference_steps, use_distillation
+    ) -> dict:
+        """
+        The "ss" stage of `run`: the sparse structure and pose, with the RNG
+        state after sampling them (see `_rng_state`).
+        """
+        cached = self._cached_result(ss_key, "ss")
+        if cached is not None:
+            return cached
+        if seed is not None:
+            torch.manual_seed(seed)
+        ss_return_dict = self.sample_sparse_structure(
+            ss_input_dict,
+            inference_steps=inference_steps,
+            use_distillation=use_distillation,
+        )
+
+        self._decode_pose(ss_return_dict, ss_input_dict)
+        ss = {"ss_return_dict": ss_return_dict, "rng_state": self._rng_state()}
+        self._cache_result(ss_key, ss)
+        return ss
+
+    def _sample_slat_stage(
+        self, image, coords, slat_key, inference_steps, use_distillation
+    ):
+        """The "slat" stage of `run`: the structured latent on `coords`."""
+        cached = self._cached_result(slat_key, "slat")
+        if cached is not None:
+            return self._slat_from_cache(cached)
+        slat_input_dict = self.preprocess_image(image, self.slat_preprocessor)
+        slat = self.sample_slat(
+            slat_input_dict,
+            coords,
+            inference_steps=inference_steps,
+            use_distillation=use_distillation,
+        )
+        self._cache_result(slat_key, self._slat_to_cache(slat))
+        return slat
+
+    def _decode_stage(self, stage, sample_slat, decoded_key, decode_formats) -> dict:
+        """
+        The "decoded" stage of `run`: the decoded formats of the "slat" stage,
+        which only runs (`sample_slat`) when they are not cached.
+        """
+        outputs = self._cached_result(decoded_key, "decoded")
+        if outputs is None:
+            slat = stage("slat", sample_slat, self._slat_to_cache, self._slat_from_cache)
+            outputs = self.decode_slat(slat, decode_formats)
+            # stored before postprocessing adds to it
+            self._cache_result(decoded_key, outputs)
+        return outputs
+
+    def _finish(
+        self,
+        stage,
+        outputs,
+        ss_return_dict,
+        ss_input_dict,
+        pointmap_dict,
+        output_key,
+        with_layout_postprocess,
+        with_mesh_postprocess,
+        with_texture_baking,
+        use_vertex_color,
+        rendering_engine,
+    ) -> dict:
+        """
+        The rest of `run` once decoded: the GLB postprocessing, the "layout"
+        stage and the output. It runs without the sampling lock, maybe on
+        another thread (defer_postprocess): the layout optimization takes
+        GLOBAL_RNG_LOCK itself.
+        """
+        outputs = self.postprocess_slat_output(
+            outputs,
+            with_mesh_postprocess,
+            with_texture_baking,
+            use_vertex_color,
+            rendering_engine,
+        )
+
+        def layout():
+            if with_layout_postprocess:
+                with GLOBAL_RNG_LOCK:
+                    self._layout_post_optimization(
+                        outputs, pointmap_dict["intrinsics"], ss_return_dict, ss_input_dict
+                    )
+            return ss_return_dict
+
+        ss_return_dict = stage("layout", layout)
+
+        logger.info("Finished!")
+
+        output = {**ss_return_dict, **outputs, **self._pointmap_outputs(pointmap_dict)}
+        self._cache_result(output_key, output)
+        return output
+
+    def _pointmap_outputs(self, pointmap_dict) -> dict:
+        pts = type(self)._down_sample_img(pointmap_dict["pointmap"])
+        pts_colors = type(self)._down_sample_img(pointmap_dict["pts_color"])
+        return {
+            "pointmap": pts.cpu().permute((1, 2, 0)),  # HxWx3
+            "pointmap_colors": pts_colors.cpu().permute((1, 2, 0)),  # HxWx3
+            # Additive (see compute_pointmap): normalized camera intrinsics
+            # (3x3) and MoGe's per-pixel normal map (HxWx3, full input
+            # resolution), both in MoGe's own camera-space convention -- NOT
+            # the PyTorch3D convention `pointmap` above uses. None when
+            # unavailable (e.g. depth-model checkpoint without a normal head).
+            # request_utils.extract_intrinsics reads the former for the
+            # /infer response.
+            "intrinsics": pointmap_dict.get("intrinsics"),
+            "normal": pointmap_dict.get("normal"),
+        }
+
+    def run_multi_object(
+        self,
+        image: Union[Image.Image, np.ndarray],
+        masks: List[Union[Image.Image, np.ndarray]],
+        seed: Optional[int] = None,
+        stage1_only=False,
+        with_mesh_postprocess=True,
+        with_texture_baking=True,
+        with_layout_postprocess=False,
+        use_vertex_color=False,
+        stage1_inference_steps=None,
+        stage2_inference_steps=None,
+        use_stage1_distillation=False,
+        use_stage2_distillation=False,
+        pointmap=None,
+        decode_formats=None,
+        rendering_engine: str = "nvdiffrast",  # nvdiffrast OR "pytorch3d"
+        profiler: Optional[StageProfiler] = None,
+    ) -> dict:
+        """
+        Reconstruct the objects of several masks of one image.
+
+        The pointmap is computed once for the image and clipped per object.
+        Both flow stages then run once for all K objects: the SS latents as a
+        batch of K, the SLAT latents as one sparse batch packing the K
+        structures. Decoding and postprocessing run per object.
+
+        With a seed, the noise is drawn for all objects at once, so results
+        are not those of K separate `run` calls with that seed.
+
+        Returns:
+            dict: "objects", one dict per mask with the per-object keys of
+            `run` (pose, latents, decoded formats, "glb", ...), "scene", the
+            objects posed in the camera frame (see
+            scene_composition.compose_scene), and the image level
+            "pointmap", "pointmap_colors", "intrinsics" and "normal".
+        """
+        images = [self.merge_image_and_mask(image, mask) for mask in masks]
+        with self.device, profiling(
+            profiler, "run_multi_object", num_objects=len(images)
+        ):
+            pointmap_dict = self.compute_pointmap(images[0], pointmap, clip=False)
+            scene_pointmap = pointmap_dict["pointmap"]
+            pts = type(self)._down_sample_img(scene_pointmap)
+            pts_colors = type(self)._down_sample_img(pointmap_dict["pts_color"])
+
+            ss_input_dicts, slat_input_dicts = [], []
+            for object_image in images:
+                mask = torch.from_numpy(self.image_to_float(object_image))[..., -1]
+                ss_input_dicts.append(
+                    self.preprocess_image(
+                        object_image,
+                        self.ss_preprocessor,
+                        pointmap=self._clip_pointmap(scene_pointmap, mask),
+                    )
+                )
+                slat_input_dicts.append(
+                    self.preprocess_image(object_image, self.slat_preprocessor)
+                )
+
+            if seed is not None:
+                torch.manual_seed(seed)
+            ss_return_dicts = self.sample_sparse_structure_multi_object(
+                self.stack_input_dicts(ss_input_dicts),
+                inference_steps=stage1_inference_steps,
+                use_distillation=use_stage1_distillation,
             )
+            for ss_return_dict, ss_input_dict in zip(ss_return_dicts, ss_input_dicts):
+                self._decode_pose(ss_return_dict, ss_input_dict)
 
-            try:
-                if with_layout_postprocess:
-
-                    if (
-                        glb is not None
-                        and self.layout_post_optimization_method is not None
-                    ):
-                        logger.info("Running mesh layout post optimization method...")
-                        postprocessed_pose = self.run_post_optimization(
-                            deepcopy(glb),
-                            pointmap_dict["intrinsics"],
-                            ss_return_dict,
-                            ss_input_dict,
-                        )
-                        ss_return_dict.update(postprocessed_pose)
-                        logger.info("Finished mesh post-optimization!")
-                    elif (
-                        gs_input is not None
-                        and self.layout_post_optimization_method_GS is not None
-                    ):
-                        logger.info("Running GS layout post optimization method...")
-                        postprocessed_pose = self.run_post_optimization_GS(
-                            deepcopy(gs_input[0]),
+            if stage1_only:
+                for ss_return_dict in ss_return_dicts:
+                    ss_return_dict["voxel"] = ss_return_dict["coords"][:, 1:] / 64 - 0.5
+                objects = ss_return_dicts
+            else:
+                slats = self.sample_slat_multi_object(
+                    self.stack_input_dicts(slat_input_dicts),
+                    [ss_return_dict["coords"] for ss_return_dict in ss_return_dicts],
+                    inference_steps=stage2_inference_steps,
+                    use_distillation=use_stage2_distillation,
+                )
+                objects = []
+                for slat, ss_return_dict, ss_input_dict in zip(
+                    slats, ss_return_dicts, ss_input_dicts
+                ):
+                    outputs = self.decode_slat(
+                        slat,
+                        self.decode_formats if decode_formats is None else decode_formats,
+                    )
+                    outputs = self.postprocess_slat_output(
+                        outputs,
+                        with_mesh_postprocess,
+                        with_texture_baking,
+                        use_vertex_color,
+                        rendering_engine,
+                    )
+                    if with_layout_postprocess:
+                        self._layout_post_optimization(
+                            outputs,
                             pointmap_dict["intrinsics"],
                             ss_return_dict,
                             ss_input_dict,
-                            backend="gsplat",
                         )
-                        ss_return_dict.update(postprocessed_pose)
-                        logger.info(f"Finished GS post-optimization!")
-                    else:
-                        logger.info(
-                            "No post-optimization method available (no GS or mesh found)"
-                        )
-            except Exception as e:
-                logger.error(
-                    f"Error during layout post optimization: {e}", exc_info=True
-                )
+                    objects.append({**ss_return_dict, **outputs})
 
             logger.info("Finished!")
 
             return {
-                **ss_return_dict,
-                **outputs,
+                "objects": objects,
+                "scene": compose_scene(objects),
                 "pointmap": pts.cpu().permute((1, 2, 0)),  # HxWx3
                 "pointmap_colors": pts_colors.cpu().permute((1, 2, 0)),  # HxWx3
-                # Additive (see compute_pointmap): normalized camera intrinsics
-                # (3x3) and MoGe's per-pixel normal map (HxWx3, full input
-                # resolution), both in MoGe's own camera-space convention --
-                # NOT the PyTorch3D convention `pointmap` above uses. None when
-                # unavailable (e.g. depth-model checkpoint without a normal
-                # head). request_utils.extract_intrinsics reads the former for
-                # the /infer response.
                 "intrinsics": pointmap_dict.get("intrinsics"),
                 "normal": pointmap_dict.get("normal"),
             }
 
+    def run_batch(
+        self,
+        images: List[Union[Image.Image, np.ndarray]],
+        seed: Optional[int] = None,
+        with_mesh_postprocess=True,
+        with_texture_baking=True,
+        with_layout_postprocess=False,
+        use_vertex_color=False,
+        stage1_inference_steps=None,
+        stage2_inference_steps=None,
+        use_stage1_distillation=False,
+        use_stage2_distillation=False,
+        decode_formats=None,
+        rendering_engine: str = "nvdiffrast",  # nvdiffrast OR "pytorch3d"
+        profiler: Optional[StageProfiler] = None,
+        defer_postprocess: bool = False,
+    ) -> list:
+        """
+        Reconstruct the objects of several RGBA images (the mask in the alpha
+        channel) with the same settings, as the server's micro-batches do.
+
+        The depth model and decoding run per image. Both flow stages run once
+        for every group of images whose preprocessed inputs have the same
+        shapes, as in `run_multi_object`. With a seed, the noise is drawn for
+        all images at once, so results are not those of separate `run` calls
+        with that seed, and the result cache is neither read nor written.
+
+        Returns:
+            list: one output per image, as `run` returns it (with
+            defer_postprocess, one function per image).
+        """
+        images = [self.merge_image_and_mask(image, None) for image in images]
+        if decode_formats is None:
+            decode_formats = self.decode_formats
+        # no checkpoints: every stage is computed
+        stage = partial(run_stage, None)
+        with self.device, profiling(profiler, "run_batch", num_images=len(images)):
+            pointmap_dicts = [self.compute_pointmap(image) for image in images]
+            ss_input_dicts = [
+                self.preprocess_image(
+                    image, self.ss_preprocessor, pointmap=pointmap_dict["pointmap"]
+                )
+                for image, pointmap_dict in zip(images, pointmap_dicts)
+            ]
+            slat_input_dicts = [
+                self.preprocess_image(image, self.slat_preprocessor) for image in images
+            ]
+            groups = {}
+            for i, input_dicts in enumerate(zip(ss_input_dicts, slat_input_dicts)):
+                shapes = tuple(
+                    (key, tuple(value.shape))
+                    for input_dict in input_dicts
+                    for key, value in input_dict.items()
+                )
+                groups.setdefault(shapes, []).append(i)
+
+            ss_return_dicts, outputs = [None] * len(images), [None] * len(images)
+            with GLOBAL_RNG_LOCK:
+                if seed is not None:
+                    torch.manual_seed(seed)
+                for group in groups.values():
+                    group_ss = self.sample_sparse_structure_multi_object(
+                        self.stack_input_dicts([ss_input_dicts[i] for i in group]),
+                        inference_steps=stage1_inference_steps,
+                        use_distillation=use_stage1_distillation,
+                    )
+                    for i, ss_return_dict in zip(group, group_ss):
+                        self._decode_pose(ss_return_dict, ss_input_dicts[i])
+                        ss_return_dicts[i] = ss_return_dict
+                    slats = self.sample_slat_multi_object(
+                        self.stack_input_dicts([slat_input_dicts[i] for i in group]),
+                        [ss_return_dict["coords"] for ss_return_dict in group_ss],
+                        inference_steps=stage2_inference_steps,
+                        use_distillation=use_stage2_distillation,
+                    )
+                    for i, slat in zip(group, slats):
+                        outputs[i] = self.decode_slat(slat, decode_formats)
+
+        finishes = [
+            partial(
+                self._finish,
+                stage,
+                *args,
+                None,
+                with_layout_postprocess=with_layout_postprocess,
+                with_mesh_postprocess=with_mesh_postprocess,
+                with_texture_baking=with_texture_baking,
+                use_vertex_color=use_vertex_color,
+                rendering_engine=rendering_engine,
+            )
+            for args in zip(outputs, ss_return_dicts, ss_input_dicts, pointmap_dicts)
+        ]
+        if not defer_postprocess:
+            with self.device:
+                return [finish() for finish in finishes]
+
+        def deferred(finish):
+            with self.device:
+                return finish()
+
+        return [partial(deferred, finish) for finish in finishes]
+
     @staticmethod
     def _down_sample_img(img_3chw: torch.Tensor):
         # img_3chw: (3, H, W)
@@ -8,6 +8,18 @@ from pytorch3d.transforms import quaternion_to_matrix, Transform3d, matrix_to_qu
 from sam3d_objects.data.dataset.tdfy.transforms_3d import compose_transform, decompose_transform
 from sam3d_objects.data.dataset.tdfy.pose_target import PoseTargetConverter
 from loguru import logger
+from sam3d_objects.pipeline.batched_layout_optimization import (
+    GS_LOSS_WEIGHTS,
+    gaussian_hypotheses_renderer,
+    mesh_hypotheses_renderer,
+    pose_hypotheses,
+    run_batched_render_compare,
+)
+from sam3d_objects.pipeline.sparse_structure import (  # noqa: F401
+    downsample_sparse_structure,
+    filter_sparse_components,
+    prune_sparse_structure,
+)
 from sam3d_objects.pipeline.layout_post_optimization_utils import (
     run_ICP,
     compute_iou,
@@ -92,6 +104,9 @@ def layout_post_optimization(
     Enable_rendering_optimization=True,
     min_size=512,
     device=None,
+    num_rotation_hypotheses=1,
+    scale_hypotheses=(1.0,),
+    icp_backend="open3d",
 ):
     logger.info(f"Starting!")
     set_seed(100)
@@ -143,7 +158,7 @@ def layout_post_optimization(
     if Enable_shape_ICP:
         Flag_ICP = True
         points_aligned_icp, transformation = run_ICP(
-            mesh, source_points, target_points, threshold=0.05
+            mesh, source_points, target_points, threshold=0.05, backend=icp_backend
         )
         mesh_ICP = Meshes(
             verts=[points_aligned_icp], faces=[faces_idx], textures=textures
@@ -156,7 +171,7 @@ def layout_post_optimization(
         if ori_iou_shapeICP > ori_iou:
             mesh = mesh_ICP
             final_iou = ori_iou_shapeICP.cpu().item()
-            T_o3d = torch.tensor(transformation, dtype=torch.float32, device=device)
+            T_o3d = torch.as_tensor(transformation, dtype=torch.float32, device=device)
             T_o3d = T_o3d.T
             A = T_o3d[:3, :3]
             t = T_o3d[3, :3]
@@ -192,6 +207,14 @@ def layout_post_optimization(
     if not Enable_rendering_optimization:
         Flag_optim = False
         tfm = tfm_ori.compose(tfm1).compose(tfm2)
+    elif num_rotation_hypotheses * len(scale_hypotheses) > 1:
+        # several starting poses, optimized as one batch
+        quats, scales = pose_hypotheses(num_rotation_hypotheses, scale_hypotheses, device=device)
+        result = run_batched_render_compare(
+            mesh_hypotheses_renderer(mesh, center, renderer), mask, quats, scale=scales
+        )
+        quat, translation, scale, R = result.quat, result.translation, result.scale, result.R
+        logger.info(f"Render-and-compare: hypothesis {result.index} of {quats.shape[0]} kept")
     else:
         quat, translation, scale, R = run_render_compare(
             mesh, center, renderer, mask, device
@@ -253,6 +276,9 @@ def layout_post_optimization_method_GS(
     device=None,
     backend="gsplat",
     seed=100,
+    num_rotation_hypotheses=1,
+    scale_hypotheses=(1.0,),
+    icp_backend="open3d",
 ):
     """
     Gaussian Splatting layout post-optimization function.
@@ -274,6 +300,10 @@ def layout_post_optimization_method_GS(
         min_size: int, minimum image size for rendering
         device: torch device
         backend: str, "gsplat" or "inria" for GS rendering
+        num_rotation_hypotheses: int, starting rotations about the up axis for Step 3
+        scale_hypotheses: tuple of starting scales for Step 3; with more than one
+            hypothesis in all, they are optimized together (run_batched_render_compare)
+        icp_backend: str, "open3d" or "torch" (pipeline/icp.py) for Step 2
 
     Returns:
         Tuple of (quaternion, translation, scale, final_iou, initial_iou, Flag_ICP, Flag_optim)
@@ -358,7 +388,7 @@ def layout_post_optimization_method_GS(
     # Step 2: Shape ICP
     if Enable_shape_ICP and source_points is not None and target_points is not None:
         points_aligned_icp, transformation = run_gs_ICP(
-            source_points, target_points, threshold=0.05
+            source_points, target_points, threshold=0.05, backend=icp_backend
         )
         gaussian_ICP = copy_and_update_gaussian_positions(
             gaussian_aligned, points_aligned_icp
@@ -409,9 +439,25 @@ def layout_post_optimization_method_GS(
         rgb_gt_processed = prepare_rgb_for_supervision(rgb_gt, mask)
 
         logger.info(f"Using RGB+mask supervision for render-and-compare")
-        quat, translation, scale, R = run_gs_render_compare_rgb_mask(
-            gaussian_aligned, center, renderer, intrinsics_tensor, mask, rgb_gt_processed, device
-        )
+        if num_rotation_hypotheses * len(scale_hypotheses) > 1:
+            quats, scales = pose_hypotheses(
+                num_rotation_hypotheses, scale_hypotheses, device=device
+            )
+            result = run_batched_render_compare(
+                gaussian_hypotheses_renderer(gaussian_aligned, center, renderer, intrinsics_tensor),
+                mask,
+                quats,
+                scale=scales,
+                loss_weights=GS_LOSS_WEIGHTS,
+                rgb=rgb_gt_processed,
+                tol=1e-6,
+            )
+            quat, translation, scale, R = result.quat, result.translation, result.scale, result.R
+            logger.info(f"Render-and-compare: hypothesis {result.index} of {quats.shape[0]} kept")
+        else:
+            quat, translation, scale, R = run_gs_render_compare_rgb_mask(
+                gaussian_aligned, center, renderer, intrinsics_tensor, mask, rgb_gt_processed, device
+            )
         with torch.no_grad():
             transformed = apply_gs_transform(gaussian_aligned, center, quat, translation, scale)
             transformed_opencv = flip_coords_pytorch3d_to_opencv(transformed)
@@ -605,119 +651,6 @@ def get_pose_decoder(name):
     return POSE_DECODERS[name]
 
 
-def prune_sparse_structure(
-    coord_batch,
-    max_neighbor_axes_dist=1,
-):
-    coords, batch = coord_batch[:, 1:], coord_batch[:, 0].unsqueeze(-1)
-    device = coords.device
-    # 1) shift coords so minimum is zero
-    min_xyz = coords.min(0)[0]
-    coords0 = coords - min_xyz
-    # 2) build occupancy grid
-    max_xyz = coords0.max(0)[0] + 1  # size in each dim
-    D, H, W = max_xyz.tolist()
-    # shape (1,1,D,H,W)
-    occ = torch.zeros((1, 1, D, H, W), dtype=torch.uint8, device=device)
-    x, y, z = coords0.unbind(1)
-    occ[0, 0, x, y, z] = 1
-    # 3) 3×3×3 convolution to count each voxel + neighbors
-    kernel = torch.ones(
-        (
-            1,
-            1,
-            2 * max_neighbor_axes_dist + 1,
-            2 * max_neighbor_axes_dist + 1,
-            2 * max_neighbor_axes_dist + 1,
-        ),
-        dtype=torch.uint8,
-        device=device,
-    )
-    # pad so output is same size
-    pad = max_neighbor_axes_dist
-    counts = torch.nn.functional.conv3d(occ.float(), kernel.float(), padding=pad)
-    # interior voxels have count == (2*max_neighbor_axes_dist+1)**3
-    full_count = (2 * max_neighbor_axes_dist + 1) ** 3
-    # 4) lookup counts at each original coord
-    counts_at_pts = counts[0, 0, x, y, z]  # (N,)
-    is_surface = counts_at_pts < full_count
-    # 5) return filtered batch+coords (shift back if you want original coords)
-    kept = is_surface.nonzero(as_tuple=False).squeeze(1)
-    out_batch = batch[kept]
-    out_coords = coords[kept]
-    coords = torch.cat([out_batch, out_coords], dim=1)
-
-    return torch.cat([out_batch, out_coords], dim=1)
-
-
-def downsample_sparse_structure(
-    coord_batch,
-    max_coords=42000,
-    downsample_factor=2,
-):
-    """
-    Downsample sparse structure coordinates when there are more than max_coords.
-
-    Downsamples by rescaling coordinates, effectively shrinking the grid while preserving
-    the structure. The downsampled grid is centered in the original space.
-
-    Args:
-        coord_batch: tensor of shape (N, 4) where [:, 0] is batch index and [:, 1:] are coords
-        max_coords: maximum number of coordinates to keep
-            42000 should be safe number. Calculation: max(int32) / (64*768) ~= 43691
-            Only needed for mesh decoding.
-        downsample_factor: factor by which to downsample (e.g., 2 means half resolution)
-
-    Returns:
-        Downsampled coord_batch with coordinates rescaled if downsampling is needed
-    """
-    if coord_batch.shape[0] <= max_coords:
-        return coord_batch, 1
-
-    # Extract coordinates and batch indices
-    coords = coord_batch[:, 1:].float()  # Shape: (N, 3), convert to float for scaling
-    batch_indices = coord_batch[:, 0:1]  # Shape: (N, 1)
-
-    # Find the actual coordinate bounds
-    coords_min = coords.min(dim=0)[0]  # Shape: (3,)
-    coords_max = coords.max(dim=0)[0]  # Shape: (3,)
-    original_size = coords_max - coords_min + 1  # Add 1 since coordinates are discrete
-
-    # Calculate target size after downsampling
-    target_size = original_size / downsample_factor
-
-    # Calculate the offset to center the downsampled grid
-    offset = (original_size - target_size) / 2
-    target_min = coords_min + offset
-    target_max = coords_min + offset + target_size - 1
-
-    # Normalize coordinates to [0, 1] within their actual range
-    coords_normalized = (coords - coords_min) / (coords_max - coords_min)
-
-    # Scale to the target range
-    coords_rescaled = coords_normalized * (target_size - 1) + target_min
-
-    # Round to integers to get discrete grid coordinates
-    coords_rescaled = torch.round(coords_rescaled).int()
-
-    # Clamp to ensure we stay within bounds
-    coords_rescaled = torch.clamp(coords_rescaled, target_min.int(), target_max.int())
-
-    # Remove duplicates that may have been created by the downsampling
-    # Concatenate batch and coords for duplicate removal
-    combined = torch.cat([batch_indices, coords_rescaled], dim=1)
-    unique_combined = torch.unique(combined, dim=0)
-
-    # If still too many after deduplication, randomly subsample
-    if unique_combined.shape[0] > max_coords:
-        indices = torch.randperm(unique_combined.shape[0], device=coord_batch.device)[
-            :max_coords
-        ]
-        unique_combined = unique_combined[indices]
-
-    return unique_combined.int(), downsample_factor
-
-
 def normalize_mesh_verts(verts):
     vmin = verts.min(axis=0)
     vmax = verts.max(axis=0)
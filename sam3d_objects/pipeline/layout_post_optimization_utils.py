@@ -20,6 +20,7 @@ import open3d as o3d
 from scipy.ndimage import label, binary_dilation, binary_fill_holes, binary_erosion, minimum_filter
 import copy
 from sam3d_objects.model.backbone.tdfy_dit.renderers.gaussian_render import GaussianRenderer
+from sam3d_objects.pipeline.icp import icp
 from loguru import logger
 from utils3d.numpy import depth_edge
 
@@ -387,7 +388,15 @@ def o3d_to_tensor(pcd):
     return torch.tensor(np.asarray(pcd.points), dtype=torch.float32)
 
 
-def run_ICP(source_points_mesh, source_points, target_points, threshold):
+def run_ICP(source_points_mesh, source_points, target_points, threshold, backend="open3d"):
+    if backend == "torch":
+        # on the device of the points, see icp.py
+        transformation = icp(source_points, target_points, threshold).transformation
+        points_mesh = source_points_mesh.verts_padded().squeeze(0)
+        rotation, translation = transformation[:3, :3], transformation[:3, 3]
+        points_aligned_icp = points_mesh @ rotation.T.to(points_mesh) + translation.to(points_mesh)
+        return points_aligned_icp, transformation
+
     # Convert your point clouds
     mesh_src_pcd = tensor_to_o3d_pcd(source_points_mesh.verts_padded().squeeze(0))
     src_pcd = tensor_to_o3d_pcd(source_points)
@@ -722,11 +731,18 @@ def run_gs_alignment(
     return translated_positions, target_points, center, tfm1, gaussian_aligned, ori_iou, final_iou, flag_notgt
 
 
-def run_gs_ICP(source_points, target_points, threshold):
+def run_gs_ICP(source_points, target_points, threshold, backend="open3d"):
     """
     Run ICP alignment on Gaussian positions.
     Similar to run_ICP but for GS.
     """
+    if backend == "torch":
+        source_points = source_points.detach()
+        transformation = icp(source_points, target_points, threshold).transformation
+        rotation, translation = transformation[:3, :3], transformation[:3, 3]
+        points_aligned_icp = source_points @ rotation.T.to(source_points) + translation.to(source_points)
+        return points_aligned_icp, transformation
+
     # Convert to Open3D point clouds
     src_pcd = o3d.geometry.PointCloud()
     src_pcd.points = o3d.utility.Vector3dVector(source_points.detach().cpu().numpy())
@@ -764,7 +780,7 @@ def apply_icp_transformation_to_gaussian(gaussian, transformation, device):
             - t: Translation vector [3]
     """
     # Convert transformation matrix to torch
-    T_o3d = torch.tensor(transformation, dtype=torch.float32, device=device)
+    T_o3d = torch.as_tensor(transformation, dtype=torch.float32, device=device)
     T_o3d = T_o3d.T
 
     # Decompose transformation matrix
@@ -20,6 +20,7 @@ def inject_generator_multi_view(
     num_views: int,
     num_steps: int,
     mode: Literal["stochastic", "multidiffusion"] = "multidiffusion",
+    batched: bool = False,
 ):
     """Temporarily patch ``generator._generate_dynamics`` for multi-view sampling.
 
@@ -29,6 +30,15 @@ def inject_generator_multi_view(
     mode each step uses a single view's condition, rotating round-robin
     (cheaper, lower quality).
 
+    With ``batched=True`` multidiffusion folds the views into the batch
+    dimension instead: the latent is repeated once per view, the stacked
+    view conditions are flattened to ``(num_views * batch, ...)`` and the
+    original dynamics run once per step. This needs a backbone that treats
+    batch elements independently (true for the SS and SLAT flow models) and
+    composes with batched classifier-free guidance. Conditions that cannot
+    be stacked fall back to the per-view loop. Stochastic mode already runs
+    one view per step and is unaffected.
+
     The condition tokens are expected either stacked in a tensor of shape
     ``(num_views, ...)`` or as a list/tuple with one entry per view (see
     ``InferencePipeline.get_multi_view_condition_input``). The original
@@ -77,16 +87,7 @@ def inject_generator_multi_view(
     elif mode == "multidiffusion":
 
         def _dynamics_multidiffusion(x_t, t, *args_conditionals, **kwargs_conditionals):
-            # Locate the condition tokens among the positional conditionals:
-            # some generators prepend a scalar (e.g. a flag) before the tokens.
-            cond_idx = 0
-            if len(args_conditionals) > 0:
-                first = args_conditionals[0]
-                if isinstance(first, (int, float)) or (
-                    isinstance(first, torch.Tensor) and first.numel() == 1
-                ):
-                    cond_idx = 1
-
+            cond_idx = _condition_index(args_conditionals)
             if len(args_conditionals) <= cond_idx:
                 return original_dynamics(
                     x_t, t, *args_conditionals, **kwargs_conditionals
@@ -132,7 +133,39 @@ def inject_generator_multi_view(
                 )
             return torch.stack(preds).mean(dim=0)
 
-        generator._generate_dynamics = _dynamics_multidiffusion
+        def _dynamics_multidiffusion_batched(
+            x_t, t, *args_conditionals, **kwargs_conditionals
+        ):
+            cond_idx = _condition_index(args_conditionals)
+            if len(args_conditionals) <= cond_idx:
+                return original_dynamics(
+                    x_t, t, *args_conditionals, **kwargs_conditionals
+                )
+
+            cond_tokens = _stack_view_conditions(args_conditionals[cond_idx], num_views)
+            if cond_tokens is None:
+                return _dynamics_multidiffusion(
+                    x_t, t, *args_conditionals, **kwargs_conditionals
+                )
+
+            new_args = (
+                args_conditionals[:cond_idx]
+                + (cond_tokens.flatten(0, 1),)
+                + args_conditionals[cond_idx + 1 :]
+            )
+            pred = original_dynamics(
+                _map_tensors(lambda x: torch.cat([x] * num_views, dim=0), x_t),
+                t,
+                *new_args,
+                **kwargs_conditionals,
+            )
+            return _map_tensors(
+                lambda p: p.unflatten(0, (num_views, -1)).mean(dim=0), pred
+            )
+
+        generator._generate_dynamics = (
+            _dynamics_multidiffusion_batched if batched else _dynamics_multidiffusion
+        )
 
     else:
         raise ValueError(f"Unsupported mode: {mode}")
@@ -143,6 +176,45 @@ def inject_generator_multi_view(
         generator._generate_dynamics = original_dynamics
 
 
+def _condition_index(args_conditionals):
+    """Locate the condition tokens among the positional conditionals: some
+    generators prepend a scalar (e.g. a flag) before the tokens."""
+    if len(args_conditionals) > 0:
+        first = args_conditionals[0]
+        if isinstance(first, (int, float)) or (
+            isinstance(first, torch.Tensor) and first.numel() == 1
+        ):
+            return 1
+    return 0
+
+
+def _stack_view_conditions(cond_tokens, num_views):
+    """Return the view conditions as one ``(num_views, batch, ...)`` tensor,
+    or None when they are not batchable tensors."""
+    if isinstance(cond_tokens, (list, tuple)):
+        if len(cond_tokens) != num_views or not all(
+            isinstance(c, torch.Tensor) and c.shape == cond_tokens[0].shape
+            for c in cond_tokens
+        ):
+            return None
+        cond_tokens = torch.stack(list(cond_tokens), dim=0)
+    if not isinstance(cond_tokens, torch.Tensor) or cond_tokens.shape[0] != num_views:
+        return None
+    if cond_tokens.dim() < 2:
+        return None
+    return cond_tokens
+
+
+def _map_tensors(fn, struct):
+    """Apply ``fn`` to a tensor, or to every tensor of a dict/list/tuple of
+    tensors (the latent and prediction structures the generators use)."""
+    if isinstance(struct, dict):
+        return {key: fn(value) for key, value in struct.items()}
+    if isinstance(struct, (list, tuple)):
+        return tuple(fn(value) for value in struct)
+    return fn(struct)
+
+
 # Above this ratio the views disagree enough that the combined size should not
 # be trusted; picked to flag a clearly-broken view without firing on the normal
 # spread between monocular depth estimates of the same object.
@@ -0,0 +1,165 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Shared on-disk cache of depth backend outputs: pointmaps, with the intrinsics,
+normals (and any other arrays) computed alongside them.
+
+Depth inference is the same whatever the SAM3D settings, yet a batch rerun
+(batch/run_batch.sh) runs every depth backend again, and the pipeline's own
+depth model runs again for each request on the same photo. Entries are keyed
+on the image content, the depth backend, its model version and any
+conversion parameters (`PointmapCache.key`), so reruns, other masks of the
+same photo and other processes reuse them.
+
+Storage is one compressed `.npz` file per key. Per-pixel float arrays are
+stored as float16 (half the size before compression; about 1e-3 relative
+error, NaN and inf are kept), small ones such as intrinsics at full precision.
+
+Several writers (one per GPU worker, see batch/run_batch_parallel.sh) may
+share a directory: every write goes to its own temporary file that is then
+renamed over the entry, so readers see whole files only and concurrent
+writers of one key just replace each other's identical result. The size
+limit is enforced on write from the directory listing, evicting the least
+recently read or written files.
+
+It only depends on numpy, so the batch depth scripts can use it from their
+own environments (set LIDRA_SKIP_INIT before importing it there).
+"""
+import hashlib
+import os
+import tempfile
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# float arrays with more elements than this are stored as float16
+HALF_PRECISION_MIN_SIZE = 64
+
+Arrays = Dict[str, np.ndarray]
+
+
+def image_digest(image) -> str:
+    """Hash of an image file's bytes (given a path) or of an array's pixels."""
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            for chunk in iter(lambda: f.read(2**20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    image = np.ascontiguousarray(image)
+    digest.update(f"{image.dtype.str}:{image.shape}:".encode())
+    digest.update(memoryview(image.reshape(-1).view(np.uint8)))
+    return digest.hexdigest()
+
+
+class PointmapCache:
+    """
+    Args:
+        cache_dir (str): Directory of the cache files.
+        max_bytes (int): Size limit of the directory, None for no limit.
+        half_precision (bool): Store per-pixel float arrays as float16.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: Optional[int] = 10 * 2**30,
+        half_precision: bool = True,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.half_precision = half_precision
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(image, backend: str, model_version: str = "", **params) -> str:
+        """
+        Key of the outputs of `backend` (at `model_version`) on `image`, a
+        path or an array (see `image_digest`); `params` are the settings the
+        outputs depend on, e.g. conversion parameters.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(image_digest(image).encode())
+        digest.update(f"\0{backend}\0{model_version}".encode())
+        for name in sorted(params):
+            digest.update(f"\0{name}={params[name]!r}".encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Arrays]:
+        """The arrays stored under `key` (as float32 where stored as float16), or None."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            arrays = None
+        except Exception:
+            # not a readable entry: recomputed and overwritten by the caller
+            arrays = None
+        if arrays is not None:
+            try:
+                os.utime(path)
+            except FileNotFoundError:  # evicted by another writer meanwhile
+                pass
+            arrays = {
+                name: value.astype(np.float32) if value.dtype == np.float16 else value
+                for name, value in arrays.items()
+            }
+        self.stats["hits" if arrays is not None else "misses"] += 1
+        return arrays
+
+    def put(self, key: str, arrays: Dict[str, Optional[np.ndarray]]):
+        """Store the non-None `arrays` under `key`."""
+        stored = {}
+        for name, value in arrays.items():
+            if value is None:
+                continue
+            value = np.asarray(value)
+            if (
+                self.half_precision
+                and value.dtype.kind == "f"
+                and value.size > HALF_PRECISION_MIN_SIZE
+            ):
+                value = value.astype(np.float16)
+            stored[name] = value
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **stored)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if self.max_bytes is not None:
+            self._evict()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Arrays]) -> Arrays:
+        """The arrays under `key`, computed and stored by `compute()` on a miss."""
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, arrays)
+        return arrays
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".npz"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # evicted by another writer
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries)[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,193 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+On-disk cache of pipeline results, in front of `InferencePipelinePointMap.run`
+(see `InferencePipeline.set_result_cache`).
+
+Repeated requests (client retries, the same photo and mask submitted again)
+would otherwise rerun both flow stages and the postprocessing. Results are
+keyed on a canonical hash of everything that determines them:
+
+- sampling key: the RGBA input (image with its mask), seed, given pointmap,
+  the resolved sampler settings and the checkpoint identity;
+- one artifact per stage under it: the stage 1 output ("ss"), the structured
+  latent ("slat"), the decoded representations per decode formats
+  ("decoded") and the final output per postprocessing settings ("output").
+
+A run that only changes postprocessing settings then skips both samplers and
+the decoders, a repeated run skips everything. Runs without a seed are never
+cached: their samples are not reproducible.
+
+Artifacts are pickled with `torch.save`, one file per key, written atomically
+so several processes can share a directory; the least recently used files
+are evicted beyond `max_bytes`. Entries are read back with
+`torch.load(weights_only=False)`, so only point the cache at a directory
+that only this cache writes to.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import torch
+from loguru import logger
+
+from sam3d_objects.utils.profiler import record_counters
+
+
+def _update_digest(digest, value):
+    # type-tagged, order-canonical serialization of (nested) inputs
+    if isinstance(value, torch.Tensor):
+        value = value.detach().cpu().numpy()
+    elif hasattr(value, "__array_interface__") and not isinstance(value, np.ndarray):
+        value = np.asarray(value)  # PIL images
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        digest.update(f"array:{value.dtype.str}:{value.shape}:".encode())
+        digest.update(memoryview(value.reshape(-1).view(np.uint8)))
+    elif isinstance(value, dict):
+        digest.update(f"dict:{len(value)}:".encode())
+        for key in sorted(value, key=str):
+            _update_digest(digest, str(key))
+            _update_digest(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"list:{len(value)}:".encode())
+        for item in value:
+            _update_digest(digest, item)
+    elif value is None or isinstance(value, (str, int, float, bool)):
+        digest.update(f"{type(value).__name__}:{json.dumps(value)};".encode())
+    else:
+        digest.update(f"repr:{value!r};".encode())
+
+
+def canonical_hash(*parts) -> str:
+    """Hex digest of (nested dicts / lists of) arrays, tensors and scalars."""
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        _update_digest(digest, part)
+    return digest.hexdigest()
+
+
+def checkpoint_fingerprint(paths: Iterable[str]) -> str:
+    """
+    Identity of a set of checkpoint / config files: their paths, sizes and
+    modification times (the weights are not read). Missing paths count as
+    missing, so an unset optional checkpoint does not break the key.
+    """
+    entries = []
+    for path in sorted({os.path.abspath(p) for p in paths if p}):
+        try:
+            stat = os.stat(path)
+            entries.append([path, stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            entries.append([path, None, None])
+    return canonical_hash(entries)
+
+
+class ResultCache:
+    """
+    Args:
+        cache_dir (str): Directory of the cache files.
+        max_bytes (int): Size limit of the directory, least recently used
+            entries are evicted beyond it.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 20 * 2**30):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()  # key -> file size, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    # -- keys ---------------------------------------------------------------
+
+    @staticmethod
+    def key(*parts) -> str:
+        return canonical_hash(*parts)
+
+    # -- lookup -------------------------------------------------------------
+
+    def get(self, key: str, stage: str = "", map_location=None) -> Optional[Any]:
+        """
+        The value stored under `key`, or None. Every call returns a new copy,
+        tensors on the device they were stored from unless `map_location`
+        says otherwise. `stage` adds per stage hit / miss counters.
+        """
+        path = self._path(key)
+        try:
+            value = torch.load(path, map_location=map_location, weights_only=False)
+            os.utime(path)
+        except FileNotFoundError:
+            value = None
+        except Exception as e:
+            # partial write from a killed process, or an incompatible pickle
+            logger.warning(f"Dropping unreadable result cache entry {path}: {e}")
+            with self._lock:
+                self._remove(key)
+            value = None
+        counter = "hits" if value is not None else "misses"
+        with self._lock:
+            self.stats[counter] += 1
+            if value is not None and key in self._entries:
+                self._entries.move_to_end(key)
+        record_counters("result_cache", **{counter: 1})
+        if stage:
+            record_counters("result_cache", **{f"{stage}_{counter}": 1})
+        return value
+
+    def put(self, key: str, value: Any):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            torch.save(value, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # a result that cannot be pickled is served uncached, not failed
+            logger.warning(f"Could not write result cache entry {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        size = os.path.getsize(path)
+        with self._lock:
+            self._bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    # -- files --------------------------------------------------------------
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pt")
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pt"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name[: -len(".pt")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._bytes += size
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,111 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Composition of the objects of `run_multi_object` in the camera frame.
+
+Every object comes out of the pipeline in its own normalized frame, with
+the pose ("rotation" quaternion, "translation", "scale") that places it in
+the camera frame of the image. `object_to_camera` turns that pose into a
+4x4 matrix, `make_scene` merges the posed Gaussians into one.
+"""
+from copy import deepcopy
+from typing import List
+
+import torch
+from pytorch3d.transforms import quaternion_invert, quaternion_multiply, quaternion_to_matrix
+
+from sam3d_objects.data.dataset.tdfy.transforms_3d import compose_transform
+
+
+def object_to_camera(output: dict) -> torch.Tensor:
+    """
+    The (4, 4) transform from an object's frame to the camera frame, for
+    column vectors: `points_camera = M @ [points_object, 1]`.
+    """
+    transform = compose_transform(
+        scale=output["scale"],
+        rotation=quaternion_to_matrix(output["rotation"]),
+        translation=output["translation"],
+    )
+    # pytorch3d multiplies row vectors from the left
+    return transform.get_matrix()[0].T
+
+
+def make_scene(*outputs, in_place=False):
+    """
+    One Gaussian of the objects' Gaussians ("gaussian"), each moved to the
+    camera frame by its pose (see `object_to_camera`).
+    """
+    if not in_place:
+        outputs = [deepcopy(output) for output in outputs]
+
+    all_outs = []
+    minimum_kernel_size = float("inf")
+    for output in outputs:
+        # move gaussians to scene frame of reference
+        transform = compose_transform(
+            scale=output["scale"],
+            rotation=quaternion_to_matrix(output["rotation"]),
+            translation=output["translation"],
+        )
+        output["gaussian"][0].from_xyz(
+            transform.transform_points(output["gaussian"][0].get_xyz.unsqueeze(0))[0]
+        )
+        # must ... ROTATE
+        output["gaussian"][0].from_rotation(
+            quaternion_multiply(
+                quaternion_invert(output["rotation"]),
+                output["gaussian"][0].get_rotation,
+            )
+        )
+        scale = output["gaussian"][0].get_scaling
+        adjusted_scale = scale * output["scale"]
+        assert (
+            output["scale"][0, 0].item()
+            == output["scale"][0, 1].item()
+            == output["scale"][0, 2].item()
+        )
+        output["gaussian"][0].mininum_kernel_size *= output["scale"][0, 0].item()
+        adjusted_scale = torch.maximum(
+            adjusted_scale,
+            torch.tensor(
+                output["gaussian"][0].mininum_kernel_size * 1.1,
+                device=adjusted_scale.device,
+            ),
+        )
+        output["gaussian"][0].from_scaling(adjusted_scale)
+        minimum_kernel_size = min(
+            minimum_kernel_size,
+            output["gaussian"][0].mininum_kernel_size,
+        )
+        all_outs.append(output)
+
+    # merge gaussians
+    scene_gs = all_outs[0]["gaussian"][0]
+    scene_gs.mininum_kernel_size = minimum_kernel_size
+    for out in all_outs[1:]:
+        out_gs = out["gaussian"][0]
+        scene_gs._xyz = torch.cat([scene_gs._xyz, out_gs._xyz], dim=0)
+        scene_gs._features_dc = torch.cat(
+            [scene_gs._features_dc, out_gs._features_dc], dim=0
+        )
+        scene_gs._scaling = torch.cat([scene_gs._scaling, out_gs._scaling], dim=0)
+        scene_gs._rotation = torch.cat([scene_gs._rotation, out_gs._rotation], dim=0)
+        scene_gs._opacity = torch.cat([scene_gs._opacity, out_gs._opacity], dim=0)
+
+    return scene_gs
+
+
+def compose_scene(objects: List[dict]) -> dict:
+    """
+    The scene of the objects of `run_multi_object`: "object_to_camera", the
+    (K, 4, 4) transforms of the objects, and "gaussian", their Gaussians
+    merged in the camera frame (None unless every object has one).
+    """
+    return {
+        "object_to_camera": torch.stack([object_to_camera(obj) for obj in objects]),
+        "gaussian": (
+            make_scene(*objects)
+            if all("gaussian" in obj for obj in objects)
+            else None
+        ),
+    }
@@ -0,0 +1,301 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Operations on sparse structures, the (N, 4) int coords [batch, x, y, z] of
+the occupied voxels decoded by stage 1: pruning interior voxels, filtering
+small connected components and downsampling.
+
+They only touch the coordinate list: voxels are keyed by their linear index
+in their (padded) bounding box and sorted, so that neighbors are adjacent
+keys (along the fastest axis) or a binary search away (`torch.searchsorted`).
+Costs scale with the number of occupied voxels, not with the volume of the
+bounding box like the dense occupancy grid + conv3d of
+`prune_sparse_structure_dense`, kept as the reference the sparse version
+matches exactly (see scripts/benchmark_sparse_structure.py).
+"""
+import itertools
+from typing import Tuple
+
+import torch
+
+CONNECTIVITY_OFFSETS = {6: 1, 18: 2, 26: 3}  # connectivity -> max nonzero offset axes
+
+
+def _padded_volume(sizes, pad: int) -> int:
+    volume = 1
+    for size in sizes:
+        volume *= size + 2 * pad
+    return volume
+
+
+class _VoxelIndex:
+    """
+    Neighbor lookups among non-negative integer `coords` (N, D): any D
+    columns, e.g. [batch, x, y, z]. `pad` is the largest offset looked up,
+    so that no neighbor key wraps around into another row or column.
+    """
+
+    def __init__(self, coords: torch.Tensor, pad: int):
+        self.pad = pad
+        self.dims = [int(size) + 1 for size in coords.max(0)[0]]
+        self.dtype = torch.int32 if _padded_volume(self.dims, pad) < 2**31 else torch.long
+        self.keys, self.order = self.linear(coords).sort()
+
+    def linear(self, coords: torch.Tensor) -> torch.Tensor:
+        keys = torch.zeros(coords.shape[0], dtype=self.dtype, device=coords.device)
+        for column, size in enumerate(self.dims):
+            keys = keys * (size + 2 * self.pad) + (coords[:, column].to(self.dtype) + self.pad)
+        return keys
+
+    def lookup(self, coords: torch.Tensor) -> torch.Tensor:
+        """Row (into the indexed coords) of each of `coords`, -1 when unoccupied."""
+        keys = self.linear(coords)
+        positions = torch.searchsorted(self.keys, keys).clamp_(max=self.keys.numel() - 1)
+        found = self.keys[positions] == keys
+        return torch.where(found, self.order[positions], -1)
+
+
+def _neighbor_offsets(radius: int, max_nonzero: int = 3, device=None):
+    """
+    Offsets of the (2 * radius + 1)^3 cube but (0, 0, 0), with at most
+    `max_nonzero` nonzero axes; one of each pair of opposite offsets.
+    """
+    steps = range(-radius, radius + 1)
+    offsets = [
+        offset
+        for offset in itertools.product(steps, steps, steps)
+        if 0 < sum(step != 0 for step in offset) <= max_nonzero and offset > (0, 0, 0)
+    ]
+    return torch.tensor(offsets, dtype=torch.long, device=device).view(-1, 3)
+
+
+def _axis_keys(coords: torch.Tensor, sizes, axis: int, pad: int) -> torch.Tensor:
+    """
+    Linear keys of `coords` (N, 3) in a `sizes` box padded by `pad`, `axis`
+    varying fastest; int32 when they fit, as sorting them is most of the cost.
+    """
+    columns = [c for c in range(3) if c != axis] + [axis]
+    dtype = torch.int32 if _padded_volume(sizes, pad) < 2**31 else torch.long
+    keys = torch.zeros(coords.shape[0], dtype=dtype, device=coords.device)
+    for column in columns:
+        keys = keys * (sizes[column] + 2 * pad) + (coords[:, column].to(dtype) + pad)
+    return keys
+
+
+def prune_sparse_structure(
+    coord_batch,
+    max_neighbor_axes_dist=1,
+):
+    """
+    Drop the interior voxels: those whose whole (2 * max_neighbor_axes_dist
+    + 1)^3 neighborhood is occupied (so a distance of 0 drops every voxel).
+    As in the dense path, voxels of any batch index count as neighbors.
+
+    The cube test is separable: a voxel is interior when its neighbors
+    within the distance along x are all "full along y and z", and so on. Per
+    axis the voxels are sorted by keys with that axis varying fastest, where
+    the neighbors along the axis are the next and previous keys.
+    """
+    radius = max_neighbor_axes_dist
+    if coord_batch.shape[0] == 0 or radius == 0:
+        return coord_batch[:0]
+    coords = coord_batch[:, 1:]
+    coords = coords - coords.min(0)[0]
+    sizes = [int(size) + 1 for size in coords.max(0)[0]]
+    keys = _axis_keys(coords, sizes, 2, radius)
+    if bool((keys[1:] > keys[:-1]).all()):
+        # already sorted and distinct, as torch.argwhere returns them
+        voxels, inverse = coords, None
+    else:
+        keys, inverse = torch.unique(keys, return_inverse=True)
+        voxels = torch.empty((keys.shape[0], 3), dtype=coords.dtype, device=coords.device)
+        voxels[inverse] = coords
+
+    full = torch.ones(voxels.shape[0], dtype=torch.bool, device=coords.device)
+    for axis in (2, 1, 0):
+        if axis == 2:
+            axis_keys, order = keys, None
+        else:
+            axis_keys, order = _axis_keys(voxels, sizes, axis, radius).sort()
+        sorted_full = full if order is None else full[order]
+        padded_keys = torch.nn.functional.pad(axis_keys, (radius, radius), value=-1)
+        padded_full = torch.nn.functional.pad(sorted_full, (radius, radius), value=False)
+        axis_full = sorted_full.clone()
+        count = axis_keys.shape[0]
+        for step in range(1, radius + 1):
+            for sign in (1, -1):
+                neighbor = slice(radius + sign * step, radius + sign * step + count)
+                # sorted distinct keys: key + step is present iff it is `step` keys away
+                axis_full &= padded_keys[neighbor] == axis_keys + sign * step
+                axis_full &= padded_full[neighbor]
+        if order is None:
+            full = axis_full
+        else:
+            full[order] = axis_full
+    return coord_batch[~(full if inverse is None else full[inverse])]
+
+
+def prune_sparse_structure_dense(
+    coord_batch,
+    max_neighbor_axes_dist=1,
+):
+    """`prune_sparse_structure` on a dense occupancy grid of the bounding box, with conv3d."""
+    coords, batch = coord_batch[:, 1:], coord_batch[:, 0].unsqueeze(-1)
+    device = coords.device
+    # 1) shift coords so minimum is zero
+    min_xyz = coords.min(0)[0]
+    coords0 = coords - min_xyz
+    # 2) build occupancy grid
+    max_xyz = coords0.max(0)[0] + 1  # size in each dim
+    D, H, W = max_xyz.tolist()
+    # shape (1,1,D,H,W)
+    occ = torch.zeros((1, 1, D, H, W), dtype=torch.uint8, device=device)
+    x, y, z = coords0.unbind(1)
+    occ[0, 0, x, y, z] = 1
+    # 3) 3×3×3 convolution to count each voxel + neighbors
+    kernel = torch.ones(
+        (
+            1,
+            1,
+            2 * max_neighbor_axes_dist + 1,
+            2 * max_neighbor_axes_dist + 1,
+            2 * max_neighbor_axes_dist + 1,
+        ),
+        dtype=torch.uint8,
+        device=device,
+    )
+    # pad so output is same size
+    pad = max_neighbor_axes_dist
+    counts = torch.nn.functional.conv3d(occ.float(), kernel.float(), padding=pad)
+    # interior voxels have count == (2*max_neighbor_axes_dist+1)**3
+    full_count = (2 * max_neighbor_axes_dist + 1) ** 3
+    # 4) lookup counts at each original coord
+    counts_at_pts = counts[0, 0, x, y, z]  # (N,)
+    is_surface = counts_at_pts < full_count
+    # 5) return filtered batch+coords (shift back if you want original coords)
+    kept = is_surface.nonzero(as_tuple=False).squeeze(1)
+    out_batch = batch[kept]
+    out_coords = coords[kept]
+    return torch.cat([out_batch, out_coords], dim=1)
+
+
+def sparse_connected_components(coord_batch, connectivity=26) -> torch.Tensor:
+    """
+    Component of each voxel, as the smallest row index of its component's
+    voxels. Voxels are connected through faces (6), faces and edges (18) or
+    also corners (26), never across batch indices.
+    """
+    if connectivity not in CONNECTIVITY_OFFSETS:
+        raise ValueError(f"connectivity must be one of {sorted(CONNECTIVITY_OFFSETS)}")
+    coords = coord_batch.long()
+    coords = coords - coords.min(0)[0]
+    num_voxels = coords.shape[0]
+    index = _VoxelIndex(coords, pad=1)
+    offsets = _neighbor_offsets(1, CONNECTIVITY_OFFSETS[connectivity], coords.device)
+    sources, targets = [], []
+    for offset in offsets:
+        neighbors = index.lookup(coords + torch.cat([offset.new_zeros(1), offset]))
+        found = (neighbors >= 0).nonzero().squeeze(1)
+        sources.append(found)
+        targets.append(neighbors[found])
+    sources, targets = torch.cat(sources), torch.cat(targets)
+
+    # min-label propagation along the edges, both ways, with pointer jumping
+    labels = torch.arange(num_voxels, device=coords.device)
+    while True:
+        updated = labels.scatter_reduce(0, sources, labels[targets], "amin")
+        updated = updated.scatter_reduce(0, targets, updated[sources], "amin")
+        updated = updated[updated]
+        if torch.equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def filter_sparse_components(coord_batch, min_voxels, connectivity=26):
+    """Drop the voxels of the connected components with fewer than `min_voxels` voxels."""
+    if coord_batch.shape[0] == 0:
+        return coord_batch
+    labels = sparse_connected_components(coord_batch, connectivity)
+    sizes = torch.bincount(labels, minlength=labels.numel())
+    return coord_batch[sizes[labels] >= min_voxels]
+
+
+def _unique_rows(rows: torch.Tensor) -> torch.Tensor:
+    """`torch.unique(rows, dim=0)` of non-negative int rows, through their linear keys."""
+    dims = [int(size) for size in rows.max(0)[0] + 1]
+    keys = torch.zeros(rows.shape[0], dtype=torch.long, device=rows.device)
+    for column, size in enumerate(dims):
+        keys = keys * size + rows[:, column].long()
+    keys = torch.unique(keys)  # sorted, so rows come out in lexicographic order
+    unique = torch.empty((keys.shape[0], len(dims)), dtype=rows.dtype, device=rows.device)
+    for column in reversed(range(len(dims))):
+        unique[:, column] = keys % dims[column]
+        keys = keys // dims[column]
+    return unique
+
+
+def downsample_sparse_structure(
+    coord_batch,
+    max_coords=42000,
+    downsample_factor=2,
+) -> Tuple[torch.Tensor, int]:
+    """
+    Downsample sparse structure coordinates when there are more than max_coords.
+
+    Downsamples by rescaling coordinates, effectively shrinking the grid while preserving
+    the structure. The downsampled grid is centered in the original space.
+
+    Args:
+        coord_batch: tensor of shape (N, 4) where [:, 0] is batch index and [:, 1:] are coords
+        max_coords: maximum number of coordinates to keep
+            42000 should be safe number. Calculation: max(int32) / (64*768) ~= 43691
+            Only needed for mesh decoding.
+        downsample_factor: factor by which to downsample (e.g., 2 means half resolution)
+
+    Returns:
+        Downsampled coord_batch with coordinates rescaled if downsampling is needed
+    """
+    if coord_batch.shape[0] <= max_coords:
+        return coord_batch, 1
+
+    # Extract coordinates and batch indices
+    coords = coord_batch[:, 1:].float()  # Shape: (N, 3), convert to float for scaling
+    batch_indices = coord_batch[:, 0:1]  # Shape: (N, 1)
+
+    # Find the actual coordinate bounds
+    coords_min = coords.min(dim=0)[0]  # Shape: (3,)
+    coords_max = coords.max(dim=0)[0]  # Shape: (3,)
+    original_size = coords_max - coords_min + 1  # Add 1 since coordinates are discrete
+
+    # Calculate target size after downsampling
+    target_size = original_size / downsample_factor
+
+    # Calculate the offset to center the downsampled grid
+    offset = (original_size - target_size) / 2
+    target_min = coords_min + offset
+    target_max = coords_min + offset + target_size - 1
+
+    # Normalize coordinates to [0, 1] within their actual range
+    coords_normalized = (coords - coords_min) / (coords_max - coords_min)
+
+    # Scale to the target range
+    coords_rescaled = coords_normalized * (target_size - 1) + target_min
+
+    # Round to integers to get discrete grid coordinates
+    coords_rescaled = torch.round(coords_rescaled).int()
+
+    # Clamp to ensure we stay within bounds
+    coords_rescaled = torch.clamp(coords_rescaled, target_min.int(), target_max.int())
+
+    # Remove duplicates that may have been created by the downsampling
+    # Concatenate batch and coords for duplicate removal
+    combined = torch.cat([batch_indices, coords_rescaled], dim=1)
+    unique_combined = _unique_rows(combined)
+
+    # If still too many after deduplication, randomly subsample
+    if unique_combined.shape[0] > max_coords:
+        indices = torch.randperm(unique_combined.shape[0], device=coord_batch.device)[
+            :max_coords
+        ]
+        unique_combined = unique_combined[indices]
+
+    return unique_combined.int(), downsample_factor
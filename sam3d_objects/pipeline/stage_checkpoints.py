@@ -0,0 +1,155 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Named intermediate artifacts of `InferencePipelinePointMap.run`, to rerun
+only the stages after one of them:
+
+    run(image, seed=..., checkpoint_dir="ckpt/chair")                   # saves all
+    run(image, checkpoint_dir="ckpt/chair", resume_from="slat", ...)    # decode + postprocess only
+
+Stage boundaries, in order (`STAGES`):
+
+- "pointmap": the depth model output (pointmap, intrinsics, normal, colors);
+- "ss": the stage 1 output (coords, decoded pose) and the RNG state after it;
+- "slat": the structured latent (coords and features);
+- "decoded": the decoded representations, before postprocessing;
+- "layout": the pose after layout post-optimization.
+
+`resume_from=<stage>` loads that stage and the ones before it and computes
+the others, so a decode-only sweep reruns neither sampler and a
+postprocess-only sweep ("decoded") neither the decoders; resuming from
+"layout" skips the layout optimization too. The image is still needed:
+the conditioning inputs are recomputed from it (cheap next to the stages).
+
+Unlike the content-addressed `ResultCache`, checkpoints are plain files in
+the directory the caller names, one `<stage>.pt` per stage, overwritten by
+the next run that saves there. Each records the settings its stage was made
+with; resuming with other settings for a loaded stage logs a warning and
+uses the checkpoint as is. Files are `torch.save` pickles (tensors stay on
+their device, as in `ResultCache`), with the pointmap colors stored as 8 bit
+and the normals as float16; only load checkpoints you wrote.
+"""
+import os
+import threading
+from typing import Any, Callable, Optional
+
+import numpy as np
+import torch
+from loguru import logger
+
+STAGES = ("pointmap", "ss", "slat", "decoded", "layout")
+
+
+def check_stage(stage: Optional[str]):
+    if stage is not None and stage not in STAGES:
+        raise ValueError(f"unknown stage {stage!r}, expected one of {STAGES}")
+
+
+def resumes(stage: str, resume_from: Optional[str]) -> bool:
+    """Whether `stage` is loaded rather than computed when resuming from `resume_from`."""
+    return resume_from is not None and STAGES.index(stage) <= STAGES.index(resume_from)
+
+
+class StageCheckpoints:
+    """
+    Args:
+        checkpoint_dir (str): Directory of the stage files, created if missing.
+    """
+
+    def __init__(self, checkpoint_dir: str):
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def path(self, stage: str) -> str:
+        check_stage(stage)
+        return os.path.join(self.checkpoint_dir, f"{stage}.pt")
+
+    def exists(self, stage: str) -> bool:
+        return os.path.exists(self.path(stage))
+
+    def save(self, stage: str, value: Any, settings: Optional[dict] = None):
+        """Store `value` as `stage`, made with `settings` (plain values)."""
+        path = self.path(stage)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            torch.save({"settings": settings or {}, "value": value}, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, stage: str, settings: Optional[dict] = None, map_location=None) -> Any:
+        """
+        The value stored as `stage`; warns when it was made with other
+        `settings` than the given ones.
+        """
+        path = self.path(stage)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"no {stage!r} checkpoint in {self.checkpoint_dir}: run with "
+                f"checkpoint_dir={self.checkpoint_dir!r} first"
+            )
+        stored = torch.load(path, map_location=map_location, weights_only=False)
+        if settings is not None:
+            changed = {
+                key: (stored["settings"].get(key), value)
+                for key, value in settings.items()
+                if stored["settings"].get(key) != value
+            }
+            if changed:
+                logger.warning(
+                    f"Resuming from the {stage!r} checkpoint made with other settings "
+                    f"(checkpoint, requested): {changed}"
+                )
+        return stored["value"]
+
+
+def run_stage(
+    checkpoints: Optional[StageCheckpoints],
+    stage: str,
+    compute: Callable[[], Any],
+    resume_from: Optional[str] = None,
+    settings: Optional[dict] = None,
+    to_checkpoint: Optional[Callable] = None,
+    from_checkpoint: Optional[Callable] = None,
+) -> Any:
+    """
+    The artifact of `stage`: loaded from `checkpoints` when resuming from it
+    or a later stage, else `compute()`d and saved to `checkpoints` (when
+    given). `to_checkpoint` / `from_checkpoint` convert it to and from its
+    stored form.
+    """
+    if resumes(stage, resume_from):
+        logger.info(f"Resuming {stage} from {checkpoints.checkpoint_dir}")
+        value = checkpoints.load(stage, settings)
+        return value if from_checkpoint is None else from_checkpoint(value)
+    value = compute()
+    if checkpoints is not None:
+        checkpoints.save(
+            stage, value if to_checkpoint is None else to_checkpoint(value), settings
+        )
+    return value
+
+
+def pointmap_to_checkpoint(pointmap_dict: dict) -> dict:
+    """Stored form of a `compute_pointmap` output."""
+    # colors are 8 bit images divided by 255 (image_to_float), normals unit
+    # vectors: neither needs 32 bits on disk
+    normal = pointmap_dict.get("normal")
+    return {
+        **pointmap_dict,
+        "pts_color": (pointmap_dict["pts_color"] * 255).round().to(torch.uint8),
+        "normal": None if normal is None else normal.half(),
+    }
+
+
+def pointmap_from_checkpoint(stored: dict) -> dict:
+    normal = stored.get("normal")
+    pts_color = stored["pts_color"]
+    return {
+        **stored,
+        # computed as image_to_float does, so the colors are bit identical
+        "pts_color": torch.from_numpy(
+            (pts_color.cpu().numpy() / 255).astype(np.float32)
+        ).to(pts_color.device),
+        "normal": None if normal is None else normal.float(),
+    }
@@ -0,0 +1,375 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Per-stage latency / memory profiler for the inference pipelines.
+
+A `StageProfiler` is enabled for one call (`InferencePipeline.run(...,
+profiler=StageProfiler())`) and records every stage entered while it is
+active: pipeline stages (`@profiled` methods), denoising steps of the ODE
+solvers, and anything wrapped in `profile_stage(...)`. Each event has
+
+- wall time on the host, and the time between CUDA synchronizations at
+  entry and exit when CUDA is available;
+- allocated CUDA memory at entry / exit and the peak while inside;
+- the process' peak RSS at exit;
+- sizes of the tensors the stage returned (for `@profiled` methods, or
+  recorded with `event.record_tensors`).
+
+Components can also add to named counters (`record_counters`), e.g. the hits
+of the image feature cache; they are totalled per run in `to_dict`.
+
+The trace is saved as JSON (`save_json`) or as a Chrome trace-event file
+(`save_chrome_trace`, open in chrome://tracing or https://ui.perfetto.dev).
+
+When no profiler is active, `profile_stage` returns a shared no-op context
+and `@profiled` calls straight through: a context variable lookup per stage.
+"""
+import contextvars
+import functools
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import torch
+
+
+_ACTIVE_PROFILER: contextvars.ContextVar = contextvars.ContextVar(
+    "sam3d_active_profiler", default=None
+)
+
+# shapes listed per event, the counts and bytes cover every tensor
+MAX_RECORDED_SHAPES = 16
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def tensor_summary(obj: Any, max_shapes: int = MAX_RECORDED_SHAPES) -> Dict[str, Any]:
+    """
+    Count, total bytes and shapes of the tensors in a (nested) dict / list /
+    tuple. Sparse tensors (objects with `feats` and `coords` tensors) count
+    as their two tensors. Only reads metadata, never synchronizes.
+    """
+    summary = {"count": 0, "bytes": 0, "shapes": {}}
+
+    def visit(value, path):
+        if isinstance(value, torch.Tensor):
+            summary["count"] += 1
+            summary["bytes"] += value.numel() * value.element_size()
+            if len(summary["shapes"]) < max_shapes:
+                summary["shapes"][path or "."] = list(value.shape)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                visit(item, f"{path}.{key}" if path else str(key))
+        elif isinstance(value, (list, tuple)):
+            for i, item in enumerate(value):
+                visit(item, f"{path}[{i}]")
+        elif isinstance(getattr(value, "feats", None), torch.Tensor) and isinstance(
+            getattr(value, "coords", None), torch.Tensor
+        ):
+            visit(value.feats, f"{path}.feats")
+            visit(value.coords, f"{path}.coords")
+
+    visit(obj, "")
+    return summary
+
+
+class StageEvent:
+    """One profiled stage; `record_tensors` / `annotate` add to its record."""
+
+    def __init__(self, profiler: "StageProfiler", name: str, path: str, depth: int, args):
+        self.profiler = profiler
+        self.name = name
+        self.path = path
+        self.depth = depth
+        self.args = dict(args)
+        self.tensors = {}
+        self.cuda_peak = 0
+
+    def record_tensors(self, key: str, obj: Any):
+        self.tensors[key] = tensor_summary(obj)
+
+    def annotate(self, **kwargs):
+        self.args.update(kwargs)
+
+
+class _NullEvent:
+    def record_tensors(self, key, obj):
+        pass
+
+    def annotate(self, **kwargs):
+        pass
+
+
+class _NullStage:
+    # shared no-op context returned while no profiler is active
+    __slots__ = ()
+    event = _NullEvent()
+
+    def __enter__(self):
+        return self.event
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageProfiler:
+    """
+    Records nested stages while active (see the module docstring).
+
+    Args:
+        synchronize (bool): Synchronize CUDA at stage boundaries to measure
+            device time and peak memory per stage. Adds a sync per stage and
+            per denoising step.
+        record_steps (bool): Record the denoising steps of the ODE solvers.
+        device: CUDA device to measure, the current one by default.
+    """
+
+    def __init__(self, synchronize: bool = True, record_steps: bool = True, device=None):
+        self.cuda = torch.cuda.is_available()
+        self.synchronize = synchronize and self.cuda
+        self.record_steps = record_steps
+        self.device = device
+        self.events: List[Dict[str, Any]] = []
+        self.counters: Dict[str, Dict[str, float]] = {}
+        self._stack: List[StageEvent] = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    # -- activation ---------------------------------------------------------
+
+    @contextmanager
+    def activate(self, name: Optional[str] = None, **args):
+        """Make this the active profiler, optionally inside a top level stage."""
+        token = _ACTIVE_PROFILER.set(self)
+        try:
+            if name is None:
+                yield self
+            else:
+                with self.stage(name, **args):
+                    yield self
+        finally:
+            _ACTIVE_PROFILER.reset(token)
+
+    # -- recording ----------------------------------------------------------
+
+    def _sync(self):
+        if self.synchronize:
+            torch.cuda.synchronize(self.device)
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    @contextmanager
+    def stage(self, name: str, **args):
+        parent = self._stack[-1] if self._stack else None
+        path = f"{parent.path}/{name}" if parent is not None else name
+        event = StageEvent(self, name, path, len(self._stack), args)
+
+        start_us = self._now_us()
+        self._sync()
+        synced_start_us = self._now_us()
+        if self.cuda:
+            if parent is not None:
+                # keep the peak the parent reached so far before resetting
+                parent.cuda_peak = max(
+                    parent.cuda_peak, torch.cuda.max_memory_allocated(self.device)
+                )
+            memory_before = torch.cuda.memory_allocated(self.device)
+            torch.cuda.reset_peak_memory_stats(self.device)
+
+        self._stack.append(event)
+        try:
+            yield event
+        finally:
+            self._stack.pop()
+            end_us = self._now_us()
+            self._sync()
+            synced_end_us = self._now_us()
+
+            record = {
+                "name": name,
+                "path": path,
+                "depth": event.depth,
+                "start_us": start_us,
+                "wall_ms": (end_us - start_us) / 1e3,
+                "peak_rss_mb": _peak_rss_mb(),
+                "thread": threading.get_ident(),
+            }
+            if self.synchronize:
+                record["cuda_synced_ms"] = (synced_end_us - synced_start_us) / 1e3
+            if self.cuda:
+                event.cuda_peak = max(
+                    event.cuda_peak, torch.cuda.max_memory_allocated(self.device)
+                )
+                record["cuda_allocated_before_mb"] = memory_before / 2**20
+                record["cuda_allocated_after_mb"] = (
+                    torch.cuda.memory_allocated(self.device) / 2**20
+                )
+                record["cuda_peak_allocated_mb"] = event.cuda_peak / 2**20
+                if parent is not None:
+                    parent.cuda_peak = max(parent.cuda_peak, event.cuda_peak)
+            if event.args:
+                record["args"] = event.args
+            if event.tensors:
+                record["tensors"] = event.tensors
+            self.events.append(record)
+
+    def count(self, group: str, **increments):
+        totals = self.counters.setdefault(group, {})
+        for key, value in increments.items():
+            totals[key] = totals.get(key, 0) + value
+
+    # -- output -------------------------------------------------------------
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Totals per stage path: calls, wall ms, synced ms, max peak memory."""
+        totals: Dict[str, Dict[str, float]] = {}
+        for event in self.events:
+            entry = totals.setdefault(event["path"], {"calls": 0, "wall_ms": 0.0})
+            entry["calls"] += 1
+            entry["wall_ms"] += event["wall_ms"]
+            if "cuda_synced_ms" in event:
+                entry["cuda_synced_ms"] = entry.get("cuda_synced_ms", 0.0) + event[
+                    "cuda_synced_ms"
+                ]
+            if "cuda_peak_allocated_mb" in event:
+                entry["cuda_peak_allocated_mb"] = max(
+                    entry.get("cuda_peak_allocated_mb", 0.0),
+                    event["cuda_peak_allocated_mb"],
+                )
+        return totals
+
+    def counter_totals(self) -> Dict[str, Dict[str, float]]:
+        """The counters, plus a hit rate for groups counting hits and misses."""
+        totals = {}
+        for group, counts in self.counters.items():
+            totals[group] = dict(counts)
+            lookups = counts.get("hits", 0) + counts.get("misses", 0)
+            if lookups:
+                totals[group]["hit_rate"] = counts.get("hits", 0) / lookups
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "synchronized": self.synchronize,
+            "events": sorted(self.events, key=lambda e: e["start_us"]),
+            "summary": self.summary(),
+            "counters": self.counter_totals(),
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Trace-event format: one complete ("X") event per stage, and CUDA
+        memory counters at the end of every stage."""
+        trace = []
+        for event in sorted(self.events, key=lambda e: e["start_us"]):
+            args = {
+                key: value
+                for key, value in event.items()
+                if key not in ("name", "start_us", "wall_ms", "thread", "depth")
+            }
+            trace.append(
+                {
+                    "name": event["name"],
+                    "cat": event["path"].split("/")[0],
+                    "ph": "X",
+                    "ts": event["start_us"],
+                    "dur": event["wall_ms"] * 1e3,
+                    "pid": self._pid,
+                    "tid": event["thread"],
+                    "args": args,
+                }
+            )
+            if "cuda_peak_allocated_mb" in event:
+                trace.append(
+                    {
+                        "name": "cuda memory (MB)",
+                        "ph": "C",
+                        "ts": event["start_us"] + event["wall_ms"] * 1e3,
+                        "pid": self._pid,
+                        "args": {
+                            "allocated": event["cuda_allocated_after_mb"],
+                            "peak": event["cuda_peak_allocated_mb"],
+                        },
+                    }
+                )
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def save_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def save_chrome_trace(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def active_profiler() -> Optional[StageProfiler]:
+    return _ACTIVE_PROFILER.get()
+
+
+def profile_stage(name: str, **args):
+    """
+    `with profile_stage("name") as event:` records a stage on the active
+    profiler, or does nothing when there is none.
+    """
+    profiler = _ACTIVE_PROFILER.get()
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name, **args)
+
+
+def profile_step(step: int):
+    """Stage for one denoising step; no-op unless the active profiler records steps."""
+    profiler = _ACTIVE_PROFILER.get()
+    if profiler is None or not profiler.record_steps:
+        return _NULL_STAGE
+    return profiler.stage("step", step=step)
+
+
+def record_counters(group: str, **increments):
+    """Add to the `group` counters of the active profiler, if any."""
+    profiler = _ACTIVE_PROFILER.get()
+    if profiler is not None:
+        profiler.count(group, **increments)
+
+
+@contextmanager
+def profiling(profiler: Optional[StageProfiler], name: str, **args):
+    """Activate `profiler` (if not None) for the duration of a top level `name` stage."""
+    if profiler is None:
+        yield None
+        return
+    with profiler.activate(name, **args):
+        yield profiler
+
+
+def profiled(name: Optional[str] = None):
+    """
+    Decorator recording each call as a stage (named after the function by
+    default), with the sizes of the returned tensors.
+    """
+
+    def decorator(fn):
+        stage_name = fn.__name__ if name is None else name
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _ACTIVE_PROFILER.get()
+            if profiler is None:
+                return fn(*args, **kwargs)
+            with profiler.stage(stage_name) as event:
+                result = fn(*args, **kwargs)
+                event.record_tensors("output", result)
+                return result
+
+        return wrapper
+
+    return decorator
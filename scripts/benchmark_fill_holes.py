@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""Wall time and output quality of the hole filling in to_glb (_fill_holes).
+
+Runs _fill_holes on a mesh with
+
+    full        the current settings: 1000 views at 1024^2, all rasterized
+    fast        FILL_HOLES_MODES["fast"]: fewer, smaller views, batched, stopped
+                once no new face becomes visible
+    bvh         the "fast" settings with visibility ray cast on the CPU
+                (no nvdiffrast needed)
+
+and reports views used, invisible faces, faces removed by the mincut, the
+number of holes (boundary loops) left after meshfix and the removed-face
+delta against "full". Modes needing CUDA are skipped without it.
+
+With --visibility-only only the face visibility is computed (no utils3d
+graph ops, igraph or meshfix needed); quality is then the number of faces
+classified invisible and the disagreement with "full".
+
+The default mesh is synthetic: a subdivided box with a small hole, enclosing
+a second box. Pass --mesh to use any mesh trimesh can load.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_fill_holes.py [--mesh path.glb] [--modes full fast bvh]
+        [--visibility-only]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+from sam3d_objects.model.backbone.tdfy_dit.utils import visibility_utils  # noqa: E402
+
+FULL = dict(resolution=1024, num_views=1000, convergence_tol=None)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--mesh", default=None)
+    p.add_argument("--subdivisions", type=int, default=40,
+                   help="quads per box side of the synthetic mesh")
+    p.add_argument("--modes", nargs="+", default=["full", "fast", "bvh"],
+                   choices=["full", "fast", "bvh"])
+    p.add_argument("--bvh-resolution", type=int, default=256,
+                   help="view resolution of the bvh mode")
+    p.add_argument("--visibility-only", action="store_true")
+    return p.parse_args()
+
+
+def box(center, half_size, subdivisions, skip_quad=False):
+    verts, faces = [], []
+    grid = np.linspace(-1, 1, subdivisions + 1)
+    n = subdivisions + 1
+    for axis in range(3):
+        for sign in (-1, 1):
+            base = len(verts)
+            for a in grid:
+                for b in grid:
+                    p = np.zeros(3)
+                    p[axis] = sign
+                    p[(axis + 1) % 3], p[(axis + 2) % 3] = a, b
+                    verts.append(center + half_size * p)
+            for i in range(subdivisions):
+                for j in range(subdivisions):
+                    if skip_quad and axis == 0 and sign == 1 and i == j == subdivisions // 2:
+                        continue
+                    v00, v01 = base + i * n + j, base + i * n + j + 1
+                    v10, v11 = v00 + n, v01 + n
+                    faces += [[v00, v10, v11], [v00, v11, v01]]
+    verts, index = np.unique(np.round(verts, 6), axis=0, return_inverse=True)
+    return verts, index.reshape(-1)[np.asarray(faces)]
+
+
+def load_mesh(args):
+    if args.mesh is not None:
+        import trimesh
+
+        mesh = trimesh.load(args.mesh, force="mesh")
+        verts = np.asarray(mesh.vertices, dtype=np.float64)
+        # same normalization as the generated meshes: centered in [-0.5, 0.5]^3
+        verts -= (verts.max(0) + verts.min(0)) / 2
+        verts /= np.abs(verts).max() * 2
+        return verts, np.asarray(mesh.faces)
+    outer_v, outer_f = box(np.zeros(3), 0.4, args.subdivisions, skip_quad=True)
+    inner_v, inner_f = box(np.zeros(3), 0.2, args.subdivisions // 2)
+    return (np.concatenate([outer_v, inner_v]),
+            np.concatenate([outer_f, inner_f + len(outer_v)]))
+
+
+def settings(mode, args):
+    # postprocessing_utils needs the full mesh stack (utils3d, igraph, ...)
+    fast = dict(resolution=512, num_views=300, convergence_tol=1e-3)
+    try:
+        from sam3d_objects.model.backbone.tdfy_dit.utils.postprocessing_utils import (
+            FILL_HOLES_MODES,
+        )
+
+        fast = FILL_HOLES_MODES["fast"]
+    except ImportError:
+        pass
+    if mode == "full":
+        return dict(FULL, visibility_backend="nvdiffrast")
+    if mode == "fast":
+        return dict(fast, visibility_backend="nvdiffrast")
+    return dict(fast, resolution=args.bvh_resolution, visibility_backend="bvh")
+
+
+def run_visibility(verts, faces, config):
+    device = "cuda" if config["visibility_backend"] == "nvdiffrast" else "cpu"
+    verts = torch.tensor(verts, dtype=torch.float32, device=device)
+    faces = torch.tensor(faces, dtype=torch.int32, device=device)
+    start = time.perf_counter()
+    visibility, views = visibility_utils.face_visibility(
+        verts, faces, num_views=config["num_views"], resolution=config["resolution"],
+        backend=config["visibility_backend"], convergence_tol=config["convergence_tol"],
+    )
+    if device == "cuda":
+        torch.cuda.synchronize()
+    return time.perf_counter() - start, {"views": views, "visibility": visibility.cpu()}
+
+
+def run_fill_holes(verts, faces, config):
+    from sam3d_objects.model.backbone.tdfy_dit.utils.postprocessing_utils import _fill_holes
+
+    device = "cuda" if config["visibility_backend"] == "nvdiffrast" else "cpu"
+    stats = {}
+    start = time.perf_counter()
+    out_verts, out_faces = _fill_holes(
+        torch.tensor(verts, dtype=torch.float32, device=device),
+        torch.tensor(faces, dtype=torch.int32, device=device),
+        num_views=config["num_views"], resolution=config["resolution"],
+        visibility_backend=config["visibility_backend"],
+        convergence_tol=config["convergence_tol"], stats=stats,
+    )
+    if device == "cuda":
+        torch.cuda.synchronize()
+    stats["holes"] = visibility_utils.count_boundary_loops(out_faces.cpu().numpy())
+    stats["faces"] = out_faces.shape[0]
+    return time.perf_counter() - start, stats
+
+
+def main():
+    args = parse_args()
+    verts, faces = load_mesh(args)
+    print(f"mesh: {len(verts)} vertices, {len(faces)} faces, "
+          f"{visibility_utils.count_boundary_loops(faces)} holes")
+
+    results = {}
+    for mode in args.modes:
+        config = settings(mode, args)
+        if config["visibility_backend"] == "nvdiffrast" and not torch.cuda.is_available():
+            print(f"{mode:>6} skipped: needs CUDA")
+            continue
+        run = run_visibility if args.visibility_only else run_fill_holes
+        seconds, stats = run(verts, faces, config)
+        results[mode] = (seconds, stats)
+
+    reference = results.get("full")
+    if args.visibility_only:
+        print(f"{'mode':>6} {'time s':>8} {'views':>6} {'invisible':>10} {'disagree':>9}")
+        for mode, (seconds, stats) in results.items():
+            invisible = stats["visibility"] == 0
+            disagree = ("-" if reference is None else
+                        int((invisible != (reference[1]["visibility"] == 0)).sum()))
+            print(f"{mode:>6} {seconds:>8.2f} {stats['views']:>6} "
+                  f"{int(invisible.sum()):>10} {disagree:>9}")
+        return
+
+    print(f"{'mode':>6} {'time s':>8} {'views':>6} {'invisible':>10} {'removed':>8} "
+          f"{'delta':>6} {'holes':>6} {'faces':>8}")
+    for mode, (seconds, stats) in results.items():
+        delta = ("-" if reference is None else
+                 stats["removed_faces"] - reference[1]["removed_faces"])
+        print(f"{mode:>6} {seconds:>8.2f} {stats['views']:>6} "
+              f"{stats.get('invisible_faces', 0):>10} {stats['removed_faces']:>8} "
+              f"{delta:>6} {stats['holes']:>6} {stats['faces']:>8}")
+
+
+if __name__ == "__main__":
+    main()
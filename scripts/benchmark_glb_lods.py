@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""Per-level size and generation time of the GLB levels of detail (glb_lods).
+
+Reads a textured GLB written by to_glb (one mesh with POSITION, TEXCOORD_0
+and a base color texture, as trimesh exports it), derives --levels levels of
+detail the way postprocessing_utils.glb_lods does (lod_utils.cluster_decimate
+on the mesh and its UVs, the texture scaled down with PIL), and prints per
+level the vertices, faces, texture size, the generation time and the size of
+the level as a GLB file of its own; then the size of one GLB file holding
+all levels with MSFT_lod.
+
+The GLB files are written here with numpy and PIL only (lod_utils.write_glb,
+PNG textures, the buffer layout trimesh writes), so that no trimesh, utils3d
+or rasterizer is needed.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_glb_lods.py [model.glb] [--levels 1:2048 0.25:1024 ...]
+        [--upsample 0]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from sam3d_objects.model.backbone.tdfy_dit.utils import lod_utils  # noqa: E402
+
+COMPONENT_TYPES = {5121: np.uint8, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+WIDTHS = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("glb", nargs="?", default="model.glb")
+    p.add_argument("--levels", nargs="+", default=[f"{f}:{t}" for f, t in lod_utils.LOD_LEVELS],
+                   help="fraction:texture_size per level, finest first")
+    p.add_argument("--upsample", type=int, default=0,
+                   help="split every face into 4^N (a denser mesh of the same shape)")
+    return p.parse_args()
+
+
+def load_glb(path):
+    with open(path, "rb") as f:
+        gltf, binary = lod_utils.read_glb(f.read())
+    primitive = gltf["meshes"][0]["primitives"][0]
+
+    def accessor(index):
+        info = gltf["accessors"][index]
+        view = gltf["bufferViews"][info["bufferView"]]
+        width = WIDTHS[info["type"]]
+        start = view.get("byteOffset", 0) + info.get("byteOffset", 0)
+        array = np.frombuffer(binary, COMPONENT_TYPES[info["componentType"]], info["count"] * width, start)
+        return array.reshape(info["count"], width)
+
+    material = gltf["materials"][primitive["material"]]
+    texture = gltf["textures"][material["pbrMetallicRoughness"]["baseColorTexture"]["index"]]
+    view = gltf["bufferViews"][gltf["images"][texture["source"]]["bufferView"]]
+    start = view.get("byteOffset", 0)
+    image = Image.open(io.BytesIO(binary[start : start + view["byteLength"]])).convert("RGB")
+    return (
+        accessor(primitive["attributes"]["POSITION"]).astype(np.float64),
+        accessor(primitive["indices"]).reshape(-1, 3).astype(np.int64),
+        accessor(primitive["attributes"]["TEXCOORD_0"]).astype(np.float64),
+        image,
+    )
+
+
+def subdivide(vertices, faces, uvs):
+    """Split every face into 4 at its edge midpoints (seams stay split)."""
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    unique, inverse = np.unique(edges, axis=0, return_inverse=True)
+    mid = len(vertices) + inverse.reshape(-1, 3)
+    vertices = np.concatenate([vertices, vertices[unique].mean(1)])
+    uvs = np.concatenate([uvs, uvs[unique].mean(1)])
+    a, b, c = faces.T
+    ab, bc, ca = mid.T
+    faces = np.concatenate([np.stack(f, 1) for f in ([a, ab, ca], [ab, b, bc], [ca, bc, c], [ab, bc, ca])])
+    return vertices, faces, uvs
+
+
+def encode(levels):
+    """One GLB file of (vertices, faces, uvs, texture) levels, as nodes lod0, lod1, ..."""
+    gltf = {"asset": {"version": "2.0"}, "scene": 0, "scenes": [{"nodes": [0]}],
+            "nodes": [{"name": "world", "children": []}], "meshes": [], "accessors": [],
+            "bufferViews": [], "images": [], "textures": [], "materials": []}
+    binary = bytearray()
+
+    def view(data):
+        binary.extend(b"\x00" * (-len(binary) % 4))
+        gltf["bufferViews"].append({"buffer": 0, "byteOffset": len(binary), "byteLength": len(data)})
+        binary.extend(data)
+        return len(gltf["bufferViews"]) - 1
+
+    def accessor(array, kind, component, **extra):
+        gltf["accessors"].append({"bufferView": view(array.tobytes()), "componentType": component,
+                                  "count": len(array), "type": kind, **extra})
+        return len(gltf["accessors"]) - 1
+
+    for level, (vertices, faces, uvs, texture) in enumerate(levels):
+        vertices = vertices.astype(np.float32)
+        png = io.BytesIO()
+        texture.save(png, format="PNG")
+        gltf["images"].append({"bufferView": view(png.getvalue()), "mimeType": "image/png"})
+        gltf["textures"].append({"source": level})
+        gltf["materials"].append({"pbrMetallicRoughness": {"baseColorTexture": {"index": level},
+                                                           "roughnessFactor": 1.0}})
+        primitive = {
+            "indices": accessor(faces.astype(np.uint32).reshape(-1), "SCALAR", 5125),
+            "attributes": {
+                "POSITION": accessor(vertices, "VEC3", 5126, min=vertices.min(0).tolist(),
+                                     max=vertices.max(0).tolist()),
+                "TEXCOORD_0": accessor(uvs.astype(np.float32), "VEC2", 5126),
+            },
+            "material": level,
+            "mode": 4,
+        }
+        gltf["meshes"].append({"primitives": [primitive]})
+        gltf["nodes"].append({"name": f"lod{level}", "mesh": level})
+        gltf["nodes"][0]["children"].append(level + 1)
+    gltf["buffers"] = [{"byteLength": len(binary)}]
+    return lod_utils.write_glb(gltf, bytes(binary))
+
+
+def main():
+    args = parse_args()
+    levels = [(float(f), int(t)) for f, t in (level.split(":") for level in args.levels)]
+    vertices, faces, uvs, texture = load_glb(args.glb)
+    for _ in range(args.upsample):
+        vertices, faces, uvs = subdivide(vertices, faces, uvs)
+    print(f"{args.glb}: {len(vertices)} vertices, {len(faces)} faces, "
+          f"{texture.size[0]}x{texture.size[1]} texture")
+
+    outputs = []
+    print(f"{'level':>5} {'vertices':>9} {'faces':>8} {'texture':>8} {'ms':>8} {'KiB':>9}")
+    for level, (fraction, texture_size) in enumerate(levels):
+        start = time.perf_counter()
+        level_vertices, level_faces, _, level_uvs = lod_utils.cluster_decimate(
+            vertices, faces, max(1, int(round(fraction * len(faces)))), uvs=uvs
+        )
+        level_texture = texture
+        if texture_size < max(texture.size):
+            level_texture = texture.resize((texture_size, texture_size), Image.LANCZOS)
+        seconds = time.perf_counter() - start
+        outputs.append((level_vertices, level_faces, level_uvs, level_texture))
+        size = len(encode(outputs[-1:]))
+        print(f"{level:>5} {len(level_vertices):>9} {len(level_faces):>8} "
+              f"{max(level_texture.size):>8} {seconds * 1e3:>8.1f} {size / 2**10:>9.1f}")
+    combined = lod_utils.add_msft_lod(encode(outputs), [f"lod{i}" for i in range(len(outputs))])
+    print(f"one GLB file with MSFT_lod: {len(combined) / 2**10:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
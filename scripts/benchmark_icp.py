@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""CPU cost of the torch ICP (sam3d_objects/pipeline/icp.py) against point count.
+
+For synthetic clouds (an irregular closed surface; the source a rigidly moved,
+noisy subset of the target, as a decoded shape against the depth points) of
+each --points size, times
+
+    torch         `icp`, one cloud
+    batched       `icp` on --batch clouds at once, per cloud
+    open3d        registration_icp, when open3d is installed (with the
+                  host copies run_ICP used to make)
+
+for point-to-point and point-to-plane (target normals precomputed, not
+timed), and prints the median wall time in milliseconds, the iterations and
+the rotation error of the result in degrees.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_icp.py [--points 1000 10000 100000] [--batch 4]
+        [--threshold 0.05] [--threads 4] [--device cpu]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import torch  # noqa: E402
+
+from sam3d_objects.pipeline.icp import estimate_normals, icp  # noqa: E402
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--points", nargs="+", type=int, default=[1000, 10000, 100000])
+    p.add_argument("--batch", type=int, default=4, help="clouds of the batched run")
+    p.add_argument("--threshold", type=float, default=0.05)
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    p.add_argument("--device", default="cpu")
+    return p.parse_args()
+
+
+def rigid(seed):
+    generator = torch.Generator().manual_seed(seed)
+    axis = torch.nn.functional.normalize(torch.randn(3, generator=generator), dim=0)
+    skew = torch.tensor([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    transformation = torch.eye(4)
+    transformation[:3, :3] = torch.matrix_exp(0.1 * skew)
+    transformation[:3, 3] = 0.02 * torch.randn(3, generator=generator)
+    return transformation
+
+
+def clouds(count, seed, device):
+    generator = torch.Generator().manual_seed(seed)
+    directions = torch.nn.functional.normalize(torch.randn(count, 3, generator=generator), dim=1)
+    radius = 0.4 + 0.1 * directions[:, 0] ** 2 + 0.05 * directions[:, 1]
+    target = directions * radius[:, None] * torch.tensor([1.0, 0.7, 0.5])
+    truth = rigid(seed)
+    inverse = torch.linalg.inv(truth)
+    source = target[: count * 2 // 3] @ inverse[:3, :3].T + inverse[:3, 3]
+    source = source + 0.002 * torch.randn(source.shape, generator=generator)
+    return source.to(device), target.to(device), truth.to(device)
+
+
+def rotation_error(transformation, truth):
+    relative = transformation[:3, :3].double() @ truth[:3, :3].double().T
+    cos = ((relative.trace() - 1) / 2).clamp(-1, 1)
+    return float(torch.rad2deg(torch.arccos(cos)))
+
+
+def timed(fn, repeats, device):
+    times = []
+    for _ in range(repeats):
+        if device.startswith("cuda"):
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if device.startswith("cuda"):
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e3, result
+
+
+def open3d_icp(o3d, source, target, normals, threshold, method):
+    import numpy as np
+
+    source_pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(source.cpu().double().numpy()))
+    target_pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(target.cpu().double().numpy()))
+    if method == "point_to_plane":
+        target_pcd.normals = o3d.utility.Vector3dVector(normals.cpu().double().numpy())
+        estimation = o3d.pipelines.registration.TransformationEstimationPointToPlane()
+    else:
+        estimation = o3d.pipelines.registration.TransformationEstimationPointToPoint()
+    result = o3d.pipelines.registration.registration_icp(
+        source_pcd, target_pcd, threshold, np.eye(4), estimation
+    )
+    return torch.from_numpy(np.array(result.transformation))
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    try:
+        import open3d as o3d
+    except ImportError:
+        o3d = None
+        print("open3d is not installed, skipping its runs")
+
+    print(f"{'method':>15} {'points':>8} {'backend':>8} {'ms':>9} {'iters':>6} {'rot err':>8}")
+    for method in ("point_to_point", "point_to_plane"):
+        for count in args.points:
+            batch = [clouds(count, seed, args.device) for seed in range(args.batch)]
+            source, target, truth = batch[0]
+            normals = [estimate_normals(cloud[1]) for cloud in batch]
+
+            ms, result = timed(
+                lambda: icp(source, target, args.threshold, method=method, target_normals=normals[0]),
+                args.repeats, args.device,
+            )
+            rows = [("torch", ms, int(result.iterations), rotation_error(result.transformation, truth))]
+            ms, result = timed(
+                lambda: icp([c[0] for c in batch], [c[1] for c in batch], args.threshold,
+                            method=method, target_normals=normals),
+                args.repeats, args.device,
+            )
+            errors = [rotation_error(result.transformation[i], batch[i][2]) for i in range(args.batch)]
+            rows.append((f"batch/{args.batch}", ms / args.batch, int(result.iterations.max()), max(errors)))
+            if o3d is not None:
+                ms, transformation = timed(
+                    lambda: open3d_icp(o3d, source, target, normals[0], args.threshold, method),
+                    args.repeats, args.device,
+                )
+                rows.append(("open3d", ms, -1, rotation_error(transformation, truth.cpu())))
+            for backend, ms, iterations, error in rows:
+                print(f"{method:>15} {count:>8} {backend:>8} {ms:>9.1f} {iterations:>6} {error:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Startup cost of `import inference` (notebook/inference.py).
+
+Measures, each in a fresh subprocess so nothing is cached in `sys.modules`:
+
+    core       `import inference`, what batch workers, the server and tests pay
+    deferred   the visualization, interactive and rendering modules that
+               inference.py imports on first use (matplotlib, seaborn,
+               gradio, kaolin, pytorch3d, utils3d, render_utils,
+               SceneVisualizer); before they were deferred, every
+               `import inference` paid this on top of `core`
+
+Modules that do not import here are reported and left out of `deferred`. With
+--top N it also lists the N slowest imports of `core` (from
+`python -X importtime`). The OS file cache is warm after the first run, so
+the median of --repeat runs measures a warm start.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_import_time.py [--repeat 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+DEFERRED = (
+    "matplotlib.pyplot",
+    "seaborn",
+    "gradio",
+    "kaolin.visualize",
+    "kaolin.render.camera",
+    "pytorch3d.transforms",
+    "utils3d",
+    "sam3d_objects.model.backbone.tdfy_dit.utils.render_utils",
+    "sam3d_objects.utils.visualization",
+)
+
+_TIMED = """
+import os, sys, time
+os.environ["LIDRA_SKIP_INIT"] = "true"
+sys.path.insert(0, "notebook")
+start = time.perf_counter()
+{imports}
+print(time.perf_counter() - start)
+"""
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--top", type=int, default=15, help="slowest core imports to list")
+    return p.parse_args()
+
+
+def timed(imports):
+    code = _TIMED.format(imports="\n".join(f"import {name}" for name in imports))
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.splitlines()[-1])
+
+
+def available(name):
+    code = f"import os, sys; os.environ['LIDRA_SKIP_INIT'] = 'true'; import {name}"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True)
+    return result.returncode == 0
+
+
+def slowest_imports(count):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "import sys; sys.path.insert(0, 'notebook'); import inference"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env={**os.environ, "LIDRA_SKIP_INIT": "true"},
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    args = parse_args()
+    deferred = [name for name in DEFERRED if available(name)]
+    missing = sorted(set(DEFERRED) - set(deferred))
+
+    core = [timed(["inference"]) for _ in range(args.repeat)]
+    eager = [timed(["inference", *deferred]) for _ in range(args.repeat)]
+    core_s, eager_s = statistics.median(core), statistics.median(eager)
+    print(f"core      import inference            {core_s:7.2f} s")
+    print(f"deferred  + {len(deferred)} visualization modules   {eager_s - core_s:7.2f} s"
+          f"  (saved on every core import)")
+    if missing:
+        print(f"not importable, not measured: {', '.join(missing)}")
+
+    if args.top:
+        print("\nslowest imports of core (cumulative):")
+        for microseconds, name in slowest_imports(args.top):
+            print(f"  {microseconds / 1e6:7.3f} s  {name}")
+
+
+if __name__ == "__main__":
+    main()
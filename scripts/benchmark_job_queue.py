@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""Throughput, latency and fairness of the server's job queue, without a GPU.
+
+Drives process/3d-generator/job_queue.py with a stub pipeline whose sampling
+costs `--gpu-fixed-ms` per micro-batch plus `--gpu-item-ms` per job (what a
+batched backbone amortises) and whose postprocessing costs `--cpu-ms` per job.
+Jobs arrive as a Poisson process at `--rate` jobs/s with `--keys` distinct
+batch keys (single-view / n-view requests).
+
+Compares the old one-request-at-a-time /infer (`serial`: sample then export,
+nothing overlapped) with the queue at each --max-batch-size. Fairness is the
+number of pairs of jobs that started sampling in the opposite order of
+submission.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_job_queue.py [--jobs 200] [--rate 20]
+        [--max-batch-size 1 2 4 8] [--max-wait-ms 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "process", "3d-generator"),
+)
+
+from job_queue import JobQueue  # noqa: E402
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--jobs", type=int, default=200)
+    p.add_argument("--rate", type=float, default=20.0, help="arrivals per second")
+    p.add_argument("--keys", type=int, default=2, help="distinct batch keys")
+    p.add_argument("--gpu-fixed-ms", type=float, default=30.0)
+    p.add_argument("--gpu-item-ms", type=float, default=10.0)
+    p.add_argument("--cpu-ms", type=float, default=30.0)
+    p.add_argument("--cpu-workers", type=int, default=2)
+    p.add_argument("--max-batch-size", nargs="+", type=int, default=[1, 2, 4, 8])
+    p.add_argument("--max-wait-ms", type=float, default=20.0)
+    p.add_argument("--seed", type=int, default=0)
+    return p.parse_args()
+
+
+class StubPipeline:
+    def __init__(self, args):
+        self.args = args
+
+    def batch_key(self, payload):
+        return payload["key"]
+
+    def run_batch(self, payloads):
+        time.sleep((self.args.gpu_fixed_ms + self.args.gpu_item_ms * len(payloads)) / 1000)
+        return [time.monotonic() for _ in payloads]
+
+    def postprocess(self, payload, output):
+        time.sleep(self.args.cpu_ms / 1000)
+        return output
+
+
+def arrivals(args):
+    rng = random.Random(args.seed)
+    t = 0.0
+    for i in range(args.jobs):
+        t += rng.expovariate(args.rate)
+        yield t, {"index": i, "key": rng.randrange(args.keys)}
+
+
+def run_serial(args):
+    pipeline = StubPipeline(args)
+    start = time.monotonic()
+    latencies, clock = [], 0.0
+    for offset, payload in arrivals(args):
+        # the old /infer: requests wait for the previous one to fully finish
+        clock = max(clock, offset)
+        t0 = time.monotonic()
+        pipeline.postprocess(payload, pipeline.run_batch([payload])[0])
+        clock += time.monotonic() - t0
+        latencies.append(clock - offset)
+    return args.jobs / (time.monotonic() - start), latencies, 0
+
+
+def run_queue(args, max_batch_size):
+    queue = JobQueue(
+        StubPipeline(args),
+        max_batch_size=max_batch_size,
+        max_wait=args.max_wait_ms / 1000,
+        cpu_workers=args.cpu_workers,
+        max_finished=args.jobs,
+    ).start()
+    start = time.monotonic()
+    jobs = []
+    for offset, payload in arrivals(args):
+        time.sleep(max(0.0, start + offset - time.monotonic()))
+        jobs.append(queue.submit(payload))
+    for job in jobs:
+        job.wait()
+    elapsed = time.monotonic() - start
+    queue.stop()
+
+    latencies = [job.finished_at - job.submitted_at for job in jobs]
+    started = [job.started_at for job in jobs]
+    inversions = sum(
+        started[j] < started[i] for i in range(len(jobs)) for j in range(i + 1, len(jobs))
+    )
+    return args.jobs / elapsed, latencies, inversions
+
+
+def report(name, throughput, latencies, inversions):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{name:>12} {throughput:>10.1f} {statistics.median(latencies) * 1000:>10.0f} "
+          f"{p95 * 1000:>10.0f} {inversions:>11}")
+
+
+def main():
+    args = parse_args()
+    print(f"{args.jobs} jobs at {args.rate}/s; latency in ms")
+    print(f"{'mode':>12} {'jobs/s':>10} {'p50':>10} {'p95':>10} {'inversions':>11}")
+    report("serial", *run_serial(args))
+    for max_batch_size in args.max_batch_size:
+        report(f"queue b={max_batch_size}", *run_queue(args, max_batch_size))
+
+
+if __name__ == "__main__":
+    main()
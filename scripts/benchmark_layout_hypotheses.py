@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""Convergence per wall-second of batched multi-hypothesis layout optimization.
+
+On the CPU stand-in rasterizer (`SoftPointRenderer`), for random asymmetric
+point clouds whose target pose is turned by --target-yaw degrees about the
+up axis and scaled by --target-scale, compares
+
+    identity      the single-pose path: one hypothesis, the identity start
+    sequential    each of the hypotheses optimized alone, one after the other
+    batched       all hypotheses in one batch, no pruning
+    pruned        all hypotheses in one batch, halved every --prune-every steps
+
+with --rotations x --scales hypotheses (`pose_hypotheses`). The single-pose
+runs are `run_batched_render_compare` with one hypothesis, which follows
+`run_render_compare` step for step. Prints, per method and summed over
+--scenes, the wall time, the hypothesis renders, the mean final mask IoU
+against the target, and the best loss reached within fractions of the
+sequential wall time.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_layout_hypotheses.py [--rotations 4] [--scales 1.0 1.25]
+        [--points 400] [--image-size 64] [--scenes 3] [--threads 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import torch  # noqa: E402
+
+from sam3d_objects.pipeline.batched_layout_optimization import (  # noqa: E402
+    SoftPointRenderer,
+    pose_hypotheses,
+    run_batched_render_compare,
+)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rotations", type=int, default=4)
+    p.add_argument("--scales", nargs="+", type=float, default=[1.0, 1.25])
+    p.add_argument("--target-yaw", type=float, default=170.0)
+    p.add_argument("--target-scale", type=float, default=1.2)
+    p.add_argument("--points", type=int, default=400)
+    p.add_argument("--image-size", type=int, default=64)
+    p.add_argument("--prune-every", type=int, default=5)
+    p.add_argument("--scenes", type=int, default=3)
+    p.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    return p.parse_args()
+
+
+def scene(seed, num_points, size):
+    generator = torch.Generator().manual_seed(seed)
+    points = torch.randn(num_points, 3, generator=generator) * torch.tensor([0.25, 0.12, 0.05])
+    points[: num_points // 3, 0] += 0.3
+    points[: num_points // 6, 1] += 0.15
+    points = points + torch.tensor([0.0, 0.0, 2.0])
+    focal = size * 1.2
+    intrinsics = torch.tensor([[focal, 0, size / 2], [0, focal, size / 2], [0, 0, 1]])
+    return SoftPointRenderer(points, points.mean(0), intrinsics, (size, size), sigma=0.8)
+
+
+def iou(render, result, target_mask):
+    with torch.no_grad():
+        mask = render(result.quat[None], result.translation[None], result.scale[None])["mask"]
+    pred, target = mask[0] > 0.5, target_mask > 0.5
+    return float((pred & target).sum() / (pred | target).sum().clamp(min=1))
+
+
+def run_sequential(render, mask, quats, scales):
+    """The hypotheses one at a time; history and renders concatenated."""
+    started = time.perf_counter()
+    best, history, renders = None, [], 0
+    for quat, scale in zip(quats, scales):
+        result = run_batched_render_compare(render, mask, quat[None], scale=scale[None])
+        renders += result.renders
+        if best is None or result.losses[0] < best.losses[0]:
+            best = result
+        history.append((time.perf_counter() - started, 1, float(best.losses[0])))
+    best.renders, best.history = renders, history
+    return best
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    quats, scales = pose_hypotheses(args.rotations, args.scales)
+    yaw = torch.tensor(args.target_yaw) * torch.pi / 180
+    target = (
+        torch.tensor([[torch.cos(yaw / 2), 0.0, torch.sin(yaw / 2), 0.0]]),
+        torch.tensor([[0.02, -0.01, 0.0]]),
+        torch.tensor([args.target_scale]),
+    )
+
+    methods = {
+        "identity": lambda render, mask: run_batched_render_compare(render, mask, quats[:1]),
+        "sequential": lambda render, mask: run_sequential(render, mask, quats, scales),
+        "batched": lambda render, mask: run_batched_render_compare(
+            render, mask, quats, scale=scales, prune_every=0
+        ),
+        "pruned": lambda render, mask: run_batched_render_compare(
+            render, mask, quats, scale=scales, prune_every=args.prune_every
+        ),
+    }
+    totals = {name: {"seconds": 0.0, "renders": 0, "iou": 0.0, "histories": []} for name in methods}
+    for seed in range(args.scenes):
+        render = scene(seed, args.points, args.image_size)
+        target_mask = render(*target)["mask"].detach()
+        for name, method in methods.items():
+            started = time.perf_counter()
+            result = method(render, target_mask[None])
+            totals[name]["seconds"] += time.perf_counter() - started
+            totals[name]["renders"] += result.renders
+            totals[name]["iou"] += iou(render, result, target_mask[0]) / args.scenes
+            totals[name]["histories"].append(result.history)
+
+    sequential_seconds = totals["sequential"]["seconds"] / args.scenes
+    budgets = [0.25, 0.5, 1.0]
+    print(f"{quats.shape[0]} hypotheses, {args.points} points, {args.image_size}^2 pixels, "
+          f"{args.scenes} scenes; best loss within a fraction of the sequential time "
+          f"({sequential_seconds:.2f} s per scene)")
+    print(f"{'method':>11} {'seconds':>8} {'renders':>8} {'IoU':>6}"
+          + "".join(f" {f'loss@{budget:g}':>10}" for budget in budgets))
+    for name, total in totals.items():
+        reached = []
+        for budget in budgets:
+            losses = [
+                min([loss for seconds, _, loss in history if seconds <= budget * sequential_seconds],
+                    default=float("inf"))
+                for history in total["histories"]
+            ]
+            reached.append(sum(losses) / len(losses))
+        print(f"{name:>11} {total['seconds']:>8.2f} {total['renders']:>8} {total['iou']:>6.3f}"
+              + "".join(f" {loss:>10.3f}" for loss in reached))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""Startup time and peak memory of model loading, on CPU with synthetic checkpoints.
+
+Writes safetensors checkpoints for a generator (plus an unused condition
+embedder in the same file, like the real ss/slat checkpoints) and two
+decoders, then loads them in three ways:
+
+    eager      instantiate with random init, `load_file`, `load_state_dict`
+               (InferencePipeline's default path)
+    meta       build on the meta device and materialize from the
+               memory-mapped file (InferencePipeline(meta_init=True))
+    meta+lazy  as meta, but the second decoder is never requested
+               (InferencePipeline(lazy_decoders=True) when its format is
+               not in decode_formats)
+
+Every mode runs in a fresh subprocess so the reported peak memory is that
+process' measured max RSS. The checkpoints were just written, so they are in
+the page cache: this measures a warm start. Memory-mapped pages count
+towards RSS once mapped in, so the meta modes are not free either.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_model_loading.py [--width 1024] [--blocks 24]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+MODES = ("eager", "meta", "meta+lazy")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--width", type=int, default=1024)
+    p.add_argument("--blocks", type=int, default=24, help="generator blocks")
+    p.add_argument("--decoder-blocks", type=int, default=8)
+    p.add_argument("--worker", nargs=2, metavar=("MODE", "DIR"), help=argparse.SUPPRESS)
+    return p.parse_args()
+
+
+def build(width, blocks):
+    import torch
+
+    layers = []
+    for _ in range(blocks):
+        layers += [torch.nn.LayerNorm(width), torch.nn.Linear(width, 4 * width),
+                   torch.nn.GELU(), torch.nn.Linear(4 * width, width)]
+    return torch.nn.Sequential(*layers)
+
+
+def models(args):
+    return {
+        "generator": args.blocks,
+        "decoder_mesh": args.decoder_blocks,
+        "decoder_gs": args.decoder_blocks,
+    }
+
+
+def write_checkpoints(args, directory):
+    import torch
+    from safetensors.torch import save_file
+
+    for name, blocks in models(args).items():
+        state_dict = {f"generator.{k}": v for k, v in build(args.width, blocks).state_dict().items()}
+        if name == "generator":
+            state_dict["condition_embedder.weight"] = torch.randn(4096, args.width)
+        save_file(state_dict, os.path.join(directory, f"{name}.safetensors"))
+
+
+def strip_prefix(state_dict):
+    return {k[len("generator."):]: v for k, v in state_dict.items()
+            if k.startswith("generator.")}
+
+
+def run_worker(args):
+    from safetensors.torch import load_file
+
+    from sam3d_objects.model.lazy_load import (
+        init_empty_weights,
+        load_safetensors_into_empty_model,
+        measure_load,
+    )
+
+    mode, directory = args.worker
+    report = {}
+    start = time.perf_counter()
+    for name, blocks in models(args).items():
+        if mode == "meta+lazy" and name == "decoder_gs":
+            continue
+        path = os.path.join(directory, f"{name}.safetensors")
+        with measure_load(name, report):
+            if mode == "eager":
+                model = build(args.width, blocks)
+                model.load_state_dict(strip_prefix(load_file(path, device="cpu")))
+            else:
+                with init_empty_weights():
+                    model = build(args.width, blocks)
+                missing = load_safetensors_into_empty_model(
+                    model, path, device="cpu", state_dict_fn=strip_prefix
+                )
+                assert not missing, missing
+    report["total_seconds"] = time.perf_counter() - start
+    print(json.dumps(report))
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_checkpoints(args, directory)
+        sizes = {name: os.path.getsize(os.path.join(directory, f"{name}.safetensors")) / 2**20
+                 for name in models(args)}
+        print("checkpoints: " + ", ".join(f"{n} {s:.0f} MB" for n, s in sizes.items()))
+        print("time in s; peak = max RSS of the loading process in MB after each model")
+        print(f"{'mode':>10} " + " ".join(f"{n:>22}" for n in models(args)) + f" {'total s':>8}")
+        for mode in MODES:
+            cmd = [sys.executable, os.path.abspath(__file__), "--worker", mode, directory,
+                   "--width", str(args.width), "--blocks", str(args.blocks),
+                   "--decoder-blocks", str(args.decoder_blocks)]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{mode:>10} failed: {result.stderr.strip().splitlines()[-1]}")
+                continue
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            cells = []
+            for name in models(args):
+                if name in report:
+                    stats = report[name]
+                    cells.append(f"{stats['seconds']:>9.2f}s {stats['peak_rss_mb']:>7.0f} MB")
+                else:
+                    cells.append(f"{'not loaded':>22}")
+            print(f"{mode:>10} " + " ".join(f"{c:>22}" for c in cells)
+                  + f" {report['total_seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
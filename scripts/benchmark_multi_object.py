@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""Throughput of batched multi-object sampling against the number of objects.
+
+Builds tiny, randomly initialized SS (MoT) and SLAT flow models behind
+classifier-free guidance and times one guided denoising step for K objects
+of one image, in two ways:
+
+    sequential     K batch-1 steps, one per object (the `run` loop)
+    batched        one step for all K objects: SS latents stacked on the
+                   batch dimension, SLAT structures packed into one sparse
+                   batch (`run_multi_object`)
+
+and reports objects per second of denoising. Packing needs a varlen attention
+backend (flash_attn, xformers or "sdpa_varlen", the default here): the plain
+"sdpa" backend attends over one dense block-diagonal mask of all the objects'
+tokens, which makes packing slower than the loop. A CPU is already saturated
+by one object, so expect about 1x there; the gain is GPU occupancy. Numbers are only meaningful
+relative to each other; the tiny configs exist so the script runs on a laptop
+CPU in seconds.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_multi_object.py [--stage ss slat] [--objects 1 2 4 8]
+        [--repeats 5] [--threads 4] [--batched-guidance]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+os.environ.setdefault("SPARSE_ATTN_BACKEND", "sdpa_varlen")
+
+import torch  # noqa: E402
+
+from sam3d_objects.model.backbone.generator.classifier_free_guidance import (  # noqa: E402
+    ClassifierFreeGuidance,
+)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--stage", nargs="+", default=["ss", "slat"], choices=("ss", "slat"))
+    p.add_argument("--objects", nargs="+", type=int, default=[1, 2, 4, 8])
+    p.add_argument("--voxels", type=int, default=1500, help="SLAT voxels per object")
+    p.add_argument("--repeats", type=int, default=5, help="timed steps per cell")
+    p.add_argument("--warmup", type=int, default=1)
+    p.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    p.add_argument("--batched-guidance", action="store_true")
+    return p.parse_args()
+
+
+def build_ss(args):
+    from sam3d_objects.model.backbone.tdfy_dit.models import mm_latent
+    from sam3d_objects.model.backbone.tdfy_dit.models.mot_sparse_structure_flow import (
+        SparseStructureFlowTdfyWrapper,
+    )
+
+    backbone = SparseStructureFlowTdfyWrapper(
+        latent_mapping={
+            "shape": mm_latent.Latent(8, 64, mm_latent.ShapePositionEmbedder(64, 8, 1)),
+            "6drotation": mm_latent.Latent(6, 64, mm_latent.LearntPositionEmbedder(64, 1)),
+        },
+        in_channels=8,
+        model_channels=64,
+        cond_channels=32,
+        out_channels=8,
+        num_blocks=4,
+        num_heads=4,
+        qk_rms_norm=True,
+        force_zeros_cond=True,
+    )
+
+    def inputs(num_objects):
+        x = {
+            "shape": torch.randn(num_objects, 512, 8),
+            "6drotation": torch.randn(num_objects, 1, 6),
+        }
+        return x, (torch.randn(num_objects, 16, 32),)
+
+    def split(x, cond):
+        return [
+            ({key: value[i : i + 1] for key, value in x.items()}, (cond[0][i : i + 1],))
+            for i in range(cond[0].shape[0])
+        ]
+
+    return backbone, "add_flag", inputs, split
+
+
+def build_slat(args):
+    from sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow import (
+        SLatFlowModelTdfyWrapper,
+    )
+
+    backbone = SLatFlowModelTdfyWrapper(
+        resolution=32,
+        in_channels=8,
+        model_channels=64,
+        cond_channels=32,
+        out_channels=8,
+        num_blocks=4,
+        num_heads=4,
+        patch_size=2,
+        num_io_res_blocks=1,
+        io_block_channels=[32],
+    )
+    # spconv's CPU kernels cannot apply a fused bias; irrelevant for timing
+    for module in backbone.modules():
+        if type(module).__name__ in ("SubMConv3d", "SparseConv3d", "SparseInverseConv3d"):
+            module.bias = None
+
+    def object_coords(index):
+        coords = torch.unique(torch.randint(0, 32, (args.voxels, 3)), dim=0)
+        return torch.cat([torch.full_like(coords[:, :1], index), coords], dim=1).int()
+
+    def inputs(num_objects):
+        coords = [object_coords(i) for i in range(num_objects)]
+        packed = torch.cat(coords)
+        x = torch.randn(1, packed.shape[0], 8)
+        # numpy, as in the pipeline: guidance must not zero the coords
+        return x, (torch.randn(num_objects, 16, 32), packed.numpy())
+
+    def split(x, cond):
+        conds, packed = cond
+        packed = torch.from_numpy(packed)
+        sizes = torch.bincount(packed[:, 0].long()).tolist()
+        objects = []
+        for i, (x_i, coords) in enumerate(zip(x.split(sizes, dim=1), packed.split(sizes))):
+            coords = torch.cat([torch.zeros_like(coords[:, :1]), coords[:, 1:]], dim=1)
+            objects.append((x_i, (conds[i : i + 1], coords.numpy())))
+        return objects
+
+    return backbone, "zeros", inputs, split
+
+
+def time_steps(reverse_fn, calls, repeats, warmup):
+    """Seconds per step of all `calls`, each sampled as its own run."""
+    total = 0.0
+    for x, cond in calls:
+        for i in range(warmup + repeats):
+            if i == warmup:
+                start = time.perf_counter()
+            # t inside the guidance interval [0, 500]
+            reverse_fn(x, torch.tensor(100.0), *cond)
+        total += time.perf_counter() - start
+    return total / repeats
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    for stage in args.stage:
+        backbone, unconditional_handling, inputs, split = (
+            build_ss(args) if stage == "ss" else build_slat(args)
+        )
+        reverse_fn = ClassifierFreeGuidance(
+            backbone,
+            strength=5.0,
+            unconditional_handling=unconditional_handling,
+            interval=[0, 500],
+            batched_guidance=args.batched_guidance,
+        ).eval()
+
+        print(f"\n[{stage}] objects / s per guided step, {args.repeats} steps per cell")
+        print(f"{'K':>3} {'sequential':>11} {'batched':>9} {'speedup':>8}")
+        with torch.no_grad():
+            for num_objects in args.objects:
+                x, cond = inputs(num_objects)
+                sequential = time_steps(reverse_fn, split(x, cond), args.repeats, args.warmup)
+                batched = time_steps(reverse_fn, [(x, cond)], args.repeats, args.warmup)
+                print(
+                    f"{num_objects:>3} {num_objects / sequential:>11.2f} "
+                    f"{num_objects / batched:>9.2f} {sequential / batched:>7.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
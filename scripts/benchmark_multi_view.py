@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""Per-step latency of multi-view multidiffusion against the number of views.
+
+Builds tiny, randomly initialized SS (MoT) and SLAT flow models behind the
+real ShortCut generator + classifier-free guidance, then times one sampling
+step (`generator._generate_dynamics`, guidance active) for 1..N views in three
+configurations:
+
+    loop           one backbone call per view and per guidance branch
+    views          views folded into the batch  (batched_multi_view)
+    views+cfg      ... and guidance branches too (batched_guidance)
+
+Numbers are only meaningful relative to each other; the tiny configs exist so
+the script runs on a laptop CPU in seconds.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_multi_view.py [--stage ss slat] [--views 1 2 3 4]
+        [--repeats 10] [--threads 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, _ROOT)
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+os.environ.setdefault("SPARSE_ATTN_BACKEND", "sdpa")
+
+import torch  # noqa: E402
+
+from sam3d_objects.model.backbone.generator.classifier_free_guidance import (  # noqa: E402
+    ClassifierFreeGuidance,
+)
+from sam3d_objects.model.backbone.generator.shortcut.model import ShortCut  # noqa: E402
+from sam3d_objects.pipeline.multi_view_utils import (  # noqa: E402
+    inject_generator_multi_view,
+)
+
+CONFIGS = (
+    ("loop", False, False),
+    ("views", True, False),
+    ("views+cfg", True, True),
+)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--stage", nargs="+", default=["ss", "slat"], choices=("ss", "slat"))
+    p.add_argument("--views", nargs="+", type=int, default=[1, 2, 3, 4])
+    p.add_argument("--repeats", type=int, default=10, help="timed steps per cell")
+    p.add_argument("--warmup", type=int, default=2)
+    p.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    return p.parse_args()
+
+
+def build_ss():
+    from sam3d_objects.model.backbone.tdfy_dit.models import mm_latent
+    from sam3d_objects.model.backbone.tdfy_dit.models.mot_sparse_structure_flow import (
+        SparseStructureFlowTdfyWrapper,
+    )
+
+    backbone = SparseStructureFlowTdfyWrapper(
+        latent_mapping={
+            "shape": mm_latent.Latent(8, 64, mm_latent.ShapePositionEmbedder(64, 8, 1)),
+            "6drotation": mm_latent.Latent(6, 64, mm_latent.LearntPositionEmbedder(64, 1)),
+        },
+        in_channels=8,
+        model_channels=64,
+        cond_channels=32,
+        out_channels=8,
+        num_blocks=4,
+        num_heads=4,
+        qk_rms_norm=True,
+        force_zeros_cond=True,
+        is_shortcut_model=True,
+    )
+    x = {"shape": torch.randn(1, 512, 8), "6drotation": torch.randn(1, 1, 6)}
+    return backbone, "add_flag", x, ()
+
+
+def build_slat():
+    from sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow import (
+        SLatFlowModelTdfyWrapper,
+    )
+
+    backbone = SLatFlowModelTdfyWrapper(
+        resolution=32,
+        in_channels=8,
+        model_channels=64,
+        cond_channels=32,
+        out_channels=8,
+        num_blocks=4,
+        num_heads=4,
+        patch_size=2,
+        num_io_res_blocks=1,
+        io_block_channels=[32],
+        is_shortcut_model=True,
+    )
+    # spconv's CPU kernels cannot apply a fused bias; irrelevant for timing
+    for module in backbone.modules():
+        if type(module).__name__ in ("SubMConv3d", "SparseConv3d", "SparseInverseConv3d"):
+            module.bias = None
+    coords = torch.unique(torch.randint(0, 32, (2048, 3)), dim=0)
+    coords = torch.cat([torch.zeros_like(coords[:, :1]), coords], dim=1).int()
+    x = torch.randn(1, coords.shape[0], 8)
+    return backbone, "zeros", x, (coords.numpy(),)
+
+
+def time_step(generator, x, view_conds, extra_args, num_views, batched_views, repeats, warmup):
+    with inject_generator_multi_view(
+        generator, num_views=num_views, num_steps=repeats + warmup, batched=batched_views
+    ):
+        for i in range(warmup + repeats):
+            if i == warmup:
+                start = time.perf_counter()
+            # t=0.1 lies inside the default guidance interval [0, 500] / 1000
+            generator._generate_dynamics(x, 0.1, 0.0, view_conds, *extra_args)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    for stage in args.stage:
+        backbone, unconditional_handling, x, extra_args = (
+            build_ss() if stage == "ss" else build_slat()
+        )
+        reverse_fn = ClassifierFreeGuidance(
+            backbone,
+            strength=5.0,
+            unconditional_handling=unconditional_handling,
+            interval=[0, 500],
+        )
+        generator = ShortCut(reverse_fn=reverse_fn, no_shortcut=True).eval()
+
+        print(f"\n[{stage}] per-step latency (ms), {args.repeats} steps per cell")
+        print(f"{'views':>5} " + " ".join(f"{name:>10}" for name, _, _ in CONFIGS) + f" {'speedup':>8}")
+        with torch.no_grad():
+            for num_views in args.views:
+                view_conds = torch.randn(num_views, 1, 16, 32)
+                row = []
+                for _, batched_views, batched_guidance in CONFIGS:
+                    reverse_fn.batched_guidance = batched_guidance
+                    row.append(
+                        time_step(
+                            generator, x, view_conds, extra_args, num_views,
+                            batched_views, args.repeats, args.warmup,
+                        )
+                    )
+                print(
+                    f"{num_views:>5} " + " ".join(f"{ms:>10.1f}" for ms in row)
+                    + f" {row[0] / row[-1]:>7.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""Write / read throughput and file size of Gaussian splat PLY files.
+
+Compares, on random splats,
+
+    plyfile    the previous Gaussian.save_ply / load_ply: a structured array
+               filled from `list(map(tuple, ...))` and written with plyfile,
+               read back one property at a time
+    standard   ply_io.save_gaussians / load_gaussians: the same file bytes,
+               written / read as one (N, K) float32 buffer with numpy
+    compact    save_gaussians(compact=True): the quantized, chunked format
+
+Numpy only (plus plyfile for the baseline), runs on CPU.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_ply_io.py [--gaussians 500000] [--sh-rest 0]
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+
+import numpy as np
+
+_PLY_IO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "sam3d_objects", "model",
+    "backbone", "tdfy_dit", "representations", "gaussian", "ply_io.py",
+)
+_spec = importlib.util.spec_from_file_location("ply_io", _PLY_IO)
+ply_io = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(ply_io)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--gaussians", type=int, default=500_000)
+    p.add_argument("--sh-rest", type=int, default=0,
+                   help="number of f_rest coefficients (45 for SH degree 3)")
+    p.add_argument("--repeats", type=int, default=3)
+    return p.parse_args()
+
+
+def random_splats(n, num_rest):
+    rng = np.random.default_rng(0)
+    attributes = {
+        "xyz": rng.uniform(-0.5, 0.5, (n, 3)).astype(np.float32),
+        "f_dc": rng.normal(0, 1, (n, 3)).astype(np.float32),
+        "opacity": rng.normal(0, 2, (n, 1)).astype(np.float32),
+        "scale": rng.uniform(-7, -3, (n, 3)).astype(np.float32),
+        "rotation": rng.normal(0, 1, (n, 4)).astype(np.float32),
+    }
+    if num_rest:
+        attributes["f_rest"] = rng.normal(0, 0.2, (n, num_rest)).astype(np.float32)
+    return attributes
+
+
+def plyfile_save(path, attributes):
+    from plyfile import PlyData, PlyElement
+
+    n = len(attributes["xyz"])
+    num_rest = attributes["f_rest"].shape[1] if "f_rest" in attributes else 0
+    names = ply_io.gaussian_attribute_names(3, 3, 4, num_rest)
+    columns = [attributes["xyz"], np.zeros_like(attributes["xyz"]), attributes["f_dc"]]
+    if num_rest:
+        columns.append(attributes["f_rest"])
+    columns += [attributes["opacity"], attributes["scale"], attributes["rotation"]]
+    elements = np.empty(n, dtype=[(name, "f4") for name in names])
+    elements[:] = list(map(tuple, np.concatenate(columns, axis=1)))
+    PlyData([PlyElement.describe(elements, "vertex")]).write(path)
+
+
+def plyfile_load(path):
+    from plyfile import PlyData
+
+    vertex = PlyData.read(path).elements[0]
+    names = [p.name for p in vertex.properties]
+    columns = {name: np.asarray(vertex[name]) for name in names}
+
+    def stack(prefix):
+        keys = sorted((k for k in names if k.startswith(prefix)),
+                      key=lambda k: int(k.split("_")[-1]))
+        return np.stack([columns[k] for k in keys], axis=1)
+
+    attributes = {
+        "xyz": np.stack([columns["x"], columns["y"], columns["z"]], axis=1),
+        "f_dc": stack("f_dc_"),
+        "opacity": columns["opacity"][:, None],
+        "scale": stack("scale_"),
+        "rotation": stack("rot"),
+    }
+    if any(name.startswith("f_rest_") for name in names):
+        attributes["f_rest"] = stack("f_rest_")
+    return attributes
+
+
+def timed(fn, repeats):
+    fn()  # warmup
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    args = parse_args()
+    attributes = random_splats(args.gaussians, args.sh_rest)
+    modes = {
+        "plyfile": (plyfile_save, plyfile_load),
+        "standard": (ply_io.save_gaussians, ply_io.load_gaussians),
+        "compact": (lambda path, attrs: ply_io.save_gaussians(path, attrs, compact=True),
+                    ply_io.load_gaussians),
+    }
+    print(f"{args.gaussians} gaussians, {args.sh_rest} f_rest coefficients")
+    print(f"{'mode':>10} {'write s':>9} {'read s':>9} {'Msplat/s w':>11} "
+          f"{'Msplat/s r':>11} {'size MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, (save, load) in modes.items():
+            path = os.path.join(directory, f"{mode}.ply")
+            try:
+                write_s = timed(lambda: save(path, attributes), args.repeats)
+                read_s = timed(lambda: load(path), args.repeats)
+            except ImportError as e:
+                print(f"{mode:>10} skipped: {e}")
+                continue
+            size = os.path.getsize(path) / 2**20
+            print(f"{mode:>10} {write_s:>9.3f} {read_s:>9.3f} "
+                  f"{args.gaussians / write_s / 1e6:>11.2f} "
+                  f"{args.gaussians / read_s / 1e6:>11.2f} {size:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
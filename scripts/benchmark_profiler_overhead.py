@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Per-step overhead of the stage profiler in the ODE solver loop.
+
+Runs Euler.solve with a trivial dynamics function (so the loop itself is
+what is measured) in three ways:
+
+    bare       the solver loop without any profiler hook
+    off        the instrumented loop, no profiler active (the default)
+    on         the instrumented loop under an active StageProfiler
+               (--no-sync to skip the CUDA synchronizations)
+
+Usage (from the repo root):
+
+    python scripts/benchmark_profiler_overhead.py [--steps 100000] [--device cpu]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import torch  # noqa: E402
+
+from sam3d_objects.model.backbone.generator.flow_matching.solver import Euler  # noqa: E402
+from sam3d_objects.utils.profiler import StageProfiler  # noqa: E402
+
+
+class BareEuler(Euler):
+    def solve_iter(self, dynamics_fn, x_init, times, *args, **kwargs):
+        x_t = x_init
+        for t0, t1 in zip(times[:-1], times[1:]):
+            x_t = self.step(dynamics_fn, x_t, t0, t1 - t0, *args, **kwargs)
+            yield x_t, t0
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--steps", type=int, default=100_000)
+    p.add_argument("--device", default="cpu")
+    p.add_argument("--no-sync", action="store_true")
+    return p.parse_args()
+
+
+def per_step_us(solver, times, x, profiler=None):
+    dynamics = lambda x_t, t: x_t  # noqa: E731
+    start = time.perf_counter()
+    if profiler is None:
+        solver.solve(dynamics, x, times)
+    else:
+        with profiler.activate("solve"):
+            solver.solve(dynamics, x, times)
+    return (time.perf_counter() - start) / (len(times) - 1) * 1e6
+
+
+def main():
+    args = parse_args()
+    # python floats: the per-step cost is then the loop, not tensor ops on t
+    times = torch.linspace(0, 1, args.steps + 1).tolist()
+    x = torch.zeros(16, device=args.device)
+    bare = per_step_us(BareEuler(), times, x)
+    off = per_step_us(Euler(), times, x)
+    on = per_step_us(Euler(), times, x, StageProfiler(synchronize=not args.no_sync))
+    print(f"{args.steps} steps on {args.device}, us per step")
+    print(f"{'bare':>6} {bare:>8.2f}")
+    print(f"{'off':>6} {off:>8.2f}  (+{off - bare:.2f})")
+    print(f"{'on':>6} {on:>8.2f}  (+{on - bare:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Frames per second of per-camera vs chunked camera rendering.
+
+Renders a random Gaussian splat over --frames cameras (like render_video /
+render_multiview) with
+
+    per-camera  render_frames: cameras built one by one, every frame copied
+                back to numpy as soon as it is rendered
+    chunk=N     render_frames_batched: cameras built in one vectorized call,
+                frames kept on the device as uint8 and copied back in one
+                bulk transfer (or streamed per chunk with --sink)
+
+Needs CUDA and a Gaussian rasterizer (--backend inria or gsplat). With
+--fake-renderer the rasterizer is replaced by a cheap stand-in, which isolates
+the camera / conversion / transfer overhead this change targets and also
+runs on CPU.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_rendering.py [--frames 300] [--resolution 512]
+        [--chunk-size 8 32 100] [--backend gsplat] [--sink] [--fake-renderer]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import torch  # noqa: E402
+
+from sam3d_objects.model.backbone.tdfy_dit.representations import Gaussian  # noqa: E402
+from sam3d_objects.model.backbone.tdfy_dit.utils import render_utils  # noqa: E402
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--frames", type=int, default=300)
+    p.add_argument("--resolution", type=int, default=512)
+    p.add_argument("--gaussians", type=int, default=200_000)
+    p.add_argument("--chunk-size", nargs="+", type=int, default=[8, 32, 100])
+    p.add_argument("--backend", default="gsplat", choices=["inria", "gsplat"])
+    p.add_argument("--sink", action="store_true",
+                   help="stream chunks to a no-op sink instead of one bulk transfer")
+    p.add_argument("--fake-renderer", action="store_true")
+    p.add_argument("--repeats", type=int, default=3)
+    return p.parse_args()
+
+
+class FakeRenderer:
+    def __init__(self, resolution, device):
+        self.image = torch.rand(3, resolution, resolution, device=device)
+
+    def render(self, sample, extrinsics, intrinsics, colors_overwrite=None):
+        return {"color": self.image * extrinsics[0, 0]}
+
+
+def random_gaussian(n, device):
+    gs = Gaussian(aabb=[-0.5, -0.5, -0.5, 1.0, 1.0, 1.0], device=device)
+    gs.from_xyz(torch.rand(n, 3, device=device) - 0.5)
+    gs.from_features(torch.rand(n, 1, 3, device=device))
+    gs.from_scaling(torch.full((n, 3), 0.005, device=device))
+    gs.from_rotation(torch.nn.functional.normalize(torch.randn(n, 4, device=device), dim=-1))
+    gs.from_opacity(torch.full((n, 1), 0.5, device=device))
+    return gs
+
+
+def cameras(args, batched, device):
+    yaws = torch.linspace(0, 2 * 3.1415, args.frames)
+    pitch = 0.25 + 0.5 * torch.sin(torch.linspace(0, 2 * 3.1415, args.frames))
+    if batched or device == "cpu":  # the per-camera builder is cuda only
+        extr, intr = render_utils.yaw_pitch_r_fov_to_extrinsics_intrinsics_batched(
+            yaws, pitch, 2, 40, device=device
+        )
+        return (extr, intr) if batched else (list(extr), list(intr))
+    return render_utils.yaw_pitch_r_fov_to_extrinsics_intrinsics(
+        yaws.tolist(), pitch.tolist(), 2, 40
+    )
+
+
+def fps(fn, args, device):
+    fn()  # warmup
+    if device == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(args.repeats):
+        fn()
+    if device == "cuda":
+        torch.cuda.synchronize()
+    return args.frames * args.repeats / (time.perf_counter() - start)
+
+
+def main():
+    args = parse_args()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if device == "cpu" and not args.fake_renderer:
+        sys.exit("the Gaussian rasterizers need CUDA; use --fake-renderer on CPU")
+    if args.fake_renderer:
+        renderer = FakeRenderer(args.resolution, device)
+        render_utils.get_renderer = lambda sample, options={}, **kwargs: renderer
+        sample = None
+    else:
+        sample = random_gaussian(args.gaussians, device)
+    options = {"resolution": args.resolution, "bg_color": (0, 0, 0), "backend": args.backend}
+
+    def per_camera():
+        extr, intr = cameras(args, batched=False, device=device)
+        render_utils.render_frames(sample, extr, intr, options, verbose=False)
+
+    print(f"{args.frames} frames at {args.resolution}x{args.resolution} on {device}"
+          f"{' (fake renderer)' if args.fake_renderer else ''}")
+    print(f"{'mode':>12} {'fps':>8}")
+    print(f"{'per-camera':>12} {fps(per_camera, args, device):>8.1f}")
+    for chunk_size in args.chunk_size:
+        def chunked():
+            extr, intr = cameras(args, batched=True, device=device)
+            render_utils.render_frames_batched(
+                sample, extr, intr, options, verbose=False, chunk_size=chunk_size,
+                sink=(lambda frames: None) if args.sink else None,
+            )
+
+        print(f"{'chunk=' + str(chunk_size):>12} {fps(chunked, args, device):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
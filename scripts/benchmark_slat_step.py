@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""Per-step latency of the SLAT backbone with and without its sampling session.
+
+Runs guided denoising steps (PointmapCFG, three guidance branches) of a small
+SLatFlowModelTdfyWrapper with a transformer condition embedder, on fixed
+coords and conditions, in two ways:
+
+    session     the default: coords uploaded, input packed and conditions
+                embedded on the first step, reused afterwards
+    per-step    the session cleared before every step (coords upload, sparse
+                input packing and condition embedding redone each step)
+
+and reports ms per step and the number of embedder calls.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_slat_step.py [--steps 25] [--voxels 4000]
+        [--device cuda] [--batched-guidance]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import torch  # noqa: E402
+
+from sam3d_objects.model.backbone.generator.classifier_free_guidance import (  # noqa: E402
+    PointmapCFG,
+)
+from sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow import (  # noqa: E402
+    SLatFlowModelTdfyWrapper,
+)
+
+
+class Embedder(torch.nn.Module):
+    def __init__(self, dim, num_layers):
+        super().__init__()
+        self.image_proj = torch.nn.Linear(3 * 14 * 14, dim)
+        self.pointmap_proj = torch.nn.Linear(3 * 14 * 14, dim)
+        layer = torch.nn.TransformerEncoderLayer(dim, 8, 4 * dim, batch_first=True)
+        self.encoder = torch.nn.TransformerEncoder(layer, num_layers)
+        self.force_drop_modalities = None
+        self.calls = 0
+
+    def forward(self, image, pointmap):
+        self.calls += 1
+        pointmap_tokens = self.pointmap_proj(pointmap)
+        if self.force_drop_modalities and "pointmap" in self.force_drop_modalities:
+            pointmap_tokens = pointmap_tokens * 0
+        return self.encoder(torch.cat([self.image_proj(image), pointmap_tokens], dim=1))
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--steps", type=int, default=25)
+    p.add_argument("--voxels", type=int, default=4000)
+    p.add_argument("--tokens", type=int, default=256, help="tokens per image modality")
+    p.add_argument("--embedder-layers", type=int, default=4)
+    p.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    p.add_argument("--batched-guidance", action="store_true")
+    return p.parse_args()
+
+
+def build(args):
+    backbone = SLatFlowModelTdfyWrapper(
+        resolution=64,
+        in_channels=8,
+        model_channels=128,
+        cond_channels=256,
+        out_channels=8,
+        num_blocks=2,
+        num_heads=4,
+        patch_size=2,
+        num_io_res_blocks=1,
+        io_block_channels=[64],
+        condition_embedder=Embedder(256, args.embedder_layers),
+        force_zeros_cond=True,
+    )
+    if args.device == "cpu":
+        # spconv's CPU kernels cannot apply a fused bias
+        for module in backbone.modules():
+            if type(module).__name__ in ("SubMConv3d", "SparseConv3d", "SparseInverseConv3d"):
+                module.bias = None
+    return PointmapCFG(
+        backbone,
+        strength=3.0,
+        strength_pm=1.5,
+        unconditional_handling="add_flag",
+        interval=[0, 1000],
+        batched_guidance=args.batched_guidance,
+    ).to(args.device).eval()
+
+
+def inputs(args):
+    coords = torch.unique(torch.randint(0, 64, (args.voxels, 3)), dim=0)
+    coords = torch.cat([torch.zeros_like(coords[:, :1]), coords], dim=1).int()
+    image = torch.randn(1, args.tokens, 3 * 14 * 14, device=args.device)
+    pointmap = torch.randn(1, args.tokens, 3 * 14 * 14, device=args.device)
+    x = torch.randn(1, coords.shape[0], 8, device=args.device)
+    return x, (image, pointmap, coords.numpy())
+
+
+def sync(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+
+
+def ms_per_step(cfg, x, conditions, steps, device, clear_every_step):
+    cfg.backbone.clear_spatial_cache()
+    cfg.backbone.condition_embedder.calls = 0
+    sync(device)
+    start = time.perf_counter()
+    for step in range(steps):
+        if clear_every_step:
+            cfg.backbone.clear_spatial_cache()
+        t = torch.tensor(1000.0 * (1 - step / steps), device=device)
+        x = x + 0.01 * cfg(x, t, *conditions)
+    sync(device)
+    seconds = time.perf_counter() - start
+    cfg.backbone.clear_spatial_cache()
+    return seconds / steps * 1e3, cfg.backbone.condition_embedder.calls
+
+
+def main():
+    args = parse_args()
+    torch.manual_seed(0)
+    cfg = build(args)
+    x, conditions = inputs(args)
+    print(f"{conditions[2].shape[0]} voxels, {args.steps} steps on {args.device}, "
+          f"batched guidance: {args.batched_guidance}")
+    with torch.no_grad():
+        ms_per_step(cfg, x, conditions, 2, args.device, True)  # warm up
+        results = {
+            "per-step": ms_per_step(cfg, x, conditions, args.steps, args.device, True),
+            "session": ms_per_step(cfg, x, conditions, args.steps, args.device, False),
+        }
+    print(f"{'mode':>9} {'ms/step':>9} {'embeds':>7}")
+    for mode, (ms, calls) in results.items():
+        print(f"{mode:>9} {ms:>9.2f} {calls:>7}")
+
+
+if __name__ == "__main__":
+    main()
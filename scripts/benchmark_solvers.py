@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""Function evaluations against accuracy for the flow matching ODE solvers.
+
+Builds a tiny, randomly initialized (seeded) SS (MoT) or SLAT flow model
+behind the real ShortCut generator + classifier-free guidance, samples the
+same noise with every solver at several step counts, and reports per run
+
+    nfe         velocity evaluations (guided backbone calls)
+    time        wall time of the sampling loop
+    rel. error  RMS distance to a reference sample (RK4, --reference-steps),
+                relative to the reference's RMS
+
+The adaptive solver is run once per tolerance (--tolerances) on a single
+sampling interval, its step count is then its own.
+
+Numbers are only meaningful relative to each other. As in the pipeline,
+guidance is only applied on part of the time range (interval [0, 500]): the
+velocity jumps where it stops, which limits the order any solver reaches
+unless a sampling time falls on the jump.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_solvers.py [--stage ss slat] [--steps 2 4 8 16 25]
+        [--solvers euler heun dpmpp_2m rk4] [--tolerances 1e-1 1e-2 1e-3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+os.environ.setdefault("SPARSE_ATTN_BACKEND", "sdpa")
+
+import torch  # noqa: E402
+
+from sam3d_objects.data.utils import tree_tensor_map  # noqa: E402
+from sam3d_objects.model.backbone.generator.classifier_free_guidance import (  # noqa: E402
+    ClassifierFreeGuidance,
+)
+from sam3d_objects.model.backbone.generator.shortcut.model import ShortCut  # noqa: E402
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--stage", nargs="+", default=["ss"], choices=("ss", "slat"))
+    p.add_argument("--steps", nargs="+", type=int, default=[2, 4, 8, 16, 25])
+    p.add_argument("--solvers", nargs="+", default=["euler", "heun", "dpmpp_2m", "rk4"])
+    p.add_argument("--tolerances", nargs="+", type=float, default=[1e-1, 1e-2, 1e-3])
+    p.add_argument("--tableau", default="bosh3", choices=("bosh3", "dopri5"))
+    p.add_argument("--reference-steps", type=int, default=200)
+    p.add_argument("--rescale-t", type=float, default=3.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    return p.parse_args()
+
+
+def build_ss():
+    from sam3d_objects.model.backbone.tdfy_dit.models import mm_latent
+    from sam3d_objects.model.backbone.tdfy_dit.models.mot_sparse_structure_flow import (
+        SparseStructureFlowTdfyWrapper,
+    )
+
+    backbone = SparseStructureFlowTdfyWrapper(
+        latent_mapping={
+            "shape": mm_latent.Latent(8, 64, mm_latent.ShapePositionEmbedder(64, 8, 1)),
+            "6drotation": mm_latent.Latent(6, 64, mm_latent.LearntPositionEmbedder(64, 1)),
+        },
+        in_channels=8,
+        model_channels=64,
+        cond_channels=32,
+        out_channels=8,
+        num_blocks=2,
+        num_heads=4,
+        qk_rms_norm=True,
+        force_zeros_cond=True,
+        is_shortcut_model=True,
+    )
+    shape = {"shape": (1, 512, 8), "6drotation": (1, 1, 6)}
+    return backbone, "add_flag", shape, (torch.randn(1, 16, 32),)
+
+
+def build_slat():
+    from sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow import (
+        SLatFlowModelTdfyWrapper,
+    )
+
+    backbone = SLatFlowModelTdfyWrapper(
+        resolution=16,
+        in_channels=8,
+        model_channels=32,
+        cond_channels=32,
+        out_channels=8,
+        num_blocks=2,
+        num_heads=2,
+        patch_size=2,
+        num_io_res_blocks=1,
+        io_block_channels=[16],
+        is_shortcut_model=True,
+    )
+    # spconv's CPU kernels cannot apply a fused bias
+    for module in backbone.modules():
+        if type(module).__name__ in ("SubMConv3d", "SparseConv3d", "SparseInverseConv3d"):
+            module.bias = None
+    coords = torch.unique(torch.randint(0, 16, (600, 3)), dim=0)
+    coords = torch.cat([torch.zeros_like(coords[:, :1]), coords], dim=1).int()
+    shape = (1, coords.shape[0], 8)
+    return backbone, "zeros", shape, (torch.randn(1, 16, 32), coords.numpy())
+
+
+def randomize_zero_init(backbone, std=0.05):
+    # output layers and adaLN modulations are zero-initialized, which would
+    # make the velocity constant
+    with torch.no_grad():
+        for param in backbone.parameters():
+            if not param.any():
+                param.normal_(0, std)
+    return backbone
+
+
+def sample(generator, shape, conditions, seed, steps, solver, solver_kwargs=None):
+    generator.set_solver(solver, solver_kwargs)
+    generator.inference_steps = steps
+    nfe = [0]
+    dynamics = generator._generate_dynamics
+
+    def counting(*args, **kwargs):
+        nfe[0] += 1
+        return dynamics(*args, **kwargs)
+
+    generator._generate_dynamics = counting
+    torch.manual_seed(seed)
+    start = time.perf_counter()
+    try:
+        for _, x, _ in generator.generate_iter(shape, "cpu", *conditions):
+            pass
+    finally:
+        del generator._generate_dynamics
+    return x, nfe[0], time.perf_counter() - start
+
+
+def relative_error(x, reference):
+    squares = tree_tensor_map(lambda a, b: ((a - b) ** 2).sum(), x, reference)
+    norms = tree_tensor_map(lambda b: (b**2).sum(), reference)
+    total = lambda tree: sum(  # noqa: E731
+        float(v) for v in (tree.values() if isinstance(tree, dict) else [tree])
+    )
+    return (total(squares) / total(norms)) ** 0.5
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    for stage in args.stage:
+        torch.manual_seed(args.seed)
+        backbone, unconditional_handling, shape, conditions = (
+            build_ss() if stage == "ss" else build_slat()
+        )
+        reverse_fn = ClassifierFreeGuidance(
+            randomize_zero_init(backbone),
+            strength=3.0,
+            unconditional_handling=unconditional_handling,
+            interval=[0, 500],
+        )
+        generator = ShortCut(
+            reverse_fn=reverse_fn, no_shortcut=True, rescale_t=args.rescale_t
+        ).eval()
+
+        with torch.no_grad():
+            reference, _, _ = sample(
+                generator, shape, conditions, args.seed, args.reference_steps, "rk4"
+            )
+            runs = []
+            for solver in args.solvers:
+                for steps in args.steps:
+                    x, nfe, seconds = sample(
+                        generator, shape, conditions, args.seed, steps, solver
+                    )
+                    runs.append((solver, steps, nfe, seconds, relative_error(x, reference)))
+            for tol in args.tolerances:
+                x, nfe, seconds = sample(
+                    generator, shape, conditions, args.seed, 1, "adaptive_rk",
+                    {"tableau": args.tableau, "rtol": tol, "atol": tol},
+                )
+                name = f"adaptive_rk[{args.tableau}, tol={tol:g}]"
+                runs.append((name, "-", nfe, seconds, relative_error(x, reference)))
+
+        print(f"\n[{stage}] reference: rk4, {args.reference_steps} steps")
+        print(f"{'solver':>30} {'steps':>6} {'nfe':>5} {'time s':>8} {'rel. error':>11}")
+        for name, steps, nfe, seconds, error in runs:
+            print(f"{name:>30} {steps:>6} {nfe:>5} {seconds:>8.2f} {error:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
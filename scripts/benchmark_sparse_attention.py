@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""Memory and latency of the sparse SDPA backends across batch sizes and token counts.
+
+Compares `masked_sdpa` (SPARSE_ATTN_BACKEND=sdpa, one dense [sum_q, sum_kv]
+block-diagonal mask) with `varlen_sdpa` (SPARSE_ATTN_BACKEND=sdpa_varlen,
+length buckets, no cross-batch mask) on packed self-attention inputs whose
+per-sequence lengths vary by +-25% around --tokens, like a batch of objects
+with different voxel counts.
+
+Every cell runs in a fresh subprocess so the reported peak memory is that
+process' measured max RSS (inputs included), not an estimate.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_sparse_attention.py [--batch 1 2 4 8]
+        [--tokens 1024 4096] [--heads 8] [--channels 64] [--repeats 3]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+_MASKED_SDPA = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "sam3d_objects",
+    "model",
+    "backbone",
+    "tdfy_dit",
+    "modules",
+    "sparse",
+    "attention",
+    "masked_sdpa.py",
+)
+BACKENDS = ("masked_sdpa", "varlen_sdpa")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--batch", nargs="+", type=int, default=[1, 2, 4, 8])
+    p.add_argument("--tokens", nargs="+", type=int, default=[1024, 4096],
+                   help="mean tokens per sequence")
+    p.add_argument("--heads", type=int, default=8)
+    p.add_argument("--channels", type=int, default=64)
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    p.add_argument("--worker", nargs=3, metavar=("BACKEND", "BATCH", "TOKENS"),
+                   help=argparse.SUPPRESS)
+    return p.parse_args()
+
+
+def load_backends():
+    # masked_sdpa.py only needs torch; skip the sparse package (spconv)
+    spec = importlib.util.spec_from_file_location("masked_sdpa", _MASKED_SDPA)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def run_worker(args):
+    import torch
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    backend, batch, tokens = args.worker[0], int(args.worker[1]), int(args.worker[2])
+    fn = getattr(load_backends(), backend)
+
+    generator = torch.Generator().manual_seed(0)
+    seqlens = torch.randint(
+        int(tokens * 0.75), int(tokens * 1.25) + 1, (batch,), generator=generator
+    ).tolist()
+    q, k, v = (
+        torch.randn(1, sum(seqlens), args.heads, args.channels, generator=generator)
+        for _ in range(3)
+    )
+
+    with torch.no_grad():
+        fn(q, k, v, seqlens, seqlens)  # warmup
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            fn(q, k, v, seqlens, seqlens)
+        latency_ms = (time.perf_counter() - start) / args.repeats * 1000
+    print(json.dumps({"ms": latency_ms, "peak_mb": max_rss_mb()}))
+
+
+def run_cell(args, backend, batch, tokens):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", backend, str(batch),
+           str(tokens), "--heads", str(args.heads), "--channels", str(args.channels),
+           "--repeats", str(args.repeats)]
+    if args.threads:
+        cmd += ["--threads", str(args.threads)]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    print("latency in ms; peak = max RSS of the benchmark process in MB")
+    print(f"{'batch':>5} {'tokens':>7} "
+          + " ".join(f"{name + ' ms':>16} {name + ' peak':>18}" for name in BACKENDS))
+    for tokens in args.tokens:
+        for batch in args.batch:
+            cells = []
+            for backend in BACKENDS:
+                cell = run_cell(args, backend, batch, tokens)
+                if cell is None:  # typically an out-of-memory kill
+                    cells.append(f"{'failed':>16} {'-':>18}")
+                else:
+                    cells.append(f"{cell['ms']:>16.1f} {cell['peak_mb']:>18.0f}")
+            print(f"{batch:>5} {tokens:>7} " + " ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""CPU cost of the sparse structure operations against grid resolution and occupancy.
+
+For random structures (a noisy ball, like a decoded object: `--occupancy` is
+the fraction of the grid it fills) at each `--resolutions`, times
+
+    prune dense    occupancy grid of the bounding box + conv3d (the old path)
+    prune sparse   neighbor lookups on the coord list (`prune_sparse_structure`)
+    components     connected components of the coord list (26-connectivity)
+    unique         the deduplication of `downsample_sparse_structure`, by
+                   linear keys, against `torch.unique(dim=0)`
+
+and checks the sparse prune returns exactly the dense result. Times are the
+median of --repeats runs, in milliseconds.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_sparse_structure.py [--resolutions 64 128 256]
+        [--occupancy 0.01 0.05 0.2] [--distance 1] [--threads 4]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import torch  # noqa: E402
+
+from sam3d_objects.pipeline.sparse_structure import (  # noqa: E402
+    _unique_rows,
+    prune_sparse_structure,
+    prune_sparse_structure_dense,
+    sparse_connected_components,
+)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--resolutions", nargs="+", type=int, default=[64, 128, 256])
+    p.add_argument("--occupancy", nargs="+", type=float, default=[0.01, 0.05, 0.2])
+    p.add_argument("--distance", type=int, default=1, help="prune neighborhood radius")
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    return p.parse_args()
+
+
+def structure(resolution, occupancy, seed=0):
+    """A noisy ball filling about `occupancy` of the grid."""
+    generator = torch.Generator().manual_seed(seed)
+    axis = torch.arange(resolution, dtype=torch.float32) - resolution / 2
+    grid = torch.stack(torch.meshgrid(axis, axis, axis, indexing="ij"), dim=-1)
+    radius = (3 * occupancy / (4 * torch.pi)) ** (1 / 3) * resolution
+    noise = torch.rand(grid.shape[:3], generator=generator) * 0.1 * radius
+    occupied = grid.norm(dim=-1) + noise <= radius
+    return torch.nn.functional.pad(torch.argwhere(occupied), (1, 0)).int()
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e3, result
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print(f"{'res':>5} {'occ':>6} {'voxels':>9} {'prune dense':>12} {'prune sparse':>13}"
+          f" {'components':>11} {'unique dim0':>12} {'unique keys':>12}")
+    for resolution in args.resolutions:
+        for occupancy in args.occupancy:
+            coords = structure(resolution, occupancy)
+            dense_ms, expected = timed(
+                lambda: prune_sparse_structure_dense(coords, args.distance), args.repeats
+            )
+            sparse_ms, pruned = timed(
+                lambda: prune_sparse_structure(coords, args.distance), args.repeats
+            )
+            assert torch.equal(pruned, expected), "sparse prune differs from the dense path"
+            components_ms, _ = timed(lambda: sparse_connected_components(coords), args.repeats)
+            unique_ms, _ = timed(lambda: torch.unique(coords, dim=0), args.repeats)
+            keys_ms, _ = timed(lambda: _unique_rows(coords), args.repeats)
+            print(f"{resolution:>5} {occupancy:>6.2f} {coords.shape[0]:>9} {dense_ms:>12.1f}"
+                  f" {sparse_ms:>13.1f} {components_ms:>11.1f} {unique_ms:>12.1f}"
+                  f" {keys_ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
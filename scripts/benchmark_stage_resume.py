@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""Cost of partial reruns from stage checkpoints, against a full run.
+
+Runs the real pipeline once on IMAGE + MASK with `checkpoint_dir`, saving
+every stage boundary (see sam3d_objects/pipeline/stage_checkpoints.py), then
+reruns it with `resume_from` each stage:
+
+    full       depth model, both samplers, decoders, postprocessing
+    pointmap   no depth model
+    ss         no depth model, no stage 1 sampling
+    slat       decode + postprocess only (a decode sweep)
+    decoded    postprocess + layout only (a postprocessing sweep)
+    layout     postprocess only, the layout optimization skipped too
+
+and prints the wall time of each (median of --repeats, after one warm-up
+run), its speedup over the full run and the size of each checkpoint file.
+Every run uses the settings of process/3d-generator/server.py's
+single-view path, so the numbers are what a sweep of those settings saves.
+
+Usage (from the repo root, inside the SAM3D conda env, on a GPU):
+
+    python scripts/benchmark_stage_resume.py notebook/images/sofa/sofa.jpeg
+        notebook/images/sofa/1.png [--tag hf] [--repeats 3] [--checkpoint-dir DIR]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(_ROOT, "notebook"))
+sys.path.insert(0, _ROOT)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("image")
+    p.add_argument("mask")
+    p.add_argument("--tag", default="hf", help="checkpoint tag under checkpoints/")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--checkpoint-dir", default=None,
+                   help="where to write the stage checkpoints (default: a temporary dir)")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Imported here so --help works outside the conda env.
+    import torch
+    from inference import Inference, load_image, load_mask
+    from sam3d_objects.pipeline.stage_checkpoints import STAGES, StageCheckpoints
+
+    inference = Inference(os.path.join(_ROOT, "checkpoints", args.tag, "pipeline.yaml"))
+    image, mask = load_image(args.image), load_mask(args.mask)
+    checkpoint_dir = args.checkpoint_dir or tempfile.mkdtemp(prefix="sam3d_stages_")
+
+    def run(resume_from=None):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        inference(
+            image,
+            mask,
+            seed=args.seed,
+            with_mesh_postprocess=True,
+            with_texture_baking=True,
+            with_layout_postprocess=True,
+            checkpoint_dir=checkpoint_dir,
+            resume_from=resume_from,
+        )
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        return time.perf_counter() - start
+
+    run()  # warm-up, also writes every checkpoint
+    times = {"full": statistics.median(run() for _ in range(args.repeats))}
+    for stage in STAGES:
+        times[stage] = statistics.median(run(stage) for _ in range(args.repeats))
+
+    checkpoints = StageCheckpoints(checkpoint_dir)
+    print(f"\ncheckpoints in {checkpoint_dir}")
+    print(f"{'resume_from':>12} {'seconds':>9} {'speedup':>8} {'checkpoint':>11}")
+    for name, seconds in times.items():
+        size = "" if name == "full" else f"{os.path.getsize(checkpoints.path(name)) / 2**20:.1f} MiB"
+        print(f"{name:>12} {seconds:>9.2f} {times['full'] / seconds:>7.1f}x {size:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""Quality per second of compute of the texture baking in to_glb (bake_texture).
+
+Bakes a texture from --views renders of a synthetic textured sphere (UV maps
+ray cast analytically, colors sampled from a procedural texture and shaded
+per view, so that no texture reproduces every view exactly, as with the
+Gaussian renders of to_glb) with
+
+    opt         the "opt" mode: 2500 Adam steps from a black texture
+    fast        the "fast" mode: the weighted-average projection bake
+                (hole filled)
+    adaptive    the "adaptive" mode: coarse-to-fine from the projection
+                bake, every level stopped once its loss stops improving
+
+all sampling the texture with `sample_texture` (the pytorch3d engine of
+bake_texture; no rasterizer or CUDA needed). Prints the wall time, the steps,
+the PSNR of the texture against the "opt" texture over the texels some view
+sees, and the PSNR of the re-rendered views against the observations.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_texture_baking.py [--texture-size 512] [--image-size 256]
+        [--views 40] [--steps 2500] [--threads 4] [--device cpu]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+from sam3d_objects.model.backbone.tdfy_dit.utils import texture_baking  # noqa: E402
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--texture-size", type=int, default=512)
+    p.add_argument("--image-size", type=int, default=256)
+    p.add_argument("--views", type=int, default=40)
+    p.add_argument("--steps", type=int, default=2500, help="steps of the opt reference")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    p.add_argument("--device", default="cpu")
+    return p.parse_args()
+
+
+def ground_truth(size, device):
+    """A procedural texture with smooth gradients, stripes and sharp edges."""
+    v, u = torch.meshgrid(torch.linspace(0, 1, size), torch.linspace(0, 1, size), indexing="ij")
+    checker = ((u * 12).floor() + (v * 6).floor()) % 2
+    texture = torch.stack(
+        [0.2 + 0.6 * u, 0.3 + 0.4 * checker, 0.5 + 0.4 * torch.sin(2 * np.pi * (3 * u + 2 * v))], -1
+    )
+    return texture.clamp(0, 1)[None].to(device)
+
+
+def sphere_views(num_views, image_size, device, seed):
+    """UV maps, masks and viewing cosines of a unit sphere seen from a ring of cameras."""
+    generator = torch.Generator().manual_seed(seed)
+    pixels = (torch.arange(image_size) + 0.5) / image_size * 2 - 1
+    y, x = torch.meshgrid(pixels, pixels, indexing="ij")
+    views = []
+    for i in range(num_views):
+        yaw = 2 * np.pi * i / num_views
+        pitch = float(torch.empty(()).uniform_(-0.8, 0.8, generator=generator))
+        forward = -torch.tensor(
+            [np.cos(pitch) * np.cos(yaw), np.cos(pitch) * np.sin(yaw), np.sin(pitch)]
+        ).float()
+        right = torch.nn.functional.normalize(torch.linalg.cross(forward, torch.tensor([0.0, 0.0, 1.0])), dim=0)
+        up = torch.linalg.cross(right, forward)
+        origin = -3 * forward
+        # perspective rays, 45 degree field of view
+        directions = torch.nn.functional.normalize(
+            forward + 0.41 * (x[..., None] * right + y[..., None] * up), dim=-1
+        )
+        b = (directions * origin).sum(-1)
+        disc = b ** 2 - (origin @ origin - 1)
+        mask = disc > 0
+        depth = -b - disc.clamp(min=0).sqrt()
+        point = origin + depth[..., None] * directions
+        u = torch.atan2(point[..., 1], point[..., 0]) / (2 * np.pi) + 0.5
+        v = torch.acos(point[..., 2].clamp(-1, 1)) / np.pi
+        cosine = -(point * directions).sum(-1)
+        views.append((torch.stack([u, v], -1)[None].to(device), mask.to(device), cosine.to(device)))
+    return views
+
+
+def psnr(a, b):
+    mse = ((a - b) ** 2).mean().clamp(min=1e-12)
+    return float(10 * torch.log10(1 / mse))
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    np.random.seed(args.seed)
+
+    truth = ground_truth(4 * args.texture_size, args.device)
+    views = sphere_views(args.views, args.image_size, args.device, args.seed)
+    uv_maps = [uv for uv, _, _ in views]
+    masks = [mask for _, mask, _ in views]
+    observations = []
+    for uv, mask, cosine in views:
+        # view dependent shading and noise
+        shade = (0.85 + 0.15 * cosine.clamp(0, 1))[..., None]
+        color = texture_baking.sample_texture(truth, uv) * shade
+        observations.append((color + 0.01 * torch.randn_like(color)).clamp(0, 1) * mask[..., None])
+
+    def render(texture, index):
+        return texture_baking.sample_texture(texture, uv_maps[index])
+
+    def opt():
+        stats = {}
+        texture = texture_baking.optimize_texture(
+            torch.zeros(1, args.texture_size, args.texture_size, 3, device=args.device),
+            render, observations, masks, steps=args.steps, stats=stats,
+        )
+        return texture, stats["steps"]
+
+    def fast():
+        sums, weights = texture_baking.projection_bake(uv_maps, observations, masks, args.texture_size)
+        return texture_baking.texture_pyramid(sums, weights, 3)[-1], 0
+
+    def adaptive():
+        stats = {}
+        texture = texture_baking.adaptive_bake(uv_maps, render, observations, masks, args.texture_size,
+                                               stats=stats)
+        levels = "+".join(str(level["steps"]) for level in stats["levels"])
+        return texture, f"{stats['steps']} ({levels})"
+
+    results = {}
+    for name, bake in (("opt", opt), ("fast", fast), ("adaptive", adaptive)):
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        started = time.perf_counter()
+        texture, steps = bake()
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        results[name] = (time.perf_counter() - started, steps, texture.clamp(0, 1))
+
+    _, weights = texture_baking.projection_bake(uv_maps, observations, masks, args.texture_size)
+    seen = weights > 0
+    reference = results["opt"][2][0]
+    print(f"{args.views} views at {args.image_size}^2, {args.texture_size}^2 texture, "
+          f"{100 * float(seen.float().mean()):.1f}% of the texels seen")
+    print(f"{'mode':>9} {'seconds':>8} {'PSNR/opt':>9} {'PSNR/views':>11}  steps")
+    for name, (seconds, steps, texture) in results.items():
+        to_opt = psnr(texture[0][seen], reference[seen]) if name != "opt" else float("inf")
+        rendered = torch.cat([render(texture, i)[masks[i]] for i in range(args.views)])
+        observed = torch.cat([observations[i][masks[i]] for i in range(args.views)])
+        print(f"{name:>9} {seconds:>8.2f} {to_opt:>9.2f} {psnr(rendered, observed):>11.2f}  {steps}")
+
+
+if __name__ == "__main__":
+    main()
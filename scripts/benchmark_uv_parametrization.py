@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Wall time and UV utilization of the GLB parametrization (parametrize_mesh).
+
+Parametrizes a mesh with
+
+    single      one xatlas.parametrize call, as parametrize_mesh does without
+                a UVParametrizer
+    split/N     UVParametrizer(processes=N): the connected components grouped
+                into N parts, parametrized in a process pool and merged
+    memory      a repeated call, served by the in-memory tier
+    disk        a repeated call from a new UVParametrizer on the same
+                cache_dir (another process or run)
+
+and prints the wall time, the speedup over "single" and the UV utilization
+(the fraction of the texture covered by triangles; the rest is padding and
+packing waste, and lowers the texel density of the baked texture).
+
+The default mesh is synthetic: --components noisy spheres of decreasing
+size, like a decoded shape with detached parts. Pass --mesh to use any mesh
+trimesh can load. Needs xatlas.
+
+Usage (from the repo root):
+
+    python scripts/benchmark_uv_parametrization.py [--mesh path.glb]
+        [--components 8] [--faces 200000] [--processes 2 4 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np  # noqa: E402
+
+from sam3d_objects.model.backbone.tdfy_dit.utils import uv_parametrization  # noqa: E402
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--mesh", default=None)
+    p.add_argument("--components", type=int, default=8)
+    p.add_argument("--faces", type=int, default=200000, help="faces of the synthetic mesh")
+    p.add_argument("--processes", nargs="+", type=int, default=[2, 4, 8])
+    p.add_argument("--seed", type=int, default=0)
+    return p.parse_args()
+
+
+def sphere(rings, center, radius, generator):
+    """A latitude / longitude sphere with 2 * rings^2 faces and a noisy radius."""
+    theta, phi = np.meshgrid(
+        np.linspace(0, np.pi, rings + 1), np.linspace(0, 2 * np.pi, rings, endpoint=False), indexing="ij"
+    )
+    r = radius * (1 + 0.05 * generator.standard_normal(theta.shape))
+    vertices = np.stack(
+        [r * np.sin(theta) * np.cos(phi), r * np.sin(theta) * np.sin(phi), r * np.cos(theta)], -1
+    ).reshape(-1, 3) + center
+    index = np.arange((rings + 1) * rings).reshape(rings + 1, rings)
+    a, b = index[:-1], index[1:]
+    c, d = np.roll(b, -1, 1), np.roll(a, -1, 1)
+    faces = np.concatenate([np.stack([a, b, c], -1), np.stack([a, c, d], -1)]).reshape(-1, 3)
+    # the poles are degenerate rows of vertices; xatlas handles zero-area faces
+    return vertices, faces
+
+
+def synthetic(components, total_faces, seed):
+    generator = np.random.default_rng(seed)
+    shares = 0.5 ** np.arange(components)
+    shares /= shares.sum()
+    vertices, faces, base = [], [], 0
+    for i, share in enumerate(shares):
+        rings = max(4, int(np.sqrt(share * total_faces / 2)))
+        v, f = sphere(rings, (3.0 * i, 0.0, 0.0), 1.0 - 0.08 * i, generator)
+        vertices.append(v)
+        faces.append(f + base)
+        base += len(v)
+    return np.concatenate(vertices).astype(np.float32), np.concatenate(faces).astype(np.int64)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    args = parse_args()
+    try:
+        import xatlas  # noqa: F401
+    except ImportError:
+        sys.exit("xatlas is not installed")
+    if args.mesh:
+        import trimesh
+
+        mesh = trimesh.load(args.mesh, force="mesh")
+        vertices, faces = np.asarray(mesh.vertices, np.float32), np.asarray(mesh.faces, np.int64)
+    else:
+        vertices, faces = synthetic(args.components, args.faces, args.seed)
+    components = uv_parametrization.face_components(faces, len(vertices)).max() + 1
+    print(f"{len(vertices)} vertices, {len(faces)} faces, {components} components")
+
+    rows = []
+    seconds, (_, single_faces, single_uvs) = timed(
+        lambda: uv_parametrization.xatlas_parametrize(vertices, faces)
+    )
+    rows.append(("single", seconds, uv_parametrization.uv_utilization(single_uvs, single_faces)))
+    single_seconds = seconds
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for processes in args.processes:
+            parametrizer = uv_parametrization.UVParametrizer(
+                cache_dir=cache_dir, processes=processes, min_parallel_faces=1
+            )
+            parametrizer._get_pool()  # pool start-up is paid once per service, not per mesh
+            seconds, (_, split_faces, split_uvs) = timed(lambda: parametrizer(vertices, faces))
+            rows.append((f"split/{processes}", seconds,
+                         uv_parametrization.uv_utilization(split_uvs, split_faces)))
+            parametrizer.close()
+        cached = uv_parametrization.UVParametrizer(cache_dir=cache_dir)
+        cached(vertices, faces)
+        seconds, (_, cached_faces, cached_uvs) = timed(lambda: cached(vertices, faces))
+        rows.append(("memory", seconds, uv_parametrization.uv_utilization(cached_uvs, cached_faces)))
+        seconds, (_, cached_faces, cached_uvs) = timed(
+            lambda: uv_parametrization.UVParametrizer(cache_dir=cache_dir)(vertices, faces)
+        )
+        rows.append(("disk", seconds, uv_parametrization.uv_utilization(cached_uvs, cached_faces)))
+
+    print(f"{'mode':>9} {'seconds':>9} {'speedup':>8} {'UV util':>8}")
+    for name, seconds, utilization in rows:
+        print(f"{name:>9} {seconds:>9.3f} {single_seconds / seconds:>7.1f}x {utilization:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Write the open3d parity fixtures of tests/test_icp.py.
+
+A synthetic target (an irregular closed surface) with its estimated normals
+and a source (a rigidly moved, noisy subset of it), and for point-to-point
+and point-to-plane the transformation, fitness and inlier RMSE that
+open3d's registration_icp finds for them. The test checks the torch ICP
+against these without open3d installed; rerun this (with open3d) to
+regenerate them.
+
+Usage (from the repo root):
+
+    python scripts/make_icp_parity_fixtures.py [--out tests/data/icp_open3d_parity.npz]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np  # noqa: E402
+import open3d as o3d  # noqa: E402
+import torch  # noqa: E402
+
+from sam3d_objects.pipeline.icp import estimate_normals  # noqa: E402
+
+THRESHOLD = 0.05
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--out", default="tests/data/icp_open3d_parity.npz")
+    return p.parse_args()
+
+
+def clouds(count=1500, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    directions = torch.nn.functional.normalize(torch.randn(count, 3, generator=generator), dim=1)
+    radius = 0.4 + 0.1 * directions[:, 0] ** 2 + 0.05 * directions[:, 1]
+    target = directions * radius[:, None] * torch.tensor([1.0, 0.7, 0.5])
+    axis = torch.nn.functional.normalize(torch.tensor([0.3, 1.0, -0.2]), dim=0)
+    skew = torch.tensor([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    inverse = torch.linalg.inv(torch.matrix_exp(0.15 * skew))
+    source = (target[: count * 2 // 3] - torch.tensor([0.05, 0.0, -0.03])) @ inverse.T
+    source = source + 0.003 * torch.randn(source.shape, generator=generator)
+    # stored as float32: both ICPs start from exactly the stored values
+    return source.float().double(), target.float().double()
+
+
+def main():
+    args = parse_args()
+    source, target = clouds()
+    normals = estimate_normals(target).float().double()
+    fixtures = {
+        "source": source.float().numpy(),
+        "target": target.float().numpy(),
+        "normals": normals.float().numpy(),
+        "threshold": np.float64(THRESHOLD),
+        "open3d_version": np.str_(o3d.__version__),
+    }
+    source_pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(source.numpy()))
+    target_pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(target.numpy()))
+    target_pcd.normals = o3d.utility.Vector3dVector(normals.numpy())
+    registration = o3d.pipelines.registration
+    for method, estimation in (
+        ("point_to_point", registration.TransformationEstimationPointToPoint()),
+        ("point_to_plane", registration.TransformationEstimationPointToPlane()),
+    ):
+        result = registration.registration_icp(
+            source_pcd, target_pcd, THRESHOLD, np.eye(4), estimation
+        )
+        fixtures[f"{method}_transformation"] = np.asarray(result.transformation)
+        fixtures[f"{method}_fitness"] = np.float64(result.fitness)
+        fixtures[f"{method}_inlier_rmse"] = np.float64(result.inlier_rmse)
+        print(f"{method}: fitness {result.fitness:.4f}, inlier RMSE {result.inlier_rmse:.6f}")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    np.savez_compressed(args.out, **fixtures)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Tests for the SQLite work queue of the multi-GPU batch runner (batch/batch_queue.py)."""
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "batch"))
+
+from batch_queue import (  # noqa: E402
+    DONE,
+    FAILED,
+    TaskQueue,
+    round_robin_makespan,
+    run_worker,
+    simulate_queue,
+    synthetic_costs,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lease_complete_and_retry(tmp_path):
+    queue = TaskQueue(str(tmp_path / "q.sqlite"), max_attempts=2, clock=Clock())
+    queue.add(["a", "b"])
+
+    assert queue.lease("w0") == "a"
+    assert queue.lease("w1") == "b"
+    assert queue.lease("w2") is None  # both leased
+    queue.complete("w0", "a", True)
+    queue.complete("w1", "b", False, error="boom")
+    assert queue.lease("w2") == "b"  # second attempt
+    queue.complete("w2", "b", False, error="boom again")
+
+    assert queue.lease("w0") is None
+    assert queue.counts() == {DONE: 1, FAILED: 1}
+    assert queue.failed() == [("b", "boom again")]
+    report = queue.utilization()
+    assert report["w1"]["failed"] == 1 and report["w0"]["done"] == 1
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    clock = Clock()
+    queue = TaskQueue(str(tmp_path / "q.sqlite"), lease_seconds=10, max_attempts=2, clock=clock)
+    queue.add(["a"])
+    assert queue.lease("w0") == "a"
+
+    clock.now = 8
+    assert queue.heartbeat("w0", "a")
+    clock.now = 15  # still within the extended lease
+    assert queue.lease("w1") is None
+    clock.now = 30  # w0 stopped sending heartbeats
+    assert queue.lease("w1") == "a"
+    assert not queue.heartbeat("w0", "a")
+    queue.complete("w0", "a", True)  # a late outcome of the lost lease is ignored
+    assert queue.counts() == {"running": 1}
+
+    clock.now = 50  # w1 dies too: out of attempts
+    assert queue.lease("w2") is None
+    assert queue.failed() == [("a", "lease expired")]
+
+
+def test_resume_keeps_finished_tasks(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    queue = TaskQueue(path, clock=Clock())
+    queue.add(["a", "b", "c"])
+    queue.complete("w0", queue.lease("w0"), True)
+    queue.complete("w0", queue.lease("w0"), False)
+
+    queue = TaskQueue(path, max_attempts=1, clock=Clock())  # the runner restarts
+    queue.add(["a", "b", "c", "d"])
+    leased = []
+    while (name := queue.lease("w1")) is not None:
+        leased.append(name)
+        queue.complete("w1", name, False)
+    assert leased == ["b", "c", "d"]
+    queue.retry_failed()
+    assert queue.lease("w1") == "b"
+
+
+def test_reset_queues_finished_tasks_again(tmp_path):
+    queue = TaskQueue(str(tmp_path / "q.sqlite"), max_attempts=1, clock=Clock())
+    queue.add(["a", "b", "c"])
+    queue.complete("w0", queue.lease("w0"), True)
+    queue.complete("w0", queue.lease("w0"), False, error="boom")
+    assert queue.counts(["a", "b", "x"]) == {DONE: 1, FAILED: 1}
+
+    queue.reset(["a", "b"])
+    assert queue.counts(["a", "b"]) == {"pending": 2}
+    assert [queue.lease("w1") for _ in range(4)] == ["a", "b", "c", None]
+    assert queue.failed() == []
+
+
+def test_threaded_workers_run_every_task_once(tmp_path):
+    queue = TaskQueue(str(tmp_path / "q.sqlite"), lease_seconds=5)
+    names = [f"s{i}" for i in range(40)]
+    queue.add(names)
+    runs, lock = [], threading.Lock()
+
+    def process(name):
+        with lock:
+            runs.append(name)
+        if name == "s3" and runs.count(name) == 1:
+            raise RuntimeError("flaky")
+        return True
+
+    workers = [
+        threading.Thread(target=run_worker, args=(queue, f"w{i}", process, 0.01))
+        for i in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sorted(runs) == sorted(names + ["s3"])
+    assert queue.counts() == {DONE: 40}
+
+
+def test_queue_beats_round_robin_on_heavy_tails():
+    costs = synthetic_costs(120, seed=3)
+    makespan, report = simulate_queue(costs, 4, fail_once={"5"})
+
+    lower_bound = max(sum(costs) / 4, max(costs))
+    assert lower_bound <= makespan < round_robin_makespan(costs, 4)
+    # greedy list scheduling: within one task of the lower bound
+    assert makespan <= sum(costs) / 4 + costs[5] + max(costs)
+    assert sum(entry["done"] for entry in report.values()) == 120
+    assert sum(entry["failed"] for entry in report.values()) == 1
+    assert min(entry["utilization"] for entry in report.values()) > 0.8
@@ -0,0 +1,360 @@
+"""Equivalence tests for single-pass batched classifier-free guidance.
+
+Batched guidance must give the same prediction as the sequential path (one
+backbone call per guidance branch) while calling the backbone only once. The
+tiny backbone below runs anywhere torch does; the real SS / SLAT backbones are
+exercised too when their dependencies (kaolin, spconv) are importable.
+"""
+import importlib.util
+import os
+from pathlib import Path
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+os.environ.setdefault("SPARSE_ATTN_BACKEND", "sdpa")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from sam3d_objects.model.backbone.generator.classifier_free_guidance import (  # noqa: E402
+    ClassifierFreeGuidance,
+    PointmapCFG,
+)
+
+
+class TinyEmbedder(torch.nn.Module):
+    """Embeds an image and a pointmap, honouring `force_drop_modalities`."""
+
+    def __init__(self, dim=8):
+        super().__init__()
+        self.image_proj = torch.nn.Linear(4, dim)
+        self.pointmap_proj = torch.nn.Linear(3, dim)
+        self.force_drop_modalities = None
+
+    def forward(self, image, pointmap):
+        pointmap_tokens = self.pointmap_proj(pointmap)
+        if self.force_drop_modalities and "pointmap" in self.force_drop_modalities:
+            pointmap_tokens = pointmap_tokens * 0
+        return torch.cat([self.image_proj(image), pointmap_tokens], dim=1)
+
+
+class TinyBackbone(torch.nn.Module):
+    """Dense cross-attention backbone following the Tdfy wrapper conventions."""
+
+    def __init__(self, dim=8):
+        super().__init__()
+        self.condition_embedder = TinyEmbedder(dim)
+        self.force_zeros_cond = True
+        self.t_proj = torch.nn.Linear(1, dim)
+        self.attn = torch.nn.MultiheadAttention(dim, 2, batch_first=True)
+        self.out = torch.nn.Linear(dim, dim)
+        self.calls = 0
+
+    def _embed_condition(self, *args, **kwargs):
+        cfg_activate = kwargs.pop("cfg", False)
+        cond = self.condition_embedder(*args, **kwargs)
+        if self.force_zeros_cond and cfg_activate:
+            cond = cond * 0
+        return cond
+
+    def _forward_embedded(self, x, t, cond):
+        self.calls += 1
+        t = t.reshape(-1, 1).float().expand(x.shape[0], 1)
+        h = x + self.t_proj(t)[:, None]
+        h = h + self.attn(h, cond, cond)[0]
+        return self.out(h)
+
+    def forward(self, x, t, *args, **kwargs):
+        return self._forward_embedded(x, t, self._embed_condition(*args, **kwargs))
+
+    def embed_branch(self, *args, **kwargs):
+        return {"cond": self._embed_condition(*args, **kwargs)}
+
+    def forward_branches(self, x, t, branches):
+        n = len(branches)
+        cond = torch.cat([branch["cond"] for branch in branches], dim=0)
+        h = self._forward_embedded(torch.cat([x] * n, dim=0), t, cond)
+        return list(h.split(x.shape[0], dim=0))
+
+
+def _conditions(batch_size=2):
+    return {
+        "image": torch.randn(batch_size, 5, 4),
+        "pointmap": torch.randn(batch_size, 6, 3),
+    }
+
+
+def _run_both(cfg, x, t, **conditions):
+    cfg.batched_guidance = False
+    cfg.backbone.calls = 0
+    sequential = cfg(x, t, **conditions)
+    sequential_calls = cfg.backbone.calls
+
+    cfg.batched_guidance = True
+    cfg.backbone.calls = 0
+    batched = cfg(x, t, **conditions)
+    batched_calls = cfg.backbone.calls
+    return sequential, sequential_calls, batched, batched_calls
+
+
+@pytest.mark.parametrize("unconditional_handling", ["zeros", "add_flag"])
+def test_cfg_batched_matches_sequential(unconditional_handling):
+    torch.manual_seed(0)
+    cfg = ClassifierFreeGuidance(
+        TinyBackbone(),
+        strength=3.0,
+        unconditional_handling=unconditional_handling,
+        interval=[0, 500],
+    ).eval()
+    x = torch.randn(2, 7, 8)
+
+    with torch.no_grad():
+        seq, seq_calls, bat, bat_calls = _run_both(
+            cfg, x, torch.tensor(100.0), **_conditions()
+        )
+
+    assert (seq_calls, bat_calls) == (2, 1)
+    torch.testing.assert_close(bat, seq, atol=1e-5, rtol=1e-5)
+
+
+def test_pointmap_cfg_batched_matches_sequential():
+    torch.manual_seed(0)
+    cfg = PointmapCFG(
+        TinyBackbone(),
+        strength=3.0,
+        strength_pm=1.5,
+        unconditional_handling="add_flag",
+        interval=[0, 500],
+    ).eval()
+    x = torch.randn(2, 7, 8)
+
+    with torch.no_grad():
+        seq, seq_calls, bat, bat_calls = _run_both(
+            cfg, x, torch.tensor(100.0), **_conditions()
+        )
+
+    assert (seq_calls, bat_calls) == (3, 1)
+    torch.testing.assert_close(bat, seq, atol=1e-5, rtol=1e-5)
+    # the pointmap drop is scoped to its own branch
+    assert cfg.backbone.condition_embedder.force_drop_modalities is None
+
+
+def test_interval_gating_is_unchanged():
+    """Outside the guidance interval both modes run the conditional branch only."""
+    torch.manual_seed(0)
+    cfg = PointmapCFG(
+        TinyBackbone(),
+        strength=3.0,
+        strength_pm=1.5,
+        unconditional_handling="add_flag",
+        interval=[0, 500],
+    ).eval()
+    x = torch.randn(2, 7, 8)
+
+    with torch.no_grad():
+        seq, seq_calls, bat, bat_calls = _run_both(
+            cfg, x, torch.tensor(900.0), **_conditions()
+        )
+
+    assert (seq_calls, bat_calls) == (1, 1)
+    torch.testing.assert_close(bat, seq)
+
+
+def test_batched_guidance_requires_branch_support():
+    class PlainBackbone(torch.nn.Module):
+        def forward(self, x, t, cond):
+            return x + cond
+
+    cfg = ClassifierFreeGuidance(
+        PlainBackbone(), interval=[0, 500], batched_guidance=True
+    ).eval()
+    with pytest.raises(RuntimeError, match="forward_branches"):
+        cfg(torch.zeros(1, 2), torch.tensor(1.0), torch.ones(1, 2))
+
+
+def _tiny_mot_backbone():
+    mot = pytest.importorskip(
+        "sam3d_objects.model.backbone.tdfy_dit.models.mot_sparse_structure_flow"
+    )
+    mm_latent = pytest.importorskip(
+        "sam3d_objects.model.backbone.tdfy_dit.models.mm_latent"
+    )
+    return mot.SparseStructureFlowTdfyWrapper(
+        latent_mapping={
+            "shape": mm_latent.Latent(
+                8, 32, mm_latent.ShapePositionEmbedder(32, 4, 1)
+            ),
+            "6drotation": mm_latent.Latent(
+                6, 32, mm_latent.LearntPositionEmbedder(32, 1)
+            ),
+        },
+        in_channels=8,
+        model_channels=32,
+        cond_channels=16,
+        out_channels=8,
+        num_blocks=2,
+        num_heads=2,
+        qk_rms_norm=True,
+        force_zeros_cond=True,
+        is_shortcut_model=True,
+    )
+
+
+def _tiny_slat_backbone():
+    pytest.importorskip("spconv")
+    slat_flow = pytest.importorskip(
+        "sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow"
+    )
+    backbone = slat_flow.SLatFlowModelTdfyWrapper(
+        resolution=16,
+        in_channels=8,
+        model_channels=32,
+        cond_channels=16,
+        out_channels=8,
+        num_blocks=1,
+        num_heads=2,
+        patch_size=2,
+        num_io_res_blocks=1,
+        io_block_channels=[16],
+        is_shortcut_model=True,
+    )
+    # spconv's CPU kernels cannot apply a fused bias
+    for module in backbone.modules():
+        if type(module).__name__ in ("SubMConv3d", "SparseConv3d", "SparseInverseConv3d"):
+            module.bias = None
+    return backbone
+
+
+def _random_coords(n=80, resolution=16):
+    coords = torch.unique(torch.randint(0, resolution, (n, 3)), dim=0)
+    return torch.cat([torch.zeros_like(coords[:, :1]), coords], dim=1).int()
+
+
+def test_mot_sparse_structure_flow_batched_matches_sequential():
+    torch.manual_seed(0)
+    cfg = ClassifierFreeGuidance(
+        _tiny_mot_backbone(),
+        strength=5.0,
+        unconditional_handling="add_flag",
+        interval=[0, 500],
+    ).eval()
+    x = {"shape": torch.randn(1, 64, 8), "6drotation": torch.randn(1, 1, 6)}
+    cond = torch.randn(1, 10, 16)
+
+    with torch.no_grad():
+        kwargs = {"d": torch.tensor([40.0])}
+        cfg.batched_guidance = False
+        seq = cfg(x, torch.tensor([100.0]), cond, **kwargs)
+        cfg.batched_guidance = True
+        bat = cfg(x, torch.tensor([100.0]), cond, **kwargs)
+
+    for key in seq:
+        torch.testing.assert_close(bat[key], seq[key], atol=1e-5, rtol=1e-5)
+
+
+def test_slat_flow_batched_matches_sequential():
+    torch.manual_seed(0)
+    cfg = ClassifierFreeGuidance(
+        _tiny_slat_backbone(),
+        strength=5.0,
+        unconditional_handling="zeros",
+        interval=[0, 500],
+    ).eval()
+    coords = _random_coords()
+    x = torch.randn(1, coords.shape[0], 8)
+    cond = torch.randn(1, 10, 16)
+
+    with torch.no_grad():
+        kwargs = {"d": torch.tensor([40.0])}
+        cfg.batched_guidance = False
+        seq = cfg(x, torch.tensor(100.0), cond, coords.numpy(), **kwargs)
+        cfg.batched_guidance = True
+        bat = cfg(x, torch.tensor(100.0), cond, coords.numpy(), **kwargs)
+
+    torch.testing.assert_close(bat, seq, atol=1e-5, rtol=1e-5)
+
+
+# ── multi-view: views folded into the batch, composed with batched CFG ──────
+
+
+def _load_multi_view_utils():
+    spec = importlib.util.spec_from_file_location(
+        "multi_view_utils",
+        Path(__file__).resolve().parents[1]
+        / "sam3d_objects"
+        / "pipeline"
+        / "multi_view_utils.py",
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ShortCutLikeGenerator:
+    """Scales time and adds the step size `d` like ShortCut._generate_dynamics."""
+
+    def __init__(self, reverse_fn):
+        self.reverse_fn = reverse_fn
+
+    def _generate_dynamics(self, x_t, t, *args_conditionals, **kwargs_conditionals):
+        t = torch.tensor([t * 1000.0])
+        d = torch.tensor([0.0])
+        return self.reverse_fn(x_t, t, *args_conditionals, d=d, **kwargs_conditionals)
+
+
+def _multi_view_predictions(generator, x_t, *args_conditionals, num_views):
+    inject_generator_multi_view = _load_multi_view_utils().inject_generator_multi_view
+    preds = []
+    # (batched views, batched guidance): loop / folded views / both
+    for batched_views, batched_guidance in ((False, False), (True, False), (True, True)):
+        generator.reverse_fn.batched_guidance = batched_guidance
+        with inject_generator_multi_view(
+            generator, num_views=num_views, num_steps=4, batched=batched_views
+        ):
+            preds.append(generator._generate_dynamics(x_t, 0.1, *args_conditionals))
+    return preds
+
+
+def test_mot_multi_view_batched_matches_loop():
+    torch.manual_seed(0)
+    generator = ShortCutLikeGenerator(
+        ClassifierFreeGuidance(
+            _tiny_mot_backbone(),
+            strength=5.0,
+            unconditional_handling="add_flag",
+            interval=[0, 500],
+        ).eval()
+    )
+    x = {"shape": torch.randn(1, 64, 8), "6drotation": torch.randn(1, 1, 6)}
+    view_conds = torch.randn(3, 1, 10, 16)
+
+    with torch.no_grad():
+        looped, *batched = _multi_view_predictions(generator, x, view_conds, num_views=3)
+
+    for pred in batched:
+        for key in looped:
+            torch.testing.assert_close(pred[key], looped[key], atol=1e-5, rtol=1e-5)
+
+
+def test_slat_multi_view_batched_matches_loop():
+    torch.manual_seed(0)
+    generator = ShortCutLikeGenerator(
+        ClassifierFreeGuidance(
+            _tiny_slat_backbone(),
+            strength=5.0,
+            unconditional_handling="zeros",
+            interval=[0, 500],
+        ).eval()
+    )
+    coords = _random_coords()
+    x = torch.randn(1, coords.shape[0], 8)
+    view_conds = torch.randn(3, 1, 10, 16)
+
+    with torch.no_grad():
+        looped, *batched = _multi_view_predictions(
+            generator, x, view_conds, coords.numpy(), num_views=3
+        )
+
+    for pred in batched:
+        torch.testing.assert_close(pred, looped, atol=1e-5, rtol=1e-5)
@@ -0,0 +1,175 @@
+"""Tests for the batched multi-hypothesis layout optimization (batched_layout_optimization.py)."""
+import math
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+from sam3d_objects.pipeline.batched_layout_optimization import (  # noqa: E402
+    MESH_LOSS_WEIGHTS,
+    SoftPointRenderer,
+    hypotheses_loss,
+    pose_hypotheses,
+    quaternion_multiply,
+    quaternion_to_matrix,
+    run_batched_render_compare,
+    transform_points,
+    transformed_gaussian,
+)
+
+
+def _scene(seed=0, size=24):
+    """An asymmetric point cloud in front of a pinhole camera."""
+    generator = torch.Generator().manual_seed(seed)
+    points = torch.randn(120, 3, generator=generator) * torch.tensor([0.25, 0.12, 0.05])
+    points[:40, 0] += 0.3  # a heavier right side, so the half turn is wrong
+    points = points + torch.tensor([0.0, 0.0, 2.0])
+    center = points.mean(0)
+    intrinsics = torch.tensor([[30.0, 0, size / 2], [0, 30.0, size / 2], [0, 0, 1]])
+    return SoftPointRenderer(points, center, intrinsics, (size, size), sigma=0.8)
+
+
+def _sequential(render, mask, quat):
+    """run_render_compare with torch.optim.Adam, on the stand-in renderer."""
+    quat = torch.nn.Parameter(quat.clone())
+    translation = torch.nn.Parameter(torch.zeros(3))
+    scale = torch.nn.Parameter(torch.tensor(1.0))
+    start = (quat.detach().clone()[None], torch.zeros(1, 3), torch.ones(1))
+    prev_loss = None
+    for params, iterations, lr in [([translation, scale], 5, 1e-2), ([quat, translation, scale], 25, 5e-3)]:
+        optimizer = torch.optim.Adam(params, lr=lr)
+        for _ in range(iterations):
+            optimizer.zero_grad()
+            pose = (quat[None], translation[None], scale[None])
+            loss = hypotheses_loss(render(*pose), mask, MESH_LOSS_WEIGHTS, *pose, start)[0]
+            loss.backward()
+            optimizer.step()
+            if prev_loss is not None and abs(loss.item() - prev_loss) < 1e-5:
+                break
+            prev_loss = loss.item()
+    return quat.detach(), translation.detach(), scale.detach()
+
+
+def test_quaternion_helpers():
+    quats, scales = pose_hypotheses(4, scales=(1.0, 1.5))
+    assert quats.shape == (8, 4) and scales.tolist() == [1.0, 1.5] * 4
+    torch.testing.assert_close(quats[0], torch.tensor([1.0, 0, 0, 0]))
+    rotations = quaternion_to_matrix(quats)
+    torch.testing.assert_close(rotations @ rotations.transpose(1, 2), torch.eye(3).expand(8, 3, 3))
+    # a quarter turn about y maps z to x
+    torch.testing.assert_close(rotations[2] @ torch.tensor([0.0, 0, 1]), torch.tensor([1.0, 0, 0]))
+    torch.testing.assert_close(
+        quaternion_to_matrix(quaternion_multiply(quats[2], quats[4])), rotations[2] @ rotations[4]
+    )
+
+
+def test_single_hypothesis_follows_the_sequential_path():
+    render = _scene()
+    target = {"quat": torch.tensor([[0.995, 0.0, 0.1, 0.0]]),
+              "translation": torch.tensor([[0.02, -0.01, 0.0]]), "scale": torch.tensor([1.1])}
+    mask = render(**target)["mask"].detach()[None]
+    identity = torch.tensor([1.0, 0.0, 0.0, 0.0])
+
+    result = run_batched_render_compare(render, mask, identity[None])
+    quat, translation, scale = _sequential(render, mask, identity)
+    torch.testing.assert_close(result.quat, quat / quat.norm())
+    torch.testing.assert_close(result.translation, translation)
+    torch.testing.assert_close(result.scale, scale)
+    assert result.renders == result.steps
+
+
+def test_hypotheses_are_independent_and_the_best_one_wins():
+    render = _scene()
+    half_turn = torch.tensor([[0.0, 0.0, 1.0, 0.0]])
+    mask = render(half_turn, torch.zeros(1, 3), torch.ones(1))["mask"].detach()[None]
+    quats, scales = pose_hypotheses(4)
+
+    result = run_batched_render_compare(render, mask, quats, scale=scales, prune_every=0)
+    assert result.index == 2 and result.alive.all()
+    # without pruning, each hypothesis ends where it would alone
+    pair = run_batched_render_compare(render, mask, quats[1:3], scale=scales[1:3], prune_every=0)
+    torch.testing.assert_close(pair.losses, result.losses[1:3])
+    # the identity start alone stays on the wrong side
+    identity = run_batched_render_compare(render, mask, quats[:1])
+    assert identity.losses[0] > 10 * result.losses[2]
+
+
+def test_pruning_keeps_the_best_for_fewer_renders():
+    render = _scene()
+    half_turn = torch.tensor([[0.0, 0.0, 1.0, 0.0]])
+    mask = render(half_turn, torch.zeros(1, 3), torch.tensor([1.2]))["mask"].detach()[None]
+    quats, scales = pose_hypotheses(4, scales=(1.0, 1.2))
+
+    full = run_batched_render_compare(render, mask, quats, scale=scales, prune_every=0)
+    pruned = run_batched_render_compare(render, mask, quats, scale=scales, prune_every=5)
+    assert pruned.index == full.index == 5
+    assert int(pruned.alive.sum()) == 1 and pruned.renders < full.renders / 2
+    assert math.isfinite(float(pruned.losses[pruned.index]))
+    assert [entry[1] for entry in pruned.history][:6] == [8, 8, 8, 8, 8, 4]
+
+
+class _FakeGaussian:
+    def __init__(self, xyz, rotation, scaling):
+        self._xyz, self._rotation, self._scaling = xyz, rotation, scaling
+
+    @property
+    def get_xyz(self):
+        return self._xyz
+
+    @property
+    def get_rotation(self):
+        return torch.nn.functional.normalize(self._rotation, dim=-1)
+
+    def from_xyz(self, xyz):
+        self._xyz = xyz
+
+    def from_rotation(self, rotation):
+        self._rotation = rotation
+
+
+def test_transformed_gaussian_is_out_of_place():
+    xyz = torch.randn(10, 3)
+    gaussian = _FakeGaussian(xyz.clone(), torch.tensor([[1.0, 0, 0, 0]]).repeat(10, 1), torch.zeros(10, 3))
+    center = torch.zeros(3)
+    quat = torch.tensor([0.0, 0.0, 1.0, 0.0], requires_grad=True)  # half turn about y
+    scale = torch.tensor(2.0, requires_grad=True)
+
+    moved = transformed_gaussian(gaussian, center, quat, torch.zeros(3), scale, opencv=True)
+    expected = transform_points(xyz, center, quat[None], torch.zeros(1, 3), scale[None])[0]
+    torch.testing.assert_close(moved.get_xyz, expected * torch.tensor([-1.0, -1.0, 1.0]))
+    torch.testing.assert_close(moved._scaling, torch.full((10, 3), math.log(2.0)))
+    # half turns about y then z: a half turn about x
+    torch.testing.assert_close(
+        quaternion_to_matrix(moved.get_rotation[0]), torch.diag(torch.tensor([1.0, -1.0, -1.0]))
+    )
+    assert torch.equal(gaussian.get_xyz, xyz) and torch.equal(gaussian._scaling, torch.zeros(10, 3))
+    moved.get_xyz.sum().backward()
+    assert scale.grad is not None
+
+
+def test_pipeline_passes_its_layout_hypotheses():
+    pointmap_module = pytest.importorskip("sam3d_objects.pipeline.inference_pipeline_pointmap")
+    calls = []
+
+    def layout(*args, **kwargs):
+        calls.append(kwargs)
+        quat, translation, scale = args[1:4]
+        return quat, translation, scale, 0.9, 0.5, False, True
+
+    pipeline = object.__new__(pointmap_module.InferencePipelinePointMap)
+    pipeline.device = torch.device("cpu")
+    pipeline.layout_post_optimization_method_GS = layout
+    pipeline.layout_rotation_hypotheses, pipeline.layout_scale_hypotheses = 4, (0.8, 1.25)
+    pose = {"rotation": torch.ones(1, 1, 4), "translation": torch.zeros(1, 3), "scale": torch.ones(1, 3)}
+    inputs = {
+        "rgb_image_mask": torch.ones(1, 1, 4, 4),
+        "rgb_image": torch.ones(1, 3, 4, 4),
+        "rgb_pointmap_unnorm": torch.ones(1, 3, 4, 4),
+    }
+    result = pipeline.run_post_optimization_GS(None, torch.eye(3), pose, inputs)
+    assert calls[0]["num_rotation_hypotheses"] == 4
+    assert calls[0]["scale_hypotheses"] == (0.8, 1.25)
+    assert result["iou"] == 0.9
@@ -0,0 +1,90 @@
+"""Tests for chunked, on-device camera rendering (render_utils.render_frames_batched).
+
+The renderer itself is replaced by a cheap deterministic fake, so these only
+check the batching, the uint8 conversion and the transfer / sink plumbing.
+"""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("utils3d")
+pytest.importorskip("gsplat")
+render_utils = pytest.importorskip(
+    "sam3d_objects.model.backbone.tdfy_dit.utils.render_utils"
+)
+
+
+class FakeRenderer:
+    def render(self, sample, extrinsics, intrinsics, colors_overwrite=None):
+        # depends on the camera, exercises rounding and out-of-range values
+        value = extrinsics[:3, 3].sum() + intrinsics[0, 0]
+        color = torch.linspace(-0.1, 1.1, 3 * 4 * 5).reshape(3, 4, 5) * value.sin()
+        return {"color": color, "depth": torch.full((4, 5), float(value))}
+
+
+@pytest.fixture
+def cameras(monkeypatch):
+    monkeypatch.setattr(
+        render_utils, "get_renderer", lambda sample, options={}, **kwargs: FakeRenderer()
+    )
+    yaws = torch.linspace(0, 6.28, 10)
+    pitchs = 0.3 * torch.sin(yaws)
+    return render_utils.yaw_pitch_r_fov_to_extrinsics_intrinsics_batched(
+        yaws, pitchs, 2.0, 40, device="cpu"
+    )
+
+
+def test_batched_cameras_look_at_the_origin_from_distance_r():
+    extrinsics, intrinsics = render_utils.yaw_pitch_r_fov_to_extrinsics_intrinsics_batched(
+        [0.0, 1.0, 2.0], [0.1, -0.2, 0.3], [1.0, 2.0, 3.0], 40, device="cpu"
+    )
+    assert extrinsics.shape == (3, 4, 4) and intrinsics.shape == (3, 3, 3)
+    centers = torch.linalg.inv(extrinsics)[:, :3, 3]
+    torch.testing.assert_close(centers.norm(dim=-1), torch.tensor([1.0, 2.0, 3.0]))
+    # the origin projects to the principal point
+    origin_in_camera = extrinsics[:, :3, 3]
+    torch.testing.assert_close(origin_in_camera[:, :2], torch.zeros(3, 2), atol=1e-5, rtol=0)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="the per-camera path is cuda only")
+def test_batched_cameras_match_the_per_camera_path():
+    yaws, pitchs = [0.0, 1.0, 2.5], [0.1, -0.2, 0.3]
+    expected = render_utils.yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitchs, 2, 40)
+    batched = render_utils.yaw_pitch_r_fov_to_extrinsics_intrinsics_batched(
+        yaws, pitchs, 2, 40
+    )
+    for expected_list, tensor in zip(expected, batched):
+        torch.testing.assert_close(tensor, torch.stack(expected_list))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 10, 16])
+def test_batched_frames_match_the_per_camera_path(cameras, chunk_size):
+    extrinsics, intrinsics = cameras
+    expected = render_utils.render_frames(
+        object(), list(extrinsics), list(intrinsics), verbose=False
+    )
+    batched = render_utils.render_frames(
+        object(), extrinsics, intrinsics, verbose=False, chunk_size=chunk_size
+    )
+    assert len(batched["color"]) == len(expected["color"]) == 10
+    for key in ("color", "depth"):
+        for frame, expected_frame in zip(batched[key], expected[key]):
+            assert frame.dtype == expected_frame.dtype
+            np.testing.assert_array_equal(frame, expected_frame)
+
+
+def test_sink_receives_every_chunk(cameras):
+    extrinsics, intrinsics = cameras
+    chunks = []
+    rets = render_utils.render_frames_batched(
+        object(), extrinsics, intrinsics, verbose=False, chunk_size=4, sink=chunks.append
+    )
+    assert rets == {}
+    assert [len(chunk["color"]) for chunk in chunks] == [4, 4, 2]
+    assert chunks[0]["color"].shape == (4, 4, 5, 3)
+    assert chunks[0]["color"].dtype == np.uint8
@@ -0,0 +1,137 @@
+"""Tests for the content-addressed DINO feature cache (feature_cache.py).
+
+The DINO weights come from torch.hub; a tiny stand-in encoder is returned by
+the hub instead, the cache only sees its inputs and weights.
+"""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+from sam3d_objects.model.backbone.dit.embedder import dino  # noqa: E402
+from sam3d_objects.model.backbone.dit.embedder.feature_cache import (  # noqa: E402
+    FeatureCache,
+    module_fingerprint,
+)
+from sam3d_objects.utils.profiler import StageProfiler  # noqa: E402
+
+
+class TinyViT(torch.nn.Module):
+    embed_dim = 8
+
+    def __init__(self):
+        super().__init__()
+        self.patch_embed = torch.nn.Conv2d(3, self.embed_dim, 4, stride=4)
+        self.calls = 0
+
+    def forward_features(self, x):
+        self.calls += 1
+        tokens = self.patch_embed(x).flatten(2).transpose(1, 2)
+        return {
+            "x_norm_clstoken": tokens.mean(1),
+            "x_norm_patchtokens": tokens,
+            "x_prenorm": tokens,
+        }
+
+
+def _dino(monkeypatch, seed=0):
+    torch.manual_seed(seed)
+    monkeypatch.setattr(torch.hub, "load", lambda **kwargs: TinyViT())
+    return dino.Dino(input_size=16)
+
+
+def _counting(fn):
+    def compute(x):
+        compute.calls += 1
+        return fn(x)
+
+    compute.calls = 0
+    return compute
+
+
+def test_memory_tier_hits_and_copies():
+    cache = FeatureCache()
+    module = torch.nn.Linear(4, 4)
+    compute = _counting(lambda x: x * 2)
+    x = torch.randn(2, 4)
+
+    first = cache.cached(module, x, compute)
+    first += 1  # callers may modify the result in place
+    second = cache.cached(module, x.clone(), compute)
+    cache.cached(module, x + 1, compute)
+
+    assert compute.calls == 2
+    torch.testing.assert_close(second, x * 2)
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+    assert cache.hit_rate() == pytest.approx(1 / 3)
+
+
+def test_memory_limit_evicts_least_recently_used():
+    entry_bytes = 16 * 4
+    cache = FeatureCache(max_memory_bytes=2 * entry_bytes)
+    module = torch.nn.Linear(4, 4)
+    compute = _counting(lambda x: x.repeat(1, 4))
+    a, b, c = (torch.full((1, 4), float(i)) for i in range(3))
+
+    for x in (a, b, a, c):  # c evicts b, a was used more recently
+        cache.cached(module, x, compute)
+    assert compute.calls == 3
+    cache.cached(module, a, compute)
+    assert compute.calls == 3
+    cache.cached(module, b, compute)
+    assert compute.calls == 4
+    assert cache._memory_bytes <= 2 * entry_bytes
+
+
+def test_disk_tier_survives_the_process(tmp_path):
+    module = torch.nn.Linear(4, 4)
+    x = torch.randn(3, 4)
+    compute = _counting(lambda x: x.double() / 3)
+    expected = FeatureCache(cache_dir=str(tmp_path)).cached(module, x, compute)
+
+    reloaded = FeatureCache(cache_dir=str(tmp_path))
+    features = reloaded.cached(module, x, compute)
+    assert compute.calls == 1
+    assert reloaded.stats["disk_hits"] == 1
+    assert features.dtype == torch.float64
+    torch.testing.assert_close(features, expected, atol=1e-3, rtol=1e-3)
+
+    # one entry fits: the oldest file goes first
+    small = FeatureCache(cache_dir=str(tmp_path), max_disk_bytes=reloaded._disk_bytes)
+    small.cached(module, x + 1, compute)
+    assert compute.calls == 2
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_encoders_with_the_same_weights_share_entries(monkeypatch):
+    first, same = _dino(monkeypatch, seed=0), _dino(monkeypatch, seed=0)
+    other = _dino(monkeypatch, seed=1)
+    assert module_fingerprint(first) == module_fingerprint(same)
+    assert module_fingerprint(first) != module_fingerprint(other)
+
+
+def test_dino_reports_to_the_profiler(monkeypatch):
+    cache = FeatureCache()
+    ss_dino, slat_dino = _dino(monkeypatch), _dino(monkeypatch)
+    ss_dino.feature_cache = slat_dino.feature_cache = cache
+    image = torch.rand(1, 3, 20, 20)
+
+    profiler = StageProfiler()
+    with torch.no_grad(), profiler.activate("run"):
+        ss_tokens = ss_dino(image)
+        slat_tokens = slat_dino(image)
+    torch.testing.assert_close(slat_tokens, ss_tokens)
+    assert ss_dino.backbone.calls + slat_dino.backbone.calls == 1
+
+    counters = profiler.to_dict()["counters"]["feature_cache"]
+    assert counters["hits"] == 1 and counters["misses"] == 1
+    assert counters["hit_rate"] == 0.5
+    assert counters["time_saved_ms"] >= 0
+
+    # not with grad: the encoder may be trained
+    ss_dino(image)
+    assert ss_dino.backbone.calls + slat_dino.backbone.calls == 2
@@ -0,0 +1,129 @@
+"""Round-trip tests for the vectorized Gaussian PLY writer/reader and the
+compact (quantized) splat PLY.
+
+ply_io.py only depends on numpy (plyfile for non-binary files), so it is
+loaded directly from its file to avoid importing the representations package.
+"""
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+_ROOT = Path(__file__).resolve().parents[1]
+_spec = importlib.util.spec_from_file_location(
+    "ply_io",
+    _ROOT
+    / "sam3d_objects"
+    / "model"
+    / "backbone"
+    / "tdfy_dit"
+    / "representations"
+    / "gaussian"
+    / "ply_io.py",
+)
+ply_io = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(ply_io)
+
+
+def _splats(n=1000, num_rest=0, seed=0):
+    rng = np.random.default_rng(seed)
+    attributes = {
+        "xyz": rng.uniform(-0.5, 0.5, (n, 3)).astype(np.float32),
+        "f_dc": rng.normal(0, 1, (n, 3)).astype(np.float32),
+        "opacity": rng.normal(0, 2, (n, 1)).astype(np.float32),
+        "scale": rng.uniform(-7, -3, (n, 3)).astype(np.float32),
+        "rotation": rng.normal(0, 1, (n, 4)).astype(np.float32),
+    }
+    if num_rest:
+        attributes["f_rest"] = rng.normal(0, 0.2, (n, num_rest)).astype(np.float32)
+    return attributes
+
+
+@pytest.mark.parametrize("num_rest", [0, 45])
+def test_standard_round_trip_is_exact(tmp_path, num_rest):
+    attributes = _splats(num_rest=num_rest)
+    path = tmp_path / "splat.ply"
+    ply_io.save_gaussians(path, attributes)
+    loaded = ply_io.load_gaussians(path)
+    for key, value in attributes.items():
+        np.testing.assert_array_equal(loaded[key], value)
+    if not num_rest:
+        assert loaded["f_rest"] is None
+
+
+def test_standard_ply_matches_plyfile(tmp_path):
+    plyfile = pytest.importorskip("plyfile")
+    attributes = _splats(n=50)
+    ours = tmp_path / "ours.ply"
+    ply_io.save_gaussians(ours, attributes)
+
+    # what Gaussian.save_ply used to write
+    names = ply_io.gaussian_attribute_names(3, 3, 4)
+    columns = np.concatenate(
+        [attributes["xyz"], np.zeros((50, 3), np.float32), attributes["f_dc"],
+         attributes["opacity"], attributes["scale"], attributes["rotation"]],
+        axis=1,
+    )
+    elements = np.empty(50, dtype=[(name, "f4") for name in names])
+    elements[:] = list(map(tuple, columns))
+    theirs = tmp_path / "theirs.ply"
+    plyfile.PlyData([plyfile.PlyElement.describe(elements, "vertex")]).write(str(theirs))
+
+    assert ours.read_bytes() == theirs.read_bytes()
+
+
+def test_reader_falls_back_to_plyfile_for_ascii(tmp_path):
+    plyfile = pytest.importorskip("plyfile")
+    attributes = _splats(n=20)
+    vertex = ply_io.pack_gaussians(**attributes)
+    path = tmp_path / "ascii.ply"
+    plyfile.PlyData([plyfile.PlyElement.describe(vertex, "vertex")], text=True).write(
+        str(path)
+    )
+    loaded = ply_io.load_gaussians(path)
+    np.testing.assert_allclose(loaded["xyz"], attributes["xyz"], rtol=1e-6)
+
+
+@pytest.mark.parametrize("num_rest", [0, 45])
+def test_compact_round_trip_is_within_quantization_error(tmp_path, num_rest):
+    attributes = _splats(n=1000, num_rest=num_rest)
+    path = tmp_path / "splat.compact.ply"
+    ply_io.save_gaussians(path, attributes, compact=True)
+    loaded = ply_io.load_gaussians(path)
+
+    # per-chunk ranges are at most the global range
+    np.testing.assert_allclose(loaded["xyz"], attributes["xyz"], atol=1.0 / 65535)
+    np.testing.assert_allclose(loaded["scale"], attributes["scale"], atol=4.0 / 255)
+    np.testing.assert_allclose(loaded["f_dc"], attributes["f_dc"], rtol=1e-3, atol=1e-3)
+    alpha = lambda x: 1 / (1 + np.exp(-x))  # noqa: E731
+    np.testing.assert_allclose(
+        alpha(loaded["opacity"]), alpha(attributes["opacity"]), atol=1 / 255
+    )
+    # same rotation up to sign and quantization
+    q = attributes["rotation"] / np.linalg.norm(attributes["rotation"], axis=1, keepdims=True)
+    q_loaded = loaded["rotation"] / np.linalg.norm(loaded["rotation"], axis=1, keepdims=True)
+    assert np.abs(np.sum(q * q_loaded, axis=1)).min() > 0.999
+    if num_rest:
+        span = attributes["f_rest"].max() - attributes["f_rest"].min()
+        np.testing.assert_allclose(loaded["f_rest"], attributes["f_rest"], atol=span / 255)
+
+
+def test_compact_file_is_much_smaller(tmp_path):
+    attributes = _splats(n=10_000)
+    standard, compact = tmp_path / "a.ply", tmp_path / "b.ply"
+    ply_io.save_gaussians(standard, attributes)
+    ply_io.save_gaussians(compact, attributes, compact=True)
+    assert compact.stat().st_size < 0.4 * standard.stat().st_size
+
+
+def test_compact_handles_a_partial_last_chunk(tmp_path):
+    attributes = _splats(n=ply_io.COMPACT_CHUNK_SIZE + 7)
+    path = tmp_path / "splat.ply"
+    ply_io.save_gaussians(path, attributes, compact=True)
+    elements, comments = ply_io.read_ply(path)
+    assert len(elements["chunk"]) == 2 and len(elements["vertex"]) == len(attributes["xyz"])
+    assert ply_io.COMPACT_COMMENT in comments
+    np.testing.assert_allclose(
+        ply_io.load_gaussians(path)["xyz"], attributes["xyz"], atol=1.0 / 65535
+    )
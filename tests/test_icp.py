@@ -0,0 +1,138 @@
+"""Tests for the torch ICP (icp.py), against known transforms and open3d's results."""
+import math
+import os
+from pathlib import Path
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+from sam3d_objects.pipeline.icp import (  # noqa: E402
+    VoxelGridIndex,
+    estimate_normals,
+    icp,
+)
+
+
+def _surface(count=2000, seed=0):
+    """Points on an irregular closed surface, so ICP has a unique optimum."""
+    generator = torch.Generator().manual_seed(seed)
+    directions = torch.nn.functional.normalize(torch.randn(count, 3, generator=generator), dim=1)
+    radius = 0.4 + 0.1 * directions[:, 0] ** 2 + 0.05 * directions[:, 1]
+    return (directions * radius[:, None] * torch.tensor([1.0, 0.7, 0.5])).double()
+
+
+def _rigid(angle, axis, translation):
+    axis = torch.nn.functional.normalize(torch.tensor(axis, dtype=torch.float64), dim=0)
+    skew = torch.tensor(
+        [[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]], dtype=torch.float64
+    )
+    transformation = torch.eye(4, dtype=torch.float64)
+    transformation[:3, :3] = torch.matrix_exp(angle * skew)
+    transformation[:3, 3] = torch.tensor(translation, dtype=torch.float64)
+    return transformation
+
+
+def _transform(transformation, points):
+    return points @ transformation[:3, :3].T + transformation[:3, 3]
+
+
+def test_voxel_grid_matches_brute_force():
+    generator = torch.Generator().manual_seed(1)
+    targets = torch.rand(3000, 3, generator=generator)
+    queries = torch.rand(1000, 3, generator=generator) * 1.2 - 0.1
+    target_batch = torch.randint(0, 2, (3000,), generator=generator)
+    query_batch = torch.randint(0, 2, (1000,), generator=generator)
+
+    nearest, squared = VoxelGridIndex(targets, target_batch, 0.05).nearest(queries, query_batch)
+    distances = torch.cdist(queries, targets)
+    distances[query_batch[:, None] != target_batch[None]] = math.inf
+    best, expected = distances.min(1)
+    within = best <= 0.05
+    assert torch.equal(nearest >= 0, within) and within.any() and not within.all()
+    torch.testing.assert_close(squared[within], best[within] ** 2)
+    assert torch.equal(nearest[within], expected[within])
+
+
+@pytest.mark.parametrize("method", ["point_to_point", "point_to_plane"])
+def test_icp_recovers_a_rigid_transform(method):
+    target = _surface()
+    truth = _rigid(0.1, (0.2, 1.0, 0.1), (0.03, -0.02, 0.04))
+    source = _transform(torch.linalg.inv(truth), target)
+
+    result = icp(source, target, threshold=0.2, method=method)
+    torch.testing.assert_close(result.transformation, truth, atol=1e-4, rtol=0)
+    assert result.fitness == 1.0 and result.inlier_rmse < 1e-4
+    assert 1 <= int(result.iterations) < 30
+
+
+def test_batched_icp_matches_each_cloud_alone():
+    targets = [_surface(1500, seed) for seed in range(3)]
+    truths = [_rigid(0.05 * (i + 1), (0.0, 1.0, 0.3 * i), (0.01 * i, 0.02, 0.0)) for i in range(3)]
+    sources = [_transform(torch.linalg.inv(truth), target) for truth, target in zip(truths, targets)]
+    sources[2] = sources[2][:700]  # partial overlap, different sizes
+
+    batched = icp(sources, targets, threshold=0.1)
+    for i in range(3):
+        alone = icp(sources[i], targets[i], threshold=0.1)
+        torch.testing.assert_close(batched.transformation[i], alone.transformation)
+        assert batched.iterations[i] == alone.iterations
+        torch.testing.assert_close(batched.fitness[i], alone.fitness)
+
+
+def test_estimate_normals_of_a_plane():
+    generator = torch.Generator().manual_seed(2)
+    points = torch.rand(500, 3, generator=generator, dtype=torch.float64)
+    points[:, 2] = 0.5 * points[:, 0]
+    normals = estimate_normals(points)
+    expected = torch.nn.functional.normalize(torch.tensor([-0.5, 0.0, 1.0], dtype=torch.float64), dim=0)
+    torch.testing.assert_close((normals @ expected).abs(), torch.ones(500, dtype=torch.float64))
+
+
+@pytest.mark.parametrize("method", ["point_to_point", "point_to_plane"])
+def test_parity_with_open3d_fixtures(method):
+    # written by scripts/make_icp_parity_fixtures.py with open3d's registration_icp
+    np = pytest.importorskip("numpy")
+    fixtures = np.load(Path(__file__).parent / "data" / "icp_open3d_parity.npz")
+    source, target, normals = (
+        torch.from_numpy(fixtures[name]).double() for name in ("source", "target", "normals")
+    )
+
+    result = icp(source, target, float(fixtures["threshold"]), method=method, target_normals=normals)
+    expected = torch.from_numpy(fixtures[f"{method}_transformation"])
+    torch.testing.assert_close(result.transformation, expected, atol=1e-5, rtol=0)
+    assert abs(float(result.fitness) - float(fixtures[f"{method}_fitness"])) < 1e-3
+    assert abs(float(result.inlier_rmse) - float(fixtures[f"{method}_inlier_rmse"])) < 1e-5
+
+
+@pytest.mark.parametrize("method", ["point_to_point", "point_to_plane"])
+def test_parity_with_open3d(method):
+    o3d = pytest.importorskip("open3d")
+    np = pytest.importorskip("numpy")
+    target = _surface(3000)
+    truth = _rigid(0.15, (0.3, 1.0, -0.2), (0.05, 0.0, -0.03))
+    generator = torch.Generator().manual_seed(3)
+    source = _transform(torch.linalg.inv(truth), target[:2000])
+    source = source + 0.003 * torch.randn(source.shape, generator=generator, dtype=torch.float64)
+    normals = estimate_normals(target)
+
+    source_pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(source.numpy()))
+    target_pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(target.numpy()))
+    target_pcd.normals = o3d.utility.Vector3dVector(normals.numpy())
+    estimation = (
+        o3d.pipelines.registration.TransformationEstimationPointToPoint()
+        if method == "point_to_point"
+        else o3d.pipelines.registration.TransformationEstimationPointToPlane()
+    )
+    expected = o3d.pipelines.registration.registration_icp(
+        source_pcd, target_pcd, 0.05, np.eye(4), estimation
+    )
+
+    result = icp(source, target, 0.05, method=method, target_normals=normals)
+    torch.testing.assert_close(
+        result.transformation, torch.from_numpy(np.array(expected.transformation)), atol=1e-5, rtol=0
+    )
+    assert abs(float(result.fitness) - expected.fitness) < 1e-3
+    assert abs(float(result.inlier_rmse) - expected.inlier_rmse) < 1e-5
@@ -0,0 +1,243 @@
+"""Tests for the server's micro-batching job queue, driven by a stub pipeline."""
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(
+    0, str(Path(__file__).resolve().parents[1] / "process" / "3d-generator")
+)
+
+from job_queue import DONE, FAILED, JobQueue  # noqa: E402
+from request_utils import batch_key  # noqa: E402
+
+
+class StubPipeline:
+    """Records every call; `gate` lets a test hold the scheduler in run_batch."""
+
+    def __init__(self, gpu_time=0.0, cpu_time=0.0):
+        self.gpu_time = gpu_time
+        self.cpu_time = cpu_time
+        self.batches = []
+        self.events = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self._lock = threading.Lock()
+
+    def _log(self, *event):
+        with self._lock:
+            self.events.append((time.monotonic(),) + event)
+
+    def batch_key(self, payload):
+        return payload.get("key")
+
+    def run_batch(self, payloads):
+        self.gate.wait()
+        self.batches.append([p["name"] for p in payloads])
+        self._log("gpu_start", len(self.batches))
+        time.sleep(self.gpu_time)
+        self._log("gpu_end", len(self.batches))
+        outputs = []
+        for p in payloads:
+            if p.get("fail_run"):
+                outputs.append(ValueError(f"bad {p['name']}"))
+            else:
+                outputs.append(p["name"].upper())
+        return outputs
+
+    def postprocess(self, payload, output):
+        self._log("cpu_start", payload["name"])
+        time.sleep(self.cpu_time)
+        self._log("cpu_end", payload["name"])
+        if payload.get("fail_post"):
+            raise RuntimeError("export failed")
+        return {"name": payload["name"], "output": output}
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(pipeline, **kwargs):
+        queue = JobQueue(pipeline, **kwargs).start()
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop()
+
+
+def test_submit_returns_job_with_result(make_queue):
+    queue = make_queue(StubPipeline())
+    job = queue.submit({"name": "a"})
+    assert queue.get(job.id) is job
+    assert job.wait(5)
+    assert job.status == DONE
+    assert job.result == {"name": "a", "output": "A"}
+    assert job.to_dict()["batch_size"] == 1
+
+
+def test_compatible_jobs_are_micro_batched(make_queue):
+    pipeline = StubPipeline()
+    pipeline.gate.clear()
+    queue = make_queue(pipeline, max_batch_size=4, max_wait=0.0)
+    # the first job occupies the scheduler; the rest pile up meanwhile
+    first = queue.submit({"name": "first"})
+    time.sleep(0.05)
+    jobs = [queue.submit({"name": f"j{i}"}) for i in range(6)]
+    pipeline.gate.set()
+    assert all(job.wait(5) for job in [first] + jobs)
+
+    assert pipeline.batches == [
+        ["first"],
+        ["j0", "j1", "j2", "j3"],
+        ["j4", "j5"],
+    ]
+
+
+def test_max_wait_lets_a_batch_fill(make_queue):
+    pipeline = StubPipeline()
+    queue = make_queue(pipeline, max_batch_size=3, max_wait=1.0)
+    jobs = []
+    for i in range(3):
+        jobs.append(queue.submit({"name": f"j{i}"}))
+        time.sleep(0.02)
+    assert all(job.wait(5) for job in jobs)
+    assert pipeline.batches == [["j0", "j1", "j2"]]
+
+
+def test_incompatible_jobs_are_not_batched_and_stay_fair(make_queue):
+    pipeline = StubPipeline()
+    pipeline.gate.clear()
+    queue = make_queue(pipeline, max_batch_size=4)
+    first = queue.submit({"name": "first", "key": 1})
+    time.sleep(0.05)
+    names = ["a1", "b1", "a2", "b2", "a3"]
+    jobs = [queue.submit({"name": n, "key": n[0]}) for n in names]
+    pipeline.gate.set()
+    assert all(job.wait(5) for job in [first] + jobs)
+
+    # the oldest waiting job always goes next, taking its compatible
+    # followers along; nothing is left behind by a later key
+    assert pipeline.batches == [["first"], ["a1", "a2", "a3"], ["b1", "b2"]]
+
+
+def test_postprocess_overlaps_the_next_batch(make_queue):
+    pipeline = StubPipeline(gpu_time=0.1, cpu_time=0.1)
+    queue = make_queue(pipeline, max_batch_size=1)
+    jobs = [queue.submit({"name": f"j{i}"}) for i in range(3)]
+    assert all(job.wait(5) for job in jobs)
+
+    times = {event[1:]: event[0] for event in pipeline.events}
+    # job 0 is exported while job 1 is being sampled
+    assert times[("cpu_start", "j0")] < times[("gpu_end", 2)]
+    assert times[("gpu_start", 2)] < times[("cpu_end", "j0")]
+
+
+def test_failures_only_fail_their_own_job(make_queue):
+    queue = make_queue(StubPipeline(), max_batch_size=4, max_wait=0.2)
+    ok = queue.submit({"name": "ok"})
+    bad_run = queue.submit({"name": "bad_run", "fail_run": True})
+    bad_post = queue.submit({"name": "bad_post", "fail_post": True})
+    assert all(job.wait(5) for job in (ok, bad_run, bad_post))
+
+    assert ok.status == DONE
+    assert bad_run.status == FAILED and "bad bad_run" in str(bad_run.error)
+    assert bad_post.status == FAILED and "export failed" in str(bad_post.error)
+    assert bad_post.to_dict()["error"] == "export failed"
+
+
+def test_prepare_runs_before_the_batch(make_queue):
+    class PreparingPipeline(StubPipeline):
+        def prepare(self, payload):
+            return {**payload, "name": payload["name"] + "-loaded"}
+
+    pipeline = PreparingPipeline()
+    queue = make_queue(pipeline)
+    job = queue.submit({"name": "a"})
+    assert job.wait(5)
+    assert pipeline.batches == [["a-loaded"]]
+    assert job.payload is None  # released once finished
+
+
+def test_stop_fails_jobs_that_never_started():
+    pipeline = StubPipeline()
+    pipeline.gate.clear()
+    queue = JobQueue(pipeline).start()
+    running = queue.submit({"name": "running"})
+    time.sleep(0.05)
+    waiting = queue.submit({"name": "waiting"})
+
+    stopper = threading.Thread(target=queue.stop)
+    stopper.start()
+    time.sleep(0.05)
+    pipeline.gate.set()
+    stopper.join(5)
+
+    assert running.status == DONE
+    assert waiting.status == FAILED
+    with pytest.raises(RuntimeError):
+        queue.submit({"name": "late"})
+
+
+def test_finished_jobs_are_forgotten_beyond_the_limit(make_queue):
+    queue = make_queue(StubPipeline(), max_finished=2)
+    jobs = [queue.submit({"name": f"j{i}"}) for i in range(4)]
+    for job in jobs:
+        job.wait(5)
+    assert queue.get(jobs[0].id) is None
+    assert queue.get(jobs[-1].id) is jobs[-1]
+    assert queue.pending() == 0
+
+
+class DeferringPipeline:
+    """Like the server's ServerPipeline: run_batch samples and returns each
+    job's deferred postprocessing, postprocess runs it."""
+
+    def __init__(self):
+        self.batches = []
+        self.threads = {}
+        self.finishing = threading.Event()
+
+    batch_key = staticmethod(batch_key)
+
+    def run_batch(self, payloads):
+        self.batches.append([p["name"] for p in payloads])
+        # the first job's postprocessing is running while the next is sampled
+        if len(self.batches) > 1:
+            assert self.finishing.wait(5)
+
+        def deferred(name):
+            def finish():
+                self.threads[name] = threading.current_thread().name
+                self.finishing.set()
+                time.sleep(0.05)
+                return name.upper()
+
+            return finish
+
+        return [deferred(p["name"]) for p in payloads]
+
+    def postprocess(self, payload, finish):
+        return finish()
+
+
+def test_deferred_postprocessing_runs_on_the_cpu_threads(make_queue):
+    pipeline = DeferringPipeline()
+    queue = make_queue(pipeline, max_batch_size=4, max_wait=0.2)
+
+    def submit(name, seed=None):
+        views = [("image.png", ["mask.png"])]
+        return queue.submit({"name": name, "view_specs": views, "seed": seed})
+
+    first = submit("first", seed=1)
+    jobs = [submit("a"), submit("seeded", seed=2), submit("b")]
+    assert all(job.wait(5) for job in [first] + jobs)
+
+    assert [job.result for job in jobs] == ["A", "SEEDED", "B"]
+    # unseeded single-view jobs share a micro-batch, seeded ones go alone
+    assert pipeline.batches == [["first"], ["a", "b"], ["seeded"]]
+    assert all(name.startswith("job-queue-cpu") for name in pipeline.threads.values())
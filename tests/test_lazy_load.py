@@ -0,0 +1,131 @@
+"""Tests for meta-device / memory-mapped safetensors model loading."""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+safetensors_torch = pytest.importorskip("safetensors.torch")
+
+from sam3d_objects.model.lazy_load import (  # noqa: E402
+    LazyModuleDict,
+    init_empty_weights,
+    load_safetensors_into_empty_model,
+    measure_load,
+)
+
+
+class TinyModel(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.proj = torch.nn.Linear(8, 16)
+        self.norm = torch.nn.LayerNorm(16)
+        self.out = torch.nn.Linear(16, 4, bias=False)
+        # computed in __init__ and not saved, like positional embeddings
+        self.register_buffer("freqs", torch.arange(4.0), persistent=False)
+        self.register_buffer("steps", torch.tensor(3))
+
+    def forward(self, x):
+        return self.out(self.norm(self.proj(x))) + self.freqs
+
+
+def _filter_and_remove_prefix(prefix):
+    # same key-only transform as model/io.py's filter_and_remove_prefix_state_dict_fn
+    def state_dict_fn(state_dict):
+        return {
+            key[len(prefix) :]: value
+            for key, value in state_dict.items()
+            if key.startswith(prefix)
+        }
+
+    return state_dict_fn
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    torch.manual_seed(0)
+    model = TinyModel().eval()
+    state_dict = {f"_base_models.generator.{k}": v for k, v in model.state_dict().items()}
+    state_dict["_base_models.condition_embedder.weight"] = torch.randn(3, 3)
+    path = str(tmp_path / "model.safetensors")
+    safetensors_torch.save_file(state_dict, path)
+    return model, path
+
+
+def test_init_empty_weights_puts_parameters_on_meta():
+    with init_empty_weights():
+        model = TinyModel()
+    assert all(p.is_meta for p in model.parameters())
+    assert not model.freqs.is_meta and not model.steps.is_meta
+    # restored afterwards
+    assert not torch.nn.Linear(2, 2).weight.is_meta
+
+
+def test_meta_load_matches_the_eager_model(checkpoint):
+    reference, path = checkpoint
+    with init_empty_weights():
+        model = TinyModel()
+    missing = load_safetensors_into_empty_model(
+        model, path, state_dict_fn=_filter_and_remove_prefix("_base_models.generator.")
+    )
+    assert missing == []
+    assert not any(p.is_meta for p in model.parameters())
+    x = torch.randn(5, 8)
+    torch.testing.assert_close(model.eval()(x), reference(x))
+    assert model.steps.item() == 3
+
+
+def test_meta_load_uses_the_model_dtype(checkpoint):
+    _, path = checkpoint
+    with init_empty_weights():
+        model = TinyModel().to(torch.float16)
+    load_safetensors_into_empty_model(
+        model, path, state_dict_fn=_filter_and_remove_prefix("_base_models.generator.")
+    )
+    assert model.proj.weight.dtype == torch.float16
+    assert model.steps.dtype == torch.int64
+
+
+def test_meta_load_reports_missing_parameters(checkpoint):
+    _, path = checkpoint
+    with init_empty_weights():
+        model = TinyModel()
+    missing = load_safetensors_into_empty_model(
+        model, path, state_dict_fn=_filter_and_remove_prefix("nothing.")
+    )
+    assert set(missing) == {
+        "proj.weight",
+        "proj.bias",
+        "norm.weight",
+        "norm.bias",
+        "out.weight",
+    }
+
+
+def test_measure_load_records_time_and_rss():
+    report = {}
+    with measure_load("tiny", report):
+        TinyModel()
+    assert report["tiny"]["seconds"] >= 0
+    assert report["tiny"]["peak_rss_mb"] > 0
+
+
+def test_lazy_module_dict_loads_on_first_access():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return torch.nn.Linear(2, 2)
+
+    models = LazyModuleDict({"eager": torch.nn.Linear(2, 2)})
+    models.add_lazy("decoder", loader)
+    assert "decoder" in models and not models.is_loaded("decoder")
+    assert calls == []
+    assert "decoder" not in dict(models.named_children())
+
+    decoder = models["decoder"]
+    assert models["decoder"] is decoder
+    assert calls == [1] and models.is_loaded("decoder")
+    assert "decoder.weight" in models.state_dict()
@@ -0,0 +1,173 @@
+"""Tests for the GLB levels of detail (lod_utils): vertex clustering and MSFT_lod."""
+import io
+import json
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from sam3d_objects.model.backbone.tdfy_dit.utils import lod_utils  # noqa: E402
+from sam3d_objects.model.backbone.tdfy_dit.utils.uv_parametrization import (  # noqa: E402
+    face_components,
+)
+from sam3d_objects.model.backbone.tdfy_dit.utils.visibility_utils import (  # noqa: E402
+    count_boundary_loops,
+)
+
+
+def _cube(n):
+    """Closed cube, every side its own UV chart (seam vertices split, as from xatlas)."""
+    vertices, faces, uvs = [], [], []
+    grid = np.linspace(-1, 1, n + 1)
+    for side in range(6):
+        axis, sign = side // 2, (-1, 1)[side % 2]
+        base = len(vertices)
+        for i, a in enumerate(grid):
+            for j, b in enumerate(grid):
+                p = np.zeros(3)
+                p[axis], p[(axis + 1) % 3], p[(axis + 2) % 3] = sign, a, b
+                vertices.append(p)
+                uvs.append(((side % 3 + 0.9 * i / n) / 3, (side // 3 + 0.9 * j / n) / 2))
+        for i in range(n):
+            for j in range(n):
+                v00 = base + i * (n + 1) + j
+                v01, v10, v11 = v00 + 1, v00 + n + 1, v00 + n + 2
+                quad = [[v00, v10, v11], [v00, v11, v01]]
+                faces += quad if sign > 0 else [face[::-1] for face in quad]
+    return np.array(vertices), np.array(faces), np.array(uvs)
+
+
+@pytest.mark.parametrize("target", [1000, 300])
+def test_cluster_decimate_keeps_the_mesh_closed_and_the_charts(target):
+    vertices, faces, uvs = _cube(16)
+    new_vertices, new_faces, _, new_uvs = lod_utils.cluster_decimate(
+        vertices, faces, target, uvs=uvs
+    )
+    assert 0.5 * target < len(new_faces) <= target
+    assert new_faces.max() == len(new_vertices) - 1 and len(new_uvs) == len(new_vertices)
+    # charts stay apart in UV space, but meet in 3D: welded, the mesh is closed
+    _, welded = np.unique(np.round(new_vertices, 9), axis=0, return_inverse=True)
+    assert count_boundary_loops(welded.reshape(-1)[new_faces]) == 0
+    charts = face_components(new_faces, len(new_vertices))
+    assert charts.max() + 1 == 6
+    for chart in range(6):
+        chart_uvs = new_uvs[new_faces[charts == chart]].reshape(-1, 2)
+        cell = np.floor(chart_uvs * [3, 2])
+        assert (cell == cell[0]).all()
+
+
+def test_cluster_decimate_averages_attributes_and_skips_small_meshes():
+    vertices, faces, _ = _cube(4)
+    colors = (vertices[:, :1] > 0).repeat(3, 1).astype(np.float32)
+    same = lod_utils.cluster_decimate(vertices, faces, len(faces), attributes=colors)
+    assert same[1] is faces and same[2] is colors and same[3] is None
+    new_vertices, new_faces, new_colors, _ = lod_utils.cluster_decimate(
+        vertices, faces, 40, attributes=colors
+    )
+    assert len(new_faces) <= 40 and new_colors.shape == (len(new_vertices), 3)
+    assert new_colors.dtype == np.float32 and 0 <= new_colors.min() <= new_colors.max() <= 1
+
+
+def _glb(levels=3):
+    # a root node with one child node per level, as trimesh exports scenes
+    gltf = {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": "world", "children": list(range(1, levels + 1))}]
+        + [{"name": f"lod{i}", "mesh": i} for i in range(levels)],
+        "meshes": [{"primitives": []} for _ in range(levels)],
+        "buffers": [{"byteLength": 5}],
+    }
+    return lod_utils.write_glb(gltf, b"\x01\x02\x03\x04\x05")
+
+
+def test_glb_round_trip_is_aligned():
+    data = _glb()
+    assert len(data) % 4 == 0 and int.from_bytes(data[8:12], "little") == len(data)
+    gltf, binary = lod_utils.read_glb(data)
+    assert gltf["nodes"][1]["name"] == "lod0"
+    assert binary == b"\x01\x02\x03\x04\x05\x00\x00\x00"
+    with pytest.raises(ValueError):
+        lod_utils.read_glb(b"glTF" + (1).to_bytes(4, "little") + (12).to_bytes(4, "little"))
+
+
+def test_add_msft_lod_detaches_the_coarse_levels():
+    data = lod_utils.add_msft_lod(_glb(), ["lod0", "lod1", "lod2"], screen_coverage=(0.4, 0.1, 0.0))
+    gltf, binary = lod_utils.read_glb(data)
+    assert gltf["extensionsUsed"] == ["MSFT_lod"]
+    assert gltf["nodes"][0]["children"] == [1]
+    assert gltf["nodes"][1]["extensions"] == {"MSFT_lod": {"ids": [2, 3]}}
+    assert gltf["nodes"][1]["extras"] == {"MSFT_screencoverage": [0.4, 0.1, 0.0]}
+    assert binary[:5] == b"\x01\x02\x03\x04\x05"
+    json.dumps(gltf)
+    with pytest.raises(ValueError, match="lod5"):
+        lod_utils.add_msft_lod(_glb(), ["lod0", "lod5"])
+
+
+def _reachable(gltf):
+    # nodes of the default scene, children included
+    stack = list(gltf["scenes"][gltf.get("scene", 0)]["nodes"])
+    seen = set()
+    while stack:
+        node = stack.pop()
+        seen.add(node)
+        stack += gltf["nodes"][node].get("children", [])
+    return seen
+
+
+def _texture_size(gltf, binary, node):
+    # size of the base color image of a node's mesh
+    primitive = gltf["meshes"][gltf["nodes"][node]["mesh"]]["primitives"][0]
+    material = gltf["materials"][primitive["material"]]
+    texture = gltf["textures"][material["pbrMetallicRoughness"]["baseColorTexture"]["index"]]
+    view = gltf["bufferViews"][gltf["images"][texture["source"]]["bufferView"]]
+    start = view.get("byteOffset", 0)
+    return Image.open(io.BytesIO(binary[start : start + view["byteLength"]])).size
+
+
+def test_export_glb_lods_in_one_file_and_in_separate_files(tmp_path):
+    trimesh = pytest.importorskip("trimesh")
+    postprocessing_utils = pytest.importorskip(
+        "sam3d_objects.model.backbone.tdfy_dit.utils.postprocessing_utils"
+    )
+    vertices, faces, uvs = _cube(8)
+    texture = Image.fromarray(np.random.default_rng(0).integers(0, 255, (64, 64, 3), np.uint8))
+    glb = trimesh.Trimesh(
+        vertices,
+        faces,
+        visual=trimesh.visual.TextureVisuals(
+            uv=uvs,
+            material=trimesh.visual.material.PBRMaterial(baseColorTexture=texture),
+        ),
+        process=False,
+    )
+    meshes, report = postprocessing_utils.glb_lods(glb, ((1.0, 64), (0.25, 32), (0.06, 16)))
+    assert [level["texture_size"] for level in report] == [64, 32, 16]
+    assert report[0]["faces"] == len(faces) > report[1]["faces"] > report[2]["faces"]
+
+    paths = postprocessing_utils.export_glb_lods(
+        meshes, str(tmp_path / "model.glb"), separate_files=True, report=report
+    )
+    assert [os.path.basename(path) for path in paths] == [f"model_lod{i}.glb" for i in range(3)]
+    for path, level, size in zip(paths, report, (64, 32, 16)):
+        assert os.path.getsize(path) == level["bytes"]
+        loaded = trimesh.load(path, force="mesh", process=False)
+        assert len(loaded.faces) == level["faces"]
+        assert loaded.visual.material.baseColorTexture.size == (size, size)
+
+    (path,) = postprocessing_utils.export_glb_lods(meshes, str(tmp_path / "model.glb"))
+    with open(path, "rb") as f:
+        gltf, binary = lod_utils.read_glb(f.read())
+    names = [node.get("name") for node in gltf["nodes"]]
+    ids = [names.index(f"lod{level}") for level in range(3)]
+    assert gltf["extensionsUsed"] == ["MSFT_lod"]
+    assert gltf["nodes"][ids[0]]["extensions"]["MSFT_lod"] == {"ids": ids[1:]}
+    # viewers without the extension see the finest level only
+    reachable = _reachable(gltf)
+    assert ids[0] in reachable and not reachable & set(ids[1:])
+    assert [_texture_size(gltf, binary, node) for node in ids] == [(64, 64), (32, 32), (16, 16)]
@@ -0,0 +1,138 @@
+"""Tests for batched multi-object inference.
+
+K objects of one image are sampled together: their SS inputs are stacked on
+the batch dimension, and their SLAT structures are packed into one sparse
+batch (object i as batch index i) with one condition row per object. The
+packed SLAT step must match K independent steps.
+"""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+os.environ.setdefault("SPARSE_ATTN_BACKEND", "sdpa")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("spconv")
+slat_flow = pytest.importorskip(
+    "sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow"
+)
+from sam3d_objects.model.backbone.generator.classifier_free_guidance import (  # noqa: E402
+    PointmapCFG,
+)
+
+
+class Embedder(torch.nn.Module):
+    def __init__(self, dim=16):
+        super().__init__()
+        self.image_proj = torch.nn.Linear(4, dim)
+        self.pointmap_proj = torch.nn.Linear(3, dim)
+        self.force_drop_modalities = None
+
+    def forward(self, image, pointmap):
+        pointmap_tokens = self.pointmap_proj(pointmap)
+        if self.force_drop_modalities and "pointmap" in self.force_drop_modalities:
+            pointmap_tokens = pointmap_tokens * 0
+        return torch.cat([self.image_proj(image), pointmap_tokens], dim=1)
+
+
+def _tiny_slat_backbone():
+    backbone = slat_flow.SLatFlowModelTdfyWrapper(
+        resolution=16,
+        in_channels=8,
+        model_channels=32,
+        cond_channels=16,
+        out_channels=8,
+        num_blocks=1,
+        num_heads=2,
+        patch_size=2,
+        num_io_res_blocks=1,
+        io_block_channels=[16],
+        condition_embedder=Embedder(),
+        force_zeros_cond=True,
+    )
+    # spconv's CPU kernels cannot apply a fused bias
+    for module in backbone.modules():
+        if type(module).__name__ in ("SubMConv3d", "SparseConv3d", "SparseInverseConv3d"):
+            module.bias = None
+    return backbone.eval()
+
+
+def _objects(num_objects=3):
+    objects = []
+    for n in torch.randint(40, 120, (num_objects,)).tolist():
+        coords = torch.unique(torch.randint(0, 16, (n, 3)), dim=0)
+        coords = torch.cat([torch.zeros_like(coords[:, :1]), coords], dim=1).int()
+        objects.append(
+            {
+                "coords": coords,
+                "x": torch.randn(1, coords.shape[0], 8),
+                "image": torch.randn(1, 5, 4),
+                "pointmap": torch.randn(1, 6, 3),
+            }
+        )
+    return objects
+
+
+def _pack(objects):
+    coords = torch.cat(
+        [
+            torch.cat([torch.full_like(o["coords"][:, :1], i), o["coords"][:, 1:]], dim=1)
+            for i, o in enumerate(objects)
+        ]
+    )
+    x = torch.cat([o["x"] for o in objects], dim=1)
+    image = torch.cat([o["image"] for o in objects])
+    pointmap = torch.cat([o["pointmap"] for o in objects])
+    return x, image, pointmap, coords
+
+
+def test_packed_step_matches_per_object_steps():
+    torch.manual_seed(0)
+    backbone = _tiny_slat_backbone()
+    objects = _objects()
+    t = torch.tensor(250.0)
+
+    with torch.no_grad():
+        reference = []
+        for o in objects:
+            backbone.clear_spatial_cache()
+            reference.append(backbone(o["x"], t, o["image"], o["pointmap"], o["coords"]))
+        backbone.clear_spatial_cache()
+        x, image, pointmap, coords = _pack(objects)
+        packed = backbone(x, t, image, pointmap, coords)
+
+    assert packed.shape == x.shape
+    sizes = [o["coords"].shape[0] for o in objects]
+    for out, ref in zip(packed.split(sizes, dim=1), reference):
+        torch.testing.assert_close(out, ref, atol=1e-5, rtol=1e-4)
+
+
+@pytest.mark.parametrize("batched_guidance", [False, True])
+def test_packed_guidance_matches_per_object_guidance(batched_guidance):
+    torch.manual_seed(0)
+    cfg = PointmapCFG(
+        _tiny_slat_backbone(),
+        strength=3.0,
+        strength_pm=1.5,
+        unconditional_handling="add_flag",
+        interval=[0, 500],
+        batched_guidance=batched_guidance,
+    ).eval()
+    objects = _objects()
+    t = torch.tensor(250.0)
+
+    with torch.no_grad():
+        reference = []
+        for o in objects:
+            cfg.backbone.clear_spatial_cache()
+            reference.append(cfg(o["x"], t, o["image"], o["pointmap"], o["coords"]))
+        cfg.backbone.clear_spatial_cache()
+        x, image, pointmap, coords = _pack(objects)
+        packed = cfg(x, t, image, pointmap, coords)
+
+    sizes = [o["coords"].shape[0] for o in objects]
+    for out, ref in zip(packed.split(sizes, dim=1), reference):
+        torch.testing.assert_close(out, ref, atol=1e-5, rtol=1e-4)
+
@@ -0,0 +1,97 @@
+"""Import footprint of notebook/inference.py: `Inference` must not pull in the
+visualization, interactive or rendering dependencies."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+for module in ("torch", "hydra", "omegaconf", "loguru"):
+    pytest.importorskip(module)
+
+# the most `import inference` may load: besides the standard library, the core
+# dependencies and their own imports
+ALLOWED_PACKAGES = {
+    "inference",
+    "sam3d_objects",
+    "torch",
+    "torchgen",
+    "numpy",
+    "PIL",
+    "omegaconf",
+    "hydra",
+    "antlr4",
+    "yaml",
+    "loguru",
+    "typing_extensions",
+    "packaging",
+    "tqdm",
+    "attr",
+    "certifi",
+    "cuda",
+    "sympy",
+    "mpmath",
+    "networkx",
+    "jinja2",
+    "markupsafe",
+    "fsspec",
+    "filelock",
+    "triton",
+    "nvidia",
+    "importlib_metadata",
+    "importlib_resources",
+    "zipp",
+    "setuptools",
+    "pkg_resources",
+    "six",
+}
+ALLOWED_SAM3D_MODULES = {
+    "sam3d_objects",
+    "sam3d_objects.pipeline",
+    "sam3d_objects.pipeline.sampler_env_overrides",
+}
+DEFERRED = ("kaolin", "gradio", "seaborn", "matplotlib", "pytorch3d", "utils3d")
+
+
+def _loaded_modules():
+    code = (
+        "import json, sys; sys.path.insert(0, 'notebook'); import inference; "
+        "print(json.dumps(sorted(sys.modules)))"
+    )
+    env = {key: value for key, value in os.environ.items() if key != "LIDRA_SKIP_INIT"}
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_core_import_loads_no_optional_dependency():
+    modules = _loaded_modules()
+    packages = {name.split(".")[0] for name in modules}
+    third_party = {
+        name
+        for name in packages - set(sys.stdlib_module_names)
+        if not name.startswith("_") and name != "cython_runtime"
+    }
+
+    assert not [name for name in DEFERRED if name in packages]
+    assert third_party <= ALLOWED_PACKAGES, third_party - ALLOWED_PACKAGES
+    sam3d_modules = {name for name in modules if name.startswith("sam3d_objects")}
+    assert sam3d_modules <= ALLOWED_SAM3D_MODULES, sam3d_modules - ALLOWED_SAM3D_MODULES
+
+
+def test_unknown_attribute():
+    sys.path.insert(0, str(ROOT / "notebook"))
+    try:
+        import inference
+    finally:
+        sys.path.remove(str(ROOT / "notebook"))
+
+    with pytest.raises(AttributeError, match="no_such_helper"):
+        inference.no_such_helper
+    assert "plt" in inference._LAZY_ATTRIBUTES
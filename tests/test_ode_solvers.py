@@ -0,0 +1,203 @@
+"""Tests for the ODE solvers of the flow matching generators.
+
+CPU only, on closed form or small smooth dynamics.
+"""
+import math
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+from sam3d_objects.model.backbone.generator.flow_matching import solver as solvers  # noqa: E402
+
+
+def _smooth_dynamics():
+    generator = torch.Generator().manual_seed(0)
+    weight = torch.randn(8, 8, generator=generator) / 3
+    bias = torch.randn(8, generator=generator)
+
+    def dynamics(x, t):
+        return torch.tanh(x @ weight) * 2 + bias * math.cos(3 * float(t)) - x / 2
+
+    return dynamics
+
+
+def _times(steps):
+    t = torch.linspace(0, 1, steps + 1, dtype=torch.float64)
+    return (t / (1 + 2 * (1 - t))).tolist()  # rescale_t = 3
+
+
+def _relative_error(dynamics, solver, steps, reference, x0):
+    x = solver.solve(dynamics, x0, _times(steps))
+    return float((x - reference).norm() / reference.norm())
+
+
+@pytest.fixture(scope="module")
+def problem():
+    dynamics = _smooth_dynamics()
+    x0 = torch.randn(16, 8, generator=torch.Generator().manual_seed(1))
+    reference = solvers.RungeKutta4().solve(dynamics, x0, _times(2000))
+    return dynamics, x0, reference
+
+
+# second order; the multistep solver's first order start steps keep its
+# observed rate lower at these step counts
+@pytest.mark.parametrize(
+    "solver, min_rate",
+    [(solvers.Heun(), 1.8), (solvers.DPMSolverPlusPlus(), 1.3)],
+)
+def test_convergence_rate(problem, solver, min_rate):
+    dynamics, x0, reference = problem
+    coarse = _relative_error(dynamics, solver, 32, reference, x0)
+    fine = _relative_error(dynamics, solver, 128, reference, x0)
+    assert math.log2(coarse / fine) / 2 > min_rate
+
+
+def test_dpm_solver_is_exact_for_a_constant_data_estimate():
+    # x_t = (1 - t) x_0 + t x_1 for a fixed x_1: v = (x_1 - x_t) / (1 - t)
+    x1 = torch.randn(4, 3)
+    x0 = torch.randn(4, 3)
+
+    def dynamics(x, t):
+        return (x1 - x) / (1 - t)
+
+    x = solvers.DPMSolverPlusPlus().solve(dynamics, x0, _times(3))
+    torch.testing.assert_close(x, x1)
+
+
+def test_multistep_beats_euler_at_equal_evaluations(problem):
+    dynamics, x0, reference = problem
+    euler = _relative_error(dynamics, solvers.Euler(), 16, reference, x0)
+    dpm = _relative_error(dynamics, solvers.DPMSolverPlusPlus(), 16, reference, x0)
+    assert dpm < euler / 2
+
+
+@pytest.mark.parametrize("tableau", ["bosh3", "dopri5"])
+def test_adaptive_rk_meets_tolerance(problem, tableau):
+    dynamics, x0, reference = problem
+    calls = []
+
+    def counting(x, t):
+        calls.append(t)
+        return dynamics(x, t)
+
+    errors = []
+    for tol in (1e-2, 1e-4):
+        calls.clear()
+        solver = solvers.AdaptiveRungeKutta(tableau, rtol=tol, atol=tol)
+        outputs = list(solver.solve_iter(counting, x0, _times(2)))
+        # one output per sampling time, whatever the internal steps
+        assert [t for _, t in outputs] == _times(2)[:-1]
+        errors.append((float((outputs[-1][0] - reference).norm() / reference.norm()), len(calls)))
+    (loose_error, loose_calls), (tight_error, tight_calls) = errors
+    assert tight_error < 1e-3
+    assert tight_error < loose_error and tight_calls > loose_calls
+
+
+def test_adaptive_rk_handles_trees():
+    solver = solvers.AdaptiveRungeKutta(rtol=1e-5, atol=1e-5)
+    x = solver.solve(
+        lambda state, t: {"x": -state["x"], "log_p": 1.0},
+        {"x": torch.ones(3), "log_p": 0.0},
+        [0.0, 0.5, 1.0],
+    )
+    torch.testing.assert_close(x["x"], torch.full((3,), math.exp(-1)), atol=1e-3, rtol=1e-3)
+    assert x["log_p"] == pytest.approx(1.0)
+
+
+def test_sde_without_noise_is_euler(problem):
+    dynamics, x0, _ = problem
+    times = torch.linspace(0, 1, 9)
+    sde = solvers.SDE(sde_strength=0.0).solve(dynamics, x0, times)
+    euler = solvers.Euler().solve(dynamics, x0, times)
+    torch.testing.assert_close(sde, euler)
+
+    noisy = solvers.SDE(sde_strength=0.1).solve(dynamics, x0, times)
+    assert torch.isfinite(noisy).all()
+
+
+def test_flow_matching_solver_selection():
+    model_module = pytest.importorskip(
+        "sam3d_objects.model.backbone.generator.flow_matching.model"
+    )
+    generator = model_module.FlowMatching(
+        reverse_fn=lambda x, t: torch.ones_like(x),
+        inference_steps=4,
+        solver_method="dpmpp_2m",
+    )
+    assert isinstance(generator._solver, solvers.DPMSolverPlusPlus)
+
+    custom = solvers.AdaptiveRungeKutta(rtol=1e-2)
+    generator.set_solver(custom)
+    assert generator._solver is custom
+    assert generator._solver_method == "custom[AdaptiveRungeKutta]"
+
+    generator.set_solver("heun")
+    x = None
+    for _, x, _ in generator.generate_iter((2, 3), "cpu"):
+        pass
+    assert x.shape == (2, 3)
+
+
+def test_dpm_solver_rejects_reversed_time_grids():
+    with pytest.raises(ValueError, match="increasing times"):
+        solvers.DPMSolverPlusPlus().solve(
+            lambda x, t: -x, torch.ones(3), torch.tensor([1.0, 0.5, 0.0])
+        )
+
+    model_module = pytest.importorskip(
+        "sam3d_objects.model.backbone.generator.flow_matching.model"
+    )
+    reverse_fn = lambda x, t: -x  # noqa: E731
+    generator = model_module.FlowMatching(reverse_fn=reverse_fn, inference_steps=4)
+    generator.set_solver("dpmpp_2m")
+    # log_likelihood integrates from x_1 back to t = 0
+    with pytest.raises(ValueError, match="log_likelihood"):
+        generator.log_likelihood(torch.ones(2, 3))
+    with pytest.raises(ValueError, match="reversed_timestamp"):
+        model_module.FlowMatching(
+            reverse_fn=reverse_fn, reversed_timestamp=True, solver_method="dpmpp_2m"
+        )
+    with pytest.raises(ValueError, match="sigma_min"):
+        model_module.FlowMatching(reverse_fn=reverse_fn, sigma_min=1e-3, solver_method="dpmpp_2m")
+
+
+class TinyShortCutBackbone(torch.nn.Module):
+    """Velocity of a linear layer over x, t and the shortcut step size d."""
+
+    def __init__(self):
+        super().__init__()
+        self.layer = torch.nn.Linear(5, 3)
+        self.d = []
+
+    def forward(self, x, t, d):
+        self.d.append(float(d))
+        features = torch.cat([x, t.expand(len(x), 1) / 1000, d.expand(len(x), 1) / 1000], 1)
+        return self.layer(features)
+
+
+def test_shortcut_only_samples_with_shortcut_steps():
+    shortcut_module = pytest.importorskip(
+        "sam3d_objects.model.backbone.generator.shortcut.model"
+    )
+    torch.manual_seed(0)
+    backbone = TinyShortCutBackbone()
+    generator = shortcut_module.ShortCut(reverse_fn=backbone, inference_steps=4)
+    with torch.no_grad():
+        x = generator.generate((2, 3), "cpu")
+    assert x.shape == (2, 3) and backbone.d == [1000 / 4] * 4
+
+    for solver in ("heun", "dpmpp_2m", "adaptive_rk"):
+        generator.set_solver(solver)
+        generator.no_shortcut = False
+        with pytest.raises(ValueError, match="no_shortcut"):
+            generator.generate((2, 3), "cpu")
+        # as a flow matching model (d = 0), any solver applies
+        generator.no_shortcut = True
+        backbone.d.clear()
+        with torch.no_grad():
+            x = generator.generate((2, 3), "cpu")
+        assert torch.isfinite(x).all() and set(backbone.d) == {0.0}
@@ -0,0 +1,128 @@
+"""Tests for the shared on-disk pointmap cache (pointmap_cache.py) and its use
+by the batch converters."""
+import multiprocessing
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from sam3d_objects.pipeline.pointmap_cache import PointmapCache  # noqa: E402
+
+BATCH_DIR = Path(__file__).resolve().parents[1] / "batch"
+
+
+def _arrays(seed=0, size=(32, 24)):
+    rng = np.random.default_rng(seed)
+    pointmap = rng.normal(size=size + (3,)).astype(np.float32)
+    pointmap[0, :3] = np.nan
+    pointmap[1, 0] = np.inf
+    return {
+        "pointmap": pointmap,
+        "intrinsics": np.array([[1.1, 0, 0.5], [0, 1.2, 0.5], [0, 0, 1]], dtype=np.float32),
+        "mask": rng.random(size) > 0.5,
+        "normal": None,
+    }
+
+
+def test_round_trip_in_half_precision(tmp_path):
+    cache = PointmapCache(str(tmp_path))
+    arrays = _arrays()
+    cache.put("k", arrays)
+    cached = cache.get("k")
+
+    assert set(cached) == {"pointmap", "intrinsics", "mask"}
+    assert cached["pointmap"].dtype == np.float32
+    np.testing.assert_allclose(cached["pointmap"], arrays["pointmap"], rtol=1e-3, atol=1e-4)
+    assert np.isnan(cached["pointmap"][0, :3]).all() and np.isposinf(cached["pointmap"][1, 0, 0])
+    # small arrays stay exact
+    np.testing.assert_array_equal(cached["intrinsics"], arrays["intrinsics"])
+    np.testing.assert_array_equal(cached["mask"], arrays["mask"])
+    assert cache.get("missing") is None
+    assert cache.stats == {"hits": 1, "misses": 1}
+
+
+def test_key(tmp_path):
+    image = tmp_path / "image.png"
+    image.write_bytes(b"pixels")
+    key = PointmapCache.key(str(image), "lotus2", near=0.2, far=1.5)
+
+    assert key == PointmapCache.key(image, "lotus2", far=1.5, near=0.2)
+    assert key != PointmapCache.key(str(image), "da3", near=0.2, far=1.5)
+    assert key != PointmapCache.key(str(image), "lotus2", "v2", near=0.2, far=1.5)
+    assert key != PointmapCache.key(str(image), "lotus2", near=0.3, far=1.5)
+    pixels = np.zeros((4, 4, 3), dtype=np.uint8)
+    assert PointmapCache.key(pixels, "MoGe") != PointmapCache.key(pixels + 1, "MoGe")
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    cache = PointmapCache(str(tmp_path), max_bytes=None)
+    for i in range(3):
+        cache.put(str(i), _arrays(i))
+        os.utime(tmp_path / f"{i}.npz", (i, i))
+    cache.get("0")  # now the most recently used
+    size = os.path.getsize(tmp_path / "0.npz")
+
+    cache.max_bytes = int(2.5 * size)
+    cache.put("3", _arrays(3))
+    assert sorted(os.listdir(tmp_path)) == ["0.npz", "3.npz"]
+
+
+def _write_many(cache_dir, seed):
+    cache = PointmapCache(cache_dir, max_bytes=None)
+    for _ in range(20):
+        cache.put("shared", _arrays(seed))
+
+
+def test_concurrent_writers(tmp_path):
+    cache_dir = str(tmp_path)
+    context = multiprocessing.get_context("spawn")
+    writers = [context.Process(target=_write_many, args=(cache_dir, 0)) for _ in range(3)]
+    for writer in writers:
+        writer.start()
+    reader = PointmapCache(cache_dir)
+    reads = 0
+    while any(writer.is_alive() for writer in writers):
+        cached = reader.get("shared")
+        if cached is not None:  # never a partial entry
+            np.testing.assert_array_equal(cached["mask"], _arrays(0)["mask"])
+            reads += 1
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+    assert reader.get("shared") is not None
+    assert os.listdir(tmp_path) == ["shared.npz"]  # no temporary files left
+
+
+def test_lotus2_converter_cached_only(tmp_path):
+    pytest.importorskip("torch")
+    image = tmp_path / "image.png"
+    image.write_bytes(b"pixels")
+    depth = tmp_path / "depth.npy"
+    np.save(depth, np.random.default_rng(0).random((8, 10)).astype(np.float32))
+    env = {**os.environ, "POINTMAP_CACHE_DIR": str(tmp_path / "cache")}
+
+    def convert(*args, out="out"):
+        return subprocess.run(
+            [sys.executable, str(BATCH_DIR / "lotus2_to_pointmap.py"), "--image", str(image),
+             "--out-dir", str(tmp_path / out), "--fov-h", "24", *args],
+            env=env, capture_output=True, text=True,
+        )
+
+    assert convert("--cached-only").returncode == 1
+    assert convert("--depth", str(depth)).returncode == 0
+    hit = convert("--cached-only", out="from_cache")
+    assert hit.returncode == 0, hit.stderr
+    assert "cache hit" in hit.stdout
+    np.testing.assert_allclose(
+        np.load(tmp_path / "from_cache" / "pointmap.npy"),
+        np.load(tmp_path / "out" / "pointmap.npy"),
+        rtol=1e-3,
+    )
+    # other conversion parameters miss
+    assert convert("--cached-only", "--near", "0.5").returncode == 1
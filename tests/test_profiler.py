@@ -0,0 +1,115 @@
+"""Tests for the per-stage pipeline profiler (sam3d_objects.utils.profiler).
+
+CPU only: no CUDA timings or memory, the structure of the trace is the same.
+"""
+import json
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+from sam3d_objects.utils import profiler as prof  # noqa: E402
+
+
+class FakeSparse:
+    def __init__(self):
+        self.feats = torch.zeros(10, 8)
+        self.coords = torch.zeros(10, 4, dtype=torch.int32)
+
+
+class Pipeline:
+    @prof.profiled()
+    def sample(self, n):
+        return {"x": torch.zeros(n, 3), "sparse": FakeSparse()}
+
+    @prof.profiled("decode")
+    def decode_slat(self, x):
+        with prof.profile_stage("inner", note="hi") as event:
+            event.annotate(size=len(x))
+        return [x["x"] * 2]
+
+    def run(self, n=4, profiler=None):
+        with prof.profiling(profiler, "run"):
+            return self.decode_slat(self.sample(n))
+
+
+def test_inactive_profiler_is_a_no_op():
+    assert prof.active_profiler() is None
+    assert prof.profile_stage("anything") is prof.profile_stage("other")
+    with prof.profile_stage("anything") as event:
+        event.record_tensors("x", torch.zeros(3))
+        event.annotate(a=1)
+    out = Pipeline().run()
+    assert out[0].shape == (4, 3)
+
+
+def test_nested_stages_and_tensor_sizes():
+    profiler = prof.StageProfiler()
+    Pipeline().run(n=5, profiler=profiler)
+    assert prof.active_profiler() is None
+
+    events = {e["path"]: e for e in profiler.events}
+    assert set(events) == {"run", "run/sample", "run/decode", "run/decode/inner"}
+    assert events["run/decode/inner"]["depth"] == 2
+    assert events["run/decode/inner"]["args"] == {"note": "hi", "size": 2}
+    assert events["run"]["wall_ms"] >= events["run/decode"]["wall_ms"]
+
+    tensors = events["run/sample"]["tensors"]["output"]
+    assert tensors["count"] == 3
+    assert tensors["bytes"] == 5 * 3 * 4 + 10 * 8 * 4 + 10 * 4 * 4
+    assert tensors["shapes"]["x"] == [5, 3]
+    assert tensors["shapes"]["sparse.coords"] == [10, 4]
+
+    summary = profiler.summary()
+    assert summary["run/sample"]["calls"] == 1
+
+
+def test_solver_steps_are_recorded():
+    from sam3d_objects.model.backbone.generator.flow_matching.solver import Euler
+
+    times = torch.linspace(0, 1, 6)
+    dynamics = lambda x, t: torch.ones_like(x)  # noqa: E731
+
+    profiler = prof.StageProfiler()
+    with profiler.activate("sample"):
+        x = Euler().solve(dynamics, torch.zeros(2), times)
+    torch.testing.assert_close(x, torch.ones(2))
+    steps = [e for e in profiler.events if e["name"] == "step"]
+    assert [e["args"]["step"] for e in steps] == list(range(5))
+    assert all(e["path"] == "sample/step" for e in steps)
+    assert steps[0]["tensors"]["x_t"]["shapes"]["."] == [2]
+
+    profiler = prof.StageProfiler(record_steps=False)
+    with profiler.activate("sample"):
+        Euler().solve(dynamics, torch.zeros(2), times)
+    assert [e["name"] for e in profiler.events] == ["sample"]
+
+
+def test_json_and_chrome_trace(tmp_path):
+    profiler = prof.StageProfiler()
+    Pipeline().run(profiler=profiler)
+    profiler.save_json(tmp_path / "trace.json")
+    profiler.save_chrome_trace(tmp_path / "trace.chrome.json")
+
+    data = json.loads((tmp_path / "trace.json").read_text())
+    assert [e["path"] for e in data["events"]][0] == "run"
+    trace = json.loads((tmp_path / "trace.chrome.json").read_text())["traceEvents"]
+    complete = {e["name"]: e for e in trace if e["ph"] == "X"}
+    assert set(complete) == {"run", "sample", "decode", "inner"}
+    run, inner = complete["run"], complete["inner"]
+    assert run["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= run["ts"] + run["dur"] + 1e-3
+    assert inner["cat"] == "run"
+
+
+def test_profiler_is_deactivated_on_error():
+    profiler = prof.StageProfiler()
+    with pytest.raises(RuntimeError):
+        with profiler.activate("run"):
+            with prof.profile_stage("failing"):
+                raise RuntimeError("boom")
+    assert prof.active_profiler() is None
+    assert {e["path"] for e in profiler.events} == {"run", "run/failing"}
@@ -0,0 +1,108 @@
+"""Tests for the on-disk pipeline result cache (result_cache.py)."""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+from sam3d_objects.pipeline.result_cache import (  # noqa: E402
+    ResultCache,
+    canonical_hash,
+    checkpoint_fingerprint,
+)
+from sam3d_objects.utils.profiler import StageProfiler  # noqa: E402
+
+
+def test_canonical_hash():
+    image = np.arange(12, dtype=np.uint8).reshape(2, 2, 3)
+    settings = {"ss_inference_steps": 25, "slat_cfg_strength": 5.0}
+    key = canonical_hash(image, 7, settings)
+
+    assert key == canonical_hash(image.copy(), 7, dict(reversed(settings.items())))
+    assert key == canonical_hash(torch.from_numpy(image), 7, settings)
+    assert key != canonical_hash(image, 8, settings)
+    assert key != canonical_hash(image.astype(np.float32), 7, settings)
+    assert key != canonical_hash(image.reshape(3, 2, 2), 7, settings)
+    assert key != canonical_hash(image, 7, {**settings, "ss_inference_steps": 12})
+    # no two values of different types collide
+    assert canonical_hash(1) != canonical_hash(1.0) != canonical_hash("1")
+    assert canonical_hash([1, 2], 3) != canonical_hash([1], 2, 3)
+
+
+def test_checkpoint_fingerprint(tmp_path):
+    ckpt = tmp_path / "ss_generator.ckpt"
+    ckpt.write_bytes(b"weights")
+    paths = [str(ckpt), str(tmp_path / "missing.ckpt"), None]
+    fingerprint = checkpoint_fingerprint(paths)
+
+    assert fingerprint == checkpoint_fingerprint(reversed(paths))
+    ckpt.write_bytes(b"new weights")
+    assert fingerprint != checkpoint_fingerprint(paths)
+
+
+def test_get_returns_fresh_copies(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    value = {"coords": torch.arange(6).view(2, 3), "glb": [1, 2]}
+    profiler = StageProfiler()
+    with profiler.activate("run"):
+        assert cache.get("k", stage="ss") is None
+        cache.put("k", value)
+        first = cache.get("k", stage="ss")
+        first["glb"].append(3)  # callers may mutate their results
+        second = cache.get("k", stage="ss")
+
+    torch.testing.assert_close(second["coords"], value["coords"])
+    assert second["glb"] == [1, 2]
+    assert cache.stats == {"hits": 2, "misses": 1}
+    counters = profiler.counters["result_cache"]
+    assert counters == {"hits": 2, "misses": 1, "ss_hits": 2, "ss_misses": 1}
+
+
+def test_entries_survive_restarts_and_evict_lru(tmp_path):
+    entry = torch.zeros(1024, dtype=torch.uint8)
+    cache = ResultCache(str(tmp_path))
+    cache.put("a", entry)
+    size = os.path.getsize(tmp_path / "a.pt")
+
+    cache = ResultCache(str(tmp_path), max_bytes=2.5 * size)
+    assert cache.get("a") is not None
+    cache.put("b", entry)
+    cache.get("a")
+    cache.put("c", entry)  # evicts b, the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert sorted(os.listdir(tmp_path)) == ["a.pt", "c.pt"]
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("k", torch.ones(3))
+    (tmp_path / "k.pt").write_bytes(b"truncated")
+
+    assert cache.get("k") is None
+    assert not (tmp_path / "k.pt").exists()
+
+
+def test_pipeline_settings_follow_the_depth_model(monkeypatch):
+    pointmap_module = pytest.importorskip("sam3d_objects.pipeline.inference_pipeline_pointmap")
+    monkeypatch.setattr(
+        pointmap_module.InferencePipeline, "_result_cache_settings", lambda self: {"seed": 1}
+    )
+
+    class DepthModel:
+        def __init__(self, model):
+            self.model = model
+
+    pipeline = object.__new__(pointmap_module.InferencePipelinePointMap)
+    pipeline.depth_model = DepthModel(torch.nn.Linear(2, 2))
+    pipeline.clip_pointmap_beyond_scale = None
+    settings = pipeline._result_cache_settings()
+    assert settings["seed"] == 1 and settings["depth_model"] == "DepthModel"
+
+    pipeline.depth_model = DepthModel(torch.nn.Linear(2, 2))
+    assert pipeline._result_cache_settings() != settings
+    pipeline.clip_pointmap_beyond_scale = 3.0
+    assert pipeline._result_cache_settings()["clip_pointmap_beyond_scale"] == 3.0
@@ -0,0 +1,40 @@
+"""Tests for the camera-frame composition of run_multi_object's objects (scene_composition)."""
+import math
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("pytorch3d")
+from sam3d_objects.pipeline import scene_composition  # noqa: E402
+
+
+def _pose(angle, translation, scale):
+    # a turn of `angle` about z
+    return {
+        "rotation": torch.tensor([[math.cos(angle / 2), 0.0, 0.0, math.sin(angle / 2)]]),
+        "translation": torch.tensor([translation]),
+        "scale": torch.full((1, 3), scale),
+    }
+
+
+def test_object_to_camera_scales_rotates_then_translates():
+    matrix = scene_composition.object_to_camera(_pose(math.pi / 2, [1.0, 2.0, 3.0], 2.0))
+    point = matrix @ torch.tensor([1.0, 0.0, 0.0, 1.0])
+    # (1, 0, 0) -> scaled (2, 0, 0) -> turned a quarter about z -> moved
+    torch.testing.assert_close(point[:3].abs().sum(), torch.tensor(8.0))
+    torch.testing.assert_close(point[3], torch.tensor(1.0))
+    torch.testing.assert_close(point[2], torch.tensor(3.0))
+    torch.testing.assert_close(matrix[:3, 3], torch.tensor([1.0, 2.0, 3.0]))
+
+
+def test_compose_scene_without_gaussians_keeps_the_poses():
+    objects = [_pose(0.0, [0.0, 0.0, 2.0], 1.0), _pose(math.pi, [1.0, 0.0, 3.0], 0.5)]
+    scene = scene_composition.compose_scene(objects)
+    assert scene["object_to_camera"].shape == (2, 4, 4) and scene["gaussian"] is None
+    torch.testing.assert_close(scene["object_to_camera"][0], torch.tensor(
+        [[1.0, 0, 0, 0], [0, 1.0, 0, 0], [0, 0, 1.0, 2.0], [0, 0, 0, 1.0]]
+    ))
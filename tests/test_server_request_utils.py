@@ -10,6 +10,7 @@ sys.path.insert(
 
 from request_utils import (  # noqa: E402
     MAX_VIEWS,
+    batch_key,
     extract_intrinsics,
     extract_metric_scale,
     extract_pose,
@@ -359,3 +360,16 @@ def test_normal_map_sidecar_path_is_always_forward_slash():
     """Production only ever runs on the same (Linux) machine as its caller;
     as_posix() keeps the result deterministic under Windows-run tests too."""
     assert "\\" not in normal_map_sidecar_path("out/mesh.glb")
+
+
+# ── batch_key ────────────────────────────────────────────────────────────────
+
+
+def test_batch_key_only_groups_unseeded_single_view_requests():
+    single = {"view_specs": [("a.png", ["m.png"])], "seed": None}
+    seeded = {**single, "seed": 7}
+    multi = {"view_specs": [("a.png", ["m.png"]), ("b.png", ["n.png"])], "seed": None}
+    assert batch_key(single) == batch_key(dict(single))
+    assert batch_key(seeded) != batch_key(dict(seeded))
+    assert batch_key(multi) != batch_key(dict(multi))
+    assert batch_key(seeded) != batch_key(single)
@@ -0,0 +1,172 @@
+"""Tests for the sampling session of the SLAT wrapper.
+
+Coords and conditions are fixed for a whole SLAT sampling run: the wrapper
+uploads the coords and embeds each guidance branch's conditions on the first
+step only, then reuses both until the coords change or the session is cleared.
+"""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+os.environ.setdefault("SPARSE_ATTN_BACKEND", "sdpa")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("spconv")
+slat_flow = pytest.importorskip(
+    "sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow"
+)
+from sam3d_objects.model.backbone.generator.classifier_free_guidance import (  # noqa: E402
+    ClassifierFreeGuidance,
+    PointmapCFG,
+)
+
+
+class CountingEmbedder(torch.nn.Module):
+    """Embeds an image and a pointmap, honouring `force_drop_modalities`."""
+
+    def __init__(self, dim=16):
+        super().__init__()
+        self.image_proj = torch.nn.Linear(4, dim)
+        self.pointmap_proj = torch.nn.Linear(3, dim)
+        self.force_drop_modalities = None
+        self.calls = 0
+
+    def forward(self, image, pointmap):
+        self.calls += 1
+        pointmap_tokens = self.pointmap_proj(pointmap)
+        if self.force_drop_modalities and "pointmap" in self.force_drop_modalities:
+            pointmap_tokens = pointmap_tokens * 0
+        return torch.cat([self.image_proj(image), pointmap_tokens], dim=1)
+
+
+def _tiny_slat_backbone():
+    backbone = slat_flow.SLatFlowModelTdfyWrapper(
+        resolution=16,
+        in_channels=8,
+        model_channels=32,
+        cond_channels=16,
+        out_channels=8,
+        num_blocks=1,
+        num_heads=2,
+        patch_size=2,
+        num_io_res_blocks=1,
+        io_block_channels=[16],
+        condition_embedder=CountingEmbedder(),
+        force_zeros_cond=True,
+    )
+    # spconv's CPU kernels cannot apply a fused bias
+    for module in backbone.modules():
+        if type(module).__name__ in ("SubMConv3d", "SparseConv3d", "SparseInverseConv3d"):
+            module.bias = None
+    return backbone.eval()
+
+
+def _random_coords(n=80, resolution=16):
+    coords = torch.unique(torch.randint(0, resolution, (n, 3)), dim=0)
+    return torch.cat([torch.zeros_like(coords[:, :1]), coords], dim=1).int()
+
+
+def _conditions():
+    return torch.randn(1, 5, 4), torch.randn(1, 6, 3)
+
+
+def _sample(cfg, x, conditions, coords, steps=4, fresh_session=False):
+    outputs = []
+    for step in range(steps):
+        if fresh_session:
+            cfg.backbone.clear_spatial_cache()
+        t = torch.tensor(100.0 + step)
+        outputs.append(cfg(x, t, *conditions, coords))
+    return outputs
+
+
+@pytest.mark.parametrize("batched_guidance", [False, True])
+def test_embedder_runs_once_per_branch(batched_guidance):
+    torch.manual_seed(0)
+    cfg = PointmapCFG(
+        _tiny_slat_backbone(),
+        strength=3.0,
+        strength_pm=1.5,
+        unconditional_handling="add_flag",
+        interval=[0, 500],
+        batched_guidance=batched_guidance,
+    ).eval()
+    embedder = cfg.backbone.condition_embedder
+    coords = _random_coords().numpy()
+    x = torch.randn(1, coords.shape[0], 8)
+    conditions = _conditions()
+
+    with torch.no_grad():
+        embedder.calls = 0
+        reference = _sample(cfg, x, conditions, coords, fresh_session=True)
+        assert embedder.calls == 3 * 4
+
+        cfg.backbone.clear_spatial_cache()
+        embedder.calls = 0
+        cached = _sample(cfg, x, conditions, coords)
+        # conditional, pointmap dropped, unconditional
+        assert embedder.calls == 3
+
+    for out, ref in zip(cached, reference):
+        torch.testing.assert_close(out, ref, atol=1e-5, rtol=1e-5)
+
+
+def test_coords_are_uploaded_once():
+    torch.manual_seed(0)
+    backbone = _tiny_slat_backbone()
+    coords = _random_coords().numpy()
+    x = torch.randn(2, coords.shape[0], 8)
+
+    session = backbone._sampling_session(coords)
+    first = session.sparse_input(x)
+    second = session.sparse_input(x * 2)
+    assert second.coords is first.coords
+    assert second._spatial_cache is first._spatial_cache
+    assert first.layout == second.layout and first.shape[0] == 2
+    torch.testing.assert_close(second.feats, x.reshape(-1, 8) * 2)
+
+    reference = backbone._sparse_input(x, coords)
+    assert torch.equal(first.coords, reference.coords)
+    assert first.layout == reference.layout
+
+
+def test_session_ends_with_new_coords_or_clear():
+    torch.manual_seed(0)
+    backbone = _tiny_slat_backbone()
+    embedder = backbone.condition_embedder
+    conditions = _conditions()
+
+    with torch.no_grad():
+        for n in (80, 120):
+            coords = _random_coords(n=n).numpy()
+            x = torch.randn(1, coords.shape[0], 8)
+            embedder.calls = 0
+            for _ in range(3):
+                backbone(x, torch.tensor(100.0), *conditions, coords)
+            assert embedder.calls == 1
+
+        backbone.clear_spatial_cache()
+        backbone(x, torch.tensor(100.0), *conditions, coords)
+        assert embedder.calls == 2
+
+        # new condition tensors make a new branch
+        backbone(x, torch.tensor(100.0), *_conditions(), coords)
+        assert embedder.calls == 3
+
+
+def test_embeddings_are_not_cached_with_grad():
+    torch.manual_seed(0)
+    cfg = ClassifierFreeGuidance(
+        _tiny_slat_backbone(),
+        strength=3.0,
+        unconditional_handling="add_flag",
+        interval=[0, 500],
+    ).eval()
+    embedder = cfg.backbone.condition_embedder
+    coords = _random_coords().numpy()
+    x = torch.randn(1, coords.shape[0], 8)
+
+    _sample(cfg, x, _conditions(), coords, steps=2)
+    assert embedder.calls == 2 * 2
@@ -0,0 +1,97 @@
+"""Tests for the sparse-native sparse structure operations (sparse_structure.py)."""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+from sam3d_objects.pipeline.sparse_structure import (  # noqa: E402
+    _unique_rows,
+    downsample_sparse_structure,
+    filter_sparse_components,
+    prune_sparse_structure,
+    prune_sparse_structure_dense,
+    sparse_connected_components,
+)
+
+
+def _random_coords(resolution, occupancy, batches=1, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    occupied = torch.rand((batches, resolution, resolution, resolution), generator=generator)
+    return torch.argwhere(occupied < occupancy).int()
+
+
+def _ball(resolution, radius):
+    axis = torch.arange(resolution) - resolution / 2
+    grid = torch.stack(torch.meshgrid(axis, axis, axis, indexing="ij"), dim=-1)
+    inside = grid.norm(dim=-1) <= radius
+    return torch.nn.functional.pad(torch.argwhere(inside), (1, 0)).int()
+
+
+@pytest.mark.parametrize("resolution", [8, 24])
+@pytest.mark.parametrize("occupancy", [0.1, 0.6, 0.95])
+@pytest.mark.parametrize("distance", [0, 1, 2])
+def test_prune_matches_dense(resolution, occupancy, distance):
+    coords = _random_coords(resolution, occupancy, batches=2, seed=resolution)
+    expected = prune_sparse_structure_dense(coords, max_neighbor_axes_dist=distance)
+    pruned = prune_sparse_structure(coords, max_neighbor_axes_dist=distance)
+    assert pruned.dtype == expected.dtype
+    assert torch.equal(pruned, expected)
+
+
+def test_prune_keeps_the_surface_of_a_ball():
+    coords = _ball(32, 10)
+    pruned = prune_sparse_structure(coords + torch.tensor([0, 5, 7, 9], dtype=torch.int32))
+    assert torch.equal(pruned, prune_sparse_structure_dense(coords + torch.tensor([0, 5, 7, 9])))
+    assert 0 < pruned.shape[0] < coords.shape[0] / 2
+
+
+def test_unique_rows_matches_torch_unique():
+    rows = torch.randint(0, 20, (5000, 4), dtype=torch.int32)
+    rows[:, 0] = rows[:, 0] % 3
+    assert torch.equal(_unique_rows(rows), torch.unique(rows, dim=0))
+
+
+def test_downsample():
+    coords = _ball(64, 24)
+    assert downsample_sparse_structure(coords, max_coords=coords.shape[0])[1] == 1
+    downsampled, factor = downsample_sparse_structure(coords, max_coords=coords.shape[0] - 1)
+    assert factor == 2
+    assert torch.equal(downsampled, torch.unique(downsampled, dim=0))
+    extent = downsampled[:, 1:].max(0)[0] - downsampled[:, 1:].min(0)[0] + 1
+    assert (extent <= (coords[:, 1:].max(0)[0] - coords[:, 1:].min(0)[0] + 1) / 2 + 1).all()
+
+
+@pytest.mark.parametrize("connectivity", [6, 18, 26])
+def test_components_match_scipy(connectivity):
+    ndimage = pytest.importorskip("scipy.ndimage")
+    np = pytest.importorskip("numpy")
+    coords = _random_coords(16, 0.25, batches=2, seed=connectivity)
+    labels = sparse_connected_components(coords, connectivity)
+
+    structure = ndimage.generate_binary_structure(3, {6: 1, 18: 2, 26: 3}[connectivity])
+    for batch in range(2):
+        rows = (coords[:, 0] == batch).nonzero().squeeze(1)
+        grid = np.zeros((16, 16, 16), dtype=bool)
+        x, y, z = coords[rows, 1:].long().T.numpy()
+        grid[x, y, z] = True
+        expected = ndimage.label(grid, structure)[0][x, y, z]
+        # same partition: the two labelings map one to one
+        pairs = set(zip(labels[rows].tolist(), expected.tolist()))
+        assert len(pairs) == len(set(expected.tolist())) == len(set(labels[rows].tolist()))
+    # components never span batch indices
+    assert not set(labels[coords[:, 0] == 0].tolist()) & set(labels[coords[:, 0] == 1].tolist())
+
+
+def test_filter_small_components():
+    ball = _ball(24, 6)
+    floaters = torch.tensor([[0, 0, 0, 0], [0, 0, 0, 1], [0, 23, 23, 23]], dtype=torch.int32)
+    coords = torch.cat([floaters[:2], ball, floaters[2:]])
+
+    filtered = filter_sparse_components(coords, min_voxels=3)
+    assert torch.equal(filtered, ball)
+    assert torch.equal(filter_sparse_components(coords, min_voxels=2), coords[:-1])
+    with pytest.raises(ValueError):
+        sparse_connected_components(coords, connectivity=8)
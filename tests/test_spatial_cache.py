@@ -0,0 +1,131 @@
+"""Tests for the coords-only spatial cache of sparse tensors.
+
+Window partitions, serializations and downsample maps only depend on the
+coords, which stay fixed for every SLAT denoising step; they are computed once
+and then served from the SparseTensor spatial cache, which the SLAT wrapper
+keeps across steps for as long as the coords object stays the same.
+"""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+os.environ.setdefault("SPARSE_ATTN_BACKEND", "sdpa")
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("spconv")
+sp = pytest.importorskip("sam3d_objects.model.backbone.tdfy_dit.modules.sparse")
+
+
+def _random_coords(n=200, resolution=16, batch_size=1):
+    coords = []
+    for b in range(batch_size):
+        xyz = torch.unique(torch.randint(0, resolution, (n, 3)), dim=0)
+        coords.append(torch.cat([torch.full_like(xyz[:, :1], b), xyz], dim=1))
+    return torch.cat(coords).int()
+
+
+def test_window_partition_is_computed_once():
+    torch.manual_seed(0)
+    coords = _random_coords(batch_size=2)
+    qkv = sp.SparseTensor(feats=torch.randn(coords.shape[0], 3, 2, 8), coords=coords)
+
+    sp.reset_spatial_cache_stats()
+    first = sp.sparse_windowed_scaled_dot_product_self_attention(qkv, 8, (0, 0, 0))
+    # blocks share the cache through `replace`, e.g. the next block's qkv
+    second = sp.sparse_windowed_scaled_dot_product_self_attention(
+        qkv.replace(qkv.feats), 8, (0, 0, 0)
+    )
+    stats = sp.reset_spatial_cache_stats()
+
+    assert stats == {"hits": 1, "misses": 1}
+    torch.testing.assert_close(second.feats, first.feats)
+
+
+def test_serialization_is_computed_once():
+    pytest.importorskip("vox2seq")
+    torch.manual_seed(0)
+    coords = _random_coords()
+    qkv = sp.SparseTensor(feats=torch.randn(coords.shape[0], 3, 2, 8), coords=coords)
+
+    sp.reset_spatial_cache_stats()
+    for _ in range(3):
+        sp.sparse_serialized_scaled_dot_product_self_attention(
+            qkv, 16, sp.SerializeMode.Z_ORDER
+        )
+    assert sp.reset_spatial_cache_stats() == {"hits": 2, "misses": 1}
+
+
+def test_downsample_map_is_cached():
+    torch.manual_seed(0)
+    coords = _random_coords()
+    x = sp.SparseTensor(feats=torch.randn(coords.shape[0], 4), coords=coords)
+    downsample = sp.SparseDownsample(2)
+
+    sp.reset_spatial_cache_stats()
+    first = downsample(x)
+    second = downsample(x.replace(x.feats * 2))
+    assert sp.reset_spatial_cache_stats() == {"hits": 1, "misses": 1}
+    torch.testing.assert_close(second.feats, first.feats * 2)
+    assert torch.equal(second.coords, first.coords)
+
+
+def _tiny_slat_backbone():
+    slat_flow = pytest.importorskip(
+        "sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow"
+    )
+    backbone = slat_flow.SLatFlowModelTdfyWrapper(
+        resolution=16,
+        in_channels=8,
+        model_channels=32,
+        cond_channels=16,
+        out_channels=8,
+        num_blocks=1,
+        num_heads=2,
+        patch_size=2,
+        num_io_res_blocks=1,
+        io_block_channels=[16],
+    )
+    # spconv's CPU kernels cannot apply a fused bias
+    for module in backbone.modules():
+        if type(module).__name__ in ("SubMConv3d", "SparseConv3d", "SparseInverseConv3d"):
+            module.bias = None
+    return backbone.eval()
+
+
+def test_slat_wrapper_reuses_the_cache_across_steps():
+    torch.manual_seed(0)
+    backbone = _tiny_slat_backbone()
+    coords = _random_coords(n=80).numpy()
+    x = torch.randn(1, coords.shape[0], 8)
+    cond = torch.randn(1, 10, 16)
+
+    with torch.no_grad():
+        sp.reset_spatial_cache_stats()
+        first_step = backbone(x, torch.tensor(100.0), cond, coords)
+        first = sp.reset_spatial_cache_stats()
+        second_step = backbone(x, torch.tensor(100.0), cond, coords)
+        second = sp.reset_spatial_cache_stats()
+
+        backbone.clear_spatial_cache()
+        fresh = backbone(x, torch.tensor(100.0), cond, coords)
+
+    assert first["misses"] > 0
+    assert second == {"hits": first["hits"] + first["misses"], "misses": 0}
+    torch.testing.assert_close(second_step, first_step)
+    torch.testing.assert_close(fresh, first_step)
+
+
+def test_slat_wrapper_drops_the_cache_for_new_coords():
+    torch.manual_seed(0)
+    backbone = _tiny_slat_backbone()
+    cond = torch.randn(1, 10, 16)
+
+    with torch.no_grad():
+        for n in (80, 120):
+            coords = _random_coords(n=n).numpy()
+            x = torch.randn(1, coords.shape[0], 8)
+            sp.reset_spatial_cache_stats()
+            backbone(x, torch.tensor(100.0), cond, coords)
+            assert sp.reset_spatial_cache_stats()["misses"] > 0
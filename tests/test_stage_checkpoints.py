@@ -0,0 +1,177 @@
+"""Tests for the named stage checkpoints of the pipeline (stage_checkpoints.py)."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+from loguru import logger  # noqa: E402
+
+from sam3d_objects.pipeline.stage_checkpoints import (  # noqa: E402
+    STAGES,
+    StageCheckpoints,
+    check_stage,
+    pointmap_from_checkpoint,
+    pointmap_to_checkpoint,
+    resumes,
+    run_stage,
+)
+
+
+def test_resumes():
+    assert [stage for stage in STAGES if resumes(stage, "slat")] == ["pointmap", "ss", "slat"]
+    assert not any(resumes(stage, None) for stage in STAGES)
+    with pytest.raises(ValueError, match="unknown stage"):
+        check_stage("latent")
+
+
+def test_save_load_and_setting_changes(tmp_path):
+    checkpoints = StageCheckpoints(str(tmp_path / "ckpt"))
+    with pytest.raises(FileNotFoundError, match="'ss' checkpoint"):
+        checkpoints.load("ss")
+    checkpoints.save("ss", {"coords": torch.arange(8).view(2, 4)}, {"seed": 1})
+
+    warnings = []
+    sink = logger.add(warnings.append, level="WARNING")
+    try:
+        value = checkpoints.load("ss", {"seed": 1})
+        assert not warnings
+        checkpoints.load("ss", {"seed": 2})
+    finally:
+        logger.remove(sink)
+    torch.testing.assert_close(value["coords"], torch.arange(8).view(2, 4))
+    assert len(warnings) == 1 and "'seed': (1, 2)" in warnings[0]
+    assert os.listdir(tmp_path / "ckpt") == ["ss.pt"]
+
+
+def test_run_stage_computes_saves_and_resumes(tmp_path):
+    checkpoints = StageCheckpoints(str(tmp_path))
+    calls = []
+
+    def compute(stage):
+        def fn():
+            calls.append(stage)
+            return {"value": torch.tensor([len(calls)])}
+
+        return fn
+
+    for stage in STAGES:
+        run_stage(checkpoints, stage, compute(stage))
+    assert calls == list(STAGES)
+
+    calls.clear()
+    resumed = {stage: run_stage(checkpoints, stage, compute(stage), "slat") for stage in STAGES}
+    assert calls == ["decoded", "layout"]
+    assert resumed["ss"]["value"].item() == 2  # as saved by the first run
+    # without checkpoints nothing is saved, nothing resumed
+    assert run_stage(None, "ss", lambda: 7) == 7
+
+
+def test_pointmap_round_trip(tmp_path):
+    rgb = np.random.default_rng(0).integers(0, 256, (3, 6, 5), dtype=np.uint8)
+    normal = torch.nn.functional.normalize(torch.randn(6, 5, 3), dim=-1)
+    pointmap_dict = {
+        "pts_color": torch.from_numpy((rgb / 255).astype(np.float32)),
+        "pointmap": torch.randn(3, 6, 5),
+        "intrinsics": torch.eye(3),
+        "normal": normal,
+    }
+    checkpoints = StageCheckpoints(str(tmp_path))
+    checkpoints.save("pointmap", pointmap_to_checkpoint(pointmap_dict))
+    stored = checkpoints.load("pointmap")
+    restored = pointmap_from_checkpoint(stored)
+
+    assert stored["pts_color"].dtype == torch.uint8
+    assert torch.equal(restored["pts_color"], pointmap_dict["pts_color"])
+    assert torch.equal(restored["pointmap"], pointmap_dict["pointmap"])
+    torch.testing.assert_close(restored["normal"], normal, atol=1e-3, rtol=0)
+    assert pointmap_from_checkpoint(pointmap_to_checkpoint({**pointmap_dict, "normal": None}))[
+        "normal"
+    ] is None
+
+
+def _stub_pipeline(calls):
+    """A pointmap pipeline whose stages record their names in `calls`."""
+    pointmap_module = pytest.importorskip("sam3d_objects.pipeline.inference_pipeline_pointmap")
+    pipeline = object.__new__(pointmap_module.InferencePipelinePointMap)
+    pipeline.device = torch.device("cpu")
+    pipeline.result_cache = None
+    pipeline.decode_formats = ["gaussian"]
+    pipeline.fill_holes_mode = None
+    pipeline.texture_bake_mode = None
+    pipeline.uv_parametrizer = None
+    pipeline.layout_rotation_hypotheses, pipeline.layout_scale_hypotheses = 1, (1.0,)
+    pipeline.ss_preprocessor = pipeline.slat_preprocessor = None
+
+    def record(name, value):
+        calls.append(name)
+        return value
+
+    pipeline.compute_pointmap = lambda image, pointmap=None: record(
+        "pointmap",
+        {
+            "pts_color": torch.rand(3, *image.shape[:2]),
+            "pointmap": torch.randn(3, *image.shape[:2]),
+            "intrinsics": torch.eye(3),
+            "normal": None,
+        },
+    )
+    pipeline.preprocess_image = lambda image, preprocessor, pointmap=None: {
+        "image": torch.zeros(1, 3, *image.shape[:2])
+    }
+    pipeline.sample_sparse_structure = lambda *args, **kwargs: record(
+        "ss", {"coords": torch.zeros(4, 4, dtype=torch.int32)}
+    )
+    pipeline.sample_sparse_structure_multi_object = lambda input_dict, **kwargs: record(
+        "ss",
+        [{"coords": torch.zeros(4, 4, dtype=torch.int32)} for _ in input_dict["image"]],
+    )
+    pipeline._decode_pose = lambda ss_return_dict, ss_input_dict: ss_return_dict.update(
+        scale=torch.ones(1, 3)
+    )
+    pipeline.sample_slat = lambda *args, **kwargs: record("slat", torch.randn(4, 8))
+    pipeline.sample_slat_multi_object = lambda input_dict, coords, **kwargs: record(
+        "slat", [torch.randn(4, 8) for _ in coords]
+    )
+    pipeline._slat_to_cache = lambda slat: {"feats": slat}
+    pipeline._slat_from_cache = lambda cached: cached["feats"]
+    pipeline.decode_slat = lambda slat, formats: record("decoded", {"gaussian": [slat.sum()]})
+    pipeline.postprocess_slat_output = lambda outputs, *args: record("postprocess", outputs)
+    return pipeline
+
+
+def test_pipeline_resume_from_slat(tmp_path):
+    calls = []
+    pipeline = _stub_pipeline(calls)
+    image = np.zeros((8, 8, 4), dtype=np.uint8)
+    checkpoint_dir = str(tmp_path / "ckpt")
+    first = pipeline.run(image, seed=1, checkpoint_dir=checkpoint_dir)
+    assert calls == ["pointmap", "ss", "slat", "decoded", "postprocess"]
+    assert sorted(os.listdir(checkpoint_dir)) == [f"{stage}.pt" for stage in sorted(STAGES)]
+
+    calls.clear()
+    resumed = pipeline.run(image, seed=1, checkpoint_dir=checkpoint_dir, resume_from="slat")
+    assert calls == ["decoded", "postprocess"]
+    torch.testing.assert_close(resumed["gaussian"][0], first["gaussian"][0])
+    torch.testing.assert_close(resumed["scale"], first["scale"])
+    with pytest.raises(ValueError, match="checkpoint_dir"):
+        pipeline.run(image, seed=1, resume_from="ss")
+
+
+def test_pipeline_run_batch_groups_equal_inputs_and_defers_postprocessing():
+    calls = []
+    pipeline = _stub_pipeline(calls)
+    images = [np.zeros((h, 8, 4), dtype=np.uint8) for h in (8, 6, 8)]
+    finishes = pipeline.run_batch(images, seed=1, defer_postprocess=True)
+    # one SS and one SLAT batch per input shape, decoded per image
+    assert calls == ["pointmap"] * 3 + ["ss", "slat", "decoded", "decoded", "ss", "slat", "decoded"]
+
+    calls.clear()
+    with ThreadPoolExecutor(1) as pool:
+        outputs = [pool.submit(finish).result() for finish in finishes]
+    assert calls == ["postprocess"] * 3
+    assert [tuple(output["pointmap"].shape[:2]) for output in outputs] == [(8, 8), (6, 8), (8, 8)]
@@ -0,0 +1,188 @@
+"""Tests for the texture baking engine of bake_texture (texture_baking)."""
+import functools
+import os
+from types import SimpleNamespace
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+from sam3d_objects.model.backbone.tdfy_dit.utils import texture_baking  # noqa: E402
+
+
+def _texel_uv(size, texels):
+    # UV map of a (1, len, 1, 2) "image" whose pixels hit the given texel centers
+    return ((texels.float() + 0.5) / size).flip(-1)[None, :, None]
+
+
+def _scene(texture_size=16, views=6, image_size=24, seed=0):
+    """Random affine UV maps over a smooth texture; every view sees a window of it."""
+    generator = torch.Generator().manual_seed(seed)
+    v, u = torch.meshgrid(torch.linspace(0, 1, 64), torch.linspace(0, 1, 64), indexing="ij")
+    truth = torch.stack([u, v, 0.5 + 0.5 * torch.sin(6 * u) * torch.cos(4 * v)], -1)[None]
+    pixels = torch.linspace(0, 1, image_size)
+    y, x = torch.meshgrid(pixels, pixels, indexing="ij")
+    uv_maps, observations, masks = [], [], []
+    for _ in range(views):
+        offset = torch.rand(2, generator=generator) * 0.5
+        uv = torch.stack([offset[0] + 0.5 * x, offset[1] + 0.5 * y], -1)[None]
+        uv_maps.append(uv)
+        observations.append(texture_baking.sample_texture(truth, uv))
+        masks.append(torch.rand(image_size, image_size, generator=generator) > 0.1)
+    return uv_maps, observations, masks
+
+
+def test_projection_bake_averages_the_pixels_of_every_texel():
+    texels = torch.tensor([[0, 0], [0, 0], [3, 2], [7, 7]])
+    colors = torch.tensor([[1.0, 0, 0], [0, 1.0, 0], [0, 0, 1.0], [1.0, 1.0, 1.0]])
+    sums, weights = texture_baking.projection_bake(
+        [_texel_uv(8, texels)], [colors[:, None]], [torch.ones(4, 1, dtype=torch.bool)], 8
+    )
+    assert weights.sum() == 4 and weights[0, 0] == 2 and weights[3, 2] == 1
+    torch.testing.assert_close(sums[0, 0] / weights[0, 0], torch.tensor([0.5, 0.5, 0.0]))
+    torch.testing.assert_close(sums[3, 2], colors[2])
+    torch.testing.assert_close(sums[7, 7], colors[3])
+
+
+def test_texels_are_centered_as_in_nvdiffrast():
+    texture = torch.rand(1, 4, 4, 3)
+    texels = torch.tensor([[0, 0], [1, 3], [3, 2]])
+    # sampling at a texel center returns the texel
+    sampled = texture_baking.sample_texture(texture, _texel_uv(4, texels))[:, 0]
+    torch.testing.assert_close(sampled, texture[0, texels[:, 0], texels[:, 1]])
+    # and a pixel is baked into the texel it falls in, up to the next texel's edge
+    uv = torch.tensor([[0.0, 0.0], [0.249, 0.249], [0.25, 0.749], [1.0, 1.0]])[None, :, None]
+    _, weights = texture_baking.projection_bake(
+        [uv], [torch.ones(4, 1, 3)], [torch.ones(4, 1, dtype=torch.bool)], 4
+    )
+    assert weights[0, 0] == 2 and weights[2, 1] == 1 and weights[3, 3] == 1
+
+
+def test_texture_pyramid_fills_holes_from_coarser_levels():
+    sums = torch.zeros(8, 8, 3)
+    weights = torch.zeros(8, 8)
+    sums[1, 1], weights[1, 1] = torch.tensor([2.0, 2.0, 2.0]), 2
+    sums[6, 6], weights[6, 6] = torch.tensor([0.0, 0.0, 1.0]), 1
+
+    pyramid = texture_baking.texture_pyramid(sums, weights, 3)
+    assert [level.shape[1] for level in pyramid] == [2, 4, 8]
+    finest = pyramid[-1][0]
+    # seen texels keep their average, holes take their coarse parent
+    torch.testing.assert_close(finest[1, 1], torch.ones(3))
+    torch.testing.assert_close(finest[6, 6], torch.tensor([0.0, 0.0, 1.0]))
+    torch.testing.assert_close(finest[0, 3], torch.ones(3))
+    torch.testing.assert_close(finest[7, 4], torch.tensor([0.0, 0.0, 1.0]))
+    # the quadrants nothing reached take the mean of all pixels
+    torch.testing.assert_close(finest[0, 7], torch.tensor([2.0, 2.0, 3.0]) / 3)
+
+
+def test_adaptive_bake_without_steps_is_the_projection_bake():
+    uv_maps, observations, masks = _scene()
+    texture = texture_baking.adaptive_bake(
+        uv_maps, None, observations, masks, 16, levels=3, max_steps=0
+    )
+    expected = texture_baking.texture_pyramid(
+        *texture_baking.projection_bake(uv_maps, observations, masks, 16), 3
+    )[-1]
+    torch.testing.assert_close(texture, expected)
+
+
+def test_adaptive_bake_stops_early_and_fits_the_views():
+    uv_maps, observations, masks = _scene()
+
+    def render(texture, index):
+        return texture_baking.sample_texture(texture, uv_maps[index])
+
+    def view_loss(texture):
+        return sum(
+            torch.nn.functional.l1_loss(render(texture, i)[masks[i]], observations[i][masks[i]])
+            for i in range(len(masks))
+        ) / len(masks)
+
+    np.random.seed(0)
+    stats = {}
+    texture = texture_baking.adaptive_bake(
+        uv_maps, render, observations, masks, 16, levels=2, max_steps=600, stats=stats
+    )
+    assert [level["size"] for level in stats["levels"]] == [8, 16]
+    assert all(level["steps"] < 600 for level in stats["levels"])
+    assert stats["steps"] == sum(level["steps"] for level in stats["levels"])
+
+    projection = texture_baking.texture_pyramid(
+        *texture_baking.projection_bake(uv_maps, observations, masks, 16), 1
+    )[-1]
+    assert view_loss(texture) < 0.5 * view_loss(projection)
+
+
+def test_optimize_texture_fixed_schedule_takes_every_step():
+    uv_maps, observations, masks = _scene(views=3)
+    stats = {}
+    np.random.seed(0)
+    texture_baking.optimize_texture(
+        torch.zeros(1, 16, 16, 3),
+        lambda texture, index: texture_baking.sample_texture(texture, uv_maps[index]),
+        observations,
+        masks,
+        steps=25,
+        stats=stats,
+    )
+    assert stats == {"steps": 25, "losses": []}
+
+
+@pytest.mark.parametrize("mode", ["fast", "adaptive"])
+def test_bake_texture_ignores_masked_pixels_off_the_mesh(monkeypatch, mode):
+    postprocessing_utils = pytest.importorskip(
+        "sam3d_objects.model.backbone.tdfy_dit.utils.postprocessing_utils"
+    )
+    size, texture_size = 16, 8
+
+    def rasterize_triangle_faces(ctx, vertices, faces, width, height, uv=None, **kwargs):
+        if uv is None:
+            # the UV charts cover the whole texture
+            return {"mask": torch.ones(1, height, width)}
+        # the mesh covers the left half of the image, mapped onto the texture
+        y, x = torch.meshgrid(torch.arange(height), torch.arange(width), indexing="ij")
+        hit = x < width // 2
+        uv_map = torch.stack([(x + 0.5) / (width // 2), (y + 0.5) / height], -1) * hit[..., None]
+        return {"uv": uv_map[None], "uv_dr": torch.zeros(1, height, width, 4), "mask": hit[None]}
+
+    monkeypatch.setattr(
+        postprocessing_utils,
+        "utils3d",
+        SimpleNamespace(
+            torch=SimpleNamespace(
+                RastContext=lambda backend: None,
+                rasterize_triangle_faces=rasterize_triangle_faces,
+                extrinsics_to_view=lambda extrinsics: extrinsics,
+                intrinsics_to_perspective=lambda intrinsics, near, far: intrinsics,
+            )
+        ),
+    )
+    monkeypatch.setattr(
+        postprocessing_utils,
+        "adaptive_bake",
+        functools.partial(texture_baking.adaptive_bake, max_steps=0),
+    )
+    # green on the mesh, red beyond it, and a mask (as from the Gaussian
+    # renders) that covers both
+    observation = np.zeros((size, size, 3), dtype=np.uint8)
+    observation[:, : size // 2, 1] = 255
+    observation[:, size // 2 :, 0] = 255
+    texture = postprocessing_utils.bake_texture(
+        np.zeros((3, 3), dtype=np.float32),
+        np.zeros((1, 3), dtype=np.int64),
+        np.zeros((3, 2), dtype=np.float32),
+        [observation],
+        [np.ones((size, size), dtype=np.uint8)],
+        [np.eye(4)],
+        [np.eye(3)],
+        texture_size=texture_size,
+        mode=mode,
+        rendering_engine="pytorch3d",
+        device="cpu",
+    )
+    assert texture.shape == (texture_size, texture_size, 3)
+    assert texture[..., 0].max() == 0 and texture[..., 1].min() == 255
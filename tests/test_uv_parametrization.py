@@ -0,0 +1,164 @@
+"""Tests for the cached, component-parallel UV parametrization (uv_parametrization).
+
+The cache, split and merge are exercised with a planar stand-in for xatlas;
+xatlas itself is only needed by the last test.
+"""
+import gc
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np
+import pytest
+
+from sam3d_objects.model.backbone.tdfy_dit.utils import uv_parametrization  # noqa: E402
+
+CALLS = []
+
+
+def _planar(vertices, faces):
+    """Project onto the xy plane and fit into the unit square, like an atlas of one chart."""
+    CALLS.append(len(faces))
+    xy = vertices[:, :2] - vertices[:, :2].min(0)
+    return np.arange(len(vertices)), faces.astype(np.uint32), (xy / xy.max()).astype(np.float32)
+
+
+def _grid(n, offset=(0.0, 0.0), scale=1.0):
+    # n x n quads in the z = 0 plane
+    x, y = np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing="ij")
+    vertices = np.stack([x.ravel(), y.ravel(), np.zeros(x.size)], 1) * scale
+    vertices[:, :2] += offset
+    index = np.arange((n + 1) ** 2).reshape(n + 1, n + 1)
+    a, b, c, d = index[:-1, :-1], index[1:, :-1], index[1:, 1:], index[:-1, 1:]
+    faces = np.concatenate([np.stack([a, b, c], -1), np.stack([a, c, d], -1)]).reshape(-1, 3)
+    return vertices.astype(np.float32), faces.astype(np.int64)
+
+
+def _meshes(*grids):
+    vertices, faces, base = [], [], 0
+    for v, f in grids:
+        vertices.append(v)
+        faces.append(f + base)
+        base += len(v)
+    return np.concatenate(vertices), np.concatenate(faces)
+
+
+def test_face_components_follow_shared_vertices():
+    faces = np.array([[0, 1, 2], [5, 6, 7], [2, 3, 4], [8, 9, 10], [7, 8, 11]])
+    labels = uv_parametrization.face_components(faces, 12)
+    assert labels.tolist() == [0, 1, 0, 1, 1]
+    assert uv_parametrization.face_components(np.zeros((0, 3), int), 0).size == 0
+
+
+def test_split_mesh_balances_components_over_parts():
+    vertices, faces = _meshes(_grid(6), _grid(2, (10, 0)), _grid(4, (20, 0)), _grid(3, (30, 0)))
+    parts = uv_parametrization.split_mesh(vertices, faces, 2)
+    assert len(parts) == 2
+    sizes = sorted(len(part_faces) for _, part_faces in parts)
+    assert sizes == [2 * 9 + 2 * 16 + 2 * 4, 2 * 36]
+    # every face lands in exactly one part, with its own vertices
+    rebuilt = np.concatenate([vertex_ids[part_faces] for vertex_ids, part_faces in parts])
+    assert sorted(map(tuple, rebuilt)) == sorted(map(tuple, faces))
+
+
+def test_merge_atlases_packs_parts_at_one_texel_density():
+    vertices, faces = _meshes(_grid(4), _grid(2, (10, 0), scale=0.5), _grid(3, (20, 0), scale=2.0))
+    parts = uv_parametrization.split_mesh(vertices, faces, 3)
+    atlases = [_planar(vertices[ids], part_faces) for ids, part_faces in parts]
+    vmapping, merged_faces, uvs = uv_parametrization.merge_atlases(parts, atlases, vertices)
+
+    assert len(merged_faces) == len(faces) and uvs.min() >= 0 and uvs.max() <= 1
+    rebuilt = vmapping[merged_faces]
+    assert sorted(map(tuple, rebuilt)) == sorted(map(tuple, faces))
+    # UV area per unit of surface is the same for every part
+    areas = []
+    start = 0
+    for ids, part_faces in parts:
+        part = merged_faces[start : start + len(part_faces)]
+        start += len(part_faces)
+        surface = uv_parametrization._surface_area(vertices[vmapping], part)
+        areas.append(uv_parametrization.uv_utilization(uvs, part) / surface)
+    np.testing.assert_allclose(areas, areas[0], rtol=1e-4)
+    # the part boxes do not overlap, so the covered area is the sum of the parts
+    boxes = []
+    start = 0
+    for _, part_faces in parts:
+        part_uvs = uvs[merged_faces[start : start + len(part_faces)]].reshape(-1, 2)
+        start += len(part_faces)
+        boxes.append((part_uvs.min(0), part_uvs.max(0)))
+    for i in range(len(boxes)):
+        for j in range(i + 1, len(boxes)):
+            overlap = np.minimum(boxes[i][1], boxes[j][1]) - np.maximum(boxes[i][0], boxes[j][0])
+            assert (overlap <= 1e-6).any()
+
+
+def test_parametrizer_caches_in_memory_and_on_disk(tmp_path):
+    vertices, faces = _grid(3)
+    CALLS.clear()
+    parametrizer = uv_parametrization.UVParametrizer(
+        cache_dir=str(tmp_path), parametrize=_planar
+    )
+    first = parametrizer(vertices, faces)
+    second = parametrizer(vertices, faces)
+    assert len(CALLS) == 1 and parametrizer.stats["memory_hits"] == 1
+    for a, b in zip(first, second):
+        np.testing.assert_array_equal(a, b)
+
+    # a new process reads the disk tier
+    fresh = uv_parametrization.UVParametrizer(cache_dir=str(tmp_path), parametrize=_planar)
+    for a, b in zip(first, fresh(vertices, faces)):
+        np.testing.assert_array_equal(a, b)
+    assert len(CALLS) == 1 and fresh.stats["disk_hits"] == 1
+
+    # any change of the mesh is a miss
+    moved = vertices.copy()
+    moved[0, 2] += 1e-6
+    fresh(moved, faces)
+    assert len(CALLS) == 2 and fresh.hit_rate() == 0.5
+
+
+def test_parametrizer_splits_large_meshes_over_processes():
+    vertices, faces = _meshes(_grid(4), _grid(4, (10, 0)), _grid(2, (20, 0)))
+    parametrizer = uv_parametrization.UVParametrizer(
+        max_memory_bytes=0, processes=2, min_parallel_faces=10, parametrize=_planar
+    )
+    try:
+        vmapping, merged_faces, uvs = parametrizer(vertices, faces)
+    finally:
+        parametrizer.close()
+    assert sorted(map(tuple, vmapping[merged_faces])) == sorted(map(tuple, faces))
+    assert uvs.min() >= 0 and uvs.max() <= 1
+    # a different split is a different atlas
+    single = uv_parametrization.UVParametrizer(parametrize=_planar)
+    assert single.key(vertices, faces) != parametrizer.key(vertices, faces)
+
+
+def test_parametrizer_settings_and_pool_shutdown():
+    parametrizer = uv_parametrization.UVParametrizer(
+        processes=2, min_parallel_faces=10, parametrize=_planar
+    )
+    assert parametrizer.settings() == ("_planar", 2, 10)
+    assert parametrizer.settings() != uv_parametrization.UVParametrizer(parametrize=_planar).settings()
+    pool = parametrizer._get_pool()
+    assert pool._mp_context.get_start_method() != "fork"
+    # a parametrizer nobody closes does not leak its workers
+    del parametrizer
+    gc.collect()
+    assert pool._shutdown_thread
+
+
+def test_split_xatlas_keeps_most_of_the_utilization():
+    pytest.importorskip("xatlas")
+    vertices, faces = _meshes(*[_grid(8, (12 * i, 0), scale=1 + 0.2 * i) for i in range(6)])
+    vertices[:, 2] = np.sin(vertices[:, 0]) * 0.3
+    single = uv_parametrization.xatlas_parametrize(vertices, faces)
+    parametrizer = uv_parametrization.UVParametrizer(processes=3, min_parallel_faces=1)
+    try:
+        vmapping, merged_faces, uvs = parametrizer(vertices, faces)
+    finally:
+        parametrizer.close()
+    assert sorted(map(tuple, vmapping[merged_faces])) == sorted(map(tuple, faces))
+    assert uv_parametrization.uv_utilization(uvs, merged_faces) > 0.6 * uv_parametrization.uv_utilization(
+        single[2], single[1]
+    )
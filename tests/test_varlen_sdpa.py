@@ -0,0 +1,83 @@
+"""CPU tests for the varlen sparse SDPA backend (SPARSE_ATTN_BACKEND=sdpa_varlen).
+
+masked_sdpa.py only depends on torch, so it is loaded directly from its file
+to avoid importing the sparse package (spconv) and sam3d_objects/__init__.py.
+"""
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+_ROOT = Path(__file__).resolve().parents[1]
+_spec = importlib.util.spec_from_file_location(
+    "masked_sdpa",
+    _ROOT
+    / "sam3d_objects"
+    / "model"
+    / "backbone"
+    / "tdfy_dit"
+    / "modules"
+    / "sparse"
+    / "attention"
+    / "masked_sdpa.py",
+)
+masked_sdpa_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(masked_sdpa_module)
+masked_sdpa = masked_sdpa_module.masked_sdpa
+varlen_sdpa = masked_sdpa_module.varlen_sdpa
+length_buckets = masked_sdpa_module.length_buckets
+
+
+def _packed(seqlens, heads=2, channels=8):
+    return torch.randn(1, sum(seqlens), heads, channels)
+
+
+@pytest.mark.parametrize(
+    "q_seqlen, kv_seqlen",
+    [
+        ([17], [17]),  # single sequence
+        ([16, 16, 16], [16, 16, 16]),  # equal lengths, no padding needed
+        ([5, 40, 12, 33, 7], [5, 40, 12, 33, 7]),  # self-attention, ragged
+        ([9, 30, 4], [10, 10, 10]),  # cross-attention to dense condition tokens
+        ([9, 30, 4], [3, 25, 11]),  # ragged queries and keys
+    ],
+)
+def test_varlen_matches_masked(q_seqlen, kv_seqlen):
+    torch.manual_seed(0)
+    q, k, v = _packed(q_seqlen), _packed(kv_seqlen), _packed(kv_seqlen)
+    expected = masked_sdpa(q, k, v, q_seqlen, kv_seqlen)
+    out = varlen_sdpa(q, k, v, q_seqlen, kv_seqlen)
+    assert out.shape == expected.shape
+    torch.testing.assert_close(out, expected, atol=1e-5, rtol=1e-5)
+
+
+def test_varlen_never_builds_the_block_diagonal_mask(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("varlen_sdpa must not build the dense mask")
+
+    monkeypatch.setattr(masked_sdpa_module, "block_diag_attn_mask", fail)
+    seqlens = [8, 20, 3]
+    q = _packed(seqlens)
+    varlen_sdpa(q, q, q, seqlens, seqlens)
+
+
+def test_length_buckets_cover_every_sequence_once():
+    q_seqlen = [5, 40, 12, 33, 7, 40, 5]
+    buckets = length_buckets(q_seqlen, q_seqlen)
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(q_seqlen)))
+
+
+@pytest.mark.parametrize("max_padding", [0.0, 0.25, 1.0])
+def test_length_buckets_respect_the_padding_budget(max_padding):
+    torch.manual_seed(0)
+    seqlens = torch.randint(1, 64, (50,)).tolist()
+    for bucket in length_buckets(seqlens, seqlens, max_padding):
+        area = sum(seqlens[i] ** 2 for i in bucket)
+        padded = len(bucket) * max(seqlens[i] for i in bucket) ** 2
+        assert len(bucket) == 1 or padded <= (1 + max_padding) * area
+
+
+def test_equal_lengths_share_one_bucket():
+    assert length_buckets([16] * 6, [16] * 6, max_padding=0.0) == [list(range(6))]
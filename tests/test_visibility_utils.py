@@ -0,0 +1,123 @@
+"""Tests for the face visibility of `_fill_holes` (visibility_utils).
+
+Only the CPU ray casting backend is exercised; it needs numpy and torch.
+"""
+import os
+
+# See test_moge2_depth_model.py: skip the heavy sam3d_objects.init import.
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+from sam3d_objects.model.backbone.tdfy_dit.utils import visibility_utils  # noqa: E402
+from sam3d_objects.model.backbone.tdfy_dit.utils.random_utils import (  # noqa: E402
+    sphere_hammersley_sequence,
+)
+
+
+def _box(center, half_size, subdivisions=1):
+    # closed axis aligned box, each side split into subdivisions^2 quads
+    verts, faces = [], []
+    grid = np.linspace(-1, 1, subdivisions + 1)
+    for axis in range(3):
+        for sign in (-1, 1):
+            base = len(verts)
+            for a in grid:
+                for b in grid:
+                    p = np.zeros(3)
+                    p[axis] = sign
+                    p[(axis + 1) % 3], p[(axis + 2) % 3] = a, b
+                    verts.append(center + half_size * p)
+            n = subdivisions + 1
+            for i in range(subdivisions):
+                for j in range(subdivisions):
+                    v00, v01 = base + i * n + j, base + i * n + j + 1
+                    v10, v11 = v00 + n, v01 + n
+                    faces += [[v00, v10, v11], [v00, v11, v01]]
+    # weld the vertices shared by two sides
+    verts, index = np.unique(np.round(verts, 6), axis=0, return_inverse=True)
+    return verts, index.reshape(-1)[np.asarray(faces)]
+
+
+def _outer_and_inner_box():
+    outer_v, outer_f = _box(np.zeros(3), 0.4, subdivisions=2)
+    inner_v, inner_f = _box(np.zeros(3), 0.1)
+    verts = np.concatenate([outer_v, inner_v])
+    faces = np.concatenate([outer_f, inner_f + len(outer_v)])
+    return torch.tensor(verts, dtype=torch.float32), torch.tensor(faces), len(outer_f)
+
+
+def test_bvh_matches_brute_force():
+    rng = np.random.default_rng(0)
+    verts = rng.uniform(-0.5, 0.5, (300, 3))
+    faces = rng.integers(0, 300, (200, 3))
+    bvh = visibility_utils.TriangleBVH(verts, faces, leaf_size=4)
+
+    origins = rng.normal(size=(3000, 3))
+    origins = 2 * origins / np.linalg.norm(origins, axis=1, keepdims=True)
+    directions = rng.uniform(-0.4, 0.4, (3000, 3)) - origins
+    face_ids, distances = bvh.intersect_first(origins, directions, max_rays=1000)
+
+    all_t = np.stack(
+        [bvh._triangles(origins, directions, np.full(3000, f)) for f in range(200)], axis=1
+    )
+    expected = np.where(np.isfinite(all_t.min(axis=1)), all_t.argmin(axis=1), -1)
+    assert (face_ids >= 0).mean() > 0.5
+    np.testing.assert_array_equal(face_ids, expected)
+    np.testing.assert_allclose(distances, all_t.min(axis=1))
+
+
+def test_enclosed_faces_are_invisible():
+    verts, faces, num_outer = _outer_and_inner_box()
+    visibility, views = visibility_utils.face_visibility(
+        verts, faces, num_views=40, resolution=32, backend="bvh"
+    )
+    assert views == 40 and visibility.shape == (faces.shape[0],)
+    assert (visibility[:num_outer] > 0).all()
+    assert (visibility[num_outer:] == 0).all()
+
+
+def test_early_termination_keeps_the_invisible_set():
+    verts, faces, _ = _outer_and_inner_box()
+    full, _ = visibility_utils.face_visibility(
+        verts, faces, num_views=200, resolution=24, backend="bvh"
+    )
+    fast, views = visibility_utils.face_visibility(
+        verts, faces, num_views=200, resolution=24, backend="bvh",
+        chunk_size=4, convergence_tol=0.0, convergence_window=16,
+    )
+    assert views < 200
+    torch.testing.assert_close(fast == 0, full == 0)
+
+
+def test_camera_origins_are_a_progressive_permutation():
+    origins = visibility_utils.sphere_camera_origins(100, radius=2.0)
+    expected = []
+    for i in range(100):
+        yaw, pitch = sphere_hammersley_sequence(i, 100)
+        expected.append(
+            [np.sin(yaw) * np.cos(pitch), np.cos(yaw) * np.cos(pitch), np.sin(pitch)]
+        )
+    expected = 2 * np.asarray(expected)
+    np.testing.assert_allclose(
+        np.sort(origins.view("f8,f8,f8"), axis=0).view(float),
+        np.sort(expected.view("f8,f8,f8"), axis=0).view(float),
+    )
+    # the first few views already surround the object
+    assert (np.sign(origins[:16]) > 0).any(axis=0).all()
+    assert (np.sign(origins[:16]) < 0).any(axis=0).all()
+
+
+def test_count_boundary_loops():
+    _, faces = _box(np.zeros(3), 1.0, subdivisions=2)
+    assert visibility_utils.count_boundary_loops(faces) == 0
+    # one quad of a side -> one hole, quads on two sides -> two holes
+    assert visibility_utils.count_boundary_loops(faces[2:]) == 1
+    assert visibility_utils.count_boundary_loops(np.delete(faces, [0, 1, 10, 11], axis=0)) == 2
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        visibility_utils.resolve_visibility_backend("optix")